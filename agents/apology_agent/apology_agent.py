@@ -1,9 +1,9 @@
 # agents/apology_agent/apology_agent.py
-# (V46.0 - Async & CORRECTED Groq Fix)
+# (V46.1 - Async via Shared LLM Gateway)
 
 from typing import Dict, Any
-from groq import AsyncGroq 
-import asyncio
+from core.llm_gateway import llm_gateway
+from core.tracing import traced
 
 class ApologyAgent:
     """
@@ -39,30 +39,14 @@ class ApologyAgent:
 """
         print("🛡️ Apology Agent (V46 - Async Handler) is on standby.") 
 
+    @traced("llm.call")
     async def _call_llm_async(self, prompt: str) -> str:
-        
-        api_key = await self.key_manager.get_key() 
-        if not api_key: raise Exception("No available Groq API keys.")
-        
-        try:
-            client = AsyncGroq(api_key=api_key)
-            
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model_name,
-            )
-            return chat_completion.choices[0].message.content.strip()
-        
-        except Exception as e:
-            print(f"❌ ApologyAgent LLM Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key) 
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying _call_llm_async...")
-                await asyncio.sleep(1)
-                return await self._call_llm_async(prompt) 
-            
-            raise e 
+        # [V46.1] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+        answer = await llm_gateway.chat(self.key_manager, self.model_name, [{"role": "user", "content": prompt}],
+                                        label="Apology Agent")
+        return answer.strip()
+
+    @traced("agent.handle")
     async def handle(self, original_query: str, error_context: str) -> str:
         """
         [V20] เมธอดหลักที่ Dispatcher จะเรียกใช้เมื่อเกิด Error (แบบ Async)
@@ -1,12 +1,13 @@
 # agents/coder_mode/code_interpreter_agent.py
-# (V45.0 - Async & CORRECTED Groq Fix)
+# (V45.1 - Async via Shared LLM Gateway)
 
-from groq import AsyncGroq  # <-- [V19] (ถูกต้อง)
 from core.code_executor import CodeExecutor
+from core.llm_gateway import llm_gateway
 import re
 import traceback
 from typing import List, Dict, Any, Optional
 import asyncio 
+from core.tracing import traced
 
 class CodeInterpreterAgent:
     def __init__(self, key_manager, model_name: str, persona_prompt: str):
@@ -41,33 +42,15 @@ class CodeInterpreterAgent:
         if "```" not in text and any(kw in text for kw in ["import", "def", "print"]): return text.strip()
         return None
 
+    @traced("llm.call")
     async def _call_llm_async(self, user_prompt: str, temperature: float = 0.1) -> str:
-        
-        api_key = await self.key_manager.get_key() 
-        if not api_key: raise Exception("No available Groq API keys.")
-        
-        try:
-            client = AsyncGroq(api_key=api_key)
-
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": user_prompt}],
-                model=self.model_name,
-                temperature=temperature
-            )
-            return chat_completion.choices[0].message.content.strip() 
-        
-        except Exception as e:
-            print(f"❌ CodeInterpreterAgent LLM Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key) 
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying _call_llm_async...")
-                await asyncio.sleep(1)
-                return await self._call_llm_async(user_prompt, temperature) 
-            
-            raise e 
+        # [V45.1] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+        answer = await llm_gateway.chat(self.key_manager, self.model_name, [{"role": "user", "content": user_prompt}],
+                                        label="Code Interpreter Agent", temperature=temperature)
+        return answer.strip()
 
 
+    @traced("agent.handle")
     async def handle(self, query: str, short_term_memory: List[Dict[str, Any]]) -> str:
         print(f"🤖 [Code Interpreter V19] Received query: '{query}' (Async)")
         memory_context = "\n".join([f"- {mem.get('role')}: {mem.get('content')}" for mem in short_term_memory])
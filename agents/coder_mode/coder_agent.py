@@ -1,8 +1,8 @@
 # agents/coder_mode/code_agent.py
 
-from groq import AsyncGroq  
 from typing import Dict, Any, List
-import asyncio  
+from core.llm_gateway import llm_gateway
+from core.tracing import traced
 
 class CoderAgent:
     """
@@ -23,34 +23,20 @@ class CoderAgent:
 """
         print("🤖 Coder Agent (V44 - Async & Fixed) is ready.") 
 
+    @traced("llm.call")
     async def _call_llm_async(self, system_prompt: str, user_prompt: str) -> str:
-        
-        api_key = await self.key_manager.get_key() 
-        if not api_key: raise Exception("No available Groq API keys.")
-        
-        try:
-            client = AsyncGroq(api_key=api_key)
-            
-            chat_completion = await client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                model=self.model_name,
-            )
-            return chat_completion.choices[0].message.content.strip()
-        
-        except Exception as e:
-            print(f"❌ CoderAgent LLM Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key) 
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying _call_llm_async...")
-                await asyncio.sleep(1)
-                return await self._call_llm_async(system_prompt, user_prompt)
-            
-            raise e 
+        # client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+        answer = await llm_gateway.chat(
+            self.key_manager, self.model_name,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            label="Coder Agent"
+        )
+        return answer.strip()
     
+    @traced("agent.handle")
     async def handle(self, query: str, short_term_memory: List[Dict[str, Any]]) -> str:
         print(f"🤖 [Coder Agent V44] Handling code query: '{query[:40]}...' (Async)") 
         
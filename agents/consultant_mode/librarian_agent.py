@@ -1,9 +1,9 @@
 # agents/consultant_mode/librarian_agent.py
-# (V43.0 - Async & CORRECTED Groq Fix)
+# (V43.1 - Async via Shared LLM Gateway)
 
 from typing import Optional, List, Dict, Any 
-from groq import AsyncGroq 
-import asyncio
+from core.llm_gateway import llm_gateway
+from core.tracing import traced
 
 class LibrarianAgent:
     """
@@ -41,32 +41,14 @@ class LibrarianAgent:
 """
         print("📚 Librarian Agent (V43 - Async Recommender) is on duty.") 
 
+    @traced("llm.call")
     async def _call_llm_async(self, prompt: str) -> str:
+        # [V43.1] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+        answer = await llm_gateway.chat(self.key_manager, self.model_name, [{"role": "user", "content": prompt}],
+                                        label="Librarian Agent")
+        return answer.strip()
         
-        api_key = await self.key_manager.get_key()
-        if not api_key: raise Exception("No available Groq API keys.")
-        
-        try:
-            client = AsyncGroq(api_key=api_key)
-
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model_name,
-            )
-            return chat_completion.choices[0].message.content.strip()
-        
-        except Exception as e:
-            print(f"❌ LibrarianAgent LLM Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key) 
-            
-            error_str = str(e).lower()
-            if api_key and ("429" in error_str or "service_unavailable" in error_str):
-                print(" 	 -> Retrying _call_llm_async...")
-                await asyncio.sleep(1)
-                return await self._call_llm_async(prompt) 
-            
-            raise e 
-        
+    @traced("agent.handle")
     async def handle(self, query: str) -> str | None:
         q_lower = query.lower().strip()
 
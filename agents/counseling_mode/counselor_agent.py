@@ -1,14 +1,18 @@
 # agents/counseling_mode/counselor_agent.py
 
-from typing import Dict, List, Any
-import google.generativeai as genai 
-import asyncio
+from typing import Dict, List, Any, Optional
+
+from core.gemini_client import gemini_clients
+from core.llm_stream import DeltaCallback, collect_stream
+from core.llm_hedging import GEMINI, hedged
+from core.rate_limiter import estimate_tokens
+from core.retry_policy import llm_retry_policy
+from core.tracing import traced
 
 class CounselorAgent:
     def __init__(self, key_manager, model_name: str, persona_prompt: str):
         self.key_manager = key_manager
         self.model_name = model_name
-        self.model = genai.GenerativeModel(self.model_name)
         self.counseling_prompt_template = persona_prompt + """
 **ภารกิจ: สหายผู้เข้าอกเข้าใจ (The Empathic Companion)**
 
@@ -32,25 +36,24 @@ class CounselorAgent:
 """
         print("❤️  ทีมสนทนาและให้คำปรึกษา (CounselorAgent) รายงานตัวพร้อมปฏิบัติภารกิจ")
 
-    async def _call_llm_async(self, prompt: str) -> str:
-        api_key = await self.key_manager.get_key()
-        if not api_key: raise Exception("No available API keys.")
-        try:
-            genai.configure(api_key=api_key)
-            response = await self.model.generate_content_async(prompt) 
-            return response.text.strip()
-        
-        except Exception as e:
-            error_str = str(e).lower()
-            if "429" in error_str or "resource_exhausted" in error_str:
-                print(f"🟡 Counselor Agent: Key '...{api_key[-4:]}' hit rate limit.")
-                self.key_manager.report_failure(api_key)
-                print(" 	 -> Retrying with the next available key...")
-                await asyncio.sleep(1) 
-                return await self._call_llm_async(prompt) 
-            raise e
+    @traced("llm.call")
+    async def _call_llm_async(self, prompt: str, on_delta: Optional[DeltaCallback] = None) -> str:
+        estimated = estimate_tokens(prompt)
+
+        async def attempt(lease) -> str:
+            deltas = gemini_clients.client(lease.api_key).stream(self.model_name, prompt, on_usage=lease.on_usage)
+            return await collect_stream(
+                hedged("COUNSELOR", GEMINI, self.model_name, deltas, prompt),
+                on_delta, label="Counselor Agent"
+            )
+
+        answer = await llm_retry_policy.call_with_key(self.key_manager, "Counselor Agent", attempt,
+                                                      model=self.model_name, estimated_tokens=estimated)
+        return answer.strip()
 
-    async def handle(self, query: str, short_term_memory: List[Dict[str, Any]]) -> str:
+    @traced("agent.handle")
+    async def handle(self, query: str, short_term_memory: List[Dict[str, Any]],
+                     on_delta: Optional[DeltaCallback] = None) -> str:
         print(f"❤️  [Counselor Agent V14] Handling sensitive query: '{query[:40]}...' (Async)")
         
         history_context = "\n".join([f"- {mem.get('role')}: {mem.get('content')}" for mem in short_term_memory])
@@ -63,7 +66,7 @@ class CounselorAgent:
                 query=query
             )
             
-            return await self._call_llm_async(prompt)
+            return await self._call_llm_async(prompt, on_delta)
             
         except Exception as e:
             print(f"❌ CounselorAgent LLM Error: {e}")
@@ -1,18 +1,28 @@
 # agents/feng_mode/feng_agent.py
-# [V11 - THE SURGICAL STRIKE: UNIFIED TRIAGE & KEYWORD EXTRACTION]
+# [V12.6 - LOCAL TRIAGE KEYWORDS]
 
 import random
 import json
 import re
 from rapidfuzz import process, fuzz
 from typing import Optional, Dict, List, Any
-import google.generativeai as genai
 from core.api_key_manager import ApiKeyManager
+from core.gemini_client import gemini_clients
+from core.intent_classifier import IntentClassifier, extract_keywords
+from core.intent_examples import FENG_ROUTER, SEED_EXAMPLES
+from core.llm_cache import llm_cache
+from core.rate_limiter import estimate_tokens
+from core.retry_policy import llm_retry_policy
+from core.tracing import annotate_trace, span, traced
 import asyncio
 
+FENG_INTENTS = {label for _, label in SEED_EXAMPLES[FENG_ROUTER]}
+
 class FengAgent:
-    def __init__(self, key_manager: ApiKeyManager, model_name: str, persona_prompt: str):
+    def __init__(self, key_manager: ApiKeyManager, model_name: str, persona_prompt: str,
+                 intent_classifier: Optional[IntentClassifier] = None):
         self.key_manager = key_manager
+        self.intent_classifier = intent_classifier
         self.model_name = model_name
         self.persona_prompt = persona_prompt
         self.intent_analysis_prompt = """
@@ -37,7 +47,7 @@ class FengAgent:
 - `USER_STORYTELLING`: เมื่อผู้ใช้กำลังเล่าเรื่องราวของตนเองอย่างต่อเนื่อง
 - `TIME_REQUEST`: ถามเกี่ยวกับเวลาปัจจุบัน
 - `DATE_REQUEST`: ถามเกี่ยวกับวันที่ปัจจุบัน
-- `MEMORY_QUERY`: คำถามที่เจาะจงเกี่ยวกับ "ประวัติการสนทนา" ของเรา เช่น "คำถามแรกสุด", "เมื่อกี้คุยอะไร", "เมื่อวานคุยเรื่องไหน", "เราคุยกันไปกี่ข้อความแล้ว"
+- `MEMORY_QUERY`: คำถามที่เจาะจงเกี่ยวกับ "ประวัติการสนทนา" ของเรา เช่น "คำถามแรกสุด", "เมื่อกี้คุยอะไร", "เมื่อวานคุยเรื่องไหน", "เราคุยกันไปกี่ข้อความแล้ว", "ฉันเคยพูดถึงเรื่อง X ตอนไหน"
 
 **ผลลัพธ์สุดท้าย:**
 สร้าง JSON object ที่มี 3 keys (`corrected_query`, `intent`, `keywords`) เท่านั้น
@@ -140,15 +150,19 @@ class FengAgent:
 - **ผลลัพธ์ JSON:**
 {{"corrected_query": "เราคุยกันไปกี่ข้อความแล้ว", "intent": "MEMORY_QUERY", "keywords": ["กี่ข้อความ", "สถิติ", "คุยกันไป"]}}
 
+- **คำถามดิบ:** "ฉันเคยพูดถึงเรื่องสโตอิกตอนไหน"
+- **ผลลัพธ์ JSON:**
+{{"corrected_query": "ฉันเคยพูดถึงเรื่องสโตอิกตอนไหน", "intent": "MEMORY_QUERY", "keywords": ["เคยพูดถึง", "สโตอิก", "ค้นหาประวัติ"]}}
+
 
 ---
 
 **คำถามดิบ:** "{query}"
 **ผลลัพธ์ JSON:**
 """
-        self.model = genai.GenerativeModel(self.model_name)
         print("👤 หน่วยคัดกรองด่านหน้า (FengAgent) [SURGICAL STRIKE] เข้าประจำตำแหน่ง")
 
+    @traced("feng.quick_response")
     async def _get_quick_response(self, query: str) -> Optional[str]:
         q_lower = query.lower().strip()
         
@@ -172,31 +186,66 @@ class FengAgent:
         except (json.JSONDecodeError, IndexError): pass
         return None
 
+    async def _classify_locally(self, query: str) -> Optional[Dict[str, Any]]:
+        """[V12.6] ถ้า IntentClassifier มั่นใจ ตอบเจตนาได้ทันทีโดยไม่ต้องเรียก Gemini (ไม่มีการแก้คำผิด คำสำคัญจาก extract_keywords)"""
+        if not self.intent_classifier:
+            return None
+        prediction = await self.intent_classifier.classify(FENG_ROUTER, query)
+        if not prediction or not prediction["confident"]:
+            if prediction:
+                print(f" 	-> Local triage unsure ({prediction['label']}, sim={prediction['similarity']}, conf={prediction['confidence']}). Asking LLM.")
+            return None
+        print(f"⚡ [Feng Triage] Local classifier: {prediction['label']} (sim={prediction['similarity']}, conf={prediction['confidence']})")
+        return {"corrected_query": query, "intent": prediction["label"], "keywords": extract_keywords(query), "triage_source": "local"}
+
+    @staticmethod
+    def _is_complete_triage(json_response: Optional[Dict]) -> bool:
+        return bool(json_response) and all(key in json_response for key in ("corrected_query", "intent", "keywords"))
+
+    @traced("feng.triage")
     async def _classify_intent_and_extract_keywords(self, query: str) -> Dict[str, Any]:
+        local_result = await self._classify_locally(query)
+        if local_result:
+            annotate_trace(triage_source="local")
+            return local_result
+        annotate_trace(triage_source="llm")
+
         print(f"🤔 [Feng Triage] Analyzing and extracting from query with '{self.model_name}' (Async)...")
-        api_key = await self.key_manager.get_key()
+        # [V12.2] สร้าง prompt ก่อนขอคีย์ เพื่อจองโควตา token ของคีย์ตามขนาดจริง
+        prompt = self.intent_analysis_prompt.format(query=query)
+        estimated = estimate_tokens(prompt)
         fallback_response = {"corrected_query": query, "intent": "DEEP_ANALYSIS_REQUEST", "keywords": query.split()}
-        if not api_key: return fallback_response
+        safety_settings = [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+        ]
+
+        def attempt(lease):
+            # [V12.1] คีย์ผูกกับ client ของคำขอนี้ คำขอ triage ที่ทำงานพร้อมกันจึงไม่สลับคีย์กัน
+            # [V12.4] คีย์ถูกยืมผ่าน lease: triage ที่ยิงพร้อมกันกระจายไปคีย์ที่ค้างน้อยที่สุด
+            return gemini_clients.client(lease.api_key).generate(
+                self.model_name, prompt, safety_settings=safety_settings, on_usage=lease.on_usage)
 
         raw_response = ""
         try:
-            genai.configure(api_key=api_key)
-            prompt = self.intent_analysis_prompt.format(query=query)
-            
-            safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-            ]
+            # [V12.3] 429 ลองใหม่ด้วยคีย์ถัดไปตาม RetryPolicy (มีเพดาน) หมดแล้วใช้ fallback_response
+            # [V12.5] คำถามเดิม = ผล triage เดิม: คำตอบที่ครบทุก key ถูกแคชบนดิสก์ (core/llm_cache.py)
+            with span("llm.call", agent="FengAgent", model=self.model_name, purpose="triage"):
+                raw_response = await llm_cache.cached(
+                    "FENG_TRIAGE", self.model_name, prompt,
+                    lambda: llm_retry_policy.call_with_key(
+                        self.key_manager, "Feng Triage", attempt, model=self.model_name, estimated_tokens=estimated),
+                    is_valid=lambda text: self._is_complete_triage(self._extract_json(text)),
+                    safety_settings=safety_settings)
             
-            response = await self.model.generate_content_async(prompt, safety_settings=safety_settings)
-            
-            raw_response = response.text
             json_response = self._extract_json(raw_response)
             
-            if json_response and "corrected_query" in json_response and "intent" in json_response and "keywords" in json_response:
+            if self._is_complete_triage(json_response):
                 print(f" 	-> Triage successful. Intent: {json_response.get('intent')}, Keywords: {json_response.get('keywords')}")
+                if self.intent_classifier and json_response.get("intent") in FENG_INTENTS:
+                    await self.intent_classifier.record(FENG_ROUTER, query, json_response["intent"])
                 return json_response
             else:
                 raise ValueError("Could not parse a valid JSON with all required keys.")
@@ -204,13 +253,6 @@ class FengAgent:
         except Exception as e:
             print(f" 	-> Triage failed: {e}")
             print(f" 	-> RAW FAILED RESPONSE FROM GEMINI: '{raw_response}'")
-            if api_key: self.key_manager.report_failure(api_key)
-            
-            if api_key and ("429" in str(e) or "resource_exhausted" in str(e).lower()):
-                print(" 	-> Retrying with a new key...")
-                await asyncio.sleep(1) 
-                return await self._classify_intent_and_extract_keywords(query)
-
             return fallback_response
 
     async def handle(self, query: str, short_term_memory: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -1,16 +1,20 @@
 # agents/feng_mode/general_conversation_agent.py
 import json
-from typing import Dict, List, Any
-from groq import AsyncGroq  
-import asyncio
+from typing import Dict, List, Any, Optional
+
+from core.config import settings
+from core.llm_gateway import llm_gateway
+from core.llm_stream import DeltaCallback
+from core.prompt_budget import Section, prompt_budgeter
+from core.tracing import span, traced
 
 class GeneralConversationAgent:
     
-    def __init__(self, key_manager, model_name: str, rag_engine, ltm_manager, persona_prompt: str):
+    def __init__(self, key_manager, model_name: str, rag_engine, memory_retriever, persona_prompt: str):
         self.key_manager = key_manager
         self.model_name = model_name
         self.rag_engine = rag_engine
-        self.ltm_manager = ltm_manager
+        self.memory_retriever = memory_retriever
         
         self.general_conversation_prompt = persona_prompt + """
 **ภารกิจ: สหายทางปัญญาผู้มีความทรงจำ**
@@ -45,55 +49,44 @@ class GeneralConversationAgent:
         contexts = [f"- '{item.get('name')}': {item.get('description', '')[:70]}..." for item in results]
         return "\n".join(contexts)
 
-    async def handle(self, query: str, short_term_memory: List[Dict[str, Any]]) -> str:
-        print(f"💬 [General Conversation Agent V12] Handling: '{query[:40]}...' (Async)")
-        ltm_context = "ไม่มีความทรงจำระยะยาวที่เกี่ยวข้อง"
-        if self.ltm_manager:
+    @traced("agent.handle")
+    async def handle(self, query: str, short_term_memory: List[Dict[str, Any]], session_id: str = "default_user",
+                     on_delta: Optional[DeltaCallback] = None) -> str:
+        print(f"💬 [General Conversation Agent V13] Handling: '{query[:40]}...' (Async)")
+        ltm_summaries: List[str] = []
+        ltm_empty_text = "ไม่มีความทรงจำระยะยาวที่เกี่ยวข้อง"
+        if self.memory_retriever:
             try:
-                relevant_memories = await asyncio.to_thread(
-                    self.ltm_manager.search_relevant_memories, query, k=2
-                )
-                if relevant_memories:
-                    ltm_context = "นี่คือบทสรุปจากการสนทนาของเราในอดีตที่อาจจะเกี่ยวข้อง:\n"
-                    ltm_context += "\n\n".join([
-                        f"- ในหัวข้อ '{mem.get('title')}':\n  {mem.get('summary')}"
-                        for mem in relevant_memories
-                    ])
+                relevant_memories = await self.memory_retriever.search(query, session_id=session_id, k=2)
+                ltm_summaries = [
+                    f"- ในหัวข้อ '{mem.get('title')}':\n  {mem.get('summary')}"
+                    for mem in relevant_memories or []
+                ]
             except Exception as ltm_e:
                 print(f"❌ GeneralConversationAgent LTM Error: {ltm_e}")
-                ltm_context = "เกิดข้อผิดพลาดในการดึงความทรงจำระยะยาว"
+                ltm_empty_text = "เกิดข้อผิดพลาดในการดึงความทรงจำระยะยาว"
         
-        api_key = await self.key_manager.get_key()
-        if not api_key:
-            return "ขออภัยครับ ตอนนี้ผมไม่สามารถสนทนาต่อได้ในขณะนี้"
-
         try:
-            client = AsyncGroq(api_key=api_key)
-            
             intuitive_context = await self._get_intuitive_context(query)
             
-            history_context = "\n".join([f"- {mem.get('role')}: {mem.get('content')}" for mem in short_term_memory])
+            # [V13.2] ประวัติสนทนาเต็มและบทสรุปความทรงจำถูกตัด/ย่อให้อยู่ในงบ token ของ GENERAL_HANDLER (เก็บเทิร์นล่าสุดไว้ก่อน)
+            prompt = prompt_budgeter.fit("GENERAL_HANDLER", self.model_name, self.general_conversation_prompt, {
+                "long_term_memory_context": Section(ltm_summaries, share=0.3, separator="\n\n", max_item_tokens=500,
+                                                    prefix="นี่คือบทสรุปจากการสนทนาของเราในอดีตที่อาจจะเกี่ยวข้อง:\n",
+                                                    empty_text=ltm_empty_text),
+                "history_context": Section([f"- {mem.get('role')}: {mem.get('content')}" for mem in short_term_memory],
+                                           share=0.7, keep="tail", max_item_tokens=settings.PROMPT_HISTORY_TURN_MAX_TOKENS),
+            }, intuitive_context=intuitive_context, query=query).text
             
-            prompt = self.general_conversation_prompt.format(
-                long_term_memory_context=ltm_context,
-                intuitive_context=intuitive_context,
-                history_context=history_context,
-                query=query
-            )
-            
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model_name,
-            )
-            return chat_completion.choices[0].message.content.strip()
+            # [V13] สตรีม delta ไปยังผู้ใช้ระหว่างที่ LLM กำลังสร้างคำตอบ
+            # [V13.1] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+            with span("llm.call", agent="GeneralConversationAgent", model=self.model_name):
+                answer = await llm_gateway.stream_chat(
+                    self.key_manager, self.model_name, [{"role": "user", "content": prompt}],
+                    on_delta=on_delta, label="General Conversation Agent", hedge_agent="GENERAL_HANDLER"
+                )
+            return answer.strip()
         
         except Exception as e:
             print(f"❌ GeneralConversationAgent LLM Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key)
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying with a new key...")
-                await asyncio.sleep(1)
-                return await self.handle(query, short_term_memory)
-
-            return "ขออภัยครับ เกิดข้อผิดพลาดในการสนทนา"
\ No newline at end of file
+            return "ขออภัยครับ เกิดข้อผิดพลาดในการสนทนา"
@@ -1,10 +1,12 @@
 # agents/feng_mode/proactive_offer_agent.py
-# (V41.0 - Async & CORRECTED AttributeFix)
+# (V42.2 - Shared LLM Gateway)
 
 import json
-from typing import Dict, Any, List
-from groq import AsyncGroq  
-import asyncio  
+from typing import Dict, Any, List, Optional
+
+from core.llm_gateway import llm_gateway
+from core.llm_stream import DeltaCallback
+from core.tracing import span, traced
 
 class ProactiveOfferAgent:
     
@@ -60,16 +62,11 @@ class ProactiveOfferAgent:
         return "\n".join(contexts)
 
 
-    async def handle(self, query: str) -> Dict[str, Any]:
-        print(f"🤔 [Proactive Offer Agent V41] Handling: '{query[:40]}...' (Async)")
-        
-        api_key = await self.key_manager.get_key() 
+    @traced("agent.handle")
+    async def handle(self, query: str, on_delta: Optional[DeltaCallback] = None) -> Dict[str, Any]:
+        print(f"🤔 [Proactive Offer Agent V42] Handling: '{query[:40]}...' (Async)")
         
-        if not api_key:
-            return self._fallback_answer(query, "No available API keys")
         try:
-            client = AsyncGroq(api_key=api_key)
-            
             intuitive_context = await self._get_intuitive_context(query)
             
             prompt = self.proactive_offer_prompt.format(
@@ -77,22 +74,17 @@ class ProactiveOfferAgent:
                 query=query
             )
             
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}], model=self.model_name
-            )
-            proactive_answer = chat_completion.choices[0].message.content.strip()
+            # [V42.2] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+            with span("llm.call", agent="ProactiveOfferAgent", model=self.model_name):
+                proactive_answer = (await llm_gateway.stream_chat(
+                    self.key_manager, self.model_name, [{"role": "user", "content": prompt}],
+                    on_delta=on_delta, label="Proactive Offer Agent", hedge_agent="PROACTIVE_OFFER_HANDLER"
+                )).strip()
             
             return {"type": "proactive_offer", "content": proactive_answer, "original_query": query}
         
         except Exception as e:
             print(f"❌ ProactiveOfferAgent Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key) 
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying with a new key...")
-                await asyncio.sleep(1)
-                return await self.handle(query) 
-
             return self._fallback_answer(query, str(e))
 
     def _fallback_answer(self, query: str, error_msg: str) -> Dict[str, Any]:
@@ -1,8 +1,11 @@
 # agents/formatter_agent.py
 
-import google.generativeai as genai
 from typing import Dict, Any
-import asyncio  
+from core.gemini_client import gemini_clients
+from core.llm_cache import llm_cache
+from core.rate_limiter import estimate_tokens
+from core.retry_policy import llm_retry_policy
+from core.tracing import traced
 
 class FormatterAgent:
     def __init__(self, key_manager, model_name: str, persona_prompt: str):
@@ -11,8 +14,7 @@ class FormatterAgent:
         """
         self.key_manager = key_manager
         self.model_name = model_name
-        
-        self.model = genai.GenerativeModel(self.model_name)
+
         self.formatting_prompt_template = """
 **ภารกิจ: เครื่องพิมพ์ดีด Markdown (Markdown Typesetter)**
 
@@ -32,24 +34,19 @@ class FormatterAgent:
 **ผลลัพธ์ที่จัดรูปแบบแล้ว:**
 """
 
+    @traced("llm.call")
     async def _call_llm_async(self, prompt: str) -> str:
-        api_key = await self.key_manager.get_key()
-        if not api_key: raise Exception("No available API keys.")
-        try:
-            genai.configure(api_key=api_key)
-            response = await self.model.generate_content_async(prompt)
-            return response.text.strip()
-        
-        except Exception as e:
-            error_str = str(e).lower()
-            if "429" in error_str or "resource_exhausted" in error_str:
-                print(f"🟡 Formatter Agent: Key '...{api_key[-4:]}' hit rate limit.")
-                self.key_manager.report_failure(api_key)
-                print(" 	 -> Retrying with the next available key...")
-                await asyncio.sleep(1) 
-                return await self._call_llm_async(prompt) 
-            raise e
+        # 429 = พักคีย์แล้วลองใหม่ด้วยคีย์ถัดไปตาม RetryPolicy กลาง (มีเพดานจำนวนครั้งและ backoff)
+        # ระบุ model/token ที่จองไว้ เพื่อให้ lease ใช้โควตา RPM/TPM ของคีย์และรายงาน usage จริงตอนคืน
+        # ร่างเดิม = ผลเดิม จึงใช้คำตอบจากแคชบนดิสก์ได้ (core/llm_cache.py)
+        response_text = await llm_cache.cached("FORMATTER", self.model_name, prompt, lambda: llm_retry_policy.call_with_key(
+            self.key_manager, "Formatter Agent",
+            lambda lease: gemini_clients.client(lease.api_key).generate(self.model_name, prompt, on_usage=lease.on_usage),
+            model=self.model_name, estimated_tokens=estimate_tokens(prompt),
+        ))
+        return response_text.strip()
 
+    @traced("agent.handle")
     async def handle(self, synthesis_order: Dict[str, Any]) -> str:
         raw_draft = synthesis_order.get("draft_to_review", "")
         if not raw_draft or not isinstance(raw_draft, str):
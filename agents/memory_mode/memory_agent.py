@@ -1,18 +1,24 @@
 # agents/memory_mode/memory_agent.py
-# (V40.0 - Async & CORRECTED Groq Fix)
+# (V42.2 - Per-Session Memory Tasks)
 
 from typing import Dict, Optional, List, Any 
-from groq import AsyncGroq 
 import sqlite3
 import datetime
 import asyncio 
 
+from core.intent_classifier import IntentClassifier, extract_search_term
+from core.intent_examples import MEMORY_ROUTER
+from core.llm_gateway import llm_gateway
+from core.tracing import span, traced
+
 class MemoryAgent:
     """
-    [V40] Agent ผู้เชี่ยวชาญด้านการตอบคำถามเชิงข้อเท็จจริง (แบบ Async ที่ถูกต้อง)
+    [V41] Agent ผู้เชี่ยวชาญด้านการตอบคำถามเชิงข้อเท็จจริง (แบบ Async ที่ถูกต้อง)
     """
-    def __init__(self, key_manager, model_name: str, memory_manager, persona_prompt: str):
+    def __init__(self, key_manager, model_name: str, memory_manager, persona_prompt: str,
+                 intent_classifier: Optional[IntentClassifier] = None):
         self.key_manager = key_manager
+        self.intent_classifier = intent_classifier
         self.model_name = model_name
         self.memory_manager = memory_manager
         self.persona_prompt = persona_prompt
@@ -25,14 +31,16 @@ class MemoryAgent:
 - `RECALL_FIRST_MEMORY`: เมื่อผู้ใช้ถามเกี่ยวกับ "ข้อความแรกสุด", "จุดเริ่มต้น", "คำถามแรก" ของการสนทนา
 - `CALCULATE_STATS`: เมื่อผู้ใช้ถามเกี่ยวกับ "สถิติ", "จำนวนข้อความ", "คุยกันไปนานแค่ไหนแล้ว"
 - `SUMMARIZE_RECENT`: เมื่อผู้ใช้ถามเกี่ยวกับสิ่งที่ "เพิ่งคุยกันไป", "เมื่อกี้", "เมื่อวาน", "ล่าสุด", หรือขอ "บทสรุป" การสนทนา
+- `SEARCH_HISTORY`: เมื่อผู้ใช้ถามว่า "เคยพูดถึง/เคยถามเรื่อง X เมื่อไหร่" หรือให้ค้นหาเรื่องใดเรื่องหนึ่งในประวัติการสนทนา (ให้ตอบเป็น `SEARCH_HISTORY: คำค้น`)
 - `NO_MATCH`: ถ้าคำถามไม่ตรงกับภารกิจใดๆ ข้างต้นเลย
 
 **คำสั่ง:**
-อ่าน "คำถามของผู้ใช้" แล้วตอบกลับเป็นชื่อ TASK ที่เหมาะสมที่สุดเพียงหนึ่งเดียวเท่านั้น ห้ามมีข้อความอื่นปน
+อ่าน "คำถามของผู้ใช้" แล้วตอบกลับเป็นชื่อ TASK ที่เหมาะสมที่สุดเพียงหนึ่งเดียวเท่านั้น ห้ามมีข้อความอื่นปน (ยกเว้นคำค้นของ `SEARCH_HISTORY`)
 
 **ตัวอย่าง:**
 - คำถาม: "เราเริ่มคุยกันเรื่องอะไรเป็นเรื่องแรก" -> ผลลัพธ์: RECALL_FIRST_MEMORY
 - คำถาม: "สรุปเรื่องที่เราคุยกันเมื่อกี้ให้หน่อย" -> ผลลัพธ์: SUMMARIZE_RECENT
+- คำถาม: "ฉันเคยพูดถึงเรื่องสโตอิกตอนไหน" -> ผลลัพธ์: SEARCH_HISTORY: สโตอิก
 - คำถาม: "เธอจำได้ไหมว่าฉันชอบหนังสือแนวไหน" -> ผลลัพธ์: NO_MATCH
 
 **คำถามของผู้ใช้:** "{query}"
@@ -54,44 +62,32 @@ class MemoryAgent:
         self.task_handlers_map = {
             "RECALL_FIRST_MEMORY": self._answer_first_memory_question,
             "CALCULATE_STATS": self._answer_stats_question,
-            "SUMMARIZE_RECENT": self._answer_recent_summary_question
+            "SUMMARIZE_RECENT": self._answer_recent_summary_question,
+            "SEARCH_HISTORY": self._answer_history_search_question
         }
         
         print("🧠 Memory Agent (V40 - Async Archivist) is online.")
 
+    @traced("llm.call")
     async def _generate_response(self, data_context: str, query: str) -> str:
         
-        api_key = await self.key_manager.get_key() 
-        if not api_key:
-            return "ขออภัยค่ะ ตอนนี้ฉันไม่สามารถเข้าถึงความทรงจำได้"
-
+        # [V42.1] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
         try:
-            client = AsyncGroq(api_key=api_key)
-            
             prompt = self.base_prompt_template.format(data_context=data_context, query=query)
             
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model_name,
-            )
-            return chat_completion.choices[0].message.content.strip()
+            answer = await llm_gateway.chat(self.key_manager, self.model_name, [{"role": "user", "content": prompt}],
+                                            label="Memory Agent")
+            return answer.strip()
         
         except Exception as e:
             print(f"❌ MemoryAgent LLM Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key) 
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying _generate_response...")
-                await asyncio.sleep(1)
-                return await self._generate_response(data_context, query) 
-
             return "ขออภัยค่ะ เกิดข้อผิดพลาดขณะค้นหาความทรงจำ"
 
-    async def _answer_first_memory_question(self, query: str) -> str:
+    async def _answer_first_memory_question(self, query: str, session_id: str) -> str:
         print(" 	- 🧠 [Memory Agent V40] Task: Recalling first memory (Async)...")
         
         first_memory = await asyncio.to_thread(
-            self.memory_manager.find_absolute_first_user_memory
+            self.memory_manager.find_absolute_first_user_memory, session_id
         )
         
         if not first_memory:
@@ -108,11 +104,11 @@ class MemoryAgent:
         return await self._generate_response(context, query) 
 
 
-    async def _answer_stats_question(self, query: str) -> str:
+    async def _answer_stats_question(self, query: str, session_id: str) -> str:
         print(" 	- 🧠 [Memory Agent V40] Task: Calculating conversation stats (Async)...")
         
         stats = await asyncio.to_thread(
-            self.memory_manager.get_conversation_stats
+            self.memory_manager.get_conversation_stats, session_id
         )
         
         if stats.get("error"):
@@ -128,16 +124,16 @@ class MemoryAgent:
         
         return await self._generate_response(context, query) 
 
-    async def _answer_recent_summary_question(self, query: str) -> str:
+    async def _answer_recent_summary_question(self, query: str, session_id: str) -> str:
         print(" 	- 🧠 [Memory Agent V40] Task: Summarizing recent topics (Async)...")
         
         summaries = await asyncio.to_thread(
-            self.memory_manager.get_last_session_summary, hours_ago=24
+            self.memory_manager.get_last_session_summary, session_id=session_id, hours_ago=24
         )
         
         if not summaries:
             print(" 	- 🟡 No long-term summary found, checking short-term memory...")
-            short_term_history = self.memory_manager.get_last_n_memories(n=10)
+            short_term_history = self.memory_manager.get_last_n_memories(n=10, session_id=session_id)
             if not short_term_history:
                 context = "ยังไม่มีข้อมูลการสนทนาล่าสุดค่ะ"
             else:
@@ -150,41 +146,76 @@ class MemoryAgent:
         
         return await self._generate_response(context, query) 
     
-    async def handle(self, query: str) -> Optional[str]:
-        print(f" 	- 🧠 [Memory Agent V40] Performing internal triage on: '{query[:30]}...' (Async)")
+    async def _answer_history_search_question(self, query: str, session_id: str, search_term: Optional[str] = None) -> str:
+        search_term = (search_term or query).strip()
+        print(f" 	- 🧠 [Memory Agent V41] Task: Searching conversation history for '{search_term}' (Async)...")
         
-        api_key = await self.key_manager.get_key() 
-        if not api_key: return "ขออภัยค่ะ ฉันไม่สามารถวิเคราะห์คำถามเกี่ยวกับความทรงจำได้ในตอนนี้"
+        matches = await asyncio.to_thread(
+            self.memory_manager.search_conversations, session_id, search_term, 5
+        )
+        
+        if not matches:
+            context = f"ไม่พบการพูดถึง '{search_term}' ในประวัติการสนทนาของเราค่ะ"
+        else:
+            context = f"นี่คือช่วงที่เราเคยพูดถึง '{search_term}' (เรียงตามความเกี่ยวข้อง):\n"
+            context += "\n".join([
+                f"- [{str(m['timestamp']).split('.')[0]}] {'คุณ' if m['role'] == 'user' else 'ฉัน'}: {m['snippet']}"
+                for m in matches
+            ])
+        
+        return await self._generate_response(context, query) 
+    
+    async def _run_task(self, query: str, session_id: str, task_name: str, task_argument: str = "") -> Optional[str]:
+        handler_function = self.task_handlers_map.get(task_name)
+        
+        if handler_function and task_name == "SEARCH_HISTORY":
+            return await handler_function(query, session_id, task_argument.strip() or None)
+        if handler_function:
+            return await handler_function(query, session_id) 
+        print(f" 	- 🟡 [Memory Agent] Query does not match any known memory task (Task: {task_name}).")
+        return None
+
+    async def _triage_locally(self, query: str) -> Optional[tuple]:
+        """[V42] (task, argument) จาก IntentClassifier เมื่อมั่นใจ SEARCH_HISTORY ต้องสกัดคำค้นได้ด้วย ไม่เช่นนั้นให้ LLM ตัดสิน"""
+        if not self.intent_classifier:
+            return None
+        prediction = await self.intent_classifier.classify(MEMORY_ROUTER, query)
+        if not prediction or not prediction["confident"]:
+            return None
+        task_argument = ""
+        if prediction["label"] == "SEARCH_HISTORY":
+            task_argument = extract_search_term(query)
+            if not task_argument:
+                return None
+        print(f" 	- ⚡ Local triage decided task: {prediction['label']} (sim={prediction['similarity']}, conf={prediction['confidence']})")
+        return prediction["label"], task_argument
+
+    @traced("agent.handle")
+    async def handle(self, query: str, session_id: str = "default_user") -> Optional[str]:
+        """[V42.2] session_id = user_id ของเทิร์น (Dispatcher) ทุกภารกิจค้น/สรุปเฉพาะประวัติของผู้ใช้คนนี้"""
+        print(f" 	- 🧠 [Memory Agent V42] Performing internal triage on: '{query[:30]}...' (Async)")
         
+        local_task = await self._triage_locally(query)
+        if local_task:
+            return await self._run_task(query, session_id, *local_task)
+
         try:
-            client = AsyncGroq(api_key=api_key)
-            
             triage_prompt = self.internal_triage_prompt.format(query=query)
             
-            completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": triage_prompt}],
-                model=self.model_name,
-                temperature=0.0
-            )
+            with span("llm.call", agent="MemoryAgent", model=self.model_name, purpose="triage"):
+                raw_task = (await llm_gateway.chat(
+                    self.key_manager, self.model_name, [{"role": "user", "content": triage_prompt}],
+                    label="Memory Agent Triage", temperature=0.0
+                )).strip()
             
-            task_name = completion.choices[0].message.content.strip()
-            print(f" 	- ✅ Internal Triage decided task: {task_name}")
+            task_name, _, task_argument = raw_task.partition(":")
+            task_name = task_name.strip()
+            print(f" 	- ✅ Internal Triage decided task: {raw_task}")
+            if self.intent_classifier and (task_name in self.task_handlers_map or task_name == "NO_MATCH"):
+                await self.intent_classifier.record(MEMORY_ROUTER, query, task_name)
 
-            handler_function = self.task_handlers_map.get(task_name)
-            
-            if handler_function:
-                return await handler_function(query) 
-            else:
-                print(f" 	- 🟡 [Memory Agent] Query does not match any known memory task (Task: {task_name}).")
-                return None
+            return await self._run_task(query, session_id, task_name, task_argument)
 
         except Exception as e:
             print(f"❌ MemoryAgent Internal Triage Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key)
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying internal triage...")
-                await asyncio.sleep(1)
-                return await self.handle(query) 
-            
-            return "ขออภัยค่ะ เกิดข้อผิดพลาดในการทำความเข้าใจคำถามเกี่ยวกับความทรงจำ"
\ No newline at end of file
+            return "ขออภัยค่ะ เกิดข้อผิดพลาดในการทำความเข้าใจคำถามเกี่ยวกับความทรงจำ"
@@ -1,15 +1,20 @@
 # agents/news_mode/news_agent.py
-import google.generativeai as genai
 import traceback
-from typing import Dict, Any
-import asyncio
+from typing import Dict, Any, Optional
+
+from core.gemini_client import gemini_clients
+from core.llm_stream import DeltaCallback, collect_stream
+from core.llm_hedging import GEMINI, hedged
+from core.prompt_budget import Section, prompt_budgeter
+from core.rate_limiter import estimate_tokens
+from core.retry_policy import llm_retry_policy
+from core.tracing import traced
 
 class NewsAgent:
     def __init__(self, key_manager, model_name: str, rag_engine, persona_prompt: str):
         self.key_manager = key_manager
         self.rag_engine = rag_engine
         self.model_name = model_name
-        self.model = genai.GenerativeModel(self.model_name)
         
         self.summary_prompt_template = persona_prompt + """
 **MANDATE (อำนาจหน้าที่): บรรณาธิการข่าวกรองอาวุโส**
@@ -57,31 +62,28 @@ class NewsAgent:
 
         print(f"📰 บรรณาธิการข่าวกรอง (NewsAgent V5.1 - Gemini Engine) ประจำสถานี")
 
-    async def _call_llm_async(self, prompt: str) -> str:
-        api_key = await self.key_manager.get_key()
-        if not api_key: raise Exception("No available API keys.")
-        try:
-            genai.configure(api_key=api_key)
-            safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-            ]
-            response = await self.model.generate_content_async(prompt, safety_settings=safety_settings)
-            return response.text.strip()
-        
-        except Exception as e:
-            error_str = str(e).lower()
-            if "429" in error_str or "resource_exhausted" in error_str:
-                print(f"🟡 News Agent: Key '...{api_key[-4:]}' hit rate limit.")
-                self.key_manager.report_failure(api_key)
-                print(" 	 -> Retrying with the next available key...")
-                await asyncio.sleep(1) 
-                return await self._call_llm_async(prompt) 
-            raise e
-
-    async def handle(self, query: str) -> Dict[str, Any]:
+    @traced("llm.call")
+    async def _call_llm_async(self, prompt: str, on_delta: Optional[DeltaCallback] = None) -> str:
+        estimated = estimate_tokens(prompt)
+        safety_settings = [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+        ]
+
+        async def attempt(lease) -> str:
+            deltas = gemini_clients.client(lease.api_key).stream(
+                self.model_name, prompt, safety_settings=safety_settings, on_usage=lease.on_usage)
+            return await collect_stream(hedged("NEWS", GEMINI, self.model_name, deltas, prompt),
+                                        on_delta, label="News Agent")
+
+        answer = await llm_retry_policy.call_with_key(self.key_manager, "News Agent", attempt,
+                                                      model=self.model_name, estimated_tokens=estimated)
+        return answer.strip()
+
+    @traced("agent.handle")
+    async def handle(self, query: str, on_delta: Optional[DeltaCallback] = None) -> Dict[str, Any]:
         print(f"📰 [News Agent V11] Handling news query: '{query}' with model '{self.model_name}' (Async)")
         thought_process = { "agent_name": "NewsAgent", "query": query, "steps": [] }
         try:
@@ -100,11 +102,13 @@ class NewsAgent:
             thought_process["steps"].append(f"Found news context. Summarizing with Gemini (Async)...")
             query_topic = query if query else "ไม่มีหัวข้อเฉพาะ"
 
-            prompt = self.summary_prompt_template.format(
-                context_from_rag=context_from_rag,
-                query_topic=query_topic
-            )
-            final_answer = await self._call_llm_async(prompt)
+            # ข่าวแต่ละชิ้นคั่นด้วย "---" (RAGEngine.search_news) ข่าวที่อันดับต่ำสุดถูกตัดก่อนเมื่อเกินงบ token ของ NEWS
+            articles = [article.strip() for article in context_from_rag.split("\n---\n") if article.strip()]
+            prompt = prompt_budgeter.fit("NEWS", self.model_name, self.summary_prompt_template, {
+                "context_from_rag": Section(articles, keep="head", separator="\n---\n\n", max_item_tokens=600),
+            }, query_topic=query_topic)
+            thought_process["prompt_tokens_saved"] = prompt.tokens_saved
+            final_answer = await self._call_llm_async(prompt.text, on_delta)
             thought_process["steps"].append("Successfully generated news briefing from RAG context using Gemini.")
             return { "answer": final_answer, "thought_process": thought_process }
         
@@ -1,13 +1,22 @@
 # agents/planning_mode/planner_agent.py
-# (V9.0 - Asynchronous & Concurrent)
+# (V10.9 - Report History Use to the Answer Cache)
 
-import google.generativeai as genai
 import json
 import re
 import traceback
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import asyncio 
 
+from core.config import settings
+from core.gemini_client import gemini_clients
+from core.llm_stream import DeltaCallback, collect_stream
+from core.llm_hedging import GEMINI, hedged, llm_hedger
+from core.prompt_budget import Section, prompt_budgeter
+from core.rate_limiter import estimate_tokens
+from core.retry_policy import llm_retry_policy
+from core.deadline import FEWER_SUB_QUERIES, SHORTER_CONTEXT, should_degrade
+from core.tracing import traced
+
 class PlannerAgent:
     def __init__(self, key_manager, model_name: str, rag_engine, persona_prompt: str):
         self.key_manager = key_manager
@@ -63,8 +72,6 @@ class PlannerAgent:
 **บทวิเคราะห์ฉบับร่าง (จากปราชญ์ฟางซิน):**
 
 """
-        
-        self.model = genai.GenerativeModel(self.model_name)
 
     def _extract_json(self, text: str) -> str:
         match = re.search(r'```(json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
@@ -74,24 +81,35 @@ class PlannerAgent:
             return text
         raise json.JSONDecodeError("Could not find JSON object in the response.", text, 0)
 
-    async def _call_llm_async(self, prompt: str) -> str:
-        api_key = await self.key_manager.get_key()
-        if not api_key: raise Exception("No available API keys.")
-        try:
-            genai.configure(api_key=api_key)
+    @traced("llm.call")
+    async def _call_llm_async(self, prompt: str, on_delta: Optional[DeltaCallback] = None) -> str:
+        """
+        [V10] เมื่อมี on_delta จะสตรีมคำตอบผ่าน on_delta ระหว่างสร้าง (ใช้กับขั้นสังเคราะห์ ไม่ใช้กับแผน JSON)
+        [V10.2] ถ้าเปิด hedging ให้ PLANNER จะใช้ทางสตรีมเสมอ เพื่อให้ยิงคำขอสำรองเมื่อ token แรกมาช้า
+        """
+        # [V10.5] จองโควตา RPM/TPM ของคีย์ตามขนาด prompt แล้วแก้ด้วย usage จริงหลังได้คำตอบ
+        estimated = estimate_tokens(prompt)
+
+        async def attempt(lease) -> str:
+            # [V10.4] client ของคีย์นี้โดยเฉพาะ (ไม่ใช้ genai.configure ที่เป็น global)
+            client = gemini_clients.client(lease.api_key)
+            # [V10.7] usage ถูกเก็บใน lease แล้วส่งให้ rate limiter ตอนคืนคีย์
+            on_usage = lease.on_usage
             
-            response = await self.model.generate_content_async(prompt)
-            return response.text
-        
-        except Exception as e:
-            if "429" in str(e) or "resource_exhausted" in str(e).lower():
-                print(f"⚠️ 429 Error. Key {api_key[:5]}... failed. Retrying...")
-                self.key_manager.report_failure(api_key)
-                await asyncio.sleep(1) 
-                return await self._call_llm_async(prompt) 
-            raise e
+            if on_delta or llm_hedger.enabled_for("PLANNER"):
+                return await collect_stream(
+                    hedged("PLANNER", GEMINI, self.model_name, client.stream(self.model_name, prompt, on_usage=on_usage), prompt),
+                    on_delta, label="Planner Agent"
+                )
+            return await client.generate(self.model_name, prompt, on_usage=on_usage)
+
+        # [V10.6] retry แบบมีเพดานและ backoff (แทนการเรียกตัวเองซ้ำหลัง sleep 1 วินาที)
+        return await llm_retry_policy.call_with_key(self.key_manager, "Planner Agent", attempt,
+                                                    model=self.model_name, estimated_tokens=estimated)
     
-    async def handle(self, query: str, short_term_memory: List[Dict], available_categories: List[str]) -> Dict[str, Any]:
+    @traced("agent.handle")
+    async def handle(self, query: str, short_term_memory: List[Dict], available_categories: List[str], session_id: str = "default_user",
+                     on_delta: Optional[DeltaCallback] = None) -> Dict[str, Any]:
         search_logs = []
         plan_thought = "Plan generation failed before it began."
         plan = {}
@@ -118,6 +136,9 @@ class PlannerAgent:
             target_categories = plan.get("categories", [])
             sub_queries = plan.get("sub_queries", [query])
             sub_queries = list(dict.fromkeys(sub_queries)) 
+            # [V10.3] เวลา/โหลดตึงตัว: ค้นหาเฉพาะ sub-query แรกๆ (ลำดับแรกของแผนใกล้คำถามเดิมที่สุด)
+            if len(sub_queries) > settings.DEGRADED_MAX_SUB_QUERIES and should_degrade(FEWER_SUB_QUERIES):
+                sub_queries = sub_queries[:settings.DEGRADED_MAX_SUB_QUERIES]
             
             print(f" 	-> Step 2 - Executing search plan... (CONCURRENTLY)")
             all_chunks = []
@@ -134,19 +155,19 @@ class PlannerAgent:
                     search_tasks.append(
                         self.rag_engine.search_books(
                             q, 
-                            self.max_context_chunks,  
-                            True, 
-                            target_categories
+                            top_k_rerank=self.max_context_chunks,  
+                            return_raw_chunks=True, 
+                            target_categories=target_categories
                         )
                     )
 
-            if "memory" in search_in and self.rag_engine and self.rag_engine.memory_index:
+            if "memory" in search_in and self.rag_engine and self.rag_engine.memory_retriever:
                 for q in sub_queries:
                     log_msg = f"🧠 Scheduling MEMORY search for connections to '{q}'..."
                     print(f" 	{log_msg}")
                     search_logs.append(log_msg)
                     
-                    search_tasks.append(self.rag_engine.search_memory(q, top_k=3))
+                    search_tasks.append(self.rag_engine.search_memory(q, session_id=session_id, top_k=3))
 
             if search_tasks:
                 print(f" 	-> 🚀 Executing {len(search_tasks)} tasks concurrently via asyncio.gather...")
@@ -169,22 +190,35 @@ class PlannerAgent:
 
             sorted_chunks = sorted(all_chunks, key=lambda x: x.get('rerank_score', 0.0), reverse=True)
             unique_chunks_map = {item.get('embedding_text', item.get('text')): item for item in sorted_chunks}
-            final_selection = list(unique_chunks_map.values())[:self.max_context_chunks]
-            
-            rag_context = "\n\n---\n\n".join([item.get("embedding_text", item.get("text", "")) for item in final_selection])
+            context_limit = self.max_context_chunks
+            if should_degrade(SHORTER_CONTEXT):
+                context_limit = max(1, self.max_context_chunks // 2)
+            final_selection = list(unique_chunks_map.values())[:context_limit]
 
             print(" 	-> Step 3 - Synthesizing final draft...")
-            history_context = "\n".join([f"- {mem['role']}: {mem['content']}" for mem in short_term_memory])
-            synthesis_prompt = self.master_prompt_template.format(history_context=history_context, rag_context=rag_context)
+            # [V10.8] context ต้องอยู่ในงบ token ของ PLANNER: chunk คะแนนต่ำสุดและเทิร์นเก่าสุดถูกตัดก่อน เทิร์นที่ยาวมากถูกย่อ
+            synthesis_prompt = prompt_budgeter.fit("PLANNER", self.model_name, self.master_prompt_template, {
+                "rag_context": Section([item.get("embedding_text", item.get("text", "")) for item in final_selection],
+                                       share=0.75, keep="head", separator="\n\n---\n\n"),
+                "history_context": Section([f"- {mem['role']}: {mem['content']}" for mem in short_term_memory],
+                                           share=0.25, keep="tail", max_item_tokens=settings.PROMPT_HISTORY_TURN_MAX_TOKENS),
+            })
+            final_selection = final_selection[:synthesis_prompt.kept["rag_context"]]
             
-            final_draft = await self._call_llm_async(synthesis_prompt)
+            final_draft = await self._call_llm_async(synthesis_prompt.text, on_delta)
 
             thought_process = {
                 "plan_thought": plan_thought,
                 "plan": plan,
                 "search_logs": search_logs,
                 "retrieved_chunks_count": len(unique_chunks_map),
-                "final_context_chunks": [chunk['embedding_text'] for chunk in final_selection] 
+                # [V10.1] จำนวนชิ้นความทรงจำส่วนตัวในบริบท (Dispatcher ไม่แคชคำตอบที่อ้างอิงความทรงจำของผู้ใช้)
+                "memory_chunks_used": sum(1 for chunk in final_selection if chunk.get('source') == 'memory'),
+                # [V10.9] จำนวนเทิร์นของประวัติสนทนาใน prompt (คำตอบที่เชื่อมโยงกับประวัติของผู้ใช้ไม่ถูกแคชข้ามผู้ใช้)
+                "history_turns_used": synthesis_prompt.kept["history_context"],
+                "final_context_chunks": [chunk['embedding_text'] for chunk in final_selection],
+                "prompt_tokens": synthesis_prompt.tokens,
+                "prompt_tokens_saved": synthesis_prompt.tokens_saved,
             }
             return {"answer": final_draft, "thought_process": thought_process}
 
@@ -1,9 +1,9 @@
 # agents/presenter_mode/presenter_agent.py
-# (V39.0 - Async & CORRECTED Groq Fix)
+# (V39.1 - Async via Shared LLM Gateway)
 
 from typing import Dict, List, Any
-from groq import AsyncGroq  
-import asyncio  
+from core.llm_gateway import llm_gateway
+from core.tracing import traced
 
 class PresenterAgent:
     """
@@ -35,33 +35,15 @@ class PresenterAgent:
 """
         print("🎤 Presenter Agent (V39 - Async LLM Powered) is ready.")
 
+    @traced("llm.call")
     async def _call_llm_async(self, prompt: str) -> str:
-        
-        api_key = await self.key_manager.get_key()
-        if not api_key: raise Exception("No available Groq API keys.")
-        
-        try:
-            client = AsyncGroq(api_key=api_key)
-            
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model_name,
-                temperature=0.7 
-            )
-            return chat_completion.choices[0].message.content.strip()
-        
-        except Exception as e:
-            print(f"❌ PresenterAgent LLM Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key) 
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying _call_llm_async...")
-                await asyncio.sleep(1)
-                return await self._call_llm_async(prompt) 
-            
-            raise e 
+        # [V39.1] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+        answer = await llm_gateway.chat(self.key_manager, self.model_name, [{"role": "user", "content": prompt}],
+                                        label="Presenter Agent", temperature=0.7)
+        return answer.strip()
 
 
+    @traced("agent.handle")
     async def handle(self, query: str, short_term_memory: List[Dict[str, Any]]) -> str:
         """
         [V24] เมธอดหลักในการทำงานของ Agent นี้ (แบบ Async)
@@ -1,10 +1,12 @@
 # agents/storytelling_mode/listener_agent.py
-# (V38.0 - Async & CORRECTED Groq Fix)
+# (V38.2 - Shared LLM Gateway)
 
-from typing import Dict, List, Any
-from groq import AsyncGroq  
+from typing import Dict, List, Any, Optional
 import random
-import asyncio  
+
+from core.llm_gateway import llm_gateway
+from core.llm_stream import DeltaCallback
+from core.tracing import traced
 
 class ListenerAgent:
     """
@@ -42,33 +44,18 @@ class ListenerAgent:
 """
         print("👂 Listener Agent (V38 - Async Active Listener) is on duty.")
 
-    async def _call_llm_async(self, prompt: str) -> str:
-        
-        api_key = await self.key_manager.get_key() 
-        if not api_key: raise Exception("No available Groq API keys.")
-        
-        try:
-            client = AsyncGroq(api_key=api_key)
-            
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model_name,
-                temperature=0.5
-            )
-            return chat_completion.choices[0].message.content.strip()
-        
-        except Exception as e:
-            print(f"❌ ListenerAgent LLM Error: {e}")
-            if api_key: self.key_manager.report_failure(api_key) 
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying _call_llm_async...")
-                await asyncio.sleep(1)
-                return await self._call_llm_async(prompt) 
-            
-            raise e 
+    @traced("llm.call")
+    async def _call_llm_async(self, prompt: str, on_delta: Optional[DeltaCallback] = None) -> str:
+        # [V38.2] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+        answer = await llm_gateway.stream_chat(
+            self.key_manager, self.model_name, [{"role": "user", "content": prompt}],
+            on_delta=on_delta, label="Listener Agent", hedge_agent="LISTENER", temperature=0.5
+        )
+        return answer.strip()
 
-    async def handle(self, query: str, short_term_memory: List[Dict[str, Any]]) -> str:
+    @traced("agent.handle")
+    async def handle(self, query: str, short_term_memory: List[Dict[str, Any]],
+                     on_delta: Optional[DeltaCallback] = None) -> str:
         """
         [V21] เมธอดหลักที่ Dispatcher จะเรียกใช้ (แบบ Async)
         """
@@ -84,7 +71,7 @@ class ListenerAgent:
                 query=query
             )
             
-            return await self._call_llm_async(prompt)
+            return await self._call_llm_async(prompt, on_delta)
             
         except Exception as e:
             print(f"❌ ListenerAgent LLM failed, using random fallback: {e}")
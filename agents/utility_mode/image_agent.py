@@ -1,12 +1,13 @@
 # agents/utility_mode/image_agent.py
-# (V36.0 - Async & CORRECTED Groq Fix)
+# (V36.2 - Cached Parameter Extraction)
 
 import httpx  
 import json
 import random
 from typing import Optional, Dict
-from groq import AsyncGroq  
-import asyncio  
+from core.llm_cache import llm_cache
+from core.llm_gateway import llm_gateway
+from core.tracing import traced
 
 class ImageAgent:
     def __init__(self, unsplash_key: str, key_manager, model_name: str):
@@ -22,35 +23,33 @@ class ImageAgent:
         
         print("🖼️  Image Agent (V36.0 - Async Curator) is ready.")
 
+    @traced("llm.call")
     async def _call_llm_async(self, prompt: str) -> Optional[Dict]:
-        
-        api_key = await self.groq_key_manager.get_key()
-        if not api_key: raise Exception("No available Groq API keys.")
-        
+        # [V36.1] client ที่ใช้ร่วมกัน + retry/หมุนคีย์ อยู่ใน LLM Gateway
+        # [V36.2] คำขอรูปเดิมได้พารามิเตอร์เดิม: ใช้คำตอบจากแคชบนดิสก์ (เก็บเฉพาะคำตอบที่ parse เป็น JSON ได้)
         try:
-            client = AsyncGroq(api_key=api_key)
-            
-            chat_completion = await client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model_name,
-                temperature=0.1
-            )
-            llm_response = chat_completion.choices[0].message.content
-            cleaned_response = llm_response.strip().replace("```json", "").replace("```", "")
-            params = json.loads(cleaned_response)
-            return params
+            llm_response = await llm_cache.cached(
+                "IMAGE_PARAMS", self.model_name, prompt,
+                lambda: llm_gateway.chat(self.groq_key_manager, self.model_name, [{"role": "user", "content": prompt}],
+                                         label="Image Agent", temperature=0.1),
+                is_valid=lambda text: self._parse_params(text) is not None, temperature=0.1)
+            return json.loads(self._clean_response(llm_response))
         
         except Exception as e:
             print(f"❌ ImageAgent LLM Error: {e}")
-            if api_key: self.groq_key_manager.report_failure(api_key)
-            
-            if api_key and ("429" in str(e).lower() or "service_unavailable" in str(e).lower()):
-                print(" 	 -> Retrying _call_llm_async...")
-                await asyncio.sleep(1)
-                return await self._call_llm_async(prompt) 
-            
             return None 
             
+    @staticmethod
+    def _clean_response(llm_response: str) -> str:
+        return llm_response.strip().replace("```json", "").replace("```", "")
+
+    def _parse_params(self, llm_response: str) -> Optional[Dict]:
+        try:
+            params = json.loads(self._clean_response(llm_response))
+        except json.JSONDecodeError:
+            return None
+        return params if isinstance(params, dict) else None
+
     async def _extract_search_parameters(self, query: str) -> Optional[Dict]:
         print(f" 	- 🧠 [Image Agent V36] Performing deep analysis on: '{query}' (Async)")
         prompt = f"""
@@ -137,6 +136,7 @@ class ImageAgent:
             print(f"❌ [Image Agent] An unexpected error occurred during search: {e}")
             return None
 
+    @traced("agent.handle")
     async def handle(self, query: str) -> Optional[Dict]:
         search_params = await self._extract_search_parameters(query) 
         
@@ -3,6 +3,7 @@
 
 import datetime
 from typing import Optional
+from core.tracing import traced
 
 class ReporterAgent:
     def __init__(self):
@@ -45,6 +46,7 @@ class ReporterAgent:
             "important_day_info": important_day_info 
         }
 
+    @traced("agent.handle")
     def handle(self, query: str) -> Optional[str]:
         """
         เมธอดหลักที่จะตรวจสอบ query และตอบกลับเกี่ยวกับวัน/เวลา
@@ -9,6 +9,7 @@ import webbrowser
 import re
 from typing import Optional
 import asyncio
+from core.tracing import traced
 
 class SystemAgent:
     def __init__(self):
@@ -123,6 +124,7 @@ class SystemAgent:
         
         return await self._set_system_volume(new_level)
 
+    @traced("agent.handle")
     async def handle(self, query: str) -> Optional[str]:
         q_lower = query.lower().strip()
 
@@ -0,0 +1,98 @@
+# benchmarks/formatter_latency.py
+# (V1.0 - Formatter Latency Benchmark)
+# วัดเวลาที่ขั้นจัดรูปแบบใช้ต่อ turn: Markdown typesetter บนเครื่อง เทียบกับ FormatterAgent (Gemini)
+# การวัดฝั่ง LLM ต้องมี GOOGLE_API_KEYS และเรียก API จริง จึงต้องเปิดด้วย --llm
+#
+# วิธีใช้: python -m benchmarks.formatter_latency --turns 200
+#          python -m benchmarks.formatter_latency --turns 10 --llm
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from benchmarks.fts_vs_like import THAI_WORDS, ENGLISH_WORDS
+from core.markdown_typesetter import typeset_markdown
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(THAI_WORDS, k=rng.randint(8, 20)) + rng.choices(ENGLISH_WORDS, k=rng.randint(0, 2))
+    return "".join(w if rng.random() < 0.7 else f" {w} " for w in words).strip()
+
+
+def make_draft(rng: random.Random) -> str:
+    """ร่างคำตอบสังเคราะห์ที่มีโครงสร้างแบบที่ Planner/General มักส่งออกมา: ย่อหน้า, หัวข้อ, รายการ, ป้ายกำกับ"""
+    parts = [_sentence(rng)]
+    for _ in range(rng.randint(1, 4)):
+        parts.append(f"{rng.choice(THAI_WORDS)}{rng.choice(THAI_WORDS)}:")
+        numbered = rng.random() < 0.5
+        for n in range(1, rng.randint(2, 6)):
+            marker = f"{n}." if numbered else "-"
+            label = f"{rng.choice(THAI_WORDS)}: " if rng.random() < 0.4 else ""
+            parts.append(f"{marker} {label}{_sentence(rng)}")
+        parts.append(_sentence(rng) + " " + _sentence(rng))
+    return "\n".join(parts)
+
+
+def _summary(samples_ms: list) -> str:
+    ordered = sorted(samples_ms)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return f"median {statistics.median(ordered):8.2f} ms | p95 {p95:8.2f} ms | max {ordered[-1]:8.2f} ms"
+
+
+def bench_local(drafts: list) -> list:
+    samples = []
+    for draft in drafts:
+        start = time.perf_counter()
+        typeset_markdown(draft)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def bench_llm(drafts: list) -> list:
+    from agents.formatter_agent import FormatterAgent
+    from core.api_key_manager import ApiKeyManager
+    from core.config import settings
+
+    if not settings.GOOGLE_API_KEYS:
+        print("⚠️ GOOGLE_API_KEYS is empty. Skipping the LLM formatter measurement.")
+        return []
+    formatter = FormatterAgent(
+        key_manager=ApiKeyManager(all_google_keys=settings.GOOGLE_API_KEYS, silent=True),
+        model_name=settings.FORMATTER_AGENT_MODEL,
+        persona_prompt=""
+    )
+    samples = []
+    for draft in drafts:
+        start = time.perf_counter()
+        await formatter.handle({"draft_to_review": draft})
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local Markdown typesetting vs the LLM formatter.")
+    parser.add_argument("--turns", type=int, default=200, help="จำนวนร่างคำตอบที่ใช้วัด")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm", action="store_true", help="วัด FormatterAgent (Gemini) ด้วย (เรียก API จริง)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    drafts = [make_draft(rng) for _ in range(args.turns)]
+    avg_chars = statistics.mean(len(d) for d in drafts)
+    print(f"📝 {len(drafts)} synthetic drafts, average {avg_chars:.0f} chars")
+
+    local = bench_local(drafts)
+    print(f"⚡ Local typesetter : {_summary(local)}")
+
+    if args.llm:
+        llm = asyncio.run(bench_llm(drafts))
+        if llm:
+            print(f"🐢 LLM formatter    : {_summary(llm)}")
+            saved = statistics.median(llm) - statistics.median(local)
+            print(f"✅ Per-turn latency saved (median): {saved:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# benchmarks/fts_vs_like.py
+# (V1.0 - Conversation Search Benchmark)
+# เปรียบเทียบ MemoryManager.search_conversations (FTS5) กับการสแกนด้วย LIKE บนฐานข้อมูลสังเคราะห์
+#
+# วิธีใช้: python -m benchmarks.fts_vs_like --rows 1000000 --sessions 1
+
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from core.memory_manager import MemoryManager
+
+THAI_WORDS = [
+    "หนังสือ", "ปรัชญา", "สโตอิก", "ความสุข", "การลงทุน", "ประวัติศาสตร์", "จิตวิทยา", "กลยุทธ์",
+    "ซุนวู", "เต๋า", "ความเครียด", "การทำงาน", "ครอบครัว", "เทคโนโลยี", "ข่าว", "เศรษฐกิจ",
+    "วันนี้", "เมื่อวาน", "รู้สึก", "อยากรู้", "ช่วย", "อธิบาย", "เปรียบเทียบ", "ข้อดี", "ข้อเสีย",
+]
+ENGLISH_WORDS = ["Sapiens", "Atomic", "Habits", "Python", "Money", "Power"]
+# คำที่ผู้ใช้มักค้นหา "เคยพูดถึงเมื่อไหร่" มักเป็นคำเฉพาะที่ไม่ได้ปรากฏบ่อย จึงแยกตามความถี่
+TOPIC_TERMS = {
+    "rare": (["มาร์คัสออเรลิอัส", "Meditations"], 0.0005),
+    "medium": (["สโตอิก", "ตำราพิชัยสงคราม"], 0.01),
+    "common": (["หนังสือ", "ความเครียด"], None),
+}
+
+
+def _random_sentence(rng: random.Random) -> str:
+    words = rng.choices(THAI_WORDS, k=rng.randint(6, 18)) + rng.choices(ENGLISH_WORDS, k=rng.randint(0, 2))
+    for terms, probability in TOPIC_TERMS.values():
+        if probability and rng.random() < probability:
+            words.append(rng.choice(terms))
+    rng.shuffle(words)
+    return "".join(w if rng.random() < 0.7 else f" {w} " for w in words).strip()
+
+
+def build_synthetic_db(db_path: str, rows: int, sessions: int, archived_ratio: float, seed: int):
+    """สร้างฐานข้อมูลผ่าน MemoryManager เพื่อให้ trigger ของ FTS5 ทำงานเหมือนของจริง"""
+    MemoryManager(db_path=db_path)
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    archived_rows = int(rows * archived_ratio)
+
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        batch = []
+        for i in range(rows):
+            session_id = f"user_{rng.randrange(sessions)}"
+            role = "user" if i % 2 == 0 else "model"
+            timestamp = start + datetime.timedelta(seconds=i * 7)
+            batch.append((i + 1, timestamp, session_id, role, _random_sentence(rng)))
+            if len(batch) >= 20000 or i == rows - 1:
+                live = [row for row in batch if row[0] > archived_rows]
+                archived = [row for row in batch if row[0] <= archived_rows]
+                if archived:
+                    cursor.executemany(
+                        "INSERT INTO archived_conversations (id, timestamp, session_id, role, content) VALUES (?, ?, ?, ?, ?)",
+                        archived
+                    )
+                if live:
+                    cursor.executemany(
+                        "INSERT INTO conversation_history (id, timestamp, session_id, role, content) VALUES (?, ?, ?, ?, ?)",
+                        live
+                    )
+                conn.commit()
+                batch = []
+                print(f"  - Inserted {i + 1:,}/{rows:,} rows", end="\r")
+    print()
+
+
+def like_scan(db_path: str, session_id: str, text: str, limit: int):
+    """สิ่งที่ต้องทำถ้าไม่มี FTS5: สแกน LIKE ทั้งสองตาราง แล้วเลือกผลลัพธ์ล่าสุด"""
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        results = []
+        for table in ("conversation_history", "archived_conversations"):
+            cursor.execute(
+                f"SELECT rowid, role, timestamp, content FROM {table} WHERE session_id = ? AND content LIKE ? ORDER BY timestamp DESC LIMIT ?",
+                (session_id, f"%{text}%", limit)
+            )
+            results.extend(cursor.fetchall())
+        results.sort(key=lambda row: row[2], reverse=True)
+        return results[:limit]
+
+
+def _time_it(fn, repeats: int):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FTS5 vs LIKE conversation search benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=1, help="หน้าเว็บใช้ 'default_user' คนเดียว จึงตั้งค่าเริ่มต้นเป็น 1")
+    parser.add_argument("--archived-ratio", type=float, default=0.7)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", type=str, default=None, help="ใช้ฐานข้อมูลที่สร้างไว้แล้ว (ข้ามขั้นตอนสร้างข้อมูล)")
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="nexus_fts_bench_"), "memory.db")
+        print(f"--- 🏭 Building synthetic DB with {args.rows:,} rows at '{db_path}' ---")
+        started = time.perf_counter()
+        build_synthetic_db(db_path, args.rows, args.sessions, args.archived_ratio, args.seed)
+        print(f"  - ✅ Built in {time.perf_counter() - started:.1f}s (including FTS5 triggers)")
+
+    manager = MemoryManager(db_path=db_path)
+    rng = random.Random(args.seed)
+    cases = [
+        (selectivity, f"user_{rng.randrange(args.sessions)}", term)
+        for selectivity, (terms, _) in TOPIC_TERMS.items() for term in terms
+    ]
+
+    print("\n--- ⏱️  Results (ms, median of repeats) ---")
+    print(f"{'selectivity':<12} {'session':<12} {'term':<18} {'LIKE':>10} {'FTS5':>10} {'speedup':>9} {'hits':>6}")
+    like_all, fts_all = [], []
+    for selectivity, session_id, term in cases:
+        like_times, _ = _time_it(lambda: like_scan(db_path, session_id, term, args.limit), args.repeats)
+        fts_times, fts_result = _time_it(lambda: manager.search_conversations(session_id, term, args.limit), args.repeats)
+        like_ms, fts_ms = statistics.median(like_times), statistics.median(fts_times)
+        like_all.append(like_ms)
+        fts_all.append(fts_ms)
+        print(f"{selectivity:<12} {session_id:<12} {term:<18} {like_ms:>10.2f} {fts_ms:>10.2f} {like_ms / max(fts_ms, 1e-6):>8.1f}x {len(fts_result):>6}")
+
+    print(f"\n✅ Overall median: LIKE {statistics.median(like_all):.2f} ms vs FTS5 {statistics.median(fts_all):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
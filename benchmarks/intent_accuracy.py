@@ -0,0 +1,79 @@
+# benchmarks/intent_accuracy.py
+# (V1.0 - Intent Classifier Accuracy Report)
+# ประเมิน IntentClassifier แบบ leave-one-out บนตัวอย่างทั้งหมด (seed + คำตัดสินของ LLM ใน INTENT_LOG_FILE)
+# รายงานความแม่นยำรวม, coverage (สัดส่วนที่ตอบเองได้โดยไม่ถาม LLM) และความแม่นยำของส่วนที่ตอบเอง ตามเกณฑ์ต่างๆ
+#
+# วิธีใช้: python -m benchmarks.intent_accuracy
+#          python -m benchmarks.intent_accuracy --router feng --thresholds 0.7 0.75 0.8 0.85 0.9
+
+import argparse
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from core.config import settings
+from core.intent_classifier import IntentClassifier, knn_vote
+
+
+def leave_one_out(vectors: np.ndarray, labels: list, k: int) -> list:
+    """คืน [(label จริง, label ที่ทาย, confidence, similarity)] โดยทายแต่ละตัวจากตัวอย่างที่เหลือ"""
+    similarities = vectors @ vectors.T
+    np.fill_diagonal(similarities, -np.inf)
+    results = []
+    for i, truth in enumerate(labels):
+        others = [j for j in range(len(labels)) if j != i]
+        predicted, confidence, similarity = knn_vote(similarities[i, others], [labels[j] for j in others], k)
+        results.append((truth, predicted, confidence, similarity))
+    return results
+
+
+def report(router: str, results: list, thresholds: list, min_confidence: float):
+    total = len(results)
+    correct = sum(truth == predicted for truth, predicted, _, _ in results)
+    print(f"\n🧭 Router '{router}': {total} examples, kNN accuracy (no threshold) {correct / total:.1%}")
+    print(f"   {'min_similarity':>14} | {'coverage':>8} | {'local accuracy':>14} | {'overall*':>8}")
+    for threshold in thresholds:
+        local = [(t, p) for t, p, conf, sim in results if sim >= threshold and conf >= min_confidence]
+        coverage = len(local) / total
+        local_accuracy = sum(t == p for t, p in local) / len(local) if local else 0.0
+        # * สมมติว่า LLM ตอบถูกทุกข้อในส่วนที่ส่งต่อไป (เพดานบนของความแม่นยำรวม)
+        overall = (sum(t == p for t, p in local) + (total - len(local))) / total
+        marker = "  <- configured" if abs(threshold - settings.INTENT_CLASSIFIER_MIN_SIMILARITY) < 1e-9 else ""
+        print(f"   {threshold:>14.2f} | {coverage:>8.1%} | {local_accuracy:>14.1%} | {overall:>8.1%}{marker}")
+
+    per_label = defaultdict(lambda: [0, 0])
+    for truth, predicted, _, _ in results:
+        per_label[truth][0] += truth == predicted
+        per_label[truth][1] += 1
+    print("   Per-label recall (no threshold):")
+    for label, (hits, count) in sorted(per_label.items()):
+        print(f"     - {label:<24} {hits}/{count}")
+    confusions = Counter((t, p) for t, p, _, _ in results if t != p).most_common(5)
+    if confusions:
+        print("   Most common confusions: " + ", ".join(f"{t}->{p} x{n}" for (t, p), n in confusions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leave-one-out accuracy report for the local intent classifier.")
+    parser.add_argument("--router", default=None, help="ประเมินเฉพาะ router นี้ (ค่าเริ่มต้น: ทั้งหมด)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.70, 0.75, 0.80, 0.85, 0.90])
+    parser.add_argument("--min-confidence", type=float, default=settings.INTENT_CLASSIFIER_MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    classifier = IntentClassifier(embedder=SentenceTransformer("BAAI/bge-m3"))
+    for router, pairs in classifier.load_examples().items():
+        if args.router and router != args.router:
+            continue
+        texts = [text for text, _ in pairs]
+        labels = [label for _, label in pairs]
+        start = time.perf_counter()
+        vectors = classifier._normalize(classifier.embedder.encode(texts, convert_to_numpy=True, batch_size=32))
+        per_query_ms = (time.perf_counter() - start) * 1000 / len(texts)
+        report(router, leave_one_out(vectors, labels, classifier.k), args.thresholds, args.min_confidence)
+        print(f"   Embedding cost ≈ {per_query_ms:.1f} ms/query (batched); kNN lookup is a single matrix-vector product.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/load_test.py
+# (V1.0 - Full-Pipeline Load Test)
+# จำลองผู้ใช้หลายคนพร้อมกันยิงคำถามเข้า /ws/{user_id} (WebSocket) และ/หรือ /ask (HTTP) ของเซิร์ฟเวอร์ที่รันอยู่
+# รายงาน throughput และ latency p50/p95/p99 แยกตาม agent_used, เวลาถึง delta แรก (WebSocket) และจำนวน 503 / error
+# ไม่ให้เสียโควตาจริง: รัน fake provider แล้วเปิดเซิร์ฟเวอร์ด้วย LLM_PROVIDER=fake
+#
+# วิธีใช้: python -m core.fake_llm --port 8765
+#          LLM_PROVIDER=fake python main.py
+#          python -m benchmarks.load_test --users 20 --turns 5 --mode both
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import websockets
+
+from core.intent_examples import FENG_ROUTER, SEED_EXAMPLES
+
+
+class TurnResult:
+    __slots__ = ("mode", "agent", "status", "total_ms", "first_delta_ms")
+
+    def __init__(self, mode: str, agent: str, status: str, total_ms: float, first_delta_ms: Optional[float] = None):
+        self.mode = mode
+        self.agent = agent
+        # ok | rejected (503) | error (frame/HTTP error หรือ FinalResponse.error) | timeout
+        self.status = status
+        self.total_ms = total_ms
+        self.first_delta_ms = first_delta_ms
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    return ordered[max(0, int(round(len(ordered) * percent / 100)) - 1)]
+
+
+def _summary(samples_ms: List[float]) -> str:
+    ordered = sorted(samples_ms)
+    return (f"p50 {_percentile(ordered, 50):8.0f} ms | p95 {_percentile(ordered, 95):8.0f} ms | "
+            f"p99 {_percentile(ordered, 99):8.0f} ms | max {ordered[-1]:8.0f} ms")
+
+
+async def ws_user(base_url: str, user_id: str, queries: List[str], think_seconds: float, timeout: float,
+                  rng: random.Random) -> List[TurnResult]:
+    """ผู้ใช้หนึ่งคนบน WebSocket เดียว ส่งคำถามทีละข้อและรอ final_response ก่อนถามข้อถัดไป"""
+    results = []
+    url = base_url.replace("http://", "ws://").replace("https://", "wss://") + f"/ws/{user_id}"
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=timeout) as socket:
+            for query in queries:
+                start = time.perf_counter()
+                first_delta_ms = None
+                await socket.send(query)
+                try:
+                    while True:
+                        remaining = timeout - (time.perf_counter() - start)
+                        frame = json.loads(await asyncio.wait_for(socket.recv(), max(0.01, remaining)))
+                        elapsed_ms = (time.perf_counter() - start) * 1000
+                        if frame["type"] == "delta" and first_delta_ms is None:
+                            first_delta_ms = elapsed_ms
+                        elif frame["type"] == "final_response":
+                            payload = frame["payload"]
+                            status = "error" if payload.get("error") else "ok"
+                            results.append(TurnResult("ws", payload.get("agent_used") or "UNKNOWN", status,
+                                                      elapsed_ms, first_delta_ms))
+                            break
+                        elif frame["type"] == "error":
+                            status = "rejected" if frame["payload"].get("code") == 503 else "error"
+                            results.append(TurnResult("ws", "-", status, elapsed_ms))
+                            break
+                except asyncio.TimeoutError:
+                    results.append(TurnResult("ws", "-", "timeout", timeout * 1000))
+                    break
+                await asyncio.sleep(rng.uniform(0, think_seconds))
+    except (OSError, websockets.exceptions.WebSocketException) as e:
+        print(f"⚠️ [{user_id}] WebSocket failed: {type(e).__name__}: {e}")
+        results.append(TurnResult("ws", "-", "error", 0.0))
+    return results
+
+
+async def ask_user(client: httpx.AsyncClient, user_id: str, queries: List[str], think_seconds: float,
+                   rng: random.Random) -> List[TurnResult]:
+    """ผู้ใช้หนึ่งคนบน /ask (ไม่มีสตรีม จึงวัดได้แค่เวลารวม)"""
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        try:
+            response = await client.post("/ask", json={"query": query, "user_id": user_id})
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if response.status_code == 503:
+                results.append(TurnResult("ask", "-", "rejected", elapsed_ms))
+            elif response.status_code != 200:
+                results.append(TurnResult("ask", "-", "error", elapsed_ms))
+            else:
+                payload = response.json()
+                results.append(TurnResult("ask", payload.get("agent_used") or "UNKNOWN",
+                                          "error" if payload.get("error") else "ok", elapsed_ms))
+        except httpx.TimeoutException:
+            results.append(TurnResult("ask", "-", "timeout", (time.perf_counter() - start) * 1000))
+        except httpx.HTTPError as e:
+            print(f"⚠️ [{user_id}] /ask failed: {type(e).__name__}: {e}")
+            results.append(TurnResult("ask", "-", "error", (time.perf_counter() - start) * 1000))
+        await asyncio.sleep(rng.uniform(0, think_seconds))
+    return results
+
+
+async def run_load(base_url: str, users: int, turns: int, mode: str, ramp_up: float, think_seconds: float,
+                   timeout: float, seed: int) -> Tuple[float, List[TurnResult]]:
+    rng = random.Random(seed)
+    pool = [query for query, _ in SEED_EXAMPLES[FENG_ROUTER]]
+    run_id = uuid.uuid4().hex[:6]
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def user(index: int) -> List[TurnResult]:
+            await asyncio.sleep(ramp_up * index / max(1, users))
+            user_rng = random.Random(rng.random())
+            queries = [user_rng.choice(pool) for _ in range(turns)]
+            user_id = f"loadtest_{run_id}_{index}"
+            user_mode = mode if mode != "both" else ("ws" if index % 2 == 0 else "ask")
+            if user_mode == "ws":
+                return await ws_user(base_url, user_id, queries, think_seconds, timeout, user_rng)
+            return await ask_user(client, user_id, queries, think_seconds, user_rng)
+
+        start = time.perf_counter()
+        per_user = await asyncio.gather(*(user(index) for index in range(users)))
+        wall_seconds = time.perf_counter() - start
+    return wall_seconds, [result for results in per_user for result in results]
+
+
+def report(results: List[TurnResult], wall_seconds: float):
+    statuses = defaultdict(int)
+    for result in results:
+        statuses[result.status] += 1
+    completed = statuses["ok"]
+    print(f"\n📊 {len(results)} turns in {wall_seconds:.1f}s | throughput {completed / wall_seconds:.2f} ok turns/s | "
+          + " | ".join(f"{status} {count}" for status, count in sorted(statuses.items())))
+
+    groups: Dict[tuple, List[TurnResult]] = defaultdict(list)
+    for result in results:
+        if result.status == "ok":
+            groups[(result.mode, result.agent)].append(result)
+    for (mode, agent), group in sorted(groups.items(), key=lambda item: (item[0][0], -len(item[1]))):
+        print(f"  {mode:3} {agent:24} n={len(group):4} | {_summary([r.total_ms for r in group])}")
+        first_deltas = [r.first_delta_ms for r in group if r.first_delta_ms is not None]
+        if first_deltas:
+            print(f"  {'':3} {'└ first delta':24} n={len(first_deltas):4} | {_summary(first_deltas)}")
+
+    for mode in sorted({result.mode for result in results}):
+        ok = [r.total_ms for r in results if r.mode == mode and r.status == "ok"]
+        if ok:
+            print(f"✅ {mode} overall: {_summary(ok)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /ws/{user_id} and /ask with many simulated users.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10, help="จำนวนผู้ใช้จำลองที่ทำงานพร้อมกัน")
+    parser.add_argument("--turns", type=int, default=5, help="จำนวนคำถามต่อผู้ใช้ (ถามทีละข้อ)")
+    parser.add_argument("--mode", choices=["ws", "ask", "both"], default="both", help="both = ผู้ใช้ครึ่งหนึ่งต่อแต่ละช่องทาง")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="ทยอยเริ่มผู้ใช้ให้ครบภายในกี่วินาที")
+    parser.add_argument("--think", type=float, default=1.0, help="เวลาพักสุ่ม (0..think วินาที) ระหว่างคำถาม")
+    parser.add_argument("--timeout", type=float, default=120.0, help="เวลารอคำตอบสูงสุดต่อเทิร์น (วินาที)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"🚦 {args.users} users x {args.turns} turns ({args.mode}) against {args.base_url}")
+    wall_seconds, results = asyncio.run(run_load(args.base_url, args.users, args.turns, args.mode, args.ramp_up,
+                                                 args.think, args.timeout, args.seed))
+    report(results, wall_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# core/admission.py
+# (V1.3 - Load from Queue Depth)
+# จำกัดจำนวน handle_query ที่ทำงานพร้อมกัน (ทั้งระบบและต่อผู้ใช้) ก่อนถึง Dispatcher
+# คำขอที่เกินจะรอในคิว FIFO ที่มีขนาดจำกัด (รายงานลำดับคิวผ่าน callback) และถูกปฏิเสธ (503) เมื่อคิวเต็มหรือรอนานเกินไป
+# ผลคืองาน encode/rerank และ LLM call ที่ยิงพร้อมกันมีเพดาน p99 จึงไม่บานปลายตอนโหลดเกิน
+# [V1.2] เพดานต่อผู้ใช้ใช้ได้เมื่อ user_id แยกผู้ใช้จริง (หน้าเว็บยังส่ง "default_user" ร่วมกันทุกคน ดู ADMISSION_MAX_PER_USER)
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+from core.config import settings
+
+# ความถี่ในการตรวจ/รายงานลำดับคิวซ้ำระหว่างรอ (รายงานเฉพาะเมื่อลำดับเปลี่ยน)
+POSITION_REPORT_INTERVAL_SECONDS = 1.0
+
+QueuePositionCallback = Callable[[int], Awaitable[None]]
+
+
+class AdmissionRejected(Exception):
+    """คำขอถูกปฏิเสธเพราะระบบรับไม่ไหว (คิวเต็ม หรือรอคิวนานเกิน) ควรตอบ 503 พร้อม Retry-After"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Admission rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user_id", "future")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionController:
+    def __init__(self,
+                 max_concurrent: int = settings.ADMISSION_MAX_CONCURRENT,
+                 max_per_user: int = settings.ADMISSION_MAX_PER_USER,
+                 max_queue: int = settings.ADMISSION_MAX_QUEUE,
+                 max_queued_per_user: int = settings.ADMISSION_MAX_QUEUED_PER_USER,
+                 queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._active_per_user: Dict[str, int] = {}
+        self._waiters: Deque[_Waiter] = deque()
+        self._admitted_total = 0
+        self._rejected_total = 0
+        print(f"🚧 Admission Controller (V1) is ready. "
+              f"(concurrent={max_concurrent}, per_user={max_per_user}, queue={max_queue})")
+
+    def _has_capacity(self, user_id: str) -> bool:
+        return self._active < self.max_concurrent and self._active_per_user.get(user_id, 0) < self.max_per_user
+
+    def _acquire(self, user_id: str):
+        self._active += 1
+        self._active_per_user[user_id] = self._active_per_user.get(user_id, 0) + 1
+        self._admitted_total += 1
+
+    def _release(self, user_id: str):
+        self._active -= 1
+        remaining = self._active_per_user.get(user_id, 1) - 1
+        if remaining > 0:
+            self._active_per_user[user_id] = remaining
+        else:
+            self._active_per_user.pop(user_id, None)
+        self._grant_waiters()
+
+    def _grant_waiters(self):
+        """ปล่อยผู้รอตามลำดับ ข้ามคนที่ติดเพดานต่อผู้ใช้ เพื่อไม่ให้ผู้ใช้คนเดียวขวางคิวของคนอื่น"""
+        for waiter in list(self._waiters):
+            if self._active >= self.max_concurrent:
+                break
+            if waiter.future.done() or not self._has_capacity(waiter.user_id):
+                continue
+            self._waiters.remove(waiter)
+            self._acquire(waiter.user_id)
+            waiter.future.set_result(True)
+
+    def _position(self, waiter: _Waiter) -> int:
+        try:
+            return self._waiters.index(waiter) + 1
+        except ValueError:
+            return 0
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self._rejected_total += 1
+        retry_after = max(1, int(self.queue_timeout // 2))
+        print(f"🚧 Admission: Rejected ({reason}). active={self._active}, queued={len(self._waiters)}")
+        return AdmissionRejected(reason, retry_after)
+
+    async def _wait_in_queue(self, user_id: str, on_queued: Optional[QueuePositionCallback]):
+        queued_for_user = sum(1 for w in self._waiters if w.user_id == user_id)
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue full")
+        if queued_for_user >= self.max_queued_per_user:
+            raise self._reject(f"too many queued requests for user '{user_id}'")
+
+        waiter = _Waiter(user_id)
+        self._waiters.append(waiter)
+        self._grant_waiters()  # คนที่รออยู่ก่อนอาจติดเพดานต่อผู้ใช้ ส่วนผู้ใช้นี้อาจเข้าได้ทันที
+        deadline = time.monotonic() + self.queue_timeout
+        last_position = 0
+        try:
+            while True:
+                position = self._position(waiter)
+                if on_queued and position and position != last_position:
+                    last_position = position
+                    await on_queued(position)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._reject(f"waited more than {self.queue_timeout:g}s in queue")
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future),
+                                           timeout=min(POSITION_REPORT_INTERVAL_SECONDS, remaining))
+                    return
+                except asyncio.TimeoutError:
+                    continue
+        except BaseException:
+            # ถูกยกเลิก/หมดเวลา: ถ้าได้สิทธิ์มาพอดีต้องคืน ไม่เช่นนั้นเอาออกจากคิว
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(user_id)
+            else:
+                waiter.future.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, on_queued: Optional[QueuePositionCallback] = None):
+        """
+        [V1] ครอบการทำงานหนึ่งเทิร์น: เข้าได้ทันทีถ้ายังมีที่ว่างและไม่มีใครรออยู่ก่อน
+        ไม่เช่นนั้นรอคิว (on_queued(position) ถูกเรียกเมื่อลำดับเปลี่ยน) หรือโยน AdmissionRejected
+        """
+        if not self._waiters and self._has_capacity(user_id):
+            self._acquire(user_id)
+        else:
+            await self._wait_in_queue(user_id, on_queued)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def load(self) -> float:
+        """
+        [V1.3] แรงกดดันจากคิว 0..1 (จำนวนที่รอ ต่อเพดาน) ใช้ตัดสินการลดคุณภาพของเทิร์น (core/deadline.py)
+        งานที่ทำอยู่ไม่นับ: ช่องเต็มแต่ไม่มีคิวถือเป็นการใช้งานปกติ จึงเป็น 0 จนกว่าจะเริ่มมีคนรอ
+        """
+        return min(1.0, len(self._waiters) / max(1, self.max_concurrent))
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted_total": self._admitted_total,
+            "rejected_total": self._rejected_total,
+        }
@@ -0,0 +1,164 @@
+# core/answer_cache.py
+# (V1.0 - Semantic Answer Cache)
+# แคชคำตอบสุดท้าย (จัดรูปแบบแล้ว) ตาม (intent, embedding ของคำถาม) ให้คำถามซ้ำหรือเกือบซ้ำไม่ต้องค้นหา/สังเคราะห์/จัดรูปแบบใหม่
+# จับคู่ด้วย cosine similarity ตามเกณฑ์ แต่ละ agent มีอายุแคชของตัวเอง (ข่าวสั้น ข้อมูลหนังสือยาว)
+# ล้างทั้งหมดเมื่อ RAGEngine โหลด index ใหม่ และเก็บสถิติ hit/miss สำหรับ /api/metrics
+
+import re
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from core.config import settings
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE_RE.sub(" ", query).strip().lower().rstrip("?？!. ")
+
+
+class CachedAnswer:
+    __slots__ = ("intent", "query", "agent_used", "answer", "thought_process", "image", "created_at", "expires_at", "hits")
+
+    def __init__(self, intent: str, query: str, agent_used: str, answer: str,
+                 thought_process: Optional[Dict], image: Optional[Dict], ttl_seconds: float):
+        self.intent = intent
+        self.query = query
+        self.agent_used = agent_used
+        self.answer = answer
+        self.thought_process = thought_process
+        self.image = image
+        self.created_at = time.time()
+        self.expires_at = time.monotonic() + ttl_seconds
+        self.hits = 0
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class AnswerCache:
+    def __init__(self, query_encoder: Callable[[str], Awaitable[Any]],
+                 ttl_seconds: Dict[str, float] = settings.ANSWER_CACHE_TTL_SECONDS,
+                 min_similarity: float = settings.ANSWER_CACHE_MIN_SIMILARITY,
+                 max_entries: int = settings.ANSWER_CACHE_MAX_ENTRIES):
+        # ใช้ encode_query ของ RAGEngine: embedding ของคำถามถูก prefetch ไว้แล้วระหว่าง triage จึงแทบไม่มีต้นทุนเพิ่ม
+        self.query_encoder = query_encoder
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self.max_entries = max_entries
+        self._entries: Dict[str, List[CachedAnswer]] = defaultdict(list)
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._per_intent: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        print(f"🗃️  Answer Cache (V1 - Semantic) is ready. (agents={sorted(ttl_seconds)}, min_similarity={min_similarity})")
+
+    def is_cacheable(self, agent_used: str) -> bool:
+        return agent_used in self.ttl_seconds
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    async def _encode(self, query: str) -> np.ndarray:
+        vector = np.asarray(await self.query_encoder(query), dtype="float32").reshape(-1)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _drop(self, intent: str, indices: List[int]):
+        drop = set(indices)
+        keep = [i for i in range(len(self._entries[intent])) if i not in drop]
+        self._entries[intent] = [self._entries[intent][i] for i in keep]
+        if keep:
+            self._vectors[intent] = self._vectors[intent][keep]
+        else:
+            self._entries.pop(intent, None)
+            self._vectors.pop(intent, None)
+
+    async def lookup(self, intent: str, query: str) -> Optional[Dict[str, Any]]:
+        """
+        [V1] คืน {"entry": CachedAnswer, "similarity": float} ของคำตอบที่ใกล้ที่สุดที่ยังไม่หมดอายุ
+        หรือ None (นับเป็น miss) ถ้าไม่มีคำตอบที่คล้ายพอ
+        """
+        entries = self._entries.get(intent)
+        result = None
+        if entries:
+            expired = [i for i, entry in enumerate(entries) if entry.expired]
+            if expired:
+                self._drop(intent, expired)
+                entries = self._entries.get(intent)
+        if entries:
+            normalized = normalize_query(query)
+            exact = next((i for i, entry in enumerate(entries) if entry.query == normalized), None)
+            if exact is not None:
+                result = {"entry": entries[exact], "similarity": 1.0}
+            else:
+                try:
+                    similarities = self._vectors[intent] @ await self._encode(query)
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.min_similarity:
+                        result = {"entry": entries[best], "similarity": round(float(similarities[best]), 3)}
+                except Exception as e:
+                    print(f"⚠️ Answer Cache: Could not embed query for lookup. Error: {e}")
+
+        counter = "hits" if result else "misses"
+        self._stats[counter] += 1
+        self._per_intent[intent][counter] += 1
+        if result:
+            result["entry"].hits += 1
+        return result
+
+    async def store(self, intent: str, query: str, agent_used: str, answer: str,
+                    thought_process: Optional[Dict] = None, image: Optional[Dict] = None):
+        if not self.is_cacheable(agent_used) or not answer or not query.strip():
+            return
+        try:
+            vector = await self._encode(query)
+        except Exception as e:
+            print(f"⚠️ Answer Cache: Could not embed query for store. Error: {e}")
+            return
+        entry = CachedAnswer(intent, normalize_query(query), agent_used, answer,
+                             thought_process, image, self.ttl_seconds[agent_used])
+        self._entries[intent].append(entry)
+        previous = self._vectors.get(intent)
+        self._vectors[intent] = vector[None, :] if previous is None else np.vstack([previous, vector[None, :]])
+        self._stats["stores"] += 1
+        self._evict()
+
+    def _evict(self):
+        """เกินความจุ: ทิ้งรายการที่หมดอายุก่อน แล้วจึงทิ้งรายการที่ใกล้หมดอายุที่สุด"""
+        if len(self) <= self.max_entries:
+            return
+        for intent in list(self._entries):
+            expired = [i for i, entry in enumerate(self._entries[intent]) if entry.expired]
+            if expired:
+                self._stats["evictions"] += len(expired)
+                self._drop(intent, expired)
+        while len(self) > self.max_entries:
+            intent, index = min(
+                ((intent, i) for intent, entries in self._entries.items() for i in range(len(entries))),
+                key=lambda pair: self._entries[pair[0]][pair[1]].expires_at
+            )
+            self._stats["evictions"] += 1
+            self._drop(intent, [index])
+
+    def invalidate(self, reason: str = "index reload"):
+        """ล้างแคชทั้งหมด (เรียกเมื่อ RAGEngine โหลด index ใหม่ คำตอบเดิมอาจอ้างข้อมูลที่ล้าสมัย)"""
+        count = len(self)
+        self._entries.clear()
+        self._vectors.clear()
+        self._stats["invalidations"] += 1
+        print(f"🗃️  Answer Cache: Invalidated {count} answers ({reason}).")
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self),
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "per_intent": {
+                intent: dict(counts, hit_rate=round(counts["hits"] / max(1, counts["hits"] + counts["misses"]), 4))
+                for intent, counts in self._per_intent.items()
+            },
+        }
@@ -1,14 +1,21 @@
 # core/api_key_manager.py
+# (V2.5 - Thread-Safe Key Selection)
 import time
+import threading
 import asyncio 
-from typing import List, Dict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Optional
+
+from core.config import settings
+from core.key_state_store import KeyStateStore, default_key_state_store
+from core.rate_limiter import BATCH, INTERACTIVE, KeyLease, KeyRateLimiter, UsageCallback
 
 class AllKeysOnCooldownError(Exception):
     """Exception ที่จะถูกโยนเมื่อ API Key ทั้งหมดไม่พร้อมใช้งาน"""
     pass
 
 class ApiKeyManager:
-    def __init__(self, all_google_keys: List[str], silent: bool = False):
+    def __init__(self, all_google_keys: List[str], silent: bool = False, state_store: Optional[KeyStateStore] = None):
         if not all_google_keys:
             print("⚠️ [Key Manager] No Google API keys provided.")
             self.all_keys = []
@@ -18,6 +25,14 @@ class ApiKeyManager:
         self.key_cooldowns: Dict[str, float] = {key: 0 for key in self.all_keys}
         self.current_index = 0
         self.silent = silent
+        # [V2.5] สคริปต์ extractor เรียก get_key/report_failure จากหลาย worker thread พร้อมกัน
+        self._lock = threading.Lock()
+        # [V2] โควตา RPM/TPM ต่อคีย์ต่อโมเดล ใช้เมื่อผู้เรียกระบุ model (ไม่ระบุ = หมุนคีย์แบบเดิม)
+        # [V2.2] cooldown/ยอดใช้ร่วมกับ process อื่น (เซิร์ฟเวอร์ + สคริปต์ extractor) และอยู่รอดหลัง restart
+        self.state_store = state_store or default_key_state_store()
+        if self.state_store:
+            self.state_store.merge_cooldowns("Google", self.key_cooldowns, force=True)
+        self.rate_limiter = KeyRateLimiter("Google", settings.GOOGLE_RATE_LIMITS, state_store=self.state_store)
 
         self.last_failure_time: float = 0.0
         self.failure_streak: int = 0
@@ -25,7 +40,8 @@ class ApiKeyManager:
         if self.all_keys and not self.silent:
             print(f"🔑 [Key Manager] Initialized with {len(self.all_keys)} Google keys (Async Ready).")
 
-    async def get_key(self) -> str:
+    async def get_key(self, model: Optional[str] = None, estimated_tokens: int = 0, lane: str = INTERACTIVE) -> str:
+        """[V2.3] lane=BATCH สำหรับงานเบื้องหลัง: หลีกทางให้คำขอของผู้ใช้ที่รอโควตา และใช้โควตาส่วนที่กันไว้ไม่ได้"""
         if not self.all_keys:
             raise AllKeysOnCooldownError("No API keys were provided to the manager.")
         
@@ -38,36 +54,80 @@ class ApiKeyManager:
                 
                 await asyncio.sleep(sleep_duration) 
 
-        for _ in range(len(self.all_keys)):
-            key_to_try = self.all_keys[self.current_index]
-            
-            if time.time() >= self.key_cooldowns.get(key_to_try, 0):
+        if lane == BATCH:
+            await self.rate_limiter.yield_to_interactive()
+
+        if self.rate_limiter.limits_for(model):
+            key = await self.rate_limiter.acquire(self._available_keys, model, estimated_tokens, lane)
+            if key is None:
+                raise AllKeysOnCooldownError(f"No Google key has quota for '{model}' within {self.rate_limiter.max_wait:g}s.")
+            self.failure_streak = 0
+            return key
+
+        available = self._available_keys()
+        if available:
+            # [V2.4] คีย์ที่มีคำขอค้างน้อยที่สุด (นับจาก lease()) เสมอกันใช้ลำดับ round-robin จาก current_index
+            with self._lock:
+                position = {key: (index - self.current_index) % len(self.all_keys) for index, key in enumerate(self.all_keys)}
+                key = min(available, key=lambda key: (self.rate_limiter.in_flight(key), position[key]))
+                self.current_index = (self.all_keys.index(key) + 1) % len(self.all_keys)
                 self.failure_streak = 0
-                return key_to_try 
-            self._rotate()
+            return key
 
         raise AllKeysOnCooldownError(f"All {len(self.all_keys)} keys are on cooldown. Try again later.")
     
-    def report_failure(self, failed_key: str, error_type: str = "generic"):
+    def _available_keys(self) -> List[str]:
+        self._merge_shared_cooldowns()
+        now = time.time()
+        return [key for key in self.all_keys if now >= self.key_cooldowns.get(key, 0)]
+
+    def _merge_shared_cooldowns(self):
+        if self.state_store:
+            self.state_store.merge_cooldowns("Google", self.key_cooldowns)
+
+    @asynccontextmanager
+    async def lease(self, model: Optional[str] = None, estimated_tokens: int = 0,
+                    lane: str = INTERACTIVE) -> AsyncIterator[KeyLease]:
+        """
+        [V2.4] async with key_manager.lease(model, tokens) as lease: ใช้ lease.api_key และส่ง lease.on_usage ให้ client
+        คีย์ถูกนับเป็นงานค้างจนจบ block (get_key จึงกระจายคำขอพร้อมกันไปคีย์อื่น) แล้ว usage ถูกส่งให้ rate limiter ตอนคืน
+        """
+        api_key = await self.get_key(model, estimated_tokens, lane)
+        async with self.rate_limiter.lease(api_key, model, estimated_tokens) as key_lease:
+            yield key_lease
+
+    def usage_observer(self, api_key: str, model: str, estimated_tokens: int) -> UsageCallback:
+        """[V2] callback ที่ส่งให้ client: รายงาน header/usage จริงของคำขอนี้กลับมาแก้โควตาที่จองไว้"""
+        return self.rate_limiter.usage_observer(api_key, model, estimated_tokens)
+
+    def report_failure(self, failed_key: str, error_type: str = "generic", retry_after: Optional[float] = None):
+        """[V2.1] retry_after = เวลาที่ provider สั่งให้รอ (ถ้ามี) ใช้แทน cooldown ตายตัว"""
         if failed_key not in self.key_cooldowns:
             return
 
-        self.last_failure_time = time.time()
-        self.failure_streak += 1
+        with self._lock:
+            self.last_failure_time = time.time()
+            self.failure_streak += 1
+            streak = self.failure_streak
 
         if error_type == 'quota':
             cooldown_duration = 24 * 60 * 60 
             reason = "Daily quota reached"
+        elif retry_after:
+            cooldown_duration = retry_after
+            reason = "Rate limit hit (Retry-After)"
         else:
             cooldown_duration = 65
             reason = "Rate limit hit/Generic"
 
-        self.key_cooldowns[failed_key] = time.time() + cooldown_duration
+        with self._lock:
+            until = self.key_cooldowns[failed_key] = time.time() + cooldown_duration
+            self._rotate()
+        if self.state_store:
+            self.state_store.set_cooldown("Google", failed_key, until, reason)
         
         if not self.silent:
-            print(f"🔻 [Key Manager] Key '...{failed_key[-4:]}' failed ({reason}). Cooldown for {cooldown_duration}s. Streak: {self.failure_streak}")
-        
-        self._rotate()
+            print(f"🔻 [Key Manager] Key '...{failed_key[-4:]}' failed ({reason}). Cooldown for {cooldown_duration:g}s. Streak: {streak}")
 
     def _rotate(self):
         """หมุน index ไปยังคีย์ตัวถัดไปในลิสต์"""
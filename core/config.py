@@ -1,5 +1,5 @@
 # core/config.py
-# (V4.1 - Final & Fully Documented)
+# (V5.12 - Per-Label Intent Log Cap)
 # นี่คือ "แผงควบคุมหลัก" ของ PROJECT NEXUS
 # ทำหน้าที่โหลดข้อมูลลับและกำหนดค่าการทำงานทั้งหมดของระบบจากที่เดียว
 
@@ -24,6 +24,9 @@ class Settings:
     PLANNER_AGENT_MODEL = os.getenv("PLANNER_AGENT_MODEL", PRIMARY_GEMINI_MODEL)
 
     FORMATTER_AGENT_MODEL = os.getenv("FORMATTER_AGENT_MODEL", PRIMARY_GEMINI_MODEL)
+    # [V4.3] ค่าเริ่มต้นทุก agent ใช้ Markdown typesetter บนเครื่อง ระบุชื่อ agent (คั่นด้วย ,) เพื่อเลือกใช้ FormatterAgent (LLM) แทน
+    # เช่น LLM_FORMATTER_AGENTS=PLANNER,NEWS
+    LLM_FORMATTER_AGENTS = {name.strip().upper() for name in os.getenv("LLM_FORMATTER_AGENTS", "").split(',') if name.strip()}
 
     COUNSELOR_AGENT_MODEL = os.getenv("COUNSELOR_AGENT_MODEL", PRIMARY_GEMINI_MODEL)
 
@@ -46,6 +49,200 @@ class Settings:
     APOLOGY_AGENT_MODEL = os.getenv("APOLOGY_AGENT_MODEL", DEFAULT_UTILITY_MODEL)
 
     MEMORY_AGENT_MODEL = os.getenv("MEMORY_AGENT_MODEL", PRIMARY_GROQ_MODEL)
+    # [V5.9] ฐานข้อมูลความทรงจำ (ประวัติสนทนา/ความทรงจำระยะยาว) และ index ของมัน ใช้ร่วมกันทั้งเซิร์ฟเวอร์และ manage_memory.py
+    MEMORY_DB_PATH = os.getenv("MEMORY_DB_PATH", "data/memory.db")
+    MEMORY_INDEX_DIR = os.getenv("MEMORY_INDEX_DIR", "data/memory_index")
+
+    # [V4.2] Memory consolidation daemon (manage_memory.py --daemon)
+    MEMORY_DAEMON_WORKERS = int(os.getenv("MEMORY_DAEMON_WORKERS", "4"))
+    MEMORY_DAEMON_BATCH_SESSIONS = int(os.getenv("MEMORY_DAEMON_BATCH_SESSIONS", "10"))
+    MEMORY_DAEMON_INTERVAL_SECONDS = float(os.getenv("MEMORY_DAEMON_INTERVAL_SECONDS", "30"))
+    # ไฟล์สัญญาณที่ daemon เขียนทุกครั้งที่ index เปลี่ยน และเซิร์ฟเวอร์คอยตรวจ
+    MEMORY_INDEX_VERSION_FILE = "index_version.json"
+    MEMORY_INDEX_WATCH_INTERVAL_SECONDS = float(os.getenv("MEMORY_INDEX_WATCH_INTERVAL_SECONDS", "10"))
+    # จำนวนรายการใน memory_vector_log ที่สะสมได้ก่อนรวมเข้าไฟล์ index หลัก (compaction)
+    MEMORY_INDEX_COMPACT_THRESHOLD = int(os.getenv("MEMORY_INDEX_COMPACT_THRESHOLD", "500"))
+    # จำนวน shard (index ต่อ session) สูงสุดที่เก็บไว้ในหน่วยความจำ ก่อนไล่ตัวที่ไม่ได้ใช้นานสุดออก (LRU)
+    MEMORY_SHARD_CACHE_SIZE = int(os.getenv("MEMORY_SHARD_CACHE_SIZE", "32"))
+
+    # [V4.4] Local intent classifier (kNN บน embedding) ก่อนเรียก LLM คัดแยกเจตนา
+    INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() == "true"
+    INTENT_CLASSIFIER_K = int(os.getenv("INTENT_CLASSIFIER_K", "5"))
+    # ตอบเองเมื่อเพื่อนบ้านที่ใกล้สุดของ label ที่ชนะคล้ายกว่าเกณฑ์ และ label นั้นได้คะแนนโหวตเกินสัดส่วนนี้
+    INTENT_CLASSIFIER_MIN_SIMILARITY = float(os.getenv("INTENT_CLASSIFIER_MIN_SIMILARITY", "0.80"))
+    INTENT_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("INTENT_CLASSIFIER_MIN_CONFIDENCE", "0.75"))
+    # คำตัดสินของ LLM ที่สะสมเป็นตัวอย่างฝึก (JSONL)
+    INTENT_LOG_FILE = "data/intent_log.jsonl"
+    INTENT_LOG_MAX_EXAMPLES = int(os.getenv("INTENT_LOG_MAX_EXAMPLES", "5000"))
+    # [V5.12] เพดานตัวอย่างต่อ label ไม่ให้ label ที่พบบ่อยท่วม kNN
+    INTENT_LOG_MAX_PER_LABEL = int(os.getenv("INTENT_LOG_MAX_PER_LABEL", "500"))
+
+    # [V4.5] Request-scoped tracing (JSON lines แบบ OTLP/JSON สรุปด้วย manage_traces.py)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_FILE = os.getenv("TRACE_FILE", "data/traces.jsonl")
+
+    # [V4.6] Admission control หน้า Dispatcher (เพดานงานพร้อมกัน + คิวรอที่มีขนาดจำกัด เกินแล้วตอบ 503)
+    ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+    # [V5.10] เพดานต่อผู้ใช้มีความหมายเมื่อ client ส่ง user_id จริงเท่านั้น
+    # หน้าเว็บ (web/static/script.js) ยังส่ง "default_user" ทุกเบราว์เซอร์ ค่าเริ่มต้นจึงเท่ากับเพดานรวม (ไม่จำกัดต่อผู้ใช้)
+    # ตั้งให้ต่ำกว่านี้ได้เมื่อทุก client มี id ของตัวเองแล้ว
+    ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", str(ADMISSION_MAX_CONCURRENT)))
+    ADMISSION_MAX_QUEUED_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUED_PER_USER", str(ADMISSION_MAX_QUEUE)))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+
+    # [V4.7] แคชคำตอบตาม (intent, embedding ของคำถาม) ใน Dispatcher
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_MIN_SIMILARITY = float(os.getenv("ANSWER_CACHE_MIN_SIMILARITY", "0.95"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+    # อายุแคช (วินาที) ต่อ agent_used เฉพาะ agent ที่ระบุเท่านั้นที่ถูกแคช เช่น NEWS=900,LIBRARIAN=86400
+    # แคชใช้ร่วมกันทุกผู้ใช้: ใส่เฉพาะ agent ที่คำตอบไม่ขึ้นกับผู้ถาม (PLANNER ใช้ประวัติสนทนาของผู้ใช้ในการสังเคราะห์)
+    ANSWER_CACHE_TTL_SECONDS = {
+        name.strip().upper(): float(ttl)
+        for name, _, ttl in (item.partition("=") for item in os.getenv(
+            "ANSWER_CACHE_TTL_SECONDS", "NEWS=900,LIBRARIAN=86400").split(","))
+        if name.strip() and ttl.strip()
+    }
+    # ความถี่ในการตรวจว่า index หนังสือ/กราฟ/ข่าวถูกสร้างใหม่หรือไม่ (แล้วโหลดใหม่ + ล้างแคชคำตอบ)
+    KNOWLEDGE_INDEX_WATCH_INTERVAL_SECONDS = int(os.getenv("KNOWLEDGE_INDEX_WATCH_INTERVAL_SECONDS", "60"))
+
+    # [V4.8] Hedged requests: ระบุชื่อ agent (คั่นด้วย ,) ที่จะยิงคำขอสำรองไปอีก provider เมื่อ token แรกมาช้า
+    # เช่น LLM_HEDGING_AGENTS=PLANNER,NEWS,GENERAL_HANDLER (ค่าเริ่มต้น: ปิด)
+    LLM_HEDGING_AGENTS = {name.strip().upper() for name in os.getenv("LLM_HEDGING_AGENTS", "").split(',') if name.strip()}
+    # งบเวลา = TTFT percentile นี้ของ provider/model หลัก (จาก HEDGE_WINDOW_SIZE ครั้งล่าสุด) จำกัดอยู่ในช่วง MIN..MAX
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_WINDOW_SIZE = int(os.getenv("HEDGE_WINDOW_SIZE", "200"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "2.0"))
+    HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.5"))
+    HEDGE_MAX_DELAY_SECONDS = float(os.getenv("HEDGE_MAX_DELAY_SECONDS", "6.0"))
+    HEDGE_BACKUP_GEMINI_MODEL = os.getenv("HEDGE_BACKUP_GEMINI_MODEL", PRIMARY_GEMINI_MODEL)
+    HEDGE_BACKUP_GROQ_MODEL = os.getenv("HEDGE_BACKUP_GROQ_MODEL", PRIMARY_GROQ_MODEL)
+
+    # [V4.9] งบเวลาต่อเทิร์น (Dispatcher ตัดเทิร์นเมื่อหมดงบ) และแรงกดดัน (0..1 = max(สัดส่วนเวลาที่ใช้ไป, ความลึกของคิว)) ที่ทำให้แต่ละขั้นลดคุณภาพ
+    TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "45"))
+    DEGRADE_FEWER_SUB_QUERIES_AT = float(os.getenv("DEGRADE_FEWER_SUB_QUERIES_AT", "0.6"))
+    DEGRADE_SKIP_RERANK_AT = float(os.getenv("DEGRADE_SKIP_RERANK_AT", "0.75"))
+    DEGRADE_SKIP_FORMATTER_AT = float(os.getenv("DEGRADE_SKIP_FORMATTER_AT", "0.85"))
+    DEGRADE_SHORTER_CONTEXT_AT = float(os.getenv("DEGRADE_SHORTER_CONTEXT_AT", "0.95"))
+    DEGRADED_MAX_SUB_QUERIES = int(os.getenv("DEGRADED_MAX_SUB_QUERIES", "1"))
+
+    # [V5.0] LLM Gateway: client ของ Groq อายุยาวต่อคีย์ (connection pool + keep-alive) และ timeout กลาง
+    LLM_GATEWAY_HTTP2 = os.getenv("LLM_GATEWAY_HTTP2", "true").lower() == "true"
+    LLM_GATEWAY_TIMEOUT_SECONDS = float(os.getenv("LLM_GATEWAY_TIMEOUT_SECONDS", "60"))
+    LLM_GATEWAY_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_GATEWAY_CONNECT_TIMEOUT_SECONDS", "5"))
+    LLM_GATEWAY_MAX_CONNECTIONS_PER_KEY = int(os.getenv("LLM_GATEWAY_MAX_CONNECTIONS_PER_KEY", "20"))
+    LLM_GATEWAY_KEEPALIVE_SECONDS = float(os.getenv("LLM_GATEWAY_KEEPALIVE_SECONDS", "120"))
+
+    # [V5.3] นโยบาย retry เดียวของทุกคำขอ LLM (core/retry_policy.py): exponential backoff + jitter, เพดานจำนวนครั้งและเวลารวม
+    LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3"))
+    LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
+    LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "8"))
+    LLM_RETRY_BUDGET_SECONDS = float(os.getenv("LLM_RETRY_BUDGET_SECONDS", "30"))
+
+    # [V5.1] Gemini เรียกผ่าน REST ด้วย httpx pool เดียว (คีย์ส่งใน header ต่อคำขอ แทน genai.configure ที่เป็น global)
+    GEMINI_API_BASE_URL = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+    GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "50"))
+
+    # [V5.2] โควตาต่อคีย์ต่อโมเดลในรูปแบบ model=RPM:TPM (คั่นด้วย ,) key manager จ่ายคีย์ที่ยังเหลือโควตามากที่สุด
+    # โมเดลที่ไม่ได้ระบุจะไม่ถูกจำกัดล่วงหน้า (พึ่ง cooldown หลังเจอ 429 เหมือนเดิม)
+    GROQ_RATE_LIMITS = {
+        model.strip(): tuple(int(part) for part in limits.split(":"))
+        for model, _, limits in (item.partition("=") for item in os.getenv(
+            "GROQ_RATE_LIMITS", "llama-3.3-70b-versatile=30:12000,llama-3.1-8b-instant=30:6000").split(","))
+        if model.strip() and limits.strip()
+    }
+    GOOGLE_RATE_LIMITS = {
+        model.strip(): tuple(int(part) for part in limits.split(":"))
+        for model, _, limits in (item.partition("=") for item in os.getenv(
+            "GOOGLE_RATE_LIMITS", "gemini-2.5-flash=10:250000").split(","))
+        if model.strip() and limits.strip()
+    }
+    # รอโควตาคืนได้ไม่เกินนี้ ถ้านานกว่านั้นถือว่าทุกคีย์ไม่พร้อม (AllKeysOnCooldownError)
+    RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "20"))
+    # token ที่จองเผื่อคำตอบของ LLM ตอนประมาณการก่อนส่งคำขอ (แก้เป็นค่าจริงเมื่อ provider ตอบกลับ)
+    RATE_LIMIT_OUTPUT_TOKEN_RESERVE = int(os.getenv("RATE_LIMIT_OUTPUT_TOKEN_RESERVE", "512"))
+
+    # [V5.4] สถานะคีย์ (cooldown + ยอดใช้) ที่ทุก process ใช้ร่วมกันผ่านไฟล์ SQLite (core/key_state_store.py)
+    # เซิร์ฟเวอร์และ knowledge_extractor_*.py จึงไม่แย่งคีย์ที่อีกฝ่ายทำให้ติด 429 และ cooldown ไม่หายเมื่อ restart
+    KEY_STATE_STORE_ENABLED = os.getenv("KEY_STATE_STORE_ENABLED", "true").lower() == "true"
+    KEY_STATE_STORE_PATH = os.getenv("KEY_STATE_STORE_PATH", "data/key_state.sqlite3")
+    # รอบการอ่าน/เขียนสถานะร่วมของ thread เบื้องหลัง (ยอดใช้ของ process นี้สะสมในหน่วยความจำแล้วเขียนเป็นชุด)
+    # busy timeout ใช้กับ thread นั้นเท่านั้น คำขอของผู้ใช้อ่าน snapshot ในหน่วยความจำ ไม่รอ lock ของไฟล์
+    KEY_STATE_REFRESH_SECONDS = float(os.getenv("KEY_STATE_REFRESH_SECONDS", "1.0"))
+    KEY_STATE_BUSY_TIMEOUT_SECONDS = float(os.getenv("KEY_STATE_BUSY_TIMEOUT_SECONDS", "2.0"))
+
+    # [V5.5] ช่องทางลำดับความสำคัญ: คำขอของผู้ใช้ (interactive) กับงานเบื้องหลัง (batch เช่น knowledge_extractor_*.py)
+    # batch ใช้โควตาของคีย์ได้ไม่เกิน (1 - LLM_INTERACTIVE_RESERVE_SHARE) และหลีกทางเมื่อมีคำขอ interactive รอโควตาอยู่
+    LLM_INTERACTIVE_RESERVE_SHARE = float(os.getenv("LLM_INTERACTIVE_RESERVE_SHARE", "0.3"))
+    LLM_BATCH_MAX_WAIT_SECONDS = float(os.getenv("LLM_BATCH_MAX_WAIT_SECONDS", "300"))
+    # หลีกทางนานสุดเท่านี้ต่อคำขอ แล้วไปต่อ (กันงาน batch ค้างตลอดเมื่อเซิร์ฟเวอร์ยุ่งต่อเนื่อง)
+    LLM_BATCH_MAX_YIELD_SECONDS = float(os.getenv("LLM_BATCH_MAX_YIELD_SECONDS", "60"))
+    LLM_BATCH_YIELD_BASE_SECONDS = float(os.getenv("LLM_BATCH_YIELD_BASE_SECONDS", "0.5"))
+
+    # [V5.6] แคชคำตอบ LLM บนดิสก์ (core/llm_cache.py) สำหรับ prompt ที่ให้คำตอบเดิมเสมอ (key = hash ของ model + prompt + params)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite3")
+    # อายุแคช (วินาที) ต่อ call site เฉพาะ namespace ที่ระบุเท่านั้นที่ถูกแคช
+    LLM_CACHE_TTL_SECONDS = {
+        name.strip().upper(): float(ttl)
+        for name, _, ttl in (item.partition("=") for item in os.getenv(
+            "LLM_CACHE_TTL_SECONDS", "FENG_TRIAGE=86400,FORMATTER=604800,IMAGE_PARAMS=604800,KG_EXTRACTION=2592000").split(","))
+        if name.strip() and ttl.strip()
+    }
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+    LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+    # [V5.11] รอบที่ thread เบื้องหลังเขียนรายการใหม่/สถิติการใช้ลงไฟล์ (คำขอของผู้ใช้ไม่รอการเขียน)
+    LLM_CACHE_FLUSH_SECONDS = float(os.getenv("LLM_CACHE_FLUSH_SECONDS", "2"))
+
+    # [V5.7] งบ token ของ prompt ต่อ agent (core/prompt_budget.py): ประวัติสนทนา/RAG context/ข่าว/ความทรงจำที่ยาวเกินถูกตัดหรือย่อ
+    # agent ที่ไม่ได้ระบุได้ prompt เต็มเหมือนเดิม
+    PROMPT_TOKEN_BUDGETS = {
+        name.strip().upper(): int(budget)
+        for name, _, budget in (item.partition("=") for item in os.getenv(
+            "PROMPT_TOKEN_BUDGETS", "PLANNER=8000,NEWS=5000,GENERAL_HANDLER=3500").split(","))
+        if name.strip() and budget.strip()
+    }
+    # เทิร์นเดียวในประวัติสนทนายาวเกินนี้ (token) ถูกย่อก่อนนับงบ (เช่นคำตอบยาวๆ ของ Planner ในเทิร์นก่อน)
+    PROMPT_HISTORY_TURN_MAX_TOKENS = int(os.getenv("PROMPT_HISTORY_TURN_MAX_TOKENS", "400"))
+
+    # [V5.8] provider ของ LLM: "live" (Groq/Gemini จริง) หรือ "fake" (core/fake_llm.py บนเครื่อง สำหรับ load test ไม่เสียโควตา)
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "live").lower()
+    GROQ_API_BASE_URL = os.getenv("GROQ_API_BASE_URL") or None
+    FAKE_LLM_BASE_URL = os.getenv("FAKE_LLM_BASE_URL", "http://127.0.0.1:8765")
+    # เวลาถึง token แรก (ค่ากลาง ms ของการแจกแจง log-normal) และความเร็วสตรีม (token/วินาที) ต่อ provider
+    FAKE_LLM_TTFT_MS = {
+        name.strip().lower(): float(value)
+        for name, _, value in (item.partition("=") for item in os.getenv("FAKE_LLM_TTFT_MS", "groq=250,gemini=700").split(","))
+        if name.strip() and value.strip()
+    }
+    FAKE_LLM_TTFT_SIGMA = float(os.getenv("FAKE_LLM_TTFT_SIGMA", "0.5"))
+    FAKE_LLM_TOKENS_PER_SECOND = {
+        name.strip().lower(): float(value)
+        for name, _, value in (item.partition("=") for item in os.getenv(
+            "FAKE_LLM_TOKENS_PER_SECOND", "groq=400,gemini=150").split(","))
+        if name.strip() and value.strip()
+    }
+    FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "250"))
+    # สัดส่วนคำขอที่สุ่มตอบ 429 และ Retry-After ที่แนบไป
+    FAKE_LLM_429_RATE = float(os.getenv("FAKE_LLM_429_RATE", "0.02"))
+    FAKE_LLM_RETRY_AFTER_SECONDS = float(os.getenv("FAKE_LLM_RETRY_AFTER_SECONDS", "2"))
+    # ตอบ 429 เมื่อคีย์ใช้เกิน GROQ_RATE_LIMITS / GOOGLE_RATE_LIMITS ใน 60 วินาที เหมือน provider จริง
+    FAKE_LLM_ENFORCE_QUOTAS = os.getenv("FAKE_LLM_ENFORCE_QUOTAS", "true").lower() == "true"
+    FAKE_LLM_KEYS_PER_PROVIDER = int(os.getenv("FAKE_LLM_KEYS_PER_PROVIDER", "4"))
+    if LLM_PROVIDER == "fake":
+        # คีย์ปลอม + ชี้ client ไปที่ fake provider + แยกไฟล์สถานะ ไม่ให้ cooldown/แคช/ตัวอย่างเจตนาจาก load test ปนกับของจริง
+        # [V5.9] รวมถึงประวัติสนทนาของผู้ใช้จำลอง (loadtest_*) และ trace ของ load test
+        GOOGLE_API_KEYS = [f"fake-google-key-{index}" for index in range(FAKE_LLM_KEYS_PER_PROVIDER)]
+        GROQ_API_KEYS = [f"fake-groq-key-{index}" for index in range(FAKE_LLM_KEYS_PER_PROVIDER)]
+        GEMINI_API_BASE_URL = f"{FAKE_LLM_BASE_URL}/v1beta"
+        GROQ_API_BASE_URL = FAKE_LLM_BASE_URL
+        KEY_STATE_STORE_PATH = "data/key_state.fake.sqlite3"
+        LLM_CACHE_PATH = "data/llm_cache.fake.sqlite3"
+        INTENT_LOG_FILE = "data/intent_log.fake.jsonl"
+        MEMORY_DB_PATH = "data/memory.fake.db"
+        MEMORY_INDEX_DIR = "data/memory_index.fake"
+        TRACE_FILE = "data/traces.fake.jsonl"
 
     NEWS_KEY = os.getenv("NEWS_API_KEY")
 
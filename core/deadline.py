@@ -0,0 +1,88 @@
+# core/deadline.py
+# (V1.1 - Enforced Turn Deadline)
+# งบเวลาต่อเทิร์นที่ส่งต่อผ่าน contextvars (Dispatcher -> agent -> RAGEngine โดยไม่ต้องเพิ่มพารามิเตอร์ทุกชั้น)
+# แต่ละขั้นถามว่า "ควรลดคุณภาพไหม" ตามแรงกดดัน = max(สัดส่วนเวลาที่ใช้ไปแล้ว, โหลดของระบบตอนรับคำขอ)
+# เกณฑ์ของแต่ละขั้นเรียงจากน้อยไปมาก จึงลดตามลำดับ: sub-query น้อยลง -> ข้าม rerank -> ข้าม Formatter (LLM) -> บริบทสั้นลง
+# การลดที่เกิดขึ้นถูกบันทึกไว้ และ Dispatcher ใส่ลงใน thought_process["degradations"]
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from core.config import settings
+
+FEWER_SUB_QUERIES = "planner.fewer_sub_queries"
+SKIP_RERANK = "rag.skip_rerank"
+SKIP_FORMATTER = "dispatcher.skip_formatter"
+SHORTER_CONTEXT = "planner.shorter_context"
+
+# แรงกดดันขั้นต่ำ (0..1) ที่ทำให้แต่ละขั้นลดคุณภาพ
+DEGRADATION_THRESHOLDS: Dict[str, float] = {
+    FEWER_SUB_QUERIES: settings.DEGRADE_FEWER_SUB_QUERIES_AT,
+    SKIP_RERANK: settings.DEGRADE_SKIP_RERANK_AT,
+    SKIP_FORMATTER: settings.DEGRADE_SKIP_FORMATTER_AT,
+    SHORTER_CONTEXT: settings.DEGRADE_SHORTER_CONTEXT_AT,
+}
+
+_current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("nexus_deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, budget_seconds: float = settings.TURN_DEADLINE_SECONDS, load: float = 0.0):
+        """load = ความลึกของคิวตอนรับคำขอ (0 = ไม่มีคิว, 1 = คิวยาวเท่าเพดาน) จาก AdmissionController.load()"""
+        self.budget_seconds = budget_seconds
+        self.load = min(max(load, 0.0), 1.0)
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_seconds
+        self.degradations: List[Dict[str, str]] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def elapsed_fraction(self) -> float:
+        if self.budget_seconds <= 0:
+            return 1.0
+        return min(1.0, (time.monotonic() - self.started_at) / self.budget_seconds)
+
+    def pressure(self) -> float:
+        return max(self.elapsed_fraction(), self.load)
+
+    def degrade(self, stage: str) -> bool:
+        """
+        [V1] คืน True ถ้าขั้นนี้ควรลดคุณภาพ (และบันทึกไว้ครั้งเดียวต่อขั้น)
+        เหตุผลระบุว่ามาจากเวลาที่ใช้ไปหรือโหลดของระบบ
+        """
+        if any(d["stage"] == stage for d in self.degradations):
+            return True
+        elapsed = self.elapsed_fraction()
+        if max(elapsed, self.load) < DEGRADATION_THRESHOLDS.get(stage, 1.0):
+            return False
+        reason = (f"used {elapsed:.0%} of {self.budget_seconds:g}s budget" if elapsed >= self.load
+                  else f"system load {self.load:.0%}")
+        self.degradations.append({"stage": stage, "reason": reason})
+        print(f"🪫 Deadline: Degrading '{stage}' ({reason}).")
+        return True
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def should_degrade(stage: str) -> bool:
+    """ทางลัดสำหรับ agent/RAGEngine: ไม่มี deadline (เช่นสคริปต์ manage_*) = ไม่ลดคุณภาพ"""
+    deadline = _current_deadline.get()
+    return deadline.degrade(stage) if deadline else False
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline):
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
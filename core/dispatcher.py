@@ -1,10 +1,34 @@
 # core/dispatcher.py
-# (V6.1 - Final, Complete & Resilient Conductor)
+# (V6.13 - Enforced Turn Deadline)
 
 import traceback
 from pydantic import BaseModel
 from typing import Optional, Dict, List, Any, Callable 
 import asyncio
+import time
+
+from core.config import settings
+from core.answer_cache import AnswerCache
+from core.deadline import SKIP_FORMATTER, Deadline, current_deadline, deadline_scope, should_degrade
+from core.llm_stream import DeltaCallback
+from core.markdown_typesetter import typeset_markdown
+from core.single_flight import SingleFlight
+from core.tracing import annotate_trace, traced
+
+# [V6.2] เจตนาที่ agent ปลายทางไม่ใช้ผลการค้นหาจาก RAGEngine (embedding / หนังสือ / กราฟ)
+# จะยกเลิก prefetch ทันทีที่รู้เจตนา (เจตนาที่ไม่รู้จักจะถูกส่งให้ Planner จึงยังเก็บ prefetch ไว้)
+PREFETCH_SKIP_INTENTS = {
+    "TIME_REQUEST", "DATE_REQUEST", "IMAGE_REQUEST", "SYSTEM_COMMAND", "CODE_REQUEST",
+    "COUNSELING_REQUEST", "USER_STORYTELLING", "LIBRARIAN_REQUEST", "MEMORY_QUERY"
+}
+
+# [V6.4] agent ที่รับ on_delta และสตรีมคำตอบเป็น WebSocket frame แบบ {"type": "delta"}
+STREAMING_AGENTS = {"GENERAL_HANDLER", "COUNSELOR", "LISTENER", "NEWS", "PLANNER", "PROACTIVE_OFFER_HANDLER"}
+
+# [V6.8] agent ที่คำตอบไม่ขึ้นกับผู้ใช้ คำขอเหมือนกันจากต่างผู้ใช้จึงใช้การคำนวณร่วมกันได้ (agent อื่นรวมเฉพาะภายในผู้ใช้เดียวกัน)
+GLOBAL_FLIGHT_AGENTS = {"NEWS", "LIBRARIAN", "REPORTER"}
+
+AGENTS_NEEDING_MEMORY = {"GENERAL_HANDLER", "COUNSELOR", "CODER", "LISTENER"}
 
 class FinalResponse(BaseModel):
     agent_used: str
@@ -29,6 +53,15 @@ class Dispatcher:
                 self.rag_engine = agent.rag_engine
                 print(f"✅ Dispatcher: RAG Engine linked from {agent.__class__.__name__}.")
                 break
+
+        # [V6.6] แคชคำตอบตาม (intent, embedding ของคำถาม) ล้างทั้งหมดเมื่อ RAGEngine โหลด index ใหม่
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED and self.rag_engine:
+            self.answer_cache = AnswerCache(query_encoder=self.rag_engine.encode_query)
+            self.rag_engine.add_reload_listener(self.answer_cache.invalidate)
+
+        # [V6.8] คำขอเหมือนกันที่มาพร้อมกันใช้การคำนวณร่วมกัน (แต่ละคนยังบันทึกประวัติของตัวเอง)
+        self.single_flight = SingleFlight("Dispatcher Single-Flight")
         
         print("🚦 ผู้ควบคุมวงออร์เคสตรา (Dispatcher) ขึ้นประจำตำแหน่งบนโพเดียม")
 
@@ -38,28 +71,81 @@ class Dispatcher:
         """
         return [{"role": h.get("role"), "parts": h.get("content")} for h in history_dicts]
 
-    async def handle_query(self, query: str, user_id: str, update_callback: Optional[Callable] = None) -> FinalResponse:
+    def _delta_relay(self, agent_name: str, update_callback: Optional[Callable]) -> Optional[DeltaCallback]:
+        """[V6.4] แปลง delta ของ agent เป็น frame {"type": "delta"} ผ่าน update_callback (WebSocket เท่านั้น)"""
+        if not update_callback or agent_name not in STREAMING_AGENTS:
+            return None
+
+        async def on_delta(text: str):
+            await update_callback({"type": "delta", "payload": {"agent": agent_name, "text": text}})
+        return on_delta
+
+    @staticmethod
+    def _best_effort(update_callback: Optional[Callable]) -> Optional[Callable]:
+        """[V6.8] งานที่ใช้ร่วมกันต้องไม่ล้มเพราะ WebSocket ของผู้เริ่มงานปิดไป คนที่รอผลอยู่ยังต้องได้คำตอบ"""
+        if not update_callback:
+            return None
+
+        async def relay(message: Dict):
+            try:
+                await update_callback(message)
+            except Exception as e:
+                print(f"⚠️ Dispatcher: Dropped progress update for shared computation ({e}).")
+        return relay
+
+    @traced("dispatcher.handle_query")
+    async def handle_query(self, query: str, user_id: str, update_callback: Optional[Callable] = None,
+                           deadline: Optional[Deadline] = None) -> FinalResponse:
+        """
+        [V6.13] ทั้งเทิร์นทำงานภายใต้ deadline (agent และ RAGEngine อ่านผ่าน current_deadline/should_degrade)
+        หมดงบเมื่อไรเทิร์นถูกยกเลิก แล้วตอบกลับด้วยข้อความขออภัยแทนการรอต่อ
+        """
+        turn_deadline = deadline or Deadline()
+        with deadline_scope(turn_deadline):
+            try:
+                async with asyncio.timeout(turn_deadline.remaining()):
+                    return await self._handle_query(query, user_id, update_callback)
+            except TimeoutError:
+                print(f"⏱️ Dispatcher: Turn exceeded its {turn_deadline.budget_seconds:g}s deadline.")
+                annotate_trace(deadline_exceeded=True)
+                return await self._finalize_response("DEADLINE_EXCEEDED", "ขออภัยครับ คำถามนี้ใช้เวลานานเกินกำหนด ลองถามใหม่อีกครั้ง หรือถามให้แคบลงนะครับ",
+                                                     user_id, is_error=True, update_callback=update_callback)
+
+    async def _handle_query(self, query: str, user_id: str, update_callback: Optional[Callable] = None) -> FinalResponse:
+        # [V6.5] span นี้เป็น root ของ trace ทั้งเทิร์น span ของ Feng / RAG / agent / SQLite จะเป็นลูกของมัน
+        annotate_trace(session_id=user_id, query_chars=len(query))
         self.memory_manager.add_memory(role="user", content=query, session_id=user_id, agent_used="USER")
         
         try:
             pending_query = self.memory_manager.check_and_clear_pending_deep_dive(user_id, user_confirmation=query)
             if pending_query:
                 print(f"✅ User confirmed deep dive. Routing to Planner for: '{pending_query}'")
-                return await self._run_deep_analysis(pending_query, user_id, update_callback=update_callback)
+                response = await self._run_deep_analysis(pending_query, user_id, update_callback=update_callback)
+                return self._persist_response(response, user_id)
 
             feng_agent = self.agents.get("FENG")
             if not feng_agent: raise ValueError("CRITICAL: FengAgent not found.")
 
             short_mem = self.memory_manager.get_last_n_memories(session_id=user_id, n=4)
             
-            dispatch_order = await feng_agent.handle(query, short_mem)
+            # [V6.2] เริ่มค้นหาล่วงหน้าพร้อมกับการวิเคราะห์เจตนา แทนที่จะรอ Gemini ตอบก่อน
+            prefetch_task = self.rag_engine.start_prefetch(query) if self.rag_engine else None
+            try:
+                dispatch_order = await feng_agent.handle(query, short_mem)
+            except BaseException:
+                if prefetch_task: prefetch_task.cancel()
+                raise
+            
+            intent = dispatch_order.get("intent")
+            annotate_trace(intent=intent)
+            if prefetch_task and (dispatch_order.get("type") == "final_answer" or intent in PREFETCH_SKIP_INTENTS):
+                prefetch_task.cancel()
             
             if dispatch_order.get("type") == "final_answer":
                 print("🚦 Dispatcher: FengAgent provided a quick response. Finalizing.")
                 final_answer = dispatch_order.get("content", "ขออภัยครับ มีข้อผิดพลาดในการตอบกลับ")
                 return await self._finalize_response("FENG_QUICK_RESPONSE", final_answer, user_id, update_callback=update_callback)
 
-            intent = dispatch_order.get("intent")
             if update_callback:
                 await update_callback({
                     "type": "progress", 
@@ -70,6 +156,11 @@ class Dispatcher:
                     }
                 })
             corrected_query = dispatch_order.get("corrected_query", query)
+            # [V6.11] prefetch ค้นด้วยคำถามดิบ แต่ agent ค้นด้วย corrected_query: ถ้า Feng แก้คำถาม ผลที่อุ่นไว้ใช้ไม่ได้
+            # จึงเริ่ม prefetch ใหม่ด้วยคำถามที่แก้แล้ว (ยกเลิกตัวเดิมแค่ถอนตัว embedding ของคำถามดิบยังใช้กับ answer cache ได้)
+            if prefetch_task and intent not in PREFETCH_SKIP_INTENTS and " ".join(corrected_query.split()) != " ".join(query.split()):
+                prefetch_task.cancel()
+                prefetch_task = self.rag_engine.start_prefetch(corrected_query)
             intent_to_agent_map = {
                 "PLANNER_REQUEST": "PLANNER",
                 "GENERAL_CONVERSATION": "GENERAL_HANDLER",
@@ -86,64 +177,43 @@ class Dispatcher:
                 "MEMORY_QUERY": "MEMORY_QUERY", 
             }
             
-            agents_needing_memory = {
-                "GENERAL_HANDLER", "COUNSELOR", "CODER", 
-                "LISTENER"
-            }
-
             agent_name = intent_to_agent_map.get(intent)
             agent = self.agents.get(agent_name)
 
-            if not agent:
-                print(f"⚠️ Dispatcher: Unknown or unhandled intent '{intent}'. Defaulting to Planner.")
-                return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback)
+            # [V6.6] ถามแคชเฉพาะเจตนาที่ agent ปลายทางแคชได้ (คำตอบไม่ขึ้นกับผู้ใช้) ด้วยคำถามดิบที่ prefetch embedding ไว้แล้ว
+            cache_intent = None
+            if self.answer_cache and self.answer_cache.is_cacheable(agent_name if agent else "PLANNER"):
+                cache_intent = intent
+                cached = await self.answer_cache.lookup(intent, query)
+                if cached:
+                    if prefetch_task: prefetch_task.cancel()
+                    return await self._finalize_cached(cached, user_id, update_callback=update_callback)
+                annotate_trace(answer_cache="miss")
+
+            # [V6.8] งานเดียวกัน (ขอบเขต, เจตนา, คำถามที่แก้แล้ว) ที่กำลังทำอยู่ จะรอผลร่วมกันแทนการเริ่มใหม่
+            scope = "global" if agent_name in GLOBAL_FLIGHT_AGENTS else user_id
+            flight_key = (scope, intent, " ".join(corrected_query.split()))
 
-            print(f"🚦 Dispatcher: Routing intent '{intent}' to '{agent_name}'.")
-            if update_callback: await update_callback({
+            async def on_join():
+                print(f"🔗 Dispatcher: Joining in-flight computation for '{corrected_query[:40]}' ({scope}).")
+                annotate_trace(single_flight="joined")
+                if update_callback:
+                    await update_callback({
                         "type": "progress",
                         "payload": {
-                            "status": "PROCESSING",
-                            "agent": agent_name,
-                            "detail": f"กำลังส่งคำสั่งให้ {agent_name}..."
+                            "status": "COALESCED",
+                            "agent": agent_name or "PLANNER",
+                            "detail": "คำถามเดียวกันกำลังถูกประมวลผลอยู่ รอรับคำตอบร่วมกัน..."
                         }
                     })
-            
-            if agent_name in self.sync_agents:
-                print(f" 	-> Executing {agent_name} (Sync)")
-                answer = agent.handle(corrected_query)
-                return await self._finalize_response(agent_name, answer, user_id, update_callback=update_callback)
-            print(f" 	-> Executing {agent_name} (Async)")
-            
-            if agent_name in agents_needing_memory:
-                answer = await agent.handle(corrected_query, short_mem)
-                return await self._finalize_response(agent_name, answer, user_id, update_callback=update_callback)
 
-            elif agent_name == "PLANNER":
-                return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback)
-            
-            elif agent_name == "PROACTIVE_OFFER_HANDLER":
-                response = await agent.handle(corrected_query) 
-                self.memory_manager.set_pending_deep_dive(user_id, response.get("original_query"))
-                return await self._finalize_response("PROACTIVE_OFFER", response.get("content"), user_id, update_callback=update_callback)
-
-            elif agent_name == "NEWS":
-                response = await agent.handle(corrected_query) 
-                return await self._finalize_response("NEWS", response.get("answer"), user_id, thought_process=response.get("thought_process"), update_callback=update_callback)
-            
-            elif agent_name == "IMAGE":
-                image_info = await agent.handle(corrected_query)
-                if image_info:
-                    answer = "นี่คือรูปภาพที่ฉันหามาให้ค่ะ"
-                    return await self._finalize_response("IMAGE", answer, user_id, image_info=image_info, update_callback=update_callback)
-                print(f"⚠️ Dispatcher: ImageAgent found no image. Defaulting to Planner.")
-                return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback)
-
-            else:
-                answer = await agent.handle(corrected_query) 
-                if answer is not None:
-                    return await self._finalize_response(agent_name, answer, user_id, update_callback=update_callback)
-                print(f"⚠️ Dispatcher: Utility Agent '{agent_name}' returned None. Defaulting to Planner.")
-                return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback)
+            response, _ = await self.single_flight.do(
+                flight_key,
+                lambda: self._route(agent_name, agent, intent, query, corrected_query, short_mem, user_id,
+                                    self._best_effort(update_callback), cache_intent),
+                on_join=on_join
+            )
+            return self._persist_response(response, user_id)
 
         except Exception as e:
             print(f"❌ Unhandled error in Dispatcher handle_query: {e}")
@@ -158,7 +228,87 @@ class Dispatcher:
             
             return await self._finalize_response("DISPATCHER_ERROR", "ขออภัยครับ เกิดข้อผิดพลาดร้ายแรงในระบบจัดการ", user_id, is_error=True, update_callback=update_callback)
 
-    async def _run_deep_analysis(self, query: str, user_id: str, update_callback: Optional[Callable] = None) -> FinalResponse:
+    async def _route(self, agent_name: Optional[str], agent: Any, intent: str, query: str, corrected_query: str,
+                     short_mem: List[Dict], user_id: str, update_callback: Optional[Callable],
+                     cache_intent: Optional[str]) -> FinalResponse:
+        """[V6.8] เรียก agent ปลายทางและจัดรูปแบบคำตอบ (ยังไม่บันทึกประวัติ) ผลนี้ใช้ร่วมกันได้ผ่าน single-flight"""
+        if not agent:
+            print(f"⚠️ Dispatcher: Unknown or unhandled intent '{intent}'. Defaulting to Planner.")
+            return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback,
+                                                 cache_intent=cache_intent, cache_query=query)
+
+        print(f"🚦 Dispatcher: Routing intent '{intent}' to '{agent_name}'.")
+        if update_callback: await update_callback({
+                    "type": "progress",
+                    "payload": {
+                        "status": "PROCESSING",
+                        "agent": agent_name,
+                        "detail": f"กำลังส่งคำสั่งให้ {agent_name}..."
+                    }
+                })
+        
+        if agent_name in self.sync_agents:
+            print(f" 	-> Executing {agent_name} (Sync)")
+            answer = agent.handle(corrected_query)
+            return await self._prepare_response(agent_name, answer, user_id, update_callback=update_callback)
+        print(f" 	-> Executing {agent_name} (Async)")
+        
+        if agent_name == "GENERAL_HANDLER":
+            # ความทรงจำระยะยาวถูกแยกตาม session จึงต้องส่ง user_id ไปด้วย
+            answer = await agent.handle(corrected_query, short_mem, session_id=user_id,
+                                        on_delta=self._delta_relay(agent_name, update_callback))
+            return await self._prepare_response(agent_name, answer, user_id, update_callback=update_callback)
+
+        if agent_name in AGENTS_NEEDING_MEMORY:
+            on_delta = self._delta_relay(agent_name, update_callback)
+            if on_delta:
+                answer = await agent.handle(corrected_query, short_mem, on_delta=on_delta)
+            else:
+                answer = await agent.handle(corrected_query, short_mem)
+            return await self._prepare_response(agent_name, answer, user_id, update_callback=update_callback)
+
+        elif agent_name == "PLANNER":
+            return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback,
+                                                 cache_intent=cache_intent, cache_query=query)
+        
+        elif agent_name == "PROACTIVE_OFFER_HANDLER":
+            response = await agent.handle(corrected_query, on_delta=self._delta_relay(agent_name, update_callback))
+            self.memory_manager.set_pending_deep_dive(user_id, response.get("original_query"))
+            return await self._prepare_response("PROACTIVE_OFFER", response.get("content"), user_id, update_callback=update_callback)
+
+        elif agent_name == "NEWS":
+            response = await agent.handle(corrected_query, on_delta=self._delta_relay(agent_name, update_callback))
+            final_response = await self._prepare_response("NEWS", response.get("answer"), user_id, thought_process=response.get("thought_process"), update_callback=update_callback)
+            await self._cache_answer(cache_intent, query, final_response)
+            return final_response
+        
+        elif agent_name == "MEMORY_QUERY":
+            # [V6.12] ประวัติสนทนาแยกตาม session: MemoryAgent ค้นเฉพาะของผู้ถาม
+            answer = await agent.handle(corrected_query, session_id=user_id)
+            if answer is not None:
+                return await self._prepare_response(agent_name, answer, user_id, update_callback=update_callback)
+            print("⚠️ Dispatcher: Memory Agent returned None. Defaulting to Planner.")
+            return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback)
+
+        elif agent_name == "IMAGE":
+            image_info = await agent.handle(corrected_query)
+            if image_info:
+                answer = "นี่คือรูปภาพที่ฉันหามาให้ค่ะ"
+                return await self._prepare_response("IMAGE", answer, user_id, image_info=image_info, update_callback=update_callback)
+            print(f"⚠️ Dispatcher: ImageAgent found no image. Defaulting to Planner.")
+            return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback)
+
+        else:
+            answer = await agent.handle(corrected_query) 
+            if answer is not None:
+                final_response = await self._prepare_response(agent_name, answer, user_id, update_callback=update_callback)
+                await self._cache_answer(cache_intent, query, final_response)
+                return final_response
+            print(f"⚠️ Dispatcher: Utility Agent '{agent_name}' returned None. Defaulting to Planner.")
+            return await self._run_deep_analysis(corrected_query, user_id, update_callback=update_callback)
+
+    async def _run_deep_analysis(self, query: str, user_id: str, update_callback: Optional[Callable] = None,
+                                 cache_intent: Optional[str] = None, cache_query: Optional[str] = None) -> FinalResponse:
         print(f"🧠 Dispatcher: Initiating deep analysis for query: '{query}'")
         
         if update_callback:
@@ -177,57 +327,141 @@ class Dispatcher:
 
         short_mem = self.memory_manager.get_last_n_memories(session_id=user_id)
         available_cats = self.rag_engine.available_categories if self.rag_engine else []
-        planner_result = await planner_agent.handle(query, short_mem, available_cats)
+        planner_result = await planner_agent.handle(query, short_mem, available_cats, session_id=user_id,
+                                                    on_delta=self._delta_relay("PLANNER", update_callback))
         
         final_draft = planner_result.get("answer", "ขออภัย มีข้อผิดพลาดในการสร้างบทวิเคราะห์")
         thought_process = planner_result.get("thought_process")
         
-        return await self._finalize_response("PLANNER", final_draft, user_id, thought_process=thought_process, update_callback=update_callback)
+        final_response = await self._prepare_response("PLANNER", final_draft, user_id, thought_process=thought_process, update_callback=update_callback)
+        await self._cache_answer(cache_intent, cache_query, final_response)
+        return final_response
 
-    async def _finalize_response(self, agent_used: str, answer: str, user_id: str, 
-                                 image_info: Optional[Dict] = None, is_error: bool = False,
-                                 thought_process: Optional[Dict] = None, 
-                                 update_callback: Optional[Callable] = None) -> FinalResponse:
+    async def _cache_answer(self, intent: Optional[str], query: Optional[str], response: FinalResponse):
+        """
+        [V6.6] เก็บคำตอบที่จัดรูปแบบแล้วลง AnswerCache (แคชใช้ร่วมกันทุกผู้ใช้)
+        ไม่เก็บคำตอบที่ผิดพลาด/ขอโทษ ไม่พบข้อมูล ลดคุณภาพ หรืออ้างอิงความทรงจำส่วนตัวของผู้ใช้
+        [V6.9] ไม่เก็บคำตอบที่ prompt มีประวัติสนทนาของผู้ใช้ (เป็นคำตอบเฉพาะตัว ห้ามเสิร์ฟให้ผู้ใช้อื่น)
+        """
+        if not self.answer_cache or not intent or not query or response.error:
+            return
+        thought_process = response.thought_process or {}
+        if thought_process.get("error") or thought_process.get("memory_chunks_used") or thought_process.get("retrieved_chunks_count") == 0:
+            return
+        if thought_process.get("history_turns_used"):
+            return
+        if thought_process.get("degradations"):
+            return  # คำตอบที่ลดคุณภาพเพราะโหลด/เวลา ไม่ควรถูกเสิร์ฟซ้ำเป็นชั่วโมง
+        if response.answer.lstrip().startswith("ขออภัย"):
+            return
+        await self.answer_cache.store(intent, query, response.agent_used, response.answer,
+                                      thought_process=response.thought_process, image=response.image)
+
+    async def _finalize_cached(self, cached: Dict[str, Any], user_id: str,
+                               update_callback: Optional[Callable] = None) -> FinalResponse:
+        entry = cached["entry"]
+        print(f"🗃️  Dispatcher: Answer cache hit for '{entry.intent}' (similarity={cached['similarity']}, agent={entry.agent_used}).")
+        annotate_trace(answer_cache="hit")
+        if update_callback:
+            await update_callback({
+                "type": "progress",
+                "payload": {
+                    "status": "CACHE_HIT",
+                    "agent": entry.agent_used,
+                    "detail": "พบคำตอบของคำถามที่คล้ายกันในแคช"
+                }
+            })
+        thought_process = dict(entry.thought_process or {}, answer_cache={
+            "similarity": cached["similarity"],
+            "cached_query": entry.query,
+            "age_seconds": int(time.time() - entry.created_at),
+        })
+        return await self._finalize_response(entry.agent_used, entry.answer, user_id, image_info=entry.image,
+                                             thought_process=thought_process, update_callback=update_callback,
+                                             preformatted=True)
+
+    @traced("dispatcher.format")
+    async def _format_answer(self, agent_used: str, draft: str, user_id: str,
+                             update_callback: Optional[Callable] = None) -> str:
+        """
+        [V6.3] จัดรูปแบบ Markdown ด้วย typesetter บนเครื่องเป็นค่าเริ่มต้น (ไม่มี LLM round trip)
+        FormatterAgent (LLM) ใช้เฉพาะ agent ที่ระบุใน LLM_FORMATTER_AGENTS หรือเมื่อ typesetter ล้มเหลว
+        """
+        formatter = self.agents.get("FORMATTER")
+        # [V6.7] เมื่อเวลา/โหลดตึงตัว ข้าม FormatterAgent (LLM) แล้วใช้ typesetter บนเครื่องแทน
+        if agent_used not in settings.LLM_FORMATTER_AGENTS or should_degrade(SKIP_FORMATTER):
+            try:
+                return typeset_markdown(draft)
+            except Exception as e:
+                print(f"⚠️ Dispatcher: Local typesetter failed for {agent_used} ({e}). Falling back to Formatter Agent.")
+                if not formatter:
+                    return draft
+
+        if not formatter:
+            return typeset_markdown(draft)
+
+        print(f"✍️ Dispatcher: Passing draft from {agent_used} to Formatter Agent.")
+        if update_callback:
+            await update_callback({
+                "type": "progress",
+                "payload": {
+                    "status": "FORMATTING",
+                    "agent": "FORMATTER",
+                    "detail": "กำลังเรียบเรียงและจัดรูปแบบคำตอบสุดท้าย..."
+                }
+            })
+
+        synthesis_order = {
+            "original_query": self.memory_manager.get_last_user_query(user_id),
+            "history": self.memory_manager.get_last_n_memories(session_id=user_id, n=4),
+            "draft_to_review": draft
+        }
+        return await formatter.handle(synthesis_order)
+
+    async def _prepare_response(self, agent_used: str, answer: str, user_id: str,
+                                image_info: Optional[Dict] = None, is_error: bool = False,
+                                thought_process: Optional[Dict] = None,
+                                update_callback: Optional[Callable] = None,
+                                preformatted: bool = False) -> FinalResponse:
+        """[V6.8] จัดรูปแบบคำตอบ (ยังไม่แตะประวัติ) ผลลัพธ์นี้ใช้ร่วมกันระหว่างคำขอที่ถูกรวมด้วย single-flight"""
         final_answer = answer or ""
+        annotate_trace(agent_used=agent_used, error=is_error)
         
         agents_that_need_formatting = {"PLANNER", "NEWS", "PROACTIVE_OFFER", "GENERAL_HANDLER", "LISTENER", "MEMORY_QUERY"}
-        if agent_used in agents_that_need_formatting and not is_error and answer:
-             formatter = self.agents.get("FORMATTER")
-             if formatter:
-                 print(f"✍️ Dispatcher: Passing draft from {agent_used} to Formatter Agent.")
-                 
-                 if update_callback:
-                    await update_callback({
-                        "type": "progress",
-                        "payload": {
-                            "status": "FORMATTING",
-                            "agent": "FORMATTER",
-                            "detail": "กำลังเรียบเรียงและจัดรูปแบบคำตอบสุดท้าย..."
-                        }
-                    })
+        if agent_used in agents_that_need_formatting and not is_error and answer and not preformatted:
+            final_answer = await self._format_answer(agent_used, final_answer, user_id, update_callback)
 
-                 synthesis_order = {
-                     "original_query": self.memory_manager.get_last_user_query(user_id),
-                     "history": self.memory_manager.get_last_n_memories(session_id=user_id, n=4),
-                     "draft_to_review": final_answer
-                 }
-                 final_answer = await formatter.handle(synthesis_order)
-        
-        self.memory_manager.add_memory(
-            role="model", 
-            content=final_answer, 
-            session_id=user_id,
-            agent_used=agent_used
-        )
-        
-        final_history = self.memory_manager.get_last_n_memories(session_id=user_id)
-        history_for_display = self._format_history_for_display(final_history)
+        deadline = current_deadline()
+        if deadline and deadline.degradations:
+            thought_process = dict(thought_process or {}, degradations=list(deadline.degradations))
+            annotate_trace(degraded=",".join(d["stage"] for d in deadline.degradations))
 
         return FinalResponse(
             agent_used=agent_used, 
             answer=final_answer,
             image=image_info, 
-            history=history_for_display,
             error=is_error,
             thought_process=thought_process
-        )
\ No newline at end of file
+        )
+
+    def _persist_response(self, response: FinalResponse, user_id: str) -> FinalResponse:
+        """[V6.8] บันทึกคำตอบลงประวัติของผู้ขอแต่ละคน แล้วคืนสำเนาพร้อม history ของคนนั้น"""
+        self.memory_manager.add_memory(
+            role="model", 
+            content=response.answer, 
+            session_id=user_id,
+            agent_used=response.agent_used
+        )
+        
+        final_history = self.memory_manager.get_last_n_memories(session_id=user_id)
+        return response.copy(update={"history": self._format_history_for_display(final_history)})
+
+    async def _finalize_response(self, agent_used: str, answer: str, user_id: str, 
+                                 image_info: Optional[Dict] = None, is_error: bool = False,
+                                 thought_process: Optional[Dict] = None, 
+                                 update_callback: Optional[Callable] = None,
+                                 preformatted: bool = False) -> FinalResponse:
+        response = await self._prepare_response(agent_used, answer, user_id, image_info=image_info, is_error=is_error,
+                                                thought_process=thought_process, update_callback=update_callback,
+                                                preformatted=preformatted)
+        return self._persist_response(response, user_id)
@@ -0,0 +1,318 @@
+# core/fake_llm.py
+# (V1.0 - Offline Fake Groq & Gemini Provider)
+# provider จำลองบนเครื่องสำหรับ load test ของ main.py โดยไม่ใช้โควตาจริง ตอบใน "รูปแบบเดียวกับ API จริง" ทาง HTTP
+# client ของระบบ (AsyncGroq ใน LLM Gateway และ GeminiClient REST) จึงทำงานตามเส้นทางจริงทั้งหมด: connection pool,
+# สตรีม SSE, usage, header x-ratelimit-* ของ Groq, 429 + Retry-After / RetryInfo ของ Gemini
+# - Groq:   POST /openai/v1/chat/completions (stream ได้ ปิดท้ายด้วย x_groq.usage เหมือนของจริง)
+# - Gemini: POST /v1beta/models/{model}:generateContent และ :streamGenerateContent?alt=sse
+# - เวลาถึง token แรกสุ่มแบบ log-normal (FAKE_LLM_TTFT_MS, FAKE_LLM_TTFT_SIGMA) แล้วสตรีมตาม FAKE_LLM_TOKENS_PER_SECOND
+# - 429 สุ่มตาม FAKE_LLM_429_RATE และ (FAKE_LLM_ENFORCE_QUOTAS) เมื่อคีย์ใช้เกิน GROQ_RATE_LIMITS / GOOGLE_RATE_LIMITS ใน 60 วินาที
+# - prompt ที่ agent ต้อง parse เป็น JSON (triage ของ Feng, แผนของ Planner, พารามิเตอร์ของ ImageAgent) ได้ JSON ที่ใช้ได้
+#
+# วิธีใช้: python -m core.fake_llm --port 8765
+#          LLM_PROVIDER=fake python main.py     (แล้วยิงโหลดด้วย python -m benchmarks.load_test)
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from core.config import settings
+from core.intent_examples import FENG_ROUTER, SEED_EXAMPLES
+from core.prompt_budget import count_tokens
+
+GROQ = "groq"
+GEMINI = "gemini"
+
+FILLER_WORDS = [
+    "ปัญญา", "หนังสือ", "แนวคิด", "หลักการ", "การเรียนรู้", "ความสุข", "กลยุทธ์", "ชีวิต", "การตัดสินใจ",
+    "ประสบการณ์", "มุมมอง", "ความเข้าใจ", "สมดุล", "เป้าหมาย", "ความสัมพันธ์", "stoicism", "habit", "insight",
+]
+_SEED_LABELS = {query: label for query, label in SEED_EXAMPLES[FENG_ROUTER]}
+# คำถามจริงอยู่ท้ายสุดของ prompt (ก่อนหน้าเป็นตัวอย่าง few-shot ที่ใช้รูปแบบเดียวกัน)
+_TRIAGE_QUERY_RE = re.compile(r'\*\*คำถามดิบ:\*\*\s*"(.*)"')
+_PLANNER_QUERY_RE = re.compile(r'\*\*คำถามของผู้ใช้:\*\*\s*"(.*)"')
+_IMAGE_QUERY_RE = re.compile(r'\*\*คำขอ:\*\*\s*"(.*)"')
+
+
+def _last_match(pattern: re.Pattern, text: str, default: str) -> str:
+    matches = pattern.findall(text)
+    return matches[-1] if matches else default
+
+
+class _QuotaWindow:
+    """ยอดคำขอ/token ของ (คีย์, โมเดล) ใน 60 วินาทีล่าสุด เลียนแบบโควตา RPM/TPM ของ provider"""
+
+    def __init__(self):
+        self.events: Deque[Tuple[float, int]] = deque()
+
+    def usage(self, now: float) -> Tuple[int, int]:
+        while self.events and now - self.events[0][0] >= 60:
+            self.events.popleft()
+        return len(self.events), sum(tokens for _, tokens in self.events)
+
+    def reset_after(self, now: float) -> float:
+        return max(0.1, 60 - (now - self.events[0][0])) if self.events else 0.0
+
+
+class FakeLLMProvider:
+    def __init__(self,
+                 ttft_ms: Dict[str, float] = settings.FAKE_LLM_TTFT_MS,
+                 ttft_sigma: float = settings.FAKE_LLM_TTFT_SIGMA,
+                 tokens_per_second: Dict[str, float] = settings.FAKE_LLM_TOKENS_PER_SECOND,
+                 output_tokens: int = settings.FAKE_LLM_OUTPUT_TOKENS,
+                 error_rate_429: float = settings.FAKE_LLM_429_RATE,
+                 retry_after_seconds: float = settings.FAKE_LLM_RETRY_AFTER_SECONDS,
+                 enforce_quotas: bool = settings.FAKE_LLM_ENFORCE_QUOTAS,
+                 seed: Optional[int] = None):
+        self.ttft_ms = ttft_ms
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate_429 = error_rate_429
+        self.retry_after_seconds = retry_after_seconds
+        self.enforce_quotas = enforce_quotas
+        self.limits = {GROQ: settings.GROQ_RATE_LIMITS, GEMINI: settings.GOOGLE_RATE_LIMITS}
+        self.rng = random.Random(seed)
+        self._windows: Dict[Tuple[str, str, str], _QuotaWindow] = defaultdict(_QuotaWindow)
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "streams": 0, "injected_429": 0,
+                                                                      "quota_429": 0, "tokens": 0})
+
+    # --- พฤติกรรมของ provider ---
+
+    def ttft(self, provider: str) -> float:
+        return self.rng.lognormvariate(math.log(self.ttft_ms.get(provider, 500) / 1000), self.ttft_sigma)
+
+    def check_quota(self, provider: str, api_key: str, model: str, prompt_tokens: int) -> Optional[float]:
+        """คืนเวลาที่ต้องรอ (วินาที) ถ้าคำขอนี้ควรได้ 429 หรือ None ถ้าผ่าน (ผ่านแล้วนับยอดทันที)"""
+        stats = self._stats[provider]
+        if self.rng.random() < self.error_rate_429:
+            stats["injected_429"] += 1
+            return self.retry_after_seconds
+        window = self._windows[(provider, api_key, model)]
+        now = time.monotonic()
+        limits = self.limits[provider].get(model)
+        if self.enforce_quotas and limits:
+            requests, tokens = window.usage(now)
+            rpm, tpm = limits
+            if requests + 1 > rpm or tokens + prompt_tokens > tpm:
+                stats["quota_429"] += 1
+                return round(window.reset_after(now), 2)
+        window.events.append((now, prompt_tokens))
+        return None
+
+    def record_completion(self, provider: str, api_key: str, model: str, completion_tokens: int):
+        window = self._windows[(provider, api_key, model)]
+        if window.events:
+            at, tokens = window.events[-1]
+            window.events[-1] = (at, tokens + completion_tokens)
+        self._stats[provider]["tokens"] += completion_tokens
+
+    def completion_text(self, prompt: str, model: str) -> str:
+        """ข้อความตอบกลับ: JSON สำหรับ prompt ที่ agent ต้อง parse, นอกนั้นเป็นข้อความยาวประมาณ FAKE_LLM_OUTPUT_TOKENS"""
+        if "Intent Analyst" in prompt:
+            query = _last_match(_TRIAGE_QUERY_RE, prompt, "")
+            labels = sorted(set(_SEED_LABELS.values()))
+            label = _SEED_LABELS.get(query) or labels[sum(map(ord, query)) % len(labels)]
+            return json.dumps({"corrected_query": query, "intent": label, "keywords": query.split()[:5]}, ensure_ascii=False)
+        if "Knowledge Architect" in prompt:
+            query = _last_match(_PLANNER_QUERY_RE, prompt, "ปัญญา")
+            return json.dumps({"thought": "แผนจำลองสำหรับ load test", "sub_queries": [query],
+                               "search_in": ["book", "memory"], "categories": []}, ensure_ascii=False)
+        if "JSON object" in prompt and "search_term" in prompt:
+            return json.dumps({"search_term": _last_match(_IMAGE_QUERY_RE, prompt, "nature"), "color": None, "style": None},
+                              ensure_ascii=False)
+        target = max(1, int(self.rng.gauss(self.output_tokens, self.output_tokens * 0.25)))
+        words: List[str] = []
+        while count_tokens(" ".join(words), model) < target:
+            words.append(self.rng.choice(FILLER_WORDS))
+        return " ".join(words)
+
+    def chunks(self, text: str, provider: str, model: str) -> List[Tuple[str, float]]:
+        """แบ่งข้อความเป็น (delta, เวลารอก่อนส่ง) ตามความเร็ว token ต่อวินาทีของ provider"""
+        words_per_chunk = 1 if provider == GROQ else 12
+        words = text.split(" ")
+        speed = max(1.0, self.tokens_per_second.get(provider, 200))
+        pieces = []
+        for start in range(0, len(words), words_per_chunk):
+            piece = " ".join(words[start:start + words_per_chunk]) + (" " if start + words_per_chunk < len(words) else "")
+            pieces.append((piece, count_tokens(piece, model) / speed))
+        return pieces
+
+    def metrics(self) -> Dict[str, Any]:
+        return {provider: dict(stats) for provider, stats in self._stats.items()}
+
+
+# --- รูปแบบ HTTP ของ Groq (OpenAI-compatible) ---
+
+def _groq_error(retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        headers={"retry-after": f"{retry_after:g}"},
+        content={"error": {"message": f"Rate limit reached. Please try again in {retry_after:g}s.",
+                           "type": "tokens", "code": "rate_limit_exceeded"}},
+    )
+
+
+def _groq_ratelimit_headers(provider: FakeLLMProvider, api_key: str, model: str) -> Dict[str, str]:
+    limits = provider.limits[GROQ].get(model)
+    if not limits:
+        return {}
+    window = provider._windows[(GROQ, api_key, model)]
+    now = time.monotonic()
+    _, tokens = window.usage(now)
+    return {
+        "x-ratelimit-limit-tokens": str(limits[1]),
+        "x-ratelimit-remaining-tokens": str(max(0, limits[1] - tokens)),
+        "x-ratelimit-reset-tokens": f"{window.reset_after(now):.2f}s",
+        "x-ratelimit-remaining-requests": "14400",
+    }
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+async def _groq_chat(provider: FakeLLMProvider, request: Request):
+    body = await request.json()
+    api_key = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    model = body.get("model", "")
+    prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+    prompt_tokens = count_tokens(prompt, model)
+    provider._stats[GROQ]["requests"] += 1
+    retry_after = provider.check_quota(GROQ, api_key, model, prompt_tokens)
+    if retry_after is not None:
+        return _groq_error(retry_after)
+
+    text = provider.completion_text(prompt, model)
+    completion_tokens = count_tokens(text, model)
+    provider.record_completion(GROQ, api_key, model, completion_tokens)
+    headers = _groq_ratelimit_headers(provider, api_key, model)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        pieces = provider.chunks(text, GROQ, model)
+        await asyncio.sleep(provider.ttft(GROQ) + sum(delay for _, delay in pieces))
+        return JSONResponse(headers=headers, content={
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                         "logprobs": None, "finish_reason": "stop"}],
+            "usage": _usage(prompt_tokens, completion_tokens),
+        })
+
+    provider._stats[GROQ]["streams"] += 1
+
+    async def events() -> AsyncIterator[bytes]:
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> bytes:
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}], **extra}
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        await asyncio.sleep(provider.ttft(GROQ))
+        yield chunk({"role": "assistant", "content": ""})
+        for piece, delay in provider.chunks(text, GROQ, model):
+            await asyncio.sleep(delay)
+            yield chunk({"content": piece})
+        yield chunk({}, "stop", x_groq={"id": f"req_{uuid.uuid4().hex[:24]}",
+                                         "usage": _usage(prompt_tokens, completion_tokens)})
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+# --- รูปแบบ HTTP ของ Gemini (REST v1beta) ---
+
+def _gemini_error(retry_after: float) -> JSONResponse:
+    return JSONResponse(status_code=429, content={"error": {
+        "code": 429, "status": "RESOURCE_EXHAUSTED",
+        "message": "You exceeded your current quota, please check your plan and billing details.",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_after:g}s"}],
+    }})
+
+
+def _gemini_payload(text: str, prompt_tokens: int, completion_tokens: int, finish_reason: Optional[str]) -> Dict[str, Any]:
+    candidate: Dict[str, Any] = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish_reason:
+        candidate["finishReason"] = finish_reason
+    return {"candidates": [candidate], "usageMetadata": {
+        "promptTokenCount": prompt_tokens, "candidatesTokenCount": completion_tokens,
+        "totalTokenCount": prompt_tokens + completion_tokens}}
+
+
+async def _gemini_generate(provider: FakeLLMProvider, request: Request, model_action: str):
+    model, _, action = model_action.partition(":")
+    body = await request.json()
+    api_key = request.headers.get("x-goog-api-key") or request.query_params.get("key", "")
+    prompt = "\n".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+    prompt_tokens = count_tokens(prompt, model)
+    provider._stats[GEMINI]["requests"] += 1
+    retry_after = provider.check_quota(GEMINI, api_key, model, prompt_tokens)
+    if retry_after is not None:
+        return _gemini_error(retry_after)
+
+    text = provider.completion_text(prompt, model)
+    completion_tokens = count_tokens(text, model)
+    provider.record_completion(GEMINI, api_key, model, completion_tokens)
+    pieces = provider.chunks(text, GEMINI, model)
+
+    if action != "streamGenerateContent":
+        await asyncio.sleep(provider.ttft(GEMINI) + sum(delay for _, delay in pieces))
+        return JSONResponse(_gemini_payload(text, prompt_tokens, completion_tokens, "STOP"))
+
+    provider._stats[GEMINI]["streams"] += 1
+
+    async def events() -> AsyncIterator[bytes]:
+        await asyncio.sleep(provider.ttft(GEMINI))
+        sent_tokens = 0
+        for index, (piece, delay) in enumerate(pieces):
+            if index:
+                await asyncio.sleep(delay)
+            sent_tokens += count_tokens(piece, model)
+            finish_reason = "STOP" if index == len(pieces) - 1 else None
+            payload = _gemini_payload(piece, prompt_tokens, sent_tokens, finish_reason)
+            yield f"data: {json.dumps(payload, ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def create_fake_llm_app(provider: Optional[FakeLLMProvider] = None) -> FastAPI:
+    provider = provider or FakeLLMProvider()
+    app = FastAPI(title="Fake LLM Provider")
+
+    @app.post("/openai/v1/chat/completions")
+    async def groq_chat_completions(request: Request):
+        return await _groq_chat(provider, request)
+
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini_generate(model_action: str, request: Request):
+        return await _gemini_generate(provider, request, model_action)
+
+    @app.get("/metrics")
+    async def metrics():
+        return provider.metrics()
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline fake Groq/Gemini provider for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    print(f"🧪 Fake LLM Provider (V1.0) on http://{args.host}:{args.port} "
+          f"(429 rate={settings.FAKE_LLM_429_RATE:g}, quotas={'on' if settings.FAKE_LLM_ENFORCE_QUOTAS else 'off'})")
+    uvicorn.run(create_fake_llm_app(FakeLLMProvider(seed=args.seed)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,171 @@
+# core/gemini_client.py
+# (V1.2 - Shared Retry Policy)
+# แทน genai.configure(api_key=...) ซึ่งเป็นสถานะ global ของทั้ง process: คำขอที่ทำงานพร้อมกันอาจใช้คีย์ของอีกคำขอ
+# แต่ละคีย์มี GeminiClient ของตัวเอง (คีย์ส่งใน header x-goog-api-key ทุกคำขอ) ทุกคีย์ใช้ httpx pool เดียวกัน
+# จึงไม่มีการตั้งค่าใหม่บน hot path และ connection/TLS session ถูกใช้ซ้ำ (ดู /api/metrics)
+
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from core.config import settings
+from core.http_pool import ConnectionReuseTracker, pooled_http_client
+from core.rate_limiter import UsageCallback, parse_duration
+
+
+class GeminiAPIError(Exception):
+    """
+    ข้อผิดพลาดจาก Gemini REST API ข้อความขึ้นต้นด้วย HTTP status และ status ของ Google (เช่น "429 RESOURCE_EXHAUSTED")
+    ลูป retry ของ agent ที่ตรวจ "429" / "resource_exhausted" ในข้อความจึงทำงานเหมือนตอนใช้ SDK
+    [V1.2] retry_after = เวลาที่ Google สั่งให้รอ (header Retry-After หรือ RetryInfo.retryDelay) ให้ RetryPolicy ใช้
+    """
+
+    def __init__(self, status_code: int, status: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status_code} {status}: {message}")
+        self.status_code = status_code
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _raise_for_error(response: httpx.Response, body: bytes):
+    if response.status_code < 400:
+        return
+    try:
+        error = json.loads(body).get("error", {})
+    except (ValueError, AttributeError):
+        error = {}
+    retry_delay = next((detail.get("retryDelay") for detail in error.get("details") or []
+                        if str(detail.get("@type", "")).endswith("RetryInfo")), None)
+    raise GeminiAPIError(response.status_code, error.get("status", response.reason_phrase),
+                         error.get("message", body[:200].decode("utf-8", "replace")),
+                         parse_duration(retry_delay or response.headers.get("retry-after")))
+
+
+def _candidate_text(payload: Dict[str, Any]) -> str:
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+def _total_tokens(payload: Dict[str, Any]) -> Optional[int]:
+    return (payload.get("usageMetadata") or {}).get("totalTokenCount")
+
+
+def _blocked_reason(payload: Dict[str, Any]) -> str:
+    block_reason = (payload.get("promptFeedback") or {}).get("blockReason")
+    if block_reason:
+        return f"prompt blocked ({block_reason})"
+    candidates = payload.get("candidates") or []
+    return f"finish_reason={candidates[0].get('finishReason')}" if candidates else "no candidates"
+
+
+class GeminiClient:
+    """client ของคีย์เดียว สร้างผ่าน gemini_clients.client(api_key) เท่านั้น"""
+
+    def __init__(self, api_key: str, pool: "GeminiClientPool"):
+        self.api_key = api_key
+        self.pool = pool
+
+    def _request_body(self, prompt: str, safety_settings: Optional[List[Dict[str, str]]],
+                      generation_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        body: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if safety_settings:
+            body["safetySettings"] = safety_settings
+        if generation_config:
+            body["generationConfig"] = generation_config
+        return body
+
+    async def generate(self, model: str, prompt: str, safety_settings: Optional[List[Dict[str, str]]] = None,
+                       generation_config: Optional[Dict[str, Any]] = None,
+                       on_usage: Optional[UsageCallback] = None) -> str:
+        """
+        [V1] เทียบเท่า GenerativeModel(model).generate_content_async(prompt).text
+        โยน ValueError เมื่อคำตอบไม่มีข้อความ (ถูกบล็อก) เหมือน response.text ของ SDK
+        [V1.1] on_usage ได้รับ usageMetadata.totalTokenCount (Gemini ไม่มี header x-ratelimit-*)
+        """
+        response = await self.pool.http.post(
+            f"{settings.GEMINI_API_BASE_URL}/models/{model}:generateContent",
+            headers={"x-goog-api-key": self.api_key},
+            json=self._request_body(prompt, safety_settings, generation_config),
+        )
+        self.pool.count(self.api_key)
+        _raise_for_error(response, response.content)
+        payload = response.json()
+        if on_usage and _total_tokens(payload) is not None:
+            on_usage(None, _total_tokens(payload))
+        text = _candidate_text(payload)
+        if not text:
+            raise ValueError(f"Gemini returned no text: {_blocked_reason(payload)}")
+        return text
+
+    async def stream(self, model: str, prompt: str, safety_settings: Optional[List[Dict[str, str]]] = None,
+                     generation_config: Optional[Dict[str, Any]] = None,
+                     on_usage: Optional[UsageCallback] = None) -> AsyncIterator[str]:
+        """[V1] delta จาก streamGenerateContent (SSE) ตามโปรโตคอลสตรีมของ core/llm_stream.py"""
+        async with self.pool.http.stream(
+            "POST",
+            f"{settings.GEMINI_API_BASE_URL}/models/{model}:streamGenerateContent",
+            params={"alt": "sse"},
+            headers={"x-goog-api-key": self.api_key},
+            json=self._request_body(prompt, safety_settings, generation_config),
+        ) as response:
+            self.pool.count(self.api_key)
+            if response.status_code >= 400:
+                _raise_for_error(response, await response.aread())
+            total_tokens = None
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = json.loads(line[5:])
+                # usageMetadata มาทุก chunk เป็นยอดสะสม ใช้ค่าสุดท้าย
+                total_tokens = _total_tokens(payload) or total_tokens
+                # chunk ที่ไม่มีข้อความ (เช่น finish_reason / safety) ไม่ต้องส่งต่อ
+                text = _candidate_text(payload)
+                if text:
+                    yield text
+            if on_usage and total_tokens is not None:
+                on_usage(None, total_tokens)
+
+
+class GeminiClientPool:
+    def __init__(self, max_connections: int = settings.GEMINI_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._http: Optional[httpx.AsyncClient] = None
+        self._clients: Dict[str, GeminiClient] = {}
+        self._requests_per_key: Dict[str, int] = {}
+        self._connections = ConnectionReuseTracker()
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # สร้างเมื่อใช้ครั้งแรก (ภายใน event loop ของเซิร์ฟเวอร์) และเปิดค้างไว้จนถึง shutdown
+        if self._http is None or self._http.is_closed:
+            self._http = pooled_http_client(self._connections, self.max_connections)
+        return self._http
+
+    def client(self, api_key: str) -> GeminiClient:
+        """[V1] client ของคีย์นี้ (สร้างครั้งเดียวต่อคีย์)"""
+        client = self._clients.get(api_key)
+        if client is None:
+            client = self._clients[api_key] = GeminiClient(api_key, self)
+        return client
+
+    def count(self, api_key: str):
+        self._requests_per_key[api_key] = self._requests_per_key.get(api_key, 0) + 1
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            **self._connections.snapshot(),
+            "requests_per_key": {f"...{key[-4:]}": count for key, count in self._requests_per_key.items()},
+        }
+
+
+gemini_clients = GeminiClientPool()
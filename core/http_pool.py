@@ -0,0 +1,61 @@
+# core/http_pool.py
+# (V1.0 - Pooled HTTP Clients for LLM Providers)
+# httpx.AsyncClient อายุยาวที่ LLM Gateway (Groq) และ Gemini client ใช้ร่วมรูปแบบเดียวกัน: keep-alive, HTTP/2 ถ้ามี h2
+# และนับว่าคำขอได้ connection ที่เปิดค้างไว้ (reused) หรือต้องเปิด TCP ใหม่ (opened) จาก httpcore trace
+
+import importlib.util
+from typing import Any, Dict
+
+import httpx
+
+from core.config import settings
+
+# httpx เปิด HTTP/2 ได้เมื่อติดตั้ง h2 (pip install "httpx[http2]") ไม่มีก็ใช้ HTTP/1.1 keep-alive
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class ConnectionReuseTracker:
+    def __init__(self):
+        self.opened = 0
+        self.reused = 0
+
+    async def on_request(self, request: httpx.Request):
+        # httpcore เรียก trace ทุกขั้นของคำขอ: ถ้าไม่มี connect_tcp แปลว่าได้ connection ที่เปิดค้างไว้
+        state = {"tcp": False}
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == "connection.connect_tcp.started":
+                state["tcp"] = True
+
+        request.extensions["trace"] = trace
+        request.extensions["nexus_connection"] = state
+
+    async def on_response(self, response: httpx.Response):
+        state = response.request.extensions.get("nexus_connection")
+        if state is None:
+            return
+        if state["tcp"]:
+            self.opened += 1
+        else:
+            self.reused += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.opened + self.reused
+        return {
+            "connections_opened": self.opened,
+            "connections_reused": self.reused,
+            "connection_reuse_rate": round(self.reused / total, 4) if total else 0.0,
+        }
+
+
+def pooled_http_client(tracker: ConnectionReuseTracker, max_connections: int,
+                       timeout: float = settings.LLM_GATEWAY_TIMEOUT_SECONDS) -> httpx.AsyncClient:
+    """[V1] client ที่ควรสร้างครั้งเดียวแล้วใช้ตลอดอายุเซิร์ฟเวอร์ (ปิดด้วย aclose ตอน shutdown)"""
+    return httpx.AsyncClient(
+        http2=settings.LLM_GATEWAY_HTTP2 and HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(timeout, connect=settings.LLM_GATEWAY_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(max_connections=max_connections,
+                            max_keepalive_connections=max_connections,
+                            keepalive_expiry=settings.LLM_GATEWAY_KEEPALIVE_SECONDS),
+        event_hooks={"request": [tracker.on_request], "response": [tracker.on_response]},
+    )
@@ -0,0 +1,206 @@
+# core/intent_classifier.py
+# (V1.1 - Gated LLM Verdicts & Local Keywords)
+# คัดแยกเจตนาบนเครื่องด้วย kNN บน embedding (BGE-M3 ตัวเดียวกับ RAGEngine) แทนการเรียก LLM ทุกข้อความ
+# ตัวอย่างฝึก = SEED_EXAMPLES (จาก prompt) + คำตัดสินของ LLM ที่บันทึกไว้ใน INTENT_LOG_FILE
+# ตอบเฉพาะกรณีที่มั่นใจ (ความคล้ายและสัดส่วนคะแนนโหวตผ่านเกณฑ์) กรณีอื่น agent จะถาม LLM ตามเดิมแล้วบันทึกผลกลับมา
+
+import asyncio
+import datetime
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from core.config import settings
+from core.intent_examples import SEED_EXAMPLES
+
+# "ฉันเคยพูดถึงเรื่องสโตอิกตอนไหน" -> "สโตอิก" (คำค้นของ SEARCH_HISTORY เมื่อไม่ได้ถาม LLM)
+_SEARCH_TERM_RE = re.compile(
+    r"(?:เคย)?(?:พูดถึง|ถาม|คุย|ค้นหาตอนที่เราคุย|ค้นหา)\s*(?:เรื่อง|ถึง)?\s*(.+?)\s*(?:ตอนไหน|เมื่อไหร่|เมื่อไร|ไหม|บ้าง)?\s*$"
+)
+
+_QUESTION_WORDS = {"ไร", "อะไร", "ไหน", "อะไรบ้าง"}
+
+EXACT_MATCH_SIMILARITY = 0.999
+
+# ภาษาไทยไม่เว้นวรรคระหว่างคำ: ตัดคำถาม/คำเชื่อมที่พบบ่อยออก ส่วนที่เหลือคือแนวคิดหลักของคำถาม
+_KEYWORD_SPLIT_RE = re.compile(
+    r"[\s,.!?()\"'“”‘’:;]+|อย่างไร|ยังไง|ทำไม|อะไรบ้าง|อะไร|ไหม|หรือเปล่า|เกี่ยวกับ|ระหว่าง|หน่อย|ครับ|ค่ะ|คือ|ของ|และ|กับ|หรือ"
+)
+
+
+def extract_search_term(query: str) -> Optional[str]:
+    match = _SEARCH_TERM_RE.search(query.strip())
+    if not match:
+        return None
+    term = match.group(1).strip(" '\"")
+    return term if term and term not in _QUESTION_WORDS else None
+
+
+def extract_keywords(query: str, limit: int = 5) -> List[str]:
+    """
+    [V1.1] คำสำคัญ (ไม่เกิน limit คำ) สำหรับผล triage ที่ไม่ได้ถาม LLM (แทน query.split() ซึ่งได้ทั้งประโยคภาษาไทยเป็นคำเดียว)
+    "ความสุขคืออะไร" -> ["ความสุข"], "ข้อดีข้อเสียของ Stoicism กับ Epicureanism" -> ["ข้อดีข้อเสีย", "Stoicism", "Epicureanism"]
+    """
+    term = extract_search_term(query)
+    keywords: List[str] = [term] if term else []
+    for chunk in _KEYWORD_SPLIT_RE.split(query):
+        chunk = chunk.strip()
+        if len(chunk) > 1 and chunk not in keywords and chunk not in _QUESTION_WORDS:
+            keywords.append(chunk)
+    return keywords[:limit] or [query.strip()]
+
+
+def knn_vote(similarities: np.ndarray, labels: List[str], k: int) -> Tuple[str, float, float]:
+    """
+    [V1] โหวตจากเพื่อนบ้าน k ตัวที่ใกล้ที่สุด ถ่วงน้ำหนักด้วยความคล้าย (cosine)
+    คืน (label, confidence = สัดส่วนคะแนนของผู้ชนะ, similarity สูงสุดของผู้ชนะ)
+    """
+    k = min(k, len(labels))
+    top = np.argpartition(-similarities, k - 1)[:k]
+    votes: Dict[str, float] = defaultdict(float)
+    best: Dict[str, float] = defaultdict(float)
+    for i in top:
+        weight = max(float(similarities[i]), 0.0)
+        votes[labels[i]] += weight
+        best[labels[i]] = max(best[labels[i]], weight)
+    winner = max(votes, key=votes.get)
+    total = sum(votes.values()) or 1.0
+    return winner, votes[winner] / total, best[winner]
+
+
+class IntentClassifier:
+    def __init__(self, embedder: Optional[SentenceTransformer] = None,
+                 log_path: str = settings.INTENT_LOG_FILE,
+                 k: int = settings.INTENT_CLASSIFIER_K,
+                 min_similarity: float = settings.INTENT_CLASSIFIER_MIN_SIMILARITY,
+                 min_confidence: float = settings.INTENT_CLASSIFIER_MIN_CONFIDENCE):
+        # embedder ถูกกำหนดภายหลังใน lifespan เมื่อโมเดลกลางโหลดเสร็จ (เหมือน RAGEngine)
+        self.embedder = embedder
+        # ถ้ามี จะใช้ embedding ของคำถามจาก warm cache ของ RAGEngine (prefetch คำนวณไว้แล้วระหว่าง triage)
+        self.query_encoder: Optional[Callable[[str], Awaitable[np.ndarray]]] = None
+        self.log_path = log_path
+        self.k = k
+        self.min_similarity = min_similarity
+        self.min_confidence = min_confidence
+        self._texts: Dict[str, List[str]] = {}
+        self._labels: Dict[str, List[str]] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._log_lock = asyncio.Lock()
+        print("🧭 Intent Classifier (V1 - Embedding kNN) is ready.")
+
+    @property
+    def is_ready(self) -> bool:
+        return self.embedder is not None and bool(self._vectors)
+
+    def _normalize(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype="float32").reshape(-1, np.asarray(vectors).shape[-1])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def load_examples(self) -> Dict[str, List[Tuple[str, str]]]:
+        """ตัวอย่างฝึกทั้งหมดแยกตาม router: seed ก่อน แล้วตามด้วยคำตัดสินของ LLM ล่าสุด (ข้อความซ้ำใช้ป้ายล่าสุด)"""
+        examples: Dict[str, Dict[str, str]] = {router: dict(pairs) for router, pairs in SEED_EXAMPLES.items()}
+        if os.path.exists(self.log_path):
+            logged: Dict[str, Dict[str, str]] = defaultdict(dict)
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        logged[entry["router"]][entry["query"]] = entry["label"]
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+            for router, pairs in logged.items():
+                recent = list(pairs.items())[-settings.INTENT_LOG_MAX_EXAMPLES:]
+                # [V1.1] label เดียวมีตัวอย่างจาก log ได้ไม่เกิน INTENT_LOG_MAX_PER_LABEL (เก็บล่าสุด)
+                per_label: Dict[str, int] = defaultdict(int)
+                kept = []
+                for text, label in reversed(recent):
+                    if per_label[label] < settings.INTENT_LOG_MAX_PER_LABEL:
+                        per_label[label] += 1
+                        kept.append((text, label))
+                examples.setdefault(router, {}).update(reversed(kept))
+        return {router: list(pairs.items()) for router, pairs in examples.items()}
+
+    def _build_sync(self):
+        for router, pairs in self.load_examples().items():
+            texts = [text for text, _ in pairs]
+            vectors = self.embedder.encode(texts, convert_to_numpy=True, batch_size=32)
+            self._texts[router] = texts
+            self._labels[router] = [label for _, label in pairs]
+            self._vectors[router] = self._normalize(vectors)
+            print(f" 	- 🧭 Router '{router}': {len(texts)} examples, {len(set(self._labels[router]))} labels")
+
+    async def load(self):
+        try:
+            await asyncio.to_thread(self._build_sync)
+            print("✅ Intent Classifier: Example embeddings built.")
+        except Exception as e:
+            print(f"❌ Intent Classifier: Could not build example embeddings. Error: {e}")
+
+    async def _encode(self, query: str) -> np.ndarray:
+        if self.query_encoder:
+            vector = await self.query_encoder(query)
+        else:
+            vector = await asyncio.to_thread(self.embedder.encode, [query], convert_to_numpy=True)
+        return self._normalize(vector)[0]
+
+    async def classify(self, router: str, query: str) -> Optional[Dict]:
+        """
+        [V1] คืน {"label", "confidence", "similarity", "confident"} หรือ None ถ้ายังไม่พร้อม
+        ข้อความที่ตรงกับตัวอย่างเดิมทุกตัวอักษรถือว่ามั่นใจเสมอ
+        """
+        if not self.is_ready or router not in self._vectors or not query.strip():
+            return None
+        try:
+            vector = await self._encode(query)
+        except Exception as e:
+            print(f"⚠️ Intent Classifier: Could not embed query. Error: {e}")
+            return None
+        similarities = self._vectors[router] @ vector
+        nearest = int(np.argmax(similarities))
+        if similarities[nearest] >= EXACT_MATCH_SIMILARITY:
+            return {"label": self._labels[router][nearest], "confidence": 1.0,
+                    "similarity": round(float(similarities[nearest]), 3), "confident": True}
+        label, confidence, similarity = knn_vote(similarities, self._labels[router], self.k)
+        confident = similarity >= self.min_similarity and confidence >= self.min_confidence
+        return {"label": label, "confidence": round(confidence, 3), "similarity": round(similarity, 3), "confident": confident}
+
+    async def record(self, router: str, query: str, label: str):
+        """
+        [V1.1] บันทึกคำตัดสินของ LLM เป็นตัวอย่างฝึกใหม่ (ทั้งในไฟล์ log และใน index ที่โหลดอยู่)
+        เฉพาะเมื่อ label นั้นอยู่ในเพื่อนบ้าน k ตัวที่ใกล้สุดอยู่แล้ว (คำตัดสินที่ขัดกับตัวอย่างทั้งหมดอาจเป็น LLM ผิด)
+        และ label นั้นยังมีตัวอย่างไม่เกิน INTENT_LOG_MAX_PER_LABEL
+        """
+        if not query.strip() or not label:
+            return
+        if not self.is_ready or router not in self._vectors or query in self._texts[router]:
+            return
+        try:
+            vector = await self._encode(query)
+            labels = self._labels[router]
+            k = min(self.k, len(labels))
+            neighbours = {labels[i] for i in np.argpartition(-(self._vectors[router] @ vector), k - 1)[:k]}
+            if label not in neighbours:
+                print(f" 	-> Intent Classifier: Not recording '{label}' (nearest examples say {sorted(neighbours)}).")
+                return
+            if labels.count(label) >= settings.INTENT_LOG_MAX_PER_LABEL:
+                return
+            entry = {"router": router, "query": query, "label": label,
+                     "timestamp": datetime.datetime.now().isoformat(timespec="seconds")}
+            async with self._log_lock:
+                await asyncio.to_thread(self._append_log, entry)
+            self._texts[router].append(query)
+            self._labels[router].append(label)
+            self._vectors[router] = np.vstack([self._vectors[router], vector[None, :]])
+        except Exception as e:
+            print(f"⚠️ Intent Classifier: Could not record '{label}' for router '{router}'. Error: {e}")
+
+    def _append_log(self, entry: Dict):
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
@@ -0,0 +1,102 @@
+# core/intent_examples.py
+# (V1.0 - Seed Examples for the Local Intent Classifier)
+# ตัวอย่างที่ติดป้ายแล้วสำหรับ IntentClassifier แยกตาม "router" (LLM ที่ทำหน้าที่คัดแยก)
+# ชุดแรกมาจากตัวอย่างใน prompt ของ FengAgent และ MemoryAgent ส่วนที่เหลือเพิ่มให้ครบทุก label
+# ข้อมูลจริงจาก traffic (คำตัดสินของ LLM) ถูกสะสมเพิ่มใน INTENT_LOG_FILE
+
+FENG_ROUTER = "feng"
+MEMORY_ROUTER = "memory"
+
+SEED_EXAMPLES = {
+    FENG_ROUTER: [
+        ("สรุปข่าวเทคโนโลยีล่าสุดทั่วโลก", "NEWS_REQUEST"),
+        ("วันนี้มีข่าวอะไรน่าสนใจบ้าง", "NEWS_REQUEST"),
+        ("สถานการณ์เศรษฐกิจไทยตอนนี้เป็นยังไง", "NEWS_REQUEST"),
+        ("ข่าวล่าสุดเกี่ยวกับ AI", "NEWS_REQUEST"),
+        ("อัปเดตข่าวตลาดหุ้นให้หน่อย", "NEWS_REQUEST"),
+
+        ("วิเคราะห์ข้อดีข้อเสียของ Stoicism กับ Epicureanism", "PLANNER_REQUEST"),
+        ("เปรียบเทียบหนังสือ 'Atomic Habits' กับ 'The Power of Habit'", "PLANNER_REQUEST"),
+        ("ทำไมคนเราถึงผัดวันประกันพรุ่ง และจะแก้อย่างไร", "PLANNER_REQUEST"),
+        ("วางแผนการอ่านหนังสือการลงทุนให้หน่อย", "PLANNER_REQUEST"),
+        ("กลยุทธ์ของซุนวูนำมาใช้กับการทำธุรกิจได้อย่างไร", "PLANNER_REQUEST"),
+        ("วิเคราะห์แนวคิดเรื่องความสุขจากมุมมองปรัชญาต่างๆ", "PLANNER_REQUEST"),
+
+        ("The Art of War คืออะไร", "DEEP_ANALYSIS_REQUEST"),
+        ("ปรัชญาสโตอิกคืออะไร", "DEEP_ANALYSIS_REQUEST"),
+        ("เต๋าเต้อจิงหมายถึงอะไร", "DEEP_ANALYSIS_REQUEST"),
+        ("Sapiens เป็นหนังสือเกี่ยวกับอะไร", "DEEP_ANALYSIS_REQUEST"),
+        ("ความหมายของคำว่าอุเบกขา", "DEEP_ANALYSIS_REQUEST"),
+
+        ("วันนี้อากาศดีนะ", "GENERAL_CONVERSATION"),
+        ("เธอชอบอ่านหนังสือแนวไหน", "GENERAL_CONVERSATION"),
+        ("ขอบคุณมากนะที่ช่วย", "GENERAL_CONVERSATION"),
+        ("เมื่อกี้ที่อธิบายมาเข้าใจแล้ว", "GENERAL_CONVERSATION"),
+        ("คิดว่ายังไงกับเรื่องนี้", "GENERAL_CONVERSATION"),
+
+        ("วันนี้รู้สึกแย่จังเลย", "COUNSELING_REQUEST"),
+        ("เครียดเรื่องงานมาก ไม่รู้จะทำยังไง", "COUNSELING_REQUEST"),
+        ("รู้สึกเหงาและไม่มีใครเข้าใจ", "COUNSELING_REQUEST"),
+        ("นอนไม่หลับเพราะคิดมาก", "COUNSELING_REQUEST"),
+        ("เศร้าจังเลยเลิกกับแฟน", "COUNSELING_REQUEST"),
+
+        ("เขียนโค้ด Python อ่านไฟล์ CSV ให้หน่อย", "CODE_REQUEST"),
+        ("ช่วยแก้บั๊กฟังก์ชันนี้ที", "CODE_REQUEST"),
+        ("เขียนสคริปต์เรียงลำดับตัวเลข", "CODE_REQUEST"),
+        ("อธิบายโค้ด JavaScript นี้หน่อย", "CODE_REQUEST"),
+
+        ("หารูปภูเขาสวยๆ ให้หน่อย", "IMAGE_REQUEST"),
+        ("ขอดูรูปทะเลตอนพระอาทิตย์ตก", "IMAGE_REQUEST"),
+        ("หาภาพแมวน่ารักๆ", "IMAGE_REQUEST"),
+        ("ขอรูปท้องฟ้าโทนสีส้ม", "IMAGE_REQUEST"),
+
+        ("เปิดโปรแกรมเครื่องคิดเลขให้หน่อย", "SYSTEM_COMMAND"),
+        ("เพิ่มเสียงหน่อย", "SYSTEM_COMMAND"),
+        ("ปิดเสียงคอมพิวเตอร์", "SYSTEM_COMMAND"),
+        ("เปิด Notepad", "SYSTEM_COMMAND"),
+
+        ("แนะนำหนังสือเกี่ยวกับประวัติศาสตร์หน่อย", "LIBRARIAN_REQUEST"),
+        ("ตอนนี้คุณมีหนังสือกี่เล่ม", "LIBRARIAN_REQUEST"),
+        ("มีหนังสือหมวดจิตวิทยาอะไรบ้าง", "LIBRARIAN_REQUEST"),
+        ("ควรอ่านเล่มไหนดีเรื่องการลงทุน", "LIBRARIAN_REQUEST"),
+
+        ("แล้วหลังจากนั้นฉันก็ย้ายไปทำงานที่เชียงใหม่", "USER_STORYTELLING"),
+        ("ตอนเด็กๆ ฉันชอบไปบ้านยายทุกปิดเทอม", "USER_STORYTELLING"),
+        ("เล่าให้ฟังนะ เมื่อวานฉันไปเจอเพื่อนเก่ามา", "USER_STORYTELLING"),
+
+        ("ตอนนี้กี่โมงแล้ว", "TIME_REQUEST"),
+        ("เวลาเท่าไหร่แล้ว", "TIME_REQUEST"),
+        ("ขอทราบเวลาปัจจุบัน", "TIME_REQUEST"),
+
+        ("วันนี้วันอะไร", "DATE_REQUEST"),
+        ("วันนี้วันที่เท่าไหร่", "DATE_REQUEST"),
+        ("วันนี้ตรงกับวันที่อะไร", "DATE_REQUEST"),
+
+        ("คำถามแรกสุดที่ฉันถามเธอคืออะไร", "MEMORY_QUERY"),
+        ("เมื่อวานเราคุยอะไรกันไปบ้าง", "MEMORY_QUERY"),
+        ("เมื่อกี้คุยเรื่องไร", "MEMORY_QUERY"),
+        ("เราคุยกันไปกี่ข้อความแล้ว", "MEMORY_QUERY"),
+        ("ฉันเคยพูดถึงเรื่องสโตอิกตอนไหน", "MEMORY_QUERY"),
+    ],
+    MEMORY_ROUTER: [
+        ("เราเริ่มคุยกันเรื่องอะไรเป็นเรื่องแรก", "RECALL_FIRST_MEMORY"),
+        ("คำถามแรกสุดที่ฉันถามเธอคืออะไร", "RECALL_FIRST_MEMORY"),
+        ("จำได้ไหมว่าเราเริ่มคุยกันยังไง", "RECALL_FIRST_MEMORY"),
+
+        ("เราคุยกันไปกี่ข้อความแล้ว", "CALCULATE_STATS"),
+        ("เราคุยกันมานานแค่ไหนแล้ว", "CALCULATE_STATS"),
+        ("ขอสถิติการสนทนาของเราหน่อย", "CALCULATE_STATS"),
+
+        ("สรุปเรื่องที่เราคุยกันเมื่อกี้ให้หน่อย", "SUMMARIZE_RECENT"),
+        ("เมื่อวานเราคุยอะไรกันไปบ้าง", "SUMMARIZE_RECENT"),
+        ("เมื่อกี้คุยเรื่องไร", "SUMMARIZE_RECENT"),
+        ("ล่าสุดเราคุยเรื่องอะไรกัน", "SUMMARIZE_RECENT"),
+
+        ("ฉันเคยพูดถึงเรื่องสโตอิกตอนไหน", "SEARCH_HISTORY"),
+        ("ฉันเคยถามเรื่องการลงทุนเมื่อไหร่", "SEARCH_HISTORY"),
+        ("ค้นหาตอนที่เราคุยเรื่องซุนวู", "SEARCH_HISTORY"),
+
+        ("เธอจำได้ไหมว่าฉันชอบหนังสือแนวไหน", "NO_MATCH"),
+        ("เธอรู้จักฉันดีแค่ไหน", "NO_MATCH"),
+    ],
+}
@@ -0,0 +1,301 @@
+# core/key_state_store.py
+# (V1.2 - Off-Loop Sync)
+# เซิร์ฟเวอร์ API, knowledge_extractor_*.py และสคริปต์อื่นต่างสร้าง key manager ของตัวเองในหน่วยความจำ
+# จึงไม่รู้ว่าอีก process กำลังใช้/ทำให้คีย์ไหนติด 429 และ cooldown หายทุกครั้งที่ restart
+# ไฟล์ SQLite เดียว (KEY_STATE_STORE_PATH) เก็บสถานะที่ทุก process ใช้ร่วมกัน:
+# - key_cooldowns: คีย์ที่ถูกพักถึงเมื่อไร (เวลา wall clock จึงเทียบข้าม process ได้ และอยู่รอดหลัง restart)
+# - key_usage: ยอดคำขอ/token ต่อคีย์ต่อโมเดล แยกตาม process เป็นช่วงละ USAGE_SLOT_SECONDS
+#   KeyRateLimiter นำยอดของ process อื่นใน 1 นาทีล่าสุดมาหักจากโควตาของตัวเอง
+# - lane_demand: [V1.1] จำนวนคำขอ interactive ที่กำลังรอโควตาในแต่ละ process งาน batch ของ process อื่นใช้ตัดสินใจหลีกทาง
+# คีย์ไม่ถูกเขียนลงไฟล์ตรงๆ ใช้ fingerprint (sha256) แทน
+# การล็อกใช้ file lock ของ SQLite เอง (WAL + busy timeout) ถ้า store ใช้ไม่ได้ key manager ทำงานแบบ process เดียวตามเดิม
+# [V1.2] อ่าน/เขียนไฟล์ใน thread เบื้องหลังเท่านั้น event loop ของเซิร์ฟเวอร์ไม่เคยรอ lock ของไฟล์
+
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+
+USAGE_SLOT_SECONDS = 10
+USAGE_WINDOW_SECONDS = 60
+# แถวที่เก่ากว่านี้ไม่มีผลกับใครแล้ว ลบทิ้งเป็นระยะ
+PRUNE_INTERVAL_SECONDS = 60
+# ค่าที่ไม่ถูกอัปเดตนานกว่านี้ถือว่า process นั้นตายไปแล้ว (กันงาน batch หลีกทางให้ process ที่ไม่อยู่แล้ว)
+LANE_DEMAND_STALE_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS key_cooldowns (
+    provider TEXT NOT NULL,
+    key_id TEXT NOT NULL,
+    cooldown_until REAL NOT NULL,
+    reason TEXT,
+    pid INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (provider, key_id)
+);
+CREATE TABLE IF NOT EXISTS key_usage (
+    provider TEXT NOT NULL,
+    key_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    requests REAL NOT NULL DEFAULT 0,
+    tokens REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (provider, key_id, model, pid, slot)
+);
+CREATE TABLE IF NOT EXISTS lane_demand (
+    provider TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    interactive_waiting INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (provider, pid)
+);
+"""
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class KeyStateStore:
+    """
+    [V1.2] ทุกเมธอดที่ key manager / rate limiter เรียกใน hot path ทำงานกับหน่วยความจำเท่านั้น
+    (ค่าที่รอเขียน + snapshot ที่อ่านมาล่าสุด) I/O ของ SQLite ทั้งหมดอยู่ใน thread เบื้องหลัง (_sync_loop)
+    ที่เขียน/อ่านทุก KEY_STATE_REFRESH_SECONDS ถ้า process อื่นถือ lock ของไฟล์อยู่ คำขอของผู้ใช้จึงไม่ต้องรอ busy timeout
+    """
+
+    def __init__(self, path: str = settings.KEY_STATE_STORE_PATH,
+                 busy_timeout: float = settings.KEY_STATE_BUSY_TIMEOUT_SECONDS,
+                 refresh_seconds: float = settings.KEY_STATE_REFRESH_SECONDS):
+        self.path = path
+        self.pid = os.getpid()
+        self.refresh_seconds = refresh_seconds
+        # _lock: ค่าในหน่วยความจำ (สั้นมาก ไม่มี I/O ข้างใน), _io_lock: connection ของ SQLite
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._pruned_at = 0.0
+        self._stats = {"cooldowns_written": 0, "cooldowns_adopted": 0, "usage_flushes": 0, "syncs": 0, "errors": 0}
+        # ค่าที่รอเขียนลงไฟล์
+        self._pending_cooldowns: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        self._pending_usage: Dict[str, Dict[Tuple[str, str], List[float]]] = {}
+        self._pending_lane: Dict[str, int] = {}
+        # snapshot ของสถานะร่วมที่อ่านมาล่าสุด (แทนที่ทั้งก้อนทุกรอบ ผู้อ่านจึงไม่ต้องล็อก)
+        self._providers = set()
+        self._cooldowns: Dict[str, Dict[str, float]] = {}
+        self._external_usage: Dict[str, Dict[str, Dict[str, Tuple[float, float]]]] = {}
+        self._lane_demand: Dict[str, int] = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # autocommit: ทุกคำสั่งเป็น transaction สั้นๆ ของตัวเอง ไม่ถือ lock ของไฟล์ค้างไว้
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._sync_loop, name="key-state-sync", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _execute(self, sql: str, params=()) -> List[tuple]:
+        with self._io_lock:
+            try:
+                return self._conn.execute(sql, params).fetchall()
+            except sqlite3.Error as e:
+                # store เป็นตัวช่วย ไม่ใช่ทางหลัก: ล้มเหลว = ใช้สถานะในหน่วยความจำต่อไป
+                self._stats["errors"] += 1
+                print(f"⚠️ [Key State Store] {type(e).__name__}: {e}")
+                return []
+
+    # --- hot path: หน่วยความจำเท่านั้น ---
+
+    def set_cooldown(self, provider: str, api_key: str, cooldown_until: float, reason: str = ""):
+        """[V1] บันทึกว่าคีย์นี้ถูกพักถึง cooldown_until (ถ้ามี process อื่นพักไว้นานกว่าแล้ว ใช้ค่าที่นานกว่า)"""
+        key = (provider, fingerprint(api_key))
+        with self._lock:
+            self._stats["cooldowns_written"] += 1
+            previous = self._pending_cooldowns.get(key)
+            if previous is None or cooldown_until > previous[0]:
+                self._pending_cooldowns[key] = (cooldown_until, reason)
+        # cooldown ควรถึง process อื่นเร็วที่สุด ไม่ต้องรอรอบถัดไป
+        self._wake.set()
+
+    def merge_cooldowns(self, provider: str, key_cooldowns: Dict[str, float], force: bool = False):
+        """
+        [V1] รวม cooldown ที่ process อื่นบันทึกไว้เข้า key_cooldowns ของ key manager (แก้ dict โดยตรง)
+        [V1.2] อ่านจาก snapshot ในหน่วยความจำ force = อ่านไฟล์ทันที (ใช้ตอนสร้าง key manager เท่านั้น ไม่ใช่ใน hot path)
+        """
+        self._providers.add(provider)
+        if force:
+            self._refresh()
+        shared = self._cooldowns.get(provider, {})
+        for api_key, local_until in key_cooldowns.items():
+            until = shared.get(fingerprint(api_key))
+            if until and until > local_until:
+                key_cooldowns[api_key] = until
+                self._stats["cooldowns_adopted"] += 1
+
+    def record_usage(self, provider: str, usage: Dict[Tuple[str, str], List[float]]):
+        """[V1] เพิ่มยอด (คำขอ, token) ของ process นี้ต่อ (คีย์, โมเดล) (เขียนลงช่วงเวลาปัจจุบันในรอบ sync ถัดไป)"""
+        self._providers.add(provider)
+        with self._lock:
+            pending = self._pending_usage.setdefault(provider, {})
+            for key, (requests, tokens) in usage.items():
+                totals = pending.setdefault(key, [0.0, 0.0])
+                totals[0] += requests
+                totals[1] += tokens
+
+    def external_usage(self, provider: str) -> Dict[str, Dict[str, Tuple[float, float]]]:
+        """[V1] ยอด (คำขอ, token) ของ process อื่นใน USAGE_WINDOW_SECONDS ล่าสุด: {model: {key_id: (requests, tokens)}}"""
+        self._providers.add(provider)
+        return self._external_usage.get(provider, {})
+
+    def publish_interactive_waiting(self, provider: str, waiting: int):
+        """[V1.1] ประกาศจำนวนคำขอ interactive ของ process นี้ที่กำลังรอโควตา"""
+        self._providers.add(provider)
+        with self._lock:
+            self._pending_lane[provider] = waiting
+
+    def interactive_waiting(self, provider: str) -> int:
+        """[V1.1] จำนวนคำขอ interactive ที่รอโควตาอยู่ใน process อื่น"""
+        self._providers.add(provider)
+        return self._lane_demand.get(provider, 0)
+
+    # --- thread เบื้องหลัง: I/O ของ SQLite ---
+
+    def _sync_loop(self):
+        while not self._closed:
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+            self.sync()
+
+    def sync(self):
+        """[V1.2] เขียนค่าที่รอไว้แล้วอ่านสถานะร่วมใหม่ (เรียกจาก thread เบื้องหลัง หรือเมื่อปิด process)"""
+        self._flush()
+        self._refresh()
+        self._stats["syncs"] += 1
+
+    def _flush(self):
+        with self._lock:
+            cooldowns, self._pending_cooldowns = self._pending_cooldowns, {}
+            usage, self._pending_usage = self._pending_usage, {}
+            lanes, self._pending_lane = self._pending_lane, {}
+        if not (cooldowns or usage or lanes):
+            return
+        now = time.time()
+        slot = int(now // USAGE_SLOT_SECONDS)
+        with self._io_lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT INTO key_cooldowns (provider, key_id, cooldown_until, reason, pid, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (provider, key_id) DO UPDATE SET "
+                    "cooldown_until = MAX(cooldown_until, excluded.cooldown_until), reason = excluded.reason, "
+                    "pid = excluded.pid, updated_at = excluded.updated_at",
+                    [(provider, key_id, until, reason, self.pid, now)
+                     for (provider, key_id), (until, reason) in cooldowns.items()],
+                )
+                self._conn.executemany(
+                    "INSERT INTO key_usage (provider, key_id, model, pid, slot, requests, tokens) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (provider, key_id, model, pid, slot) DO UPDATE SET "
+                    "requests = requests + excluded.requests, tokens = tokens + excluded.tokens",
+                    [(provider, fingerprint(api_key), model, self.pid, slot, requests, tokens)
+                     for provider, per_key in usage.items()
+                     for (api_key, model), (requests, tokens) in per_key.items()],
+                )
+                self._conn.executemany(
+                    "INSERT INTO lane_demand (provider, pid, interactive_waiting, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (provider, pid) DO UPDATE SET "
+                    "interactive_waiting = excluded.interactive_waiting, updated_at = excluded.updated_at",
+                    [(provider, self.pid, waiting, now) for provider, waiting in lanes.items()],
+                )
+                if now - self._pruned_at > PRUNE_INTERVAL_SECONDS:
+                    self._pruned_at = now
+                    self._conn.execute("DELETE FROM key_usage WHERE slot < ?",
+                                       (int((now - 2 * USAGE_WINDOW_SECONDS) // USAGE_SLOT_SECONDS),))
+                    self._conn.execute("DELETE FROM key_cooldowns WHERE cooldown_until < ?", (now,))
+                self._conn.execute("COMMIT")
+                if usage:
+                    self._stats["usage_flushes"] += 1
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                self._stats["errors"] += 1
+                print(f"⚠️ [Key State Store] {type(e).__name__}: {e}")
+                self._requeue(cooldowns, usage, lanes)
+
+    def _requeue(self, cooldowns, usage, lanes):
+        """เขียนไม่สำเร็จ (เช่นไฟล์ถูกล็อกนานเกิน busy timeout) เก็บค่ากลับไปลองใหม่รอบหน้า"""
+        with self._lock:
+            for key, value in cooldowns.items():
+                current = self._pending_cooldowns.get(key)
+                if current is None or value[0] > current[0]:
+                    self._pending_cooldowns[key] = value
+            for provider, per_key in usage.items():
+                pending = self._pending_usage.setdefault(provider, {})
+                for key, (requests, tokens) in per_key.items():
+                    totals = pending.setdefault(key, [0.0, 0.0])
+                    totals[0] += requests
+                    totals[1] += tokens
+            for provider, waiting in lanes.items():
+                self._pending_lane.setdefault(provider, waiting)
+
+    def _refresh(self):
+        now = time.time()
+        since_slot = int((now - USAGE_WINDOW_SECONDS) // USAGE_SLOT_SECONDS) + 1
+        for provider in list(self._providers):
+            rows = self._execute("SELECT key_id, cooldown_until FROM key_cooldowns WHERE provider = ? AND cooldown_until > ?",
+                                 (provider, now))
+            self._cooldowns[provider] = dict(rows)
+            usage: Dict[str, Dict[str, Tuple[float, float]]] = {}
+            for model, key_id, requests, tokens in self._execute(
+                    "SELECT model, key_id, SUM(requests), SUM(tokens) FROM key_usage "
+                    "WHERE provider = ? AND pid != ? AND slot >= ? GROUP BY model, key_id",
+                    (provider, self.pid, since_slot)):
+                usage.setdefault(model, {})[key_id] = (requests, tokens)
+            self._external_usage[provider] = usage
+            rows = self._execute(
+                "SELECT COALESCE(SUM(interactive_waiting), 0) FROM lane_demand WHERE provider = ? AND pid != ? AND updated_at > ?",
+                (provider, self.pid, now - LANE_DEMAND_STALE_SECONDS),
+            )
+            self._lane_demand[provider] = int(rows[0][0]) if rows else 0
+
+    def close(self):
+        """เขียนค่าที่ค้างอยู่ก่อนจบ process (atexit)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._flush()
+
+    def snapshot(self) -> Dict:
+        now = time.time()
+        return {"path": self.path, **self._stats,
+                "keys_on_cooldown": {provider: sum(1 for until in cooldowns.values() if until > now)
+                                     for provider, cooldowns in self._cooldowns.items()}}
+
+
+_default_store: Optional[KeyStateStore] = None
+_default_store_failed = False
+
+
+def default_key_state_store() -> Optional[KeyStateStore]:
+    """store ร่วมของ process นี้ (เปิดครั้งแรกที่เรียก) หรือ None เมื่อปิดไว้ / เปิดไฟล์ไม่ได้"""
+    global _default_store, _default_store_failed
+    if not settings.KEY_STATE_STORE_ENABLED or _default_store_failed:
+        return None
+    if _default_store is None:
+        try:
+            _default_store = KeyStateStore()
+        except (sqlite3.Error, OSError) as e:
+            _default_store_failed = True
+            print(f"⚠️ [Key State Store] Disabled, could not open '{settings.KEY_STATE_STORE_PATH}': {e}")
+            return None
+    return _default_store
@@ -0,0 +1,309 @@
+# core/llm_cache.py
+# (V1.1 - Off-Loop Reads, Background Writes)
+# คำขอ LLM บางจุดเป็นฟังก์ชันของ input ล้วนๆ (triage ของ Feng, FormatterAgent, การแยกพารามิเตอร์ของ ImageAgent,
+# การสกัด Knowledge Graph ของ knowledge_extractor_*.py) input เดิมจึงไม่ต้องเสียเวลาและโควตาของคีย์ซ้ำ
+# key = sha256(model + prompt + params) เก็บในไฟล์ SQLite (LLM_CACHE_PATH) ที่ทุก process ใช้ร่วมกันและอยู่รอดหลัง restart
+# - opt-in: แคชเฉพาะ namespace (call site) ที่มีอายุใน LLM_CACHE_TTL_SECONDS
+# - เพดานจำนวนรายการ/ขนาดรวม: เกินแล้วทิ้งรายการที่หมดอายุก่อน แล้วจึงทิ้งรายการที่ไม่ได้ใช้นานที่สุด
+# ถ้าเปิดไฟล์ไม่ได้ ทุก call site เรียก LLM ตามปกติ สถิติ hit/miss ต่อ namespace ดูได้ที่ /api/metrics
+# [V1.1] ไฟล์นี้ถูกเขียนโดย knowledge_extractor_*.py ด้วย: event loop ของเซิร์ฟเวอร์จึงไม่แตะ SQLite เลย
+# cached() อ่านใน thread (asyncio.to_thread) ส่วนการเขียน (รายการใหม่, accessed_at/hits, ลบรายการหมดอายุ, ตรวจเพดาน)
+# ถูกพักไว้ในหน่วยความจำแล้วเขียนโดย thread เบื้องหลังทุก LLM_CACHE_FLUSH_SECONDS (แบบเดียวกับ core/key_state_store.py)
+
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from core.config import settings
+from core.tracing import current_span
+
+# ตรวจเพดานทุกๆ กี่ครั้งที่เขียน (COUNT/SUM ทั้งตารางไม่ควรทำทุกครั้ง)
+ENFORCE_CAPS_EVERY_PUTS = 100
+# ลดลงเหลือสัดส่วนนี้ของเพดานเมื่อเกิน จะได้ไม่ต้องไล่ทิ้งทุกครั้งที่เขียนใหม่
+EVICT_TO_FRACTION = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    cache_key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses (accessed_at);
+"""
+
+
+def cache_key(model: str, prompt: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps({"model": model, "prompt": prompt, "params": params},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, path: str = settings.LLM_CACHE_PATH,
+                 ttl_seconds: Dict[str, float] = settings.LLM_CACHE_TTL_SECONDS,
+                 max_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+                 max_bytes: int = settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+                 enabled: bool = settings.LLM_CACHE_ENABLED,
+                 flush_seconds: float = settings.LLM_CACHE_FLUSH_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.flush_seconds = flush_seconds
+        # _conn: connection สำหรับอ่าน (ใต้ _lock) ส่วน connection สำหรับเขียนเป็นของ thread เบื้องหลังผู้เดียว
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # [V1.1] ค่าที่รอเขียน (ใต้ _pending_lock สั้นมาก ไม่มี I/O ข้างใน)
+        self._pending_lock = threading.Lock()
+        self._pending_puts: Dict[str, tuple] = {}
+        self._pending_touches: Dict[str, List[float]] = {}
+        self._pending_deletes: Set[str] = set()
+        self._puts_since_enforce = ENFORCE_CAPS_EVERY_PUTS
+        self._writer: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._closed = False
+        # ขนาดแคช ณ การตรวจเพดานครั้งล่าสุด (metrics ไม่ต้องนับทั้งตาราง)
+        self._size: Tuple[int, int] = (0, 0)
+        self._stats = {"evictions": 0, "expired": 0, "errors": 0, "flushes": 0}
+        self._per_namespace: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "stores": 0})
+
+    def is_cacheable(self, namespace: str) -> bool:
+        return self.enabled and namespace in self.ttl_seconds
+
+    def _open(self) -> Optional[sqlite3.Connection]:
+        """เปิดไฟล์ครั้งแรกที่ใช้ (import module นี้จึงไม่แตะดิสก์) เปิดไม่ได้ = ปิดแคชทั้ง process"""
+        if not self.enabled:
+            return None
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=settings.KEY_STATE_BUSY_TIMEOUT_SECONDS,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            return conn
+        except (sqlite3.Error, OSError) as e:
+            self.enabled = False
+            print(f"⚠️ [LLM Cache] Disabled, could not open '{self.path}': {e}")
+            return None
+
+    def _execute(self, sql: str, params=()) -> list:
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._open()
+            if self._conn is None:
+                return []
+            try:
+                return self._conn.execute(sql, params).fetchall()
+            except sqlite3.Error as e:
+                # แคชพัง = เรียก LLM ตามปกติ ไม่ใช่ข้อผิดพลาดของคำขอ
+                self._stats["errors"] += 1
+                print(f"⚠️ [LLM Cache] {type(e).__name__}: {e}")
+                return []
+
+    def get(self, namespace: str, model: str, prompt: str, **params) -> Optional[str]:
+        """
+        [V1] คำตอบที่แคชไว้ของ (model, prompt, params) ที่ยังไม่หมดอายุ หรือ None (params = ค่าที่มีผลกับคำตอบ เช่น temperature)
+        [V1.1] อ่านไฟล์แบบ blocking: โค้ด async ใช้ cached() ซึ่งเรียกเมธอดนี้ใน thread
+        """
+        if not self.is_cacheable(namespace):
+            return None
+        key = cache_key(model, prompt, params)
+        now = time.time()
+        with self._pending_lock:
+            pending = self._pending_puts.get(key)
+        if pending is not None:
+            # รายการที่ยังไม่ถูกเขียนลงไฟล์
+            response, expires_at = pending[3], pending[6]
+        else:
+            rows = self._execute("SELECT response, expires_at FROM llm_responses WHERE cache_key = ?", (key,))
+            response, expires_at = rows[0] if rows else (None, 0.0)
+        if response is not None and expires_at <= now:
+            self._stats["expired"] += 1
+            response = None
+            with self._pending_lock:
+                self._pending_deletes.add(key)
+        elif response is not None:
+            with self._pending_lock:
+                touch = self._pending_touches.setdefault(key, [now, 0])
+                touch[0] = now
+                touch[1] += 1
+        self._per_namespace[namespace]["hits" if response is not None else "misses"] += 1
+        self._start_writer()
+        return response
+
+    def put(self, namespace: str, model: str, prompt: str, response: str, **params):
+        """
+        [V1] เก็บคำตอบ (ควรเรียกหลังตรวจแล้วว่าคำตอบใช้ได้ คำตอบที่พังจะถูกส่งซ้ำจนหมดอายุ)
+        [V1.1] แค่พักไว้ในหน่วยความจำ thread เบื้องหลังเขียนลงไฟล์ในรอบถัดไป
+        """
+        if not self.is_cacheable(namespace) or not response:
+            return
+        now = time.time()
+        key = cache_key(model, prompt, params)
+        row = (key, namespace, model, response, len(response.encode("utf-8")),
+               now, now + self.ttl_seconds[namespace], now)
+        with self._pending_lock:
+            self._pending_puts[key] = row
+            self._pending_deletes.discard(key)
+            self._puts_since_enforce += 1
+        self._per_namespace[namespace]["stores"] += 1
+        self._start_writer()
+
+    async def cached(self, namespace: str, model: str, prompt: str, compute: Callable[[], Awaitable[str]],
+                     is_valid: Optional[Callable[[str], bool]] = None, **params) -> str:
+        """
+        [V1] คืนคำตอบจากแคช หรือเรียก compute() แล้วเก็บผลที่ผ่าน is_valid
+        namespace ที่ไม่ได้เปิดแคชไว้เรียก compute() ตรงๆ
+        """
+        if not self.is_cacheable(namespace):
+            return await compute()
+        response = await asyncio.to_thread(self.get, namespace, model, prompt, **params)
+        active = current_span()
+        if active:
+            active.set_attribute("llm_cache", "hit" if response is not None else "miss")
+        if response is not None:
+            return response
+        response = await compute()
+        if response and (is_valid is None or is_valid(response)):
+            self.put(namespace, model, prompt, response, **params)
+        return response
+
+    # --- thread เบื้องหลัง: การเขียนทั้งหมด ---
+
+    def _start_writer(self):
+        if self._writer is not None or self._closed or not self.enabled:
+            return
+        with self._pending_lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._write_loop, name="llm-cache-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _write_loop(self):
+        conn = self._open()
+        if conn is None:
+            return
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self._flush(conn)
+            if self._closed:
+                conn.close()
+                return
+
+    def _flush(self, conn: sqlite3.Connection):
+        with self._pending_lock:
+            puts, self._pending_puts = self._pending_puts, {}
+            touches, self._pending_touches = self._pending_touches, {}
+            deletes, self._pending_deletes = self._pending_deletes, set()
+            enforce = self._puts_since_enforce >= ENFORCE_CAPS_EVERY_PUTS
+            if enforce:
+                self._puts_since_enforce = 0
+        if puts or touches or deletes:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO llm_responses "
+                    "(cache_key, namespace, model, response, size, created_at, expires_at, accessed_at, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    list(puts.values()),
+                )
+                conn.executemany(
+                    "UPDATE llm_responses SET accessed_at = MAX(accessed_at, ?), hits = hits + ? WHERE cache_key = ?",
+                    [(accessed_at, hits, key) for key, (accessed_at, hits) in touches.items()],
+                )
+                # process อื่นอาจเขียนคำตอบใหม่ทับไว้แล้ว ลบเฉพาะแถวที่ยังหมดอายุอยู่
+                now = time.time()
+                conn.executemany("DELETE FROM llm_responses WHERE cache_key = ? AND expires_at <= ?",
+                                 [(key, now) for key in deletes])
+                conn.execute("COMMIT")
+                self._stats["flushes"] += 1
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self._stats["errors"] += 1
+                print(f"⚠️ [LLM Cache] {type(e).__name__}: {e}")
+                self._requeue(puts, touches, deletes)
+                return
+        if enforce:
+            self._enforce_caps(conn)
+
+    def _requeue(self, puts, touches, deletes):
+        """เขียนไม่สำเร็จ (เช่น extractor ถือ lock ของไฟล์นานเกิน busy timeout) เก็บกลับไปลองใหม่รอบหน้า"""
+        with self._pending_lock:
+            for key, row in puts.items():
+                self._pending_puts.setdefault(key, row)
+            for key, (accessed_at, hits) in touches.items():
+                touch = self._pending_touches.setdefault(key, [accessed_at, 0])
+                touch[0] = max(touch[0], accessed_at)
+                touch[1] += hits
+            self._pending_deletes.update(deletes - self._pending_puts.keys())
+
+    def _enforce_caps(self, conn: sqlite3.Connection):
+        """ทิ้งรายการที่หมดอายุ แล้วถ้ายังเกินเพดาน ทิ้งรายการที่ใช้ล่าสุดนานที่สุดจนเหลือ EVICT_TO_FRACTION ของเพดาน"""
+        try:
+            self._stats["expired"] += conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),)).rowcount
+            count, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+            if count > self.max_entries or total_bytes > self.max_bytes:
+                target_entries = int(self.max_entries * EVICT_TO_FRACTION)
+                target_bytes = int(self.max_bytes * EVICT_TO_FRACTION)
+                victims = []
+                for key, size in conn.execute("SELECT cache_key, size FROM llm_responses ORDER BY accessed_at"):
+                    if count <= target_entries and total_bytes <= target_bytes:
+                        break
+                    victims.append((key,))
+                    count -= 1
+                    total_bytes -= size
+                conn.executemany("DELETE FROM llm_responses WHERE cache_key = ?", victims)
+                self._stats["evictions"] += len(victims)
+            self._size = (count, total_bytes)
+        except sqlite3.Error as e:
+            self._stats["errors"] += 1
+            print(f"⚠️ [LLM Cache] {type(e).__name__}: {e}")
+
+    def close(self):
+        """เขียนค่าที่ค้างอยู่ก่อนจบ process (atexit)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join(timeout=settings.KEY_STATE_BUSY_TIMEOUT_SECONDS + 1)
+
+    def metrics(self) -> Dict[str, Any]:
+        """[V1.1] จากหน่วยความจำเท่านั้น (entries/size_mb ณ การตรวจเพดานครั้งล่าสุด)"""
+        entries, total_bytes = self._size
+        with self._pending_lock:
+            pending_writes = len(self._pending_puts) + len(self._pending_touches) + len(self._pending_deletes)
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            **self._stats,
+            "entries": entries,
+            "size_mb": round(total_bytes / (1024 * 1024), 2),
+            "pending_writes": pending_writes,
+            "per_namespace": {
+                namespace: dict(counts, hit_rate=round(counts["hits"] / max(1, counts["hits"] + counts["misses"]), 4))
+                for namespace, counts in self._per_namespace.items()
+            },
+        }
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,112 @@
+# core/llm_gateway.py
+# (V1.6 - Configurable Groq Base URL)
+# ทางผ่านเดียวของทุก agent ที่เรียก Groq: client (AsyncGroq + httpx) หนึ่งตัวต่อคีย์ อยู่ตลอดอายุเซิร์ฟเวอร์
+# connection pool / TLS session / HTTP/2 keep-alive จึงถูกใช้ซ้ำข้ามคำขอ แทนการสร้าง AsyncGroq ใหม่ทุกครั้ง
+# retry (RetryPolicy กลางใน core/retry_policy.py), หมุนคีย์ และ timeout อยู่ที่นี่ที่เดียวแทนโค้ดที่คัดลอกกันในแต่ละ agent
+# การใช้ connection ซ้ำวัดด้วย ConnectionReuseTracker (core/http_pool.py) ดูได้ที่ /api/metrics
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import groq
+from groq import AsyncGroq
+
+from core.config import settings
+from core.http_pool import HTTP2_AVAILABLE, ConnectionReuseTracker, pooled_http_client
+from core.llm_hedging import GROQ, hedged
+from core.llm_stream import DeltaCallback, collect_stream, stream_groq_chat
+from core.rate_limiter import INTERACTIVE, UsageCallback, estimate_tokens
+from core.retry_policy import RetryPolicy, is_transient_error, llm_retry_policy
+
+# ข้อผิดพลาดชั่วคราวที่ควรลองใหม่ด้วยคีย์ถัดไป (ข้อผิดพลาดอื่น เช่น 400 โยนต่อทันที)
+RETRYABLE_ERRORS = (groq.RateLimitError, groq.APITimeoutError, groq.APIConnectionError, groq.InternalServerError)
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS) or is_transient_error(error)
+
+
+class LLMGateway:
+    def __init__(self, retry_policy: RetryPolicy = llm_retry_policy,
+                 timeout: float = settings.LLM_GATEWAY_TIMEOUT_SECONDS):
+        self.retry_policy = retry_policy
+        self.timeout = timeout
+        self.http2 = settings.LLM_GATEWAY_HTTP2 and HTTP2_AVAILABLE
+        self._clients: Dict[str, AsyncGroq] = {}
+        self._requests_per_key: Dict[str, int] = {}
+        self._connections = ConnectionReuseTracker()
+        self._stats = {"requests": 0, "clients_created": 0}
+
+    def client(self, api_key: str) -> AsyncGroq:
+        """[V1] AsyncGroq ที่ใช้ร่วมกันของคีย์นี้ (สร้างครั้งแรกที่ใช้ แล้วเก็บไว้ตลอด)"""
+        client = self._clients.get(api_key)
+        if client is None:
+            http_client = pooled_http_client(self._connections, settings.LLM_GATEWAY_MAX_CONNECTIONS_PER_KEY, self.timeout)
+            # retry ของ SDK ปิดไว้ gateway ลองใหม่เองด้วยคีย์ถัดไป
+            # [V1.6] base_url = None ใช้ปลายทางปกติของ SDK, LLM_PROVIDER=fake ชี้ไปที่ core/fake_llm.py
+            client = AsyncGroq(api_key=api_key, base_url=settings.GROQ_API_BASE_URL, http_client=http_client, max_retries=0)
+            self._clients[api_key] = client
+            self._stats["clients_created"] += 1
+            print(f"🔌 LLM Gateway: Opened pooled client for key '...{api_key[-4:]}' (http2={self.http2}).")
+        self._requests_per_key[api_key] = self._requests_per_key.get(api_key, 0) + 1
+        return client
+
+    async def _with_retries(self, key_manager, label: str, model: str, messages: List[Dict[str, str]],
+                            attempt: Callable[[str, UsageCallback], Awaitable[str]], lane: str, **kwargs) -> str:
+        """
+        [V1] เรียก attempt(api_key, on_usage) ด้วยคีย์ใหม่ทุกรอบ ข้อผิดพลาดชั่วคราวทำให้คีย์ถูกพักและหมุนไปคีย์ถัดไป
+        ครั้งสุดท้ายที่ล้มเหลวโยนข้อผิดพลาดเดิมให้ agent ใช้คำตอบสำรองของตัวเอง
+        [V1.2] จองโควตาของคีย์ด้วย token ที่ประมาณไว้ และส่ง header/usage จริงกลับให้ key manager ผ่าน on_usage
+        [V1.3] จำนวนครั้ง/backoff/งบเวลา มาจาก RetryPolicy กลาง (สถิติ retry แยกตาม label)
+        [V1.4] lane = INTERACTIVE (ค่าเริ่มต้น, คำขอจาก Dispatcher) หรือ BATCH (งานเบื้องหลัง)
+        [V1.5] คีย์มาจาก key_manager.lease(): คำขอพร้อมกันกระจายไปคีย์ที่ค้างน้อยสุด usage ถูกส่งกลับตอนคืนคีย์
+        """
+        self._stats["requests"] += 1
+        prompt_text = "".join(message["content"] for message in messages)
+        estimated = estimate_tokens(prompt_text, kwargs.get("max_tokens") or settings.RATE_LIMIT_OUTPUT_TOKEN_RESERVE)
+        return await self.retry_policy.call_with_key(
+            key_manager, label,
+            lambda lease: attempt(lease.api_key, lease.on_usage),
+            model=model, estimated_tokens=estimated, is_retryable=is_retryable, lane=lane,
+        )
+
+    async def chat(self, key_manager, model: str, messages: List[Dict[str, str]],
+                   label: str = "LLM", lane: str = INTERACTIVE, **kwargs) -> str:
+        """[V1] chat completion แบบไม่สตรีม คืนข้อความของคำตอบ (kwargs ส่งต่อให้ Groq เช่น temperature, response_format)"""
+        async def attempt(api_key: str, on_usage: UsageCallback) -> str:
+            raw = await self.client(api_key).chat.completions.with_raw_response.create(
+                messages=messages, model=model, **kwargs)
+            completion = await raw.parse()
+            on_usage(raw.headers, completion.usage.total_tokens if completion.usage else None)
+            return completion.choices[0].message.content or ""
+        return await self._with_retries(key_manager, label, model, messages, attempt, lane, **kwargs)
+
+    async def stream_chat(self, key_manager, model: str, messages: List[Dict[str, str]],
+                          on_delta: Optional[DeltaCallback] = None, label: str = "LLM",
+                          hedge_agent: Optional[str] = None, lane: str = INTERACTIVE, **kwargs) -> str:
+        """
+        [V1] สตรีมคำตอบ (ส่ง delta ให้ on_delta) แล้วคืนข้อความเต็ม
+        hedge_agent = ชื่อ agent ใน Dispatcher สำหรับ hedging ข้าม provider (core/llm_hedging.py)
+        ล้มเหลวหลังส่ง delta ไปแล้ว (StreamInterruptedError) จะไม่ retry เพื่อไม่ให้ข้อความซ้ำ
+        """
+        async def attempt(api_key: str, on_usage: UsageCallback) -> str:
+            deltas = stream_groq_chat(self.client(api_key), model, messages, on_usage=on_usage, **kwargs)
+            if hedge_agent:
+                deltas = hedged(hedge_agent, GROQ, model, deltas, messages[-1]["content"])
+            return await collect_stream(deltas, on_delta, label=label)
+        return await self._with_retries(key_manager, label, model, messages, attempt, lane, **kwargs)
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            **self._connections.snapshot(),
+            "http2": self.http2,
+            "requests_per_key": {f"...{key[-4:]}": count for key, count in self._requests_per_key.items()},
+        }
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,181 @@
+# core/llm_hedging.py
+# (V1.5 - Shared Rate-Limit Check)
+# ชั้นกลางของสตรีม LLM: วัดเวลาถึง token แรก (TTFT) ของแต่ละ provider/model ไว้ตลอด
+# สำหรับ agent ที่เปิดใช้ (LLM_HEDGING_AGENTS) ถ้า provider หลักยังไม่ส่ง token แรกภายในงบเวลา (percentile ของ TTFT ที่ผ่านมา)
+# จะยิงคำขอสำรองไปอีก provider (Gemini <-> Groq) ด้วย prompt เดียวกัน ใครส่ง token แรกก่อนชนะ อีกฝั่งถูกยกเลิก
+# ตัดสินที่ token แรกเพราะหลังจากนั้น delta ถูกส่งถึงผู้ใช้แล้ว สลับสตรีมกลางทางไม่ได้
+
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import AsyncIterator, Deque, Dict, Tuple
+
+from core.config import settings
+from core.gemini_client import gemini_clients
+from core.llm_stream import stream_groq_chat
+from core.rate_limiter import estimate_tokens
+from core.retry_policy import is_rate_limit_error
+from core.tracing import current_span
+
+GEMINI = "gemini"
+GROQ = "groq"
+
+
+class TTFTTracker:
+    """เก็บ TTFT ล่าสุดต่อ (provider, model) แบบหน้าต่างเลื่อน ใช้คำนวณงบเวลาก่อนยิงคำขอสำรอง"""
+
+    def __init__(self, window: int = settings.HEDGE_WINDOW_SIZE):
+        self._samples: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def observe(self, provider: str, model: str, seconds: float):
+        self._samples[(provider, model)].append(seconds)
+
+    def budget(self, provider: str, model: str) -> float:
+        samples = self._samples.get((provider, model))
+        if not samples or len(samples) < settings.HEDGE_MIN_SAMPLES:
+            return settings.HEDGE_DEFAULT_DELAY_SECONDS
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(settings.HEDGE_PERCENTILE / 100 * (len(ordered) - 1))))
+        return min(max(ordered[index], settings.HEDGE_MIN_DELAY_SECONDS), settings.HEDGE_MAX_DELAY_SECONDS)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            f"{provider}/{model}": {"samples": len(samples), "budget_seconds": round(self.budget(provider, model), 3)}
+            for (provider, model), samples in self._samples.items()
+        }
+
+
+class LLMHedger:
+    def __init__(self):
+        self.google_key_manager = None
+        self.groq_key_manager = None
+        self.agents = settings.LLM_HEDGING_AGENTS
+        self.ttft = TTFTTracker()
+        self._stats = {"requests": 0, "hedges_fired": 0, "backup_wins": 0}
+
+    def configure(self, google_key_manager, groq_key_manager):
+        """เรียกครั้งเดียวใน lifespan: คำขอสำรองต้องใช้คีย์ของอีก provider"""
+        self.google_key_manager = google_key_manager
+        self.groq_key_manager = groq_key_manager
+        if self.agents:
+            print(f"🪁 LLM Hedger (V1): Hedging enabled for {sorted(self.agents)} "
+                  f"(p{settings.HEDGE_PERCENTILE:g} TTFT budget, backup {GEMINI}:{settings.HEDGE_BACKUP_GEMINI_MODEL} / {GROQ}:{settings.HEDGE_BACKUP_GROQ_MODEL})")
+
+    def enabled_for(self, agent: str) -> bool:
+        return agent in self.agents and self.google_key_manager is not None and self.groq_key_manager is not None
+
+    async def _backup_stream(self, provider: str, prompt: str) -> AsyncIterator[str]:
+        """สตรีมสำรองจากอีก provider ใช้คีย์ของ provider นั้น (รายงาน 429 ให้ key manager เหมือนที่ agent ทำ)"""
+        key_manager = self.groq_key_manager if provider == GROQ else self.google_key_manager
+        model = settings.HEDGE_BACKUP_GROQ_MODEL if provider == GROQ else settings.HEDGE_BACKUP_GEMINI_MODEL
+        # [V1.3] คำขอสำรองกินโควตาของคีย์เหมือนคำขอปกติ (ถ้าโควตาเต็ม get_key จะรอ ซึ่งช้ากว่าสตรีมหลักอยู่แล้ว)
+        estimated = estimate_tokens(prompt)
+        # [V1.4] คีย์ถูกยืมตลอดอายุสตรีมสำรอง (ถูกยกเลิกเมื่อสตรีมหลักชนะ = คืนคีย์ทันที)
+        async with key_manager.lease(model, estimated) as lease:
+            try:
+                if provider == GROQ:
+                    # [V1.1] ใช้ client ที่ pool ไว้ของ LLM Gateway (import ตรงนี้เพราะ gateway ห่อสตรีมด้วย hedger)
+                    from core.llm_gateway import llm_gateway
+                    deltas = stream_groq_chat(llm_gateway.client(lease.api_key), model,
+                                              [{"role": "user", "content": prompt}], on_usage=lease.on_usage)
+                else:
+                    deltas = gemini_clients.client(lease.api_key).stream(model, prompt, on_usage=lease.on_usage)
+                async for delta in deltas:
+                    yield delta
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    key_manager.report_failure(lease.api_key)
+                raise
+
+    async def _first_delta(self, deltas: AsyncIterator[str]) -> str:
+        # StopAsyncIteration ห้ามหลุดออกจาก Task ตรงๆ จึงแปลงเป็นข้อความว่าง
+        try:
+            return await deltas.__anext__()
+        except StopAsyncIteration:
+            return ""
+
+    @staticmethod
+    async def _discard(task: asyncio.Task, deltas: AsyncIterator[str]):
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        try:
+            await deltas.aclose()
+        except Exception:
+            pass
+
+    async def stream(self, agent: str, provider: str, model: str, primary: AsyncIterator[str],
+                     prompt: str) -> AsyncIterator[str]:
+        """
+        [V1] ครอบสตรีมหลักของ agent: วัด TTFT ทุกครั้ง และยิงคำขอสำรองเมื่อ agent เปิด hedging และ token แรกมาช้ากว่างบ
+        ข้อผิดพลาดก่อนถึงงบเวลาโยนต่อตามเดิม (ให้ลูป retry เปลี่ยนคีย์ของ agent ทำงาน)
+        """
+        self._stats["requests"] += 1
+        start = time.perf_counter()
+        first_task = asyncio.ensure_future(self._first_delta(primary))
+        winner, winner_deltas, winner_provider = first_task, primary, provider
+
+        if self.enabled_for(agent):
+            budget = self.ttft.budget(provider, model)
+            done, _ = await asyncio.wait({first_task}, timeout=budget)
+            if not done:
+                backup_provider = GROQ if provider == GEMINI else GEMINI
+                self._stats["hedges_fired"] += 1
+                print(f"🪁 LLM Hedger: {agent} ({provider}:{model}) no first token after {budget:.2f}s. "
+                      f"Firing backup request to {backup_provider}.")
+                backup = self._backup_stream(backup_provider, prompt)
+                backup_task = asyncio.ensure_future(self._first_delta(backup))
+                pending = {first_task, backup_task}
+                winner = None
+                try:
+                    while pending and winner is None:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            if not task.exception() and task.result():
+                                winner = task
+                                break
+                        # ฝั่งที่ล้มเหลวหรือได้สตรีมว่างถูกตัดออก รออีกฝั่งต่อ
+                except BaseException:
+                    await self._discard(first_task, primary)
+                    await self._discard(backup_task, backup)
+                    raise
+                if winner is None:
+                    await self._discard(backup_task, backup)
+                    winner = first_task  # ทั้งสองฝั่งล้มเหลว: โยนข้อผิดพลาดของ provider หลักให้ agent จัดการตามเดิม
+                elif winner is backup_task:
+                    self._stats["backup_wins"] += 1
+                    await self._discard(first_task, primary)
+                    winner_deltas, winner_provider = backup, backup_provider
+                    print(f"🪁 LLM Hedger: Backup {backup_provider} won for {agent} after {time.perf_counter() - start:.2f}s.")
+                else:
+                    await self._discard(backup_task, backup)
+                active = current_span()
+                if active:
+                    active.set_attribute("hedge.fired", True)
+                    active.set_attribute("hedge.winner", winner_provider)
+
+        try:
+            first = await winner
+        except BaseException:
+            await self._discard(winner, winner_deltas)
+            raise
+        # ถ้าฝั่งสำรองชนะ TTFT จริงของ provider หลักนานกว่านี้แน่ๆ บันทึกเป็นค่าขั้นต่ำเพื่อให้งบเวลาปรับตามจริง
+        self.ttft.observe(provider, model, time.perf_counter() - start)
+        if not first:
+            return
+        try:
+            yield first
+            async for delta in winner_deltas:
+                yield delta
+        finally:
+            await winner_deltas.aclose()
+
+    def metrics(self) -> Dict:
+        return {**self._stats, "ttft": self.ttft.snapshot()}
+
+
+llm_hedger = LLMHedger()
+
+
+def hedged(agent: str, provider: str, model: str, primary: AsyncIterator[str], prompt: str) -> AsyncIterator[str]:
+    """ทางลัดสำหรับ agent: collect_stream(hedged("NEWS", GEMINI, self.model_name, client.stream(...), prompt), ...)"""
+    return llm_hedger.stream(agent, provider, model, primary, prompt)
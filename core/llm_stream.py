@@ -0,0 +1,65 @@
+# core/llm_stream.py
+# (V1.2 - Streaming LLM Delta Protocol)
+# โปรโตคอลสตรีมของ agent: LLM แต่ละเจ้าถูกห่อเป็น async generator ที่ yield ข้อความทีละส่วน (delta)
+# agent รวบรวม delta เป็นคำตอบเต็มด้วย collect_stream() และส่งต่อแต่ละ delta ให้ on_delta (Dispatcher -> WebSocket)
+# คำตอบฉบับเต็มยังคงถูกจัดรูปแบบและบันทึกโดย Dispatcher._finalize_response เหมือนเดิม
+# [V1.1] สตรีมของ Gemini อยู่ที่ GeminiClient.stream (core/gemini_client.py) แทน SDK
+
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from core.rate_limiter import UsageCallback
+
+DeltaCallback = Callable[[str], Awaitable[None]]
+
+
+class StreamInterruptedError(Exception):
+    """
+    สตรีมล้มเหลวหลังจากส่ง delta ไปให้ผู้ใช้แล้ว จึงห้าม retry ด้วยคีย์ใหม่ (ข้อความจะซ้ำ)
+    ข้อความของ exception นี้ตั้งใจไม่มีคำว่า 429 เพื่อไม่ให้ลูป retry ของ agent จับได้
+    """
+
+    def __init__(self, partial_text: str, cause: Exception):
+        super().__init__(f"Stream interrupted after {len(partial_text)} chars: {type(cause).__name__}")
+        self.partial_text = partial_text
+
+
+async def stream_groq_chat(client, model: str, messages: List[Dict[str, str]],
+                           on_usage: Optional[UsageCallback] = None, **kwargs) -> AsyncIterator[str]:
+    """
+    delta จาก AsyncGroq chat completion (stream=True)
+    [V1.2] on_usage ได้รับ header x-ratelimit-* ตอนเริ่มสตรีม และจำนวน token จริงจาก chunk สุดท้าย (x_groq.usage)
+    """
+    raw = await client.chat.completions.with_raw_response.create(messages=messages, model=model, stream=True, **kwargs)
+    if on_usage:
+        on_usage(raw.headers, None)
+    stream = await raw.parse()
+    async for chunk in stream:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage and on_usage:
+            on_usage(None, usage.total_tokens)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def collect_stream(deltas: AsyncIterator[str], on_delta: Optional[DeltaCallback] = None,
+                         label: str = "LLM") -> str:
+    """
+    [V1] รวบรวม delta เป็นข้อความเต็ม และส่งแต่ละ delta ให้ on_delta ทันทีที่ได้รับ
+    log เวลาถึง token แรก (TTFT) ซึ่งเป็น latency ที่ผู้ใช้รู้สึกเมื่อมีการสตรีม
+    """
+    parts: List[str] = []
+    start = time.perf_counter()
+    try:
+        async for delta in deltas:
+            if not parts:
+                print(f"⏱️ {label}: First token after {time.perf_counter() - start:.2f}s")
+            parts.append(delta)
+            if on_delta:
+                await on_delta(delta)
+    except Exception as e:
+        if parts and on_delta:
+            raise StreamInterruptedError("".join(parts), e) from e
+        raise
+    print(f"⏱️ {label}: Stream completed in {time.perf_counter() - start:.2f}s ({len(parts)} deltas)")
+    return "".join(parts)
@@ -0,0 +1,142 @@
+# core/markdown_typesetter.py
+# (V1.0 - Local Rule-Based Markdown Typesetter)
+# จัดรูปแบบ Markdown ให้ร่างคำตอบแบบ deterministic บนเครื่อง แทนการส่งไปให้ FormatterAgent (LLM) อีกรอบ
+# กฎเดียวกับ prompt ของ FormatterAgent: ห้ามเปลี่ยน/เพิ่ม/ลบคำ ทำได้แค่เติมสัญลักษณ์ Markdown และบรรทัดว่าง
+#
+# หมายเหตุเรื่องภาษาไทย: ภาษาไทยไม่เว้นวรรคระหว่างคำ ตัวปิด `**` ที่อยู่หลังเครื่องหมายวรรคตอนและติดกับตัวอักษรไทย
+# (เช่น `**ข้อดี:**คือ...`) จะไม่ถูก marked ตีความเป็นตัวหนา จึงต้องวางเครื่องหมายวรรคตอนไว้นอก `**` เสมอ
+
+import re
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_ATX_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s")
+# bullet แบบ ASCII ต้องตามด้วยช่องว่าง ("-5 องศา" และ "**ตัวหนา**" ไม่ใช่รายการ)
+_BULLET_RE = re.compile(r"^(\s*)(?:[-*+](?=\s)|[•●○◦▪])\s*(\S.*)$")
+# ตัวเลขตามด้วยจุดแล้วต่อด้วยตัวเลข ("1.5 ล้าน") ไม่ใช่รายการ
+_ORDERED_RE = re.compile(r"^(\s*)\(?([0-9]{1,2})[.)](?![0-9])\s*(\S.*)$")
+_THAI_ORDERED_RE = re.compile(r"^(\s*)\(?([๐-๙]{1,2})[.)](?![๐-๙])\s*(\S.*)$")
+_BOLD_LINE_RE = re.compile(r"^\*\*([^*]+?)\*\*\s*$")
+# ป้ายกำกับสั้นๆ ต้นบรรทัดตามด้วย ":" เช่น "ข้อดี: ..." หรือ "สรุป : ..."
+_LABEL_RE = re.compile(r"^([^\s:*#>`|][^:*`|]{0,28}?)\s*([:：])\s*(\S.*)$")
+# ตัวหนาที่ปิดท้ายด้วยเครื่องหมายวรรคตอนแล้วติดตัวอักษรทันที เช่น "**ข้อดี:**คือ" (ผลลัพธ์ที่ LLM ชอบทำ)
+_BROKEN_BOLD_RE = re.compile(r"\*\*([^*\n]*?[^\s*\n])([:：.,!?;])\*\*(?=\w)")
+_SENTENCE_END = tuple(".!?。…\"'”)")
+
+HEADING_MAX_CHARS = 50
+LABEL_MAX_WORDS = 4
+
+
+def _is_list_line(line: str) -> bool:
+    return bool(_BULLET_RE.match(line) or _ORDERED_RE.match(line) or _THAI_ORDERED_RE.match(line))
+
+
+def _is_structural(line: str) -> bool:
+    return bool(_ATX_HEADING_RE.match(line) or _is_list_line(line) or line.lstrip().startswith((">", "|")))
+
+
+def _emphasize_label(text: str) -> str:
+    """ทำตัวหนาให้ป้ายกำกับต้นข้อความ โดยวาง ":" ไว้นอก ** เพื่อให้ตัวหนาแสดงผลได้เมื่อติดกับตัวอักษรไทย"""
+    if text.startswith("**") or "://" in text:
+        return text
+    match = _LABEL_RE.match(text)
+    if not match:
+        return text
+    label, colon, rest = match.groups()
+    # "10:30", "1:2" ไม่ใช่ป้ายกำกับ
+    if len(label.split()) > LABEL_MAX_WORDS or label.rstrip().endswith(_SENTENCE_END) or label[-1].isdigit():
+        return text
+    return f"**{label}**{colon} {rest}"
+
+
+def _typeset_list_item(line: str) -> str:
+    match = _BULLET_RE.match(line)
+    if match:
+        indent, body = match.groups()
+        return f"{indent}* {_emphasize_label(body)}"
+    match = _ORDERED_RE.match(line)
+    if match:
+        indent, number, body = match.groups()
+        return f"{indent}{number}. {_emphasize_label(body)}"
+    indent, number, body = _THAI_ORDERED_RE.match(line).groups()
+    # Markdown ordered list ต้องใช้เลขอารบิก จึงคงเลขไทยไว้เป็นตัวหนาในรายการแบบ bullet แทนการเปลี่ยนตัวเลข
+    return f"{indent}* **{number}.** {_emphasize_label(body)}"
+
+
+def _heading_text(line: str, next_line: str) -> str:
+    """คืนข้อความหัวข้อ หากบรรทัดนี้ควรเป็นหัวข้อ (บรรทัดสั้นที่ลงท้ายด้วย ':' หรือเป็นตัวหนาทั้งบรรทัด)"""
+    stripped = line.strip()
+    if not next_line.strip() or len(stripped) > HEADING_MAX_CHARS or _is_structural(stripped):
+        return ""
+    bold = _BOLD_LINE_RE.match(stripped)
+    if bold:
+        return bold.group(1).strip()
+    if stripped.endswith((":", "：")) and not _LABEL_RE.match(stripped):
+        return stripped[:-1].rstrip()
+    return ""
+
+
+def _typeset_block(lines: list) -> list:
+    out = []
+    previous_kind = None
+    for i, line in enumerate(lines):
+        if not line.strip():
+            previous_kind = None
+            out.append("")
+            continue
+
+        next_line = next((l for l in lines[i + 1:] if l.strip()), "")
+        heading = _heading_text(line, next_line)
+        if heading:
+            kind, text = "heading", f"### {heading}"
+        elif _ATX_HEADING_RE.match(line):
+            kind, text = "heading", line.strip()
+        elif _is_list_line(line):
+            kind, text = "list", _typeset_list_item(line.rstrip())
+        elif line.lstrip().startswith((">", "|")):
+            kind, text = "raw", line.rstrip()
+        else:
+            kind, text = "paragraph", _emphasize_label(line.strip())
+        if kind != "raw":
+            text = _BROKEN_BOLD_RE.sub(r"**\1**\2", text)
+
+        # marked (breaks: false) รวมบรรทัดที่ติดกันเป็นย่อหน้าเดียว จึงคั่นด้วยบรรทัดว่างทุกครั้งที่ไม่ใช่รายการต่อเนื่อง
+        continues_block = previous_kind == kind and kind in ("list", "raw")
+        if out and out[-1] != "" and not continues_block:
+            out.append("")
+        out.append(text)
+        if kind == "heading":
+            out.append("")
+            previous_kind = None
+        else:
+            previous_kind = kind
+    return out
+
+
+def typeset_markdown(text: str) -> str:
+    """
+    [V1] จัดรูปแบบ Markdown ให้ข้อความดิบโดยไม่เปลี่ยนถ้อยคำ: หัวข้อ, รายการ, ตัวหนาของป้ายกำกับ และย่อหน้า
+    บล็อกโค้ด (```) ถูกคงไว้ตามเดิมทุกตัวอักษร
+    """
+    if not text or not text.strip():
+        return text or ""
+
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    out, block, fence = [], [], None
+    for line in lines:
+        marker = _FENCE_RE.match(line)
+        if fence:
+            out.append(line)
+            if marker and marker.group(1) == fence:
+                fence = None
+                out.append("")
+            continue
+        if marker:
+            out.extend(_typeset_block(block))
+            block, fence = [], marker.group(1)
+            out.extend(["", line])
+            continue
+        block.append(line)
+    out.extend(_typeset_block(block))
+
+    result = re.sub(r"\n{3,}", "\n\n", "\n".join(out))
+    return result.strip("\n")
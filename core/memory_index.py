@@ -0,0 +1,319 @@
+# core/memory_index.py
+# (V2.0 - Per-Session Sharded Memory Index)
+# ดัชนีเวกเตอร์ของความทรงจำระยะยาว ใช้ long_term_memories.id เป็น id ของเวกเตอร์โดยตรง
+# และแยกเป็น shard ละหนึ่ง session เพื่อให้การค้นหาของผู้ใช้แต่ละคนขึ้นกับประวัติของตัวเองเท่านั้น
+#
+# โครงสร้าง (ต่อ shard ใน data/memory_index/sessions/<session>/):
+#   - memory_faiss.index     : ฐาน (IndexIDMap2 ครอบ IndexFlatIP) ณ จุด compaction ล่าสุด
+#   - memory_index_meta.json : seq สุดท้ายของ log ที่ถูกรวมเข้าไฟล์ฐานแล้ว
+# และตาราง memory_vector_log ใน memory.db (มีคอลัมน์ session_id) เก็บการเพิ่ม/แก้/ลบ หลัง compaction
+# ซึ่งถูกเขียนใน transaction เดียวกับ long_term_memories จึงไม่มีวันคลาดกัน
+# ผู้อ่าน (เซิร์ฟเวอร์) โหลดไฟล์ฐานแล้ว replay log ต่อท้าย ส่วน mapping อ่านจาก SQLite ตอนค้นหา
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import faiss
+import numpy as np
+
+SHARDS_DIRNAME = "sessions"
+INDEX_FILENAME = "memory_faiss.index"
+META_FILENAME = "memory_index_meta.json"
+LOG_OP_UPSERT = "upsert"
+LOG_OP_DELETE = "delete"
+
+
+def memory_embedding_text(memory: Dict) -> str:
+    """ข้อความที่ใช้ฝังเวกเตอร์ของความทรงจำ (ใช้ทั้งตอนสร้าง index และตอนนำไปเป็น context)"""
+    return f"หัวข้อ: {memory.get('title', '')}\nสรุป: {memory.get('summary', '')}"
+
+
+def ensure_vector_log_schema(cursor: sqlite3.Cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS memory_vector_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            memory_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            vector BLOB,
+            session_id TEXT
+        )
+    """)
+    try:
+        cursor.execute("ALTER TABLE memory_vector_log ADD COLUMN session_id TEXT")
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" not in str(e):
+            raise
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_mvl_session_seq ON memory_vector_log(session_id, seq)")
+
+
+def shard_dir(root_dir: str, session_id: str) -> str:
+    """ชื่อโฟลเดอร์ของ shard: ชื่อที่อ่านออก + hash สั้นๆ กันชื่อชนกันหลังแทนอักขระพิเศษ"""
+    readable = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:40]
+    digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(root_dir, SHARDS_DIRNAME, f"{readable}-{digest}")
+
+
+def log_upserts(cursor: sqlite3.Cursor, session_id: str, memory_ids: Sequence[int], vectors: np.ndarray):
+    """บันทึกการเพิ่ม/แก้เวกเตอร์ของ session ลง log (ผู้เรียกเป็นคนคุม transaction)"""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    cursor.executemany(
+        "INSERT INTO memory_vector_log (session_id, memory_id, op, vector) VALUES (?, ?, ?, ?)",
+        [(session_id, int(memory_id), LOG_OP_UPSERT, vector.tobytes()) for memory_id, vector in zip(memory_ids, vectors)]
+    )
+
+
+def log_deletes(cursor: sqlite3.Cursor, session_id: str, memory_ids: Iterable[int]):
+    """บันทึกการลบเวกเตอร์ของ session ลง log (ผู้เรียกเป็นคนคุม transaction)"""
+    cursor.executemany(
+        "INSERT INTO memory_vector_log (session_id, memory_id, op, vector) VALUES (?, ?, ?, NULL)",
+        [(session_id, int(memory_id), LOG_OP_DELETE) for memory_id in memory_ids]
+    )
+
+
+class MemoryVectorIndex:
+    """index ของ session เดียว (หนึ่ง shard)"""
+
+    def __init__(self, session_id: str, db_path: str = "data/memory.db", root_dir: str = "data/memory_index"):
+        self.session_id = session_id
+        self.db_path = db_path
+        self.index_dir = shard_dir(root_dir, session_id)
+        self.index_path = os.path.join(self.index_dir, INDEX_FILENAME)
+        self.meta_path = os.path.join(self.index_dir, META_FILENAME)
+
+        self.index: Optional[faiss.IndexIDMap2] = None
+        self.base_seq = 0      # seq ที่ไฟล์ฐานครอบคลุมแล้ว
+        self.applied_seq = 0   # seq ล่าสุดที่ replay เข้าหน่วยความจำแล้ว
+        # การค้นหา (to_thread) กับการ replay log ต้องไม่ทับกัน เพราะ IndexIDMap2 ถูกแก้ในที่
+        self._lock = threading.Lock()
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _read_base_seq(self) -> int:
+        if not os.path.exists(self.meta_path):
+            return 0
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("applied_seq", 0))
+
+    # ------------------------------------------------------------------
+    # Read side
+    # ------------------------------------------------------------------
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path) and os.path.exists(self.meta_path)
+
+    def load(self) -> bool:
+        """โหลดไฟล์ฐานแล้ว replay log ที่ตามมา คืน False ถ้า session นี้ยังไม่มีเวกเตอร์เลย"""
+        index, base_seq = None, 0
+        if self.exists():
+            index = faiss.read_index(self.index_path)
+            base_seq = self._read_base_seq()
+
+        with self._lock:
+            self.index, self.base_seq, self.applied_seq = index, base_seq, base_seq
+        self.refresh()
+        return self.index is not None
+
+    def refresh(self) -> int:
+        """
+        ตามให้ทันการเปลี่ยนแปลงล่าสุด ถ้ามี compaction เกิดขึ้นจะโหลดไฟล์ฐานใหม่
+        ไม่เช่นนั้น replay เฉพาะ log ใหม่ คืนจำนวนรายการ log ที่ถูก apply
+        """
+        if self._read_base_seq() != self.base_seq:
+            print(f"🔄 Memory Index [{self.session_id}]: Base file was compacted. Reloading...")
+            self.load()
+            return 0
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, memory_id, op, vector FROM memory_vector_log WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (self.session_id, self.applied_seq)
+            ).fetchall()
+        # ถ้ามี compaction แทรกระหว่างอ่าน log อาจมี log ที่หายไปแล้ว ต้องโหลดฐานใหม่
+        if self._read_base_seq() != self.base_seq:
+            self.load()
+            return 0
+        if not rows:
+            return 0
+
+        with self._lock:
+            self._apply_log_rows(rows)
+        return len(rows)
+
+    def _apply_log_rows(self, rows: List[tuple]):
+        # รวบ log ให้เหลือสถานะสุดท้ายของแต่ละ id ก่อน แล้วลบ/เพิ่มทีเดียว (remove_ids บน Flat เป็น O(n))
+        latest: Dict[int, Optional[bytes]] = {}
+        for _, memory_id, op, vector in rows:
+            latest[memory_id] = vector if op == LOG_OP_UPSERT else None
+
+        upserts = {memory_id: vector for memory_id, vector in latest.items() if vector is not None}
+        if self.index is None:
+            if not upserts:
+                self.applied_seq = rows[-1][0]
+                return
+            dim = len(next(iter(upserts.values()))) // np.dtype("float32").itemsize
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+        touched_ids = np.fromiter(latest.keys(), dtype="int64")
+        self.index.remove_ids(faiss.IDSelectorBatch(touched_ids))
+        if upserts:
+            ids = np.fromiter(upserts.keys(), dtype="int64")
+            vectors = np.vstack([np.frombuffer(v, dtype="float32") for v in upserts.values()])
+            self.index.add_with_ids(vectors, ids)
+        self.applied_seq = rows[-1][0]
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Dict]:
+        """ค้นหาด้วยเวกเตอร์ (normalize แล้ว) แล้วดึงแถวความทรงจำจาก SQLite ตาม id"""
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return []
+            scores, ids = self.index.search(np.asarray(query_vector, dtype="float32"), k)
+
+        hits = [(int(memory_id), float(score)) for memory_id, score in zip(ids[0], scores[0]) if memory_id >= 0]
+        if not hits:
+            return []
+        rows = self.get_memories([memory_id for memory_id, _ in hits])
+        results = []
+        for memory_id, score in hits:
+            # แถวที่ถูกลบไปแล้วแต่ log ยังไม่ถูก replay จะหายไปเอง
+            if memory_id in rows:
+                item = rows[memory_id]
+                item["score"] = score
+                results.append(item)
+        return results
+
+    def get_memories(self, memory_ids: Sequence[int]) -> Dict[int, Dict]:
+        if not memory_ids:
+            return {}
+        placeholders = ",".join("?" * len(memory_ids))
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                f"SELECT * FROM long_term_memories WHERE session_id = ? AND id IN ({placeholders})",
+                [self.session_id, *memory_ids]
+            ).fetchall()
+        return {row["id"]: dict(row) for row in rows}
+
+    # ------------------------------------------------------------------
+    # Write side (manage_memory.py)
+    # ------------------------------------------------------------------
+
+    def pending_log_size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM memory_vector_log WHERE session_id = ? AND seq > ?", (self.session_id, self.base_seq)
+            ).fetchone()[0]
+
+    def compact(self):
+        """
+        รวม log ทั้งหมดเข้าไฟล์ฐาน (แทนการเขียน index ใหม่ทั้งก้อนทุกครั้ง)
+        เขียน index ก่อน meta; ถ้าตายกลางทาง การ replay log ซ้ำจะให้ผลเหมือนเดิม (idempotent)
+        """
+        self.refresh()
+        with self._lock:
+            if self.index is None:
+                return
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp_index_path = self.index_path + ".tmp"
+            faiss.write_index(self.index, tmp_index_path)
+            os.replace(tmp_index_path, self.index_path)
+            self._write_meta(self.applied_seq)
+            self.base_seq = self.applied_seq
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM memory_vector_log WHERE session_id = ? AND seq <= ?", (self.session_id, self.base_seq))
+            conn.commit()
+        print(f"🗜️  Memory Index [{self.session_id}]: Compacted {self.ntotal} vectors (log applied up to seq {self.base_seq}).")
+
+    def current_log_seq(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM memory_vector_log WHERE session_id = ?", (self.session_id,)
+            ).fetchone()[0]
+
+    def rebuild(self, memory_ids: Sequence[int], vectors: np.ndarray, snapshot_seq: int):
+        """
+        สร้างไฟล์ฐานใหม่จากเวกเตอร์ที่ให้มา ซึ่งต้องอ่านจาก DB หลังจากจด snapshot_seq (current_log_seq)
+        log หลัง snapshot_seq จะถูก replay ต่อ จึงไม่หายแม้ daemon กำลังเขียนอยู่
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+        if len(memory_ids):
+            index.add_with_ids(vectors, np.asarray(memory_ids, dtype="int64"))
+        max_seq = snapshot_seq
+
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp_index_path = self.index_path + ".tmp"
+            faiss.write_index(index, tmp_index_path)
+            os.replace(tmp_index_path, self.index_path)
+            self._write_meta(max_seq)
+            self.index, self.base_seq, self.applied_seq = index, max_seq, max_seq
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM memory_vector_log WHERE session_id = ? AND seq <= ?", (self.session_id, max_seq))
+            conn.commit()
+        self.refresh()
+        print(f"🏭 Memory Index [{self.session_id}]: Rebuilt with {self.ntotal} vectors.")
+
+    def _write_meta(self, applied_seq: int):
+        tmp_meta_path = self.meta_path + ".tmp"
+        with open(tmp_meta_path, "w", encoding="utf-8") as f:
+            json.dump({"applied_seq": applied_seq}, f)
+        os.replace(tmp_meta_path, self.meta_path)
+
+
+class MemoryIndexShards:
+    """
+    คลัง shard แบบ lazy: โหลด index ของ session เมื่อถูกขอครั้งแรก
+    และเก็บไว้ในหน่วยความจำไม่เกิน max_loaded shard (ไล่ตัวที่ไม่ได้ใช้นานสุดออกก่อน)
+    """
+
+    def __init__(self, db_path: str = "data/memory.db", root_dir: str = "data/memory_index", max_loaded: int = 32):
+        self.db_path = db_path
+        self.root_dir = root_dir
+        self.max_loaded = max(1, max_loaded)
+        self._shards: "OrderedDict[str, MemoryVectorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            ensure_vector_log_schema(conn.cursor())
+
+    def get(self, session_id: str) -> MemoryVectorIndex:
+        with self._lock:
+            shard = self._shards.get(session_id)
+            if shard is not None:
+                self._shards.move_to_end(session_id)
+                return shard
+
+        # โหลดนอก lock เพื่อไม่ให้ session อื่นต้องรอ I/O
+        shard = MemoryVectorIndex(session_id, db_path=self.db_path, root_dir=self.root_dir)
+        shard.load()
+
+        with self._lock:
+            existing = self._shards.get(session_id)
+            if existing is not None:
+                self._shards.move_to_end(session_id)
+                return existing
+            self._shards[session_id] = shard
+            while len(self._shards) > self.max_loaded:
+                evicted_id, _ = self._shards.popitem(last=False)
+                print(f"♻️  Memory Index: Evicted shard '{evicted_id}' (LRU).")
+        return shard
+
+    def loaded(self) -> List[MemoryVectorIndex]:
+        with self._lock:
+            return list(self._shards.values())
+
+    def refresh_loaded(self) -> int:
+        """replay log ใหม่ให้ทุก shard ที่อยู่ในหน่วยความจำ (shard ที่ยังไม่โหลดจะอ่านสถานะล่าสุดเองตอนโหลด)"""
+        return sum(shard.refresh() for shard in self.loaded())
@@ -1,5 +1,5 @@
 # core/memory_manager.py
-# (V17.0 - Transplanted & Robust)
+# (V18.2 - LIKE Fallback for Short Search Terms)
 
 import sqlite3
 import datetime
@@ -7,8 +7,24 @@ import time
 import re
 from typing import List, Dict, Optional, Any
 
+from core.tracing import traced
+
 DEFAULT_HISTORY_LIMIT = 15
 PENDING_TASK_TIMEOUT_SECONDS = 300
+DEFAULT_SEARCH_LIMIT = 10
+# คำที่พบบ่อยอาจตรงกับหลายแสนแถว การคำนวณ bm25 ทั้งหมดจะช้า จึงจัดอันดับเฉพาะผลลัพธ์ล่าสุดจำนวนนี้
+SEARCH_CANDIDATE_LIMIT = 500
+# [V18.2] tokenizer 'trigram' หาคำที่สั้นกว่า 3 ตัวอักษรไม่เจอ (คำไทยสั้นๆ พบบ่อย) คำค้นที่สั้นกว่านี้ใช้ LIKE แทน
+TRIGRAM_MIN_CHARS = 3
+# ความยาว (ตัวอักษร) ของข้อความรอบคำที่ตรงกันใน snippet ของการค้นแบบ LIKE
+LIKE_SNIPPET_CHARS = 32
+
+# [V18] ตาราง FTS5 แบบ external-content ที่ผูกกับตารางต้นทางผ่าน trigger
+# ใช้ rowid ของตารางต้นทางเสมอ (archived_conversations ที่สร้างโดย manage_memory.py ไม่ได้ใช้ id เป็น rowid)
+FTS_SOURCE_TABLES = {
+    "conversation_history_fts": "conversation_history",
+    "archived_conversations_fts": "archived_conversations",
+}
 
 class MemoryManager:
     def __init__(self, db_path: str = "data/memory.db"):
@@ -16,6 +32,7 @@ class MemoryManager:
         self._init_db()
         self.pending_tasks: Dict[str, Any] = {}
         self._init_extra_tables() 
+        self._init_fts_tables()
 
     def _init_db(self):
         try:
@@ -78,6 +95,66 @@ class MemoryManager:
             print(f"❌ Error initializing extra tables: {e}")
 
 
+    def _init_fts_tables(self):
+        """
+        [V18] สร้างดัชนี Full-Text (FTS5) ให้ทั้งบทสนทนาปัจจุบันและที่ถูก archive แล้ว
+        พร้อม trigger ที่ทำให้ดัชนีตรงกับตารางต้นทางเสมอ
+        ใช้ tokenizer 'trigram' เพราะภาษาไทยไม่มีการเว้นวรรคระหว่างคำ (ค้นหาแบบ substring ได้)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                for fts_table, source_table in FTS_SOURCE_TABLES.items():
+                    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,))
+                    is_new = cursor.fetchone() is None
+
+                    if is_new:
+                        try:
+                            cursor.execute(f"""
+                                CREATE VIRTUAL TABLE {fts_table} USING fts5(
+                                    content, session_id UNINDEXED, role UNINDEXED, timestamp UNINDEXED,
+                                    content='{source_table}', tokenize='trigram'
+                                )
+                            """)
+                        except sqlite3.OperationalError:
+                            print(f"🟡 SQLite build has no 'trigram' tokenizer. Falling back to 'unicode61' for {fts_table}.")
+                            cursor.execute(f"""
+                                CREATE VIRTUAL TABLE {fts_table} USING fts5(
+                                    content, session_id UNINDEXED, role UNINDEXED, timestamp UNINDEXED,
+                                    content='{source_table}'
+                                )
+                            """)
+
+                    cursor.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source_table} BEGIN
+                            INSERT INTO {fts_table}(rowid, content, session_id, role, timestamp)
+                            VALUES (new.rowid, new.content, new.session_id, new.role, new.timestamp);
+                        END
+                    """)
+                    cursor.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source_table} BEGIN
+                            INSERT INTO {fts_table}({fts_table}, rowid, content, session_id, role, timestamp)
+                            VALUES ('delete', old.rowid, old.content, old.session_id, old.role, old.timestamp);
+                        END
+                    """)
+                    cursor.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {source_table} BEGIN
+                            INSERT INTO {fts_table}({fts_table}, rowid, content, session_id, role, timestamp)
+                            VALUES ('delete', old.rowid, old.content, old.session_id, old.role, old.timestamp);
+                            INSERT INTO {fts_table}(rowid, content, session_id, role, timestamp)
+                            VALUES (new.rowid, new.content, new.session_id, new.role, new.timestamp);
+                        END
+                    """)
+
+                    if is_new:
+                        # ข้อมูลที่มีอยู่ก่อนสร้างดัชนีจะถูกสร้างดัชนีย้อนหลังเพียงครั้งเดียว
+                        cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+                        print(f"🗄️  Built full-text index '{fts_table}' from '{source_table}'.")
+            print("🗄️  Verified full-text search (FTS5) indexes successfully.")
+        except Exception as e:
+            print(f"❌ Error initializing FTS5 tables: {e}")
+
+    @traced("sqlite.add_memory")
     def add_memory(self, role: str, content: str, session_id: str = "default_user", agent_used: Optional[str] = None):
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -90,6 +167,7 @@ class MemoryManager:
         except Exception as e:
             print(f"❌ Could not save memory: {e}")
 
+    @traced("sqlite.get_last_n_memories")
     def get_last_n_memories(self, n: int = DEFAULT_HISTORY_LIMIT, session_id: str = "default_user") -> List[Dict]:
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -113,6 +191,7 @@ class MemoryManager:
             "timestamp": time.time()
         }
 
+    @traced("sqlite.check_and_clear_pending_deep_dive")
     def check_and_clear_pending_deep_dive(self, session_id: str, user_confirmation: str) -> Optional[str]:
         pending = self.pending_tasks.get(session_id)
         if not pending or pending.get("type") != "DEEP_DIVE_CONFIRMATION":
@@ -130,6 +209,7 @@ class MemoryManager:
         del self.pending_tasks[session_id]
         return None
 
+    @traced("sqlite.get_last_user_query")
     def get_last_user_query(self, session_id: str = "default_user") -> str:
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -193,6 +273,7 @@ class MemoryManager:
             print(f"❌ Could not retrieve first user memory: {e}")
             return None
 
+    @traced("sqlite.get_conversation_stats")
     def get_conversation_stats(self, session_id: str = "default_user") -> Dict:
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -222,6 +303,7 @@ class MemoryManager:
             print(f"❌ Could not retrieve conversation stats: {e}")
             return {"error": str(e)}
 
+    @traced("sqlite.get_last_session_summary")
     def get_last_session_summary(self, session_id: str = "default_user", hours_ago: int = 24) -> List[Dict]:
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -241,6 +323,105 @@ class MemoryManager:
             print(f"❌ Could not retrieve last session summary: {e}")
             return []
 
+    @traced("sqlite.search_conversations")
+    def search_conversations(self, session_id: str, text: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict]:
+        """
+        [V18] ค้นหาข้อความในประวัติการสนทนาทั้งหมด (ปัจจุบัน + archive) ด้วย FTS5
+        คืนผลลัพธ์ที่จัดอันดับด้วย bm25 (จากผู้สมัครล่าสุด SEARCH_CANDIDATE_LIMIT แถว) พร้อม snippet ที่ไฮไลต์คำที่ตรงกัน
+        [V18.2] คำค้นที่สั้นกว่า TRIGRAM_MIN_CHARS ใช้การสแกน LIKE (เรียงจากใหม่ไปเก่า) แทนการคืนผลว่าง
+        """
+        cleaned_text = (text or "").strip()
+        if not cleaned_text or limit <= 0:
+            return []
+        if len(cleaned_text) < TRIGRAM_MIN_CHARS:
+            return self._search_conversations_like(session_id, cleaned_text, limit)
+
+        # ห่อเป็น phrase query เพื่อไม่ให้อักขระพิเศษของผู้ใช้ถูกตีความเป็น syntax ของ FTS5
+        match_query = '"' + cleaned_text.replace('"', '""') + '"'
+        results = []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                for source, fts_table in (("live", "conversation_history_fts"), ("archived", "archived_conversations_fts")):
+                    # ขั้นที่ 1: จัดอันดับ bm25 เฉพาะผู้สมัครล่าสุด (rowid มากสุด) โดยยังไม่สร้าง snippet
+                    cursor.execute(
+                        f"""SELECT rowid, score FROM (
+                                SELECT rowid, bm25({fts_table}) AS score
+                                FROM {fts_table}
+                                WHERE {fts_table} MATCH ? AND session_id = ?
+                                ORDER BY rowid DESC
+                                LIMIT ?
+                            ) ORDER BY score LIMIT ?""",
+                        (match_query, session_id, SEARCH_CANDIDATE_LIMIT, limit)
+                    )
+                    scores = {row["rowid"]: row["score"] for row in cursor.fetchall()}
+                    if not scores:
+                        continue
+
+                    # ขั้นที่ 2: สร้าง snippet เฉพาะแถวที่ติดอันดับ
+                    placeholders = ",".join("?" * len(scores))
+                    cursor.execute(
+                        f"""SELECT rowid, role, timestamp,
+                                   snippet({fts_table}, 0, '**', '**', '…', 32) AS snippet
+                            FROM {fts_table}
+                            WHERE {fts_table} MATCH ? AND rowid IN ({placeholders})""",
+                        (match_query, *scores.keys())
+                    )
+                    for row in cursor.fetchall():
+                        item = dict(row)
+                        item["score"] = scores[item["rowid"]]
+                        item["source"] = source
+                        results.append(item)
+        except sqlite3.OperationalError as e:
+            print(f"❌ Could not search conversations: {e}")
+            return []
+
+        # bm25 ของ FTS5 ยิ่งติดลบมากยิ่งเกี่ยวข้องมาก
+        results.sort(key=lambda item: item["score"])
+        return results[:limit]
+
+    def _search_conversations_like(self, session_id: str, text: str, limit: int) -> List[Dict]:
+        """[V18.2] สแกน LIKE ของ session นี้ (ล่าสุดก่อน) สำหรับคำค้นที่สั้นเกินกว่า trigram จะหาเจอ คืนรูปแบบเดียวกับ search_conversations"""
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        results = []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                for source, table in (("live", "conversation_history"), ("archived", "archived_conversations")):
+                    cursor.execute(
+                        f"""SELECT rowid AS rowid, role, timestamp, content FROM {table}
+                            WHERE session_id = ? AND content LIKE ? ESCAPE '\\'
+                            ORDER BY rowid DESC LIMIT ?""",
+                        (session_id, pattern, limit)
+                    )
+                    for row in cursor.fetchall():
+                        item = dict(row)
+                        item["snippet"] = self._like_snippet(item.pop("content"), text)
+                        item["score"] = 0.0
+                        item["source"] = source
+                        results.append(item)
+        except sqlite3.OperationalError as e:
+            print(f"❌ Could not search conversations: {e}")
+            return []
+
+        # ไม่มีคะแนนความเกี่ยวข้อง เรียงจากใหม่ไปเก่า
+        results.sort(key=lambda item: str(item["timestamp"]), reverse=True)
+        return results[:limit]
+
+    @staticmethod
+    def _like_snippet(content: str, text: str) -> str:
+        """ข้อความรอบคำที่ตรงกัน ไฮไลต์ด้วย ** เหมือน snippet() ของ FTS5"""
+        start = content.lower().find(text.lower())
+        if start < 0:
+            return content[:LIKE_SNIPPET_CHARS * 2]
+        end = start + len(text)
+        left = max(0, start - LIKE_SNIPPET_CHARS)
+        right = min(len(content), end + LIKE_SNIPPET_CHARS)
+        return ("…" if left > 0 else "") + content[left:start] + "**" + content[start:end] + "**" + \
+            content[end:right] + ("…" if right < len(content) else "")
+
     def get_shown_image_ids(self, session_id: str = "default_user") -> List[str]:
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -0,0 +1,75 @@
+# core/memory_retriever.py
+# (V2.1 - Traced Retrieval)
+# จุดเดียวสำหรับค้นหาความทรงจำระยะยาว ใช้ร่วมกันทั้ง RAGEngine (PlannerAgent) และ GeneralConversationAgent
+# ใช้ embedder ตัวเดียวกับ RAGEngine (BGE-M3) ซึ่งตรงกับที่ manage_memory.py ใช้สร้าง index
+# [V2] ค้นหาเฉพาะ shard ของ session นั้น ต้นทุนจึงขึ้นกับประวัติของผู้ใช้คนนั้นเท่านั้น และไม่เห็นความทรงจำของคนอื่น
+
+import asyncio
+from typing import Dict, List, Optional
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from core.config import settings
+from core.memory_index import MemoryIndexShards, memory_embedding_text
+from core.tracing import traced
+
+
+class MemoryRetriever:
+    def __init__(self, embedder: Optional[SentenceTransformer] = None,
+                 index_dir: str = "data/memory_index",
+                 db_path: str = "data/memory.db",
+                 max_loaded_shards: int = settings.MEMORY_SHARD_CACHE_SIZE):
+        # embedder ถูกกำหนดภายหลังใน lifespan เมื่อโมเดลกลางโหลดเสร็จ (เหมือน RAGEngine)
+        self.embedder = embedder
+        self.index_dir = index_dir
+        self.db_path = db_path
+        self.max_loaded_shards = max_loaded_shards
+        self.shards: Optional[MemoryIndexShards] = None
+        print("🏛️  Memory Retriever (V2 - Per-Session Shards) is ready.")
+
+    @property
+    def is_ready(self) -> bool:
+        return self.embedder is not None and self.shards is not None
+
+    async def load(self):
+        """[V2] ไม่โหลด index ล่วงหน้า shard ของแต่ละ session จะถูกโหลดเมื่อถูกค้นหาครั้งแรก"""
+        try:
+            self.shards = await asyncio.to_thread(
+                MemoryIndexShards, self.db_path, self.index_dir, self.max_loaded_shards
+            )
+            print(f"✅ Memory Retriever: Ready (lazy shards, keeping up to {self.max_loaded_shards} in memory).")
+        except Exception as e:
+            print(f"❌ Memory Retriever: Could not open memory index store. Error: {e}")
+
+    async def refresh(self):
+        """ตามให้ทัน memory daemon: replay vector log ใหม่ให้ shard ที่โหลดอยู่"""
+        if not self.shards:
+            return
+        try:
+            applied = await asyncio.to_thread(self.shards.refresh_loaded)
+            print(f"🔄 Memory Retriever: Applied {applied} index changes to {len(self.shards.loaded())} loaded shards.")
+        except Exception as e:
+            print(f"⚠️ Memory Retriever: Could not refresh memory index. Error: {e}")
+
+    def _search_sync(self, query: str, k: int, session_id: str) -> List[Dict]:
+        shard = self.shards.get(session_id)
+        if shard.ntotal == 0:
+            return []
+        query_vector = self.embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+        results = shard.search(np.asarray(query_vector, dtype="float32"), k)
+        for item in results:
+            item["embedding_text"] = memory_embedding_text(item)
+        return results
+
+    @traced("memory.vector_search")
+    async def search(self, query: str, session_id: str, k: int = 5) -> List[Dict]:
+        """ค้นหาความทรงจำของ session_id ที่เกี่ยวข้อง k รายการ คืนแถวจาก long_term_memories พร้อม score"""
+        if not self.is_ready:
+            return []
+        print(f"🧠 Memory Retriever: Searching memories of '{session_id}' for '{query[:20]}...' (k={k})")
+        try:
+            return await asyncio.to_thread(self._search_sync, query, k, session_id)
+        except Exception as e:
+            print(f"❌ Memory Retriever: Error searching memories: {e}")
+            return []
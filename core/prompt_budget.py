@@ -0,0 +1,170 @@
+# core/prompt_budget.py
+# (V1.0 - Token-Aware Prompt Budgeter)
+# prompt ของ agent ประกอบด้วยการต่อ string ตรงๆ (chunk ของหนังสือ, ประวัติสนทนา, ข่าว, บทสรุปความทรงจำ) โดยไม่รู้ว่ายาวกี่ token
+# เทิร์นยาวจึงช้าและบางครั้งเกิน context ของโมเดล ที่นี่นับ token ตามตระกูลโมเดล แล้วตัด/ย่อแต่ละส่วนให้พอดีงบของ agent
+# (PROMPT_TOKEN_BUDGETS) โดยไม่แตะส่วนคงที่ของ template (คำสั่ง, persona, คำถาม)
+# - แต่ละส่วน (Section) เป็นรายการชิ้นย่อย ตัดชิ้นท้ายสุด (keep="head" เช่น chunk ที่เรียงตามคะแนน)
+#   หรือชิ้นแรกสุด (keep="tail" เช่นประวัติสนทนา ให้เหลือเทิร์นล่าสุด) ชิ้นที่ยาวเกิน max_item_tokens ถูกย่อก่อน
+# - งบแบ่งตาม share ของแต่ละส่วน ส่วนที่สั้นกว่าส่วนแบ่งของตัวเองยกงบที่เหลือให้ส่วนอื่น
+# token ที่ประหยัดได้ต่อ agent ดูได้ที่ /api/metrics
+
+from typing import Dict, List, Optional
+
+from core.config import settings
+from core.tracing import current_span
+
+# จำนวนตัวอักษรต่อ token โดยประมาณของ tokenizer แต่ละตระกูล: (ASCII, ตัวอักษรอื่น เช่นภาษาไทย)
+# ตัวอักษรไทยกิน token มากกว่าภาษาอังกฤษหลายเท่า การหารด้วยค่าเดียวทั้งข้อความจึงนับขาดไปมากในบทสนทนาภาษาไทย
+CHARS_PER_TOKEN_BY_FAMILY = {
+    "gemini": (4.0, 3.0),
+    "llama": (4.0, 2.0),
+}
+DEFAULT_CHARS_PER_TOKEN = (4.0, 2.0)
+# เหลือที่ว่างน้อยกว่านี้ไม่ย่อชิ้นถัดไปมาใส่ (ชิ้นที่ถูกตัดเหลือสั้นๆ ไม่มีประโยชน์ต่อคำตอบ)
+MIN_PARTIAL_ITEM_TOKENS = 64
+TRUNCATION_MARKER = " …(ตัดทอน)"
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """[V1] จำนวน token โดยประมาณของ text สำหรับ model (ไม่มี tokenizer จริงของ provider ให้ใช้แบบ offline)"""
+    if not text:
+        return 0
+    model = model.lower()
+    ascii_ratio, other_ratio = next(
+        (ratios for family, ratios in CHARS_PER_TOKEN_BY_FAMILY.items() if family in model), DEFAULT_CHARS_PER_TOKEN)
+    ascii_chars = sum(1 for char in text if char < "\x80")
+    return int(ascii_chars / ascii_ratio + (len(text) - ascii_chars) / other_ratio) + 1
+
+
+class Section:
+    """ส่วนหนึ่งของ prompt ที่ตัดได้ (ค่าที่แทน {name} ใน template)"""
+
+    def __init__(self, items: List[str], share: float = 1.0, keep: str = "head", separator: str = "\n",
+                 max_item_tokens: Optional[int] = None, prefix: str = "", empty_text: str = ""):
+        self.items = list(items)
+        self.share = share
+        self.keep = keep
+        self.separator = separator
+        self.max_item_tokens = max_item_tokens
+        self.prefix = prefix
+        self.empty_text = empty_text
+
+    def render(self, items: List[str]) -> str:
+        return self.prefix + self.separator.join(items) if items else self.empty_text
+
+
+class FittedPrompt:
+    __slots__ = ("text", "tokens", "tokens_saved", "kept")
+
+    def __init__(self, text: str, tokens: int, tokens_saved: int, kept: Dict[str, int]):
+        self.text = text
+        self.tokens = tokens
+        self.tokens_saved = tokens_saved
+        # จำนวนชิ้นที่เหลือของแต่ละส่วน (เช่น ใช้บอกว่า chunk ไหนอยู่ใน prompt จริง)
+        self.kept = kept
+
+
+class PromptBudgeter:
+    def __init__(self, budgets: Dict[str, int] = settings.PROMPT_TOKEN_BUDGETS):
+        self.budgets = budgets
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _stats_for(self, label: str) -> Dict[str, int]:
+        stats = self._stats.get(label)
+        if stats is None:
+            stats = self._stats[label] = {"prompts": 0, "trimmed_prompts": 0, "tokens_before": 0, "tokens_after": 0,
+                                          "tokens_saved": 0, "items_dropped": 0, "items_compressed": 0}
+        return stats
+
+    @staticmethod
+    def _truncate(text: str, tokens: int, max_tokens: int) -> str:
+        keep_chars = max(0, int(len(text) * max_tokens / max(tokens, 1)) - len(TRUNCATION_MARKER))
+        return text[:keep_chars].rstrip() + TRUNCATION_MARKER
+
+    @staticmethod
+    def _allocate(needs: Dict[str, int], shares: Dict[str, float], available: int) -> Dict[str, int]:
+        """แบ่ง available ตาม share ส่วนที่ต้องการน้อยกว่าส่วนแบ่งได้เท่าที่ต้องการ ที่เหลือแบ่งใหม่ให้ส่วนที่ยังไม่พอ"""
+        allocation = {name: 0 for name in needs}
+        hungry = {name for name, need in needs.items() if need > 0}
+        remaining = max(0, available)
+        while hungry:
+            total_share = sum(shares[name] for name in hungry) or 1.0
+            satisfied = {name for name in hungry if needs[name] <= remaining * shares[name] / total_share}
+            if not satisfied:
+                for name in hungry:
+                    allocation[name] = int(remaining * shares[name] / total_share)
+                break
+            for name in satisfied:
+                allocation[name] = needs[name]
+                remaining -= needs[name]
+            hungry -= satisfied
+        return allocation
+
+    def _fit_section(self, section: Section, items: List[str], allowance: int, model: str) -> List[str]:
+        ordered = items if section.keep == "head" else list(reversed(items))
+        separator_tokens = count_tokens(section.separator, model)
+        used = count_tokens(section.prefix, model)
+        kept: List[str] = []
+        for item in ordered:
+            item_tokens = count_tokens(item, model)
+            cost = item_tokens + (separator_tokens if kept else 0)
+            if used + cost <= allowance:
+                kept.append(item)
+                used += cost
+                continue
+            room = allowance - used - (separator_tokens if kept else 0)
+            if room >= MIN_PARTIAL_ITEM_TOKENS:
+                kept.append(self._truncate(item, item_tokens, room))
+            break
+        return kept if section.keep == "head" else list(reversed(kept))
+
+    def fit(self, label: str, model: str, template: str, sections: Dict[str, Section], **fixed: str) -> FittedPrompt:
+        """
+        [V1] template.format(**fixed, **ส่วนที่ตัดแล้ว) ให้ทั้ง prompt ไม่เกินงบของ label
+        label ที่ไม่มีงบใน PROMPT_TOKEN_BUDGETS ได้ prompt เต็ม (นับ token อย่างเดียว)
+        """
+        stats = self._stats_for(label)
+        stats["prompts"] += 1
+        full_text = template.format(**fixed, **{name: section.render(section.items) for name, section in sections.items()})
+        full_tokens = count_tokens(full_text, model)
+        budget = self.budgets.get(label)
+        fitted = FittedPrompt(full_text, full_tokens, 0, {name: len(section.items) for name, section in sections.items()})
+
+        if budget and full_tokens > budget:
+            compressed: Dict[str, List[str]] = {}
+            for name, section in sections.items():
+                items = []
+                for item in section.items:
+                    item_tokens = count_tokens(item, model)
+                    if section.max_item_tokens and item_tokens > section.max_item_tokens:
+                        item = self._truncate(item, item_tokens, section.max_item_tokens)
+                        stats["items_compressed"] += 1
+                    items.append(item)
+                compressed[name] = items
+            # ส่วนคงที่ = template ที่ทุกส่วนว่าง (ข้อความ empty_text ของแต่ละส่วนถูกนับเป็นส่วนคงที่ด้วย)
+            fixed_tokens = count_tokens(template.format(**fixed, **{name: section.empty_text for name, section in sections.items()}), model)
+            needs = {name: count_tokens(section.render(compressed[name]), model) for name, section in sections.items()}
+            allocation = self._allocate(needs, {name: section.share for name, section in sections.items()}, budget - fixed_tokens)
+            kept = {name: self._fit_section(section, compressed[name], allocation[name], model) for name, section in sections.items()}
+            text = template.format(**fixed, **{name: section.render(kept[name]) for name, section in sections.items()})
+            tokens = count_tokens(text, model)
+            fitted = FittedPrompt(text, tokens, full_tokens - tokens, {name: len(items) for name, items in kept.items()})
+            stats["trimmed_prompts"] += 1
+            stats["items_dropped"] += sum(len(section.items) - len(kept[name]) for name, section in sections.items())
+            print(f"✂️  Prompt Budget: {label} prompt trimmed {full_tokens} -> {tokens} tokens (budget {budget}).")
+
+        stats["tokens_before"] += full_tokens
+        stats["tokens_after"] += fitted.tokens
+        stats["tokens_saved"] += fitted.tokens_saved
+        active = current_span()
+        if active:
+            active.set_attribute("prompt_tokens", fitted.tokens)
+            if fitted.tokens_saved:
+                active.set_attribute("prompt_tokens_saved", fitted.tokens_saved)
+        return fitted
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        return {label: {**stats, "budget": self.budgets.get(label)} for label, stats in self._stats.items()}
+
+
+prompt_budgeter = PromptBudgeter()
@@ -1,19 +1,36 @@
-# (V32.1 - Async Startup & BGE-M3 Ready)
+# (V34.5 - Warm-Cache Keys on Normalized Queries)
 
 import faiss
 import json
 import os
 from sentence_transformers import SentenceTransformer, CrossEncoder
 import torch
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 import asyncio
+import time
+from collections import OrderedDict, defaultdict
+
+from core.memory_retriever import MemoryRetriever
+from core.tracing import span, traced
+from core.deadline import SKIP_RERANK, should_degrade
+
+# [V34] ผลลัพธ์ที่ค้นไว้ล่วงหน้า (embedding / candidate หนังสือ / กราฟ) เก็บแบบ LRU + TTL
+WARM_CACHE_SIZE = 128
+WARM_CACHE_TTL_SECONDS = 120
+# prefetch กราฟด้วย top_k สูงสุดที่ agent ใช้ แล้วตัดให้เหลือตามที่แต่ละ agent ขอ (Flat index จึงได้ลำดับเดียวกัน)
+PREFETCH_GRAPH_TOP_K = 5
+
+
+def _normalize_query(query: str) -> str:
+    """[V34.5] key ของ warm cache: คำถามที่ต่างกันแค่ช่องว่าง (เช่นคำถามดิบกับ corrected_query ที่ Feng ไม่ได้แก้) ใช้ผลเดียวกัน"""
+    return " ".join(query.split())
 
 class RAGEngine:
     def __init__(self, 
                  embedder: SentenceTransformer, 
                  reranker: CrossEncoder,
                  book_index_path: str = "data/index",
-                 memory_index_path: str = "data/memory_index",
+                 memory_retriever: Optional[MemoryRetriever] = None,
                  graph_index_path: str = "data/graph_index",
                  news_index_path: str = "data/news_index"):
         
@@ -23,30 +40,55 @@ class RAGEngine:
         self.reranker = reranker
         
         self.book_index_path = book_index_path
-        self.memory_index_path = memory_index_path
         self.graph_index_path = graph_index_path
         self.news_index_path = news_index_path
         
         self.book_indexes, self.book_mappings, self.available_categories = {}, {}, []
-        self.memory_index, self.memory_mapping = None, None
+        # [V33] ความทรงจำถูกโหลดครั้งเดียวโดย MemoryRetriever ที่ใช้ร่วมกับ GeneralConversationAgent
+        self.memory_retriever = memory_retriever
         self.graph_index, self.graph_mapping = None, None
         self.news_index, self.news_mapping = None, None
 
+        # [V34] key -> (หมดอายุเมื่อ, future) ใช้ร่วมกันระหว่าง prefetch และ agent ที่มาค้นหาจริง
+        self._warm_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # [V34.4] ต่อชนิด (embedding/book/graph): hit/miss ของ agent และจำนวนผล prefetch ที่ agent ได้ใช้จริง
+        self._warm_stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "prefetched": 0, "prefetch_consumed": 0})
+        # [V34.2] ผู้ที่ต้องรู้เมื่อ index ถูกโหลดใหม่ (เช่น AnswerCache ของ Dispatcher)
+        self.index_generation = 0
+        self._reload_listeners: List[Callable[[], None]] = []
+
+    def add_reload_listener(self, listener: Callable[[], None]):
+        self._reload_listeners.append(listener)
+
+    def index_signature(self) -> tuple:
+        """[V34.2] เวลาแก้ไขล่าสุดของไฟล์ index หนังสือ/กราฟ/ข่าว ใช้ตรวจว่ามีการสร้าง index ใหม่บนดิสก์"""
+        paths = [os.path.join(self.graph_index_path, "graph_faiss.index"),
+                 os.path.join(self.news_index_path, "news_faiss.index")]
+        if os.path.isdir(self.book_index_path):
+            paths += [os.path.join(self.book_index_path, cat, "faiss.index") for cat in sorted(os.listdir(self.book_index_path))]
+        return tuple((path, os.path.getmtime(path)) for path in paths if os.path.exists(path))
+
     async def load_models_and_index(self):
-        """[V32] โหลด Index ทั้ง 4 (แบบ Async) เพื่อไม่ให้บล็อก 'lifespan'"""
+        """[V33] โหลด Index หนังสือ, กราฟ และข่าว (แบบ Async) ส่วนความทรงจำโหลดโดย MemoryRetriever"""
         
         print("    - 📚 [V32] Loading Book Knowledge Bases (Async)...")
         await asyncio.to_thread(self._load_book_indexes, self.book_index_path)
         
-        print("    - 🧠 [V32] Loading Memory Knowledge Base (Async)...")
-        await asyncio.to_thread(self._load_memory_index, self.memory_index_path)
-        
         print("    - 🕸️  [V32] Loading Knowledge Graph Vector Base (Async)...")
         await asyncio.to_thread(self._load_graph_index, self.graph_index_path)
         
         print("    - 📰 [V32] Loading News Vector Base (Async)...")
         await asyncio.to_thread(self._load_news_index, self.news_index_path)
         
+        # [V34.2] ผลค้นหาที่อุ่นไว้และคำตอบที่แคชไว้อ้างอิง index ชุดเก่า
+        self._warm_cache.clear()
+        self.index_generation += 1
+        for listener in self._reload_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"⚠️ RAG Engine: Reload listener failed. Error: {e}")
         print("✅ [V32.1] Unified RAG Engine (Async + BGE-M3) is fully loaded and ready.")
 
     def _load_book_indexes(self, base_path: str):
@@ -54,6 +96,8 @@ class RAGEngine:
         if not os.path.exists(base_path): 
             print("            - 🟡 ไม่พบหมวดหมู่หนังสือที่สามารถโหลดได้")
             return
+        # [V34.2] สร้างชุดใหม่แล้วสลับทีเดียว ให้การโหลดซ้ำ (reload) ไม่ทำให้หมวดหมู่ซ้ำหรือเห็นข้อมูลครึ่งๆ กลางๆ
+        book_indexes, available_categories = {}, []
         for category_name in os.listdir(base_path):
             category_path = os.path.join(base_path, category_name)
             if os.path.isdir(category_path):
@@ -63,29 +107,13 @@ class RAGEngine:
                     if not os.path.exists(index_path) or not os.path.exists(mapping_path): continue
                     index = faiss.read_index(index_path)
                     mapping = {str(i): json.loads(line) for i, line in enumerate(open(mapping_path, "r", encoding="utf-8"))}
-                    self.book_indexes[category_name] = {"index": index, "mapping": mapping}
-                    self.available_categories.append(category_name)
+                    book_indexes[category_name] = {"index": index, "mapping": mapping}
+                    available_categories.append(category_name)
                 except Exception as e:
                     print(f"            - ❌ Error loading book index for '{category_name}': {e}")
-        self.available_categories.sort()
+        self.book_indexes, self.available_categories = book_indexes, sorted(available_categories)
         print(f"            - ✅ ความรู้หนังสือ {len(self.available_categories)} หมวดหมู่ พร้อมใช้งาน")
 
-    def _load_memory_index(self, path: str):
-        print("        - [V32] Loading Memory Knowledge Base (FAISS on CPU)...")
-        if not os.path.exists(path):
-            print(f"            - 🟡 Memory RAG index path not found: '{path}'.")
-            return
-        try:
-            faiss_path = os.path.join(path, "memory_faiss.index") 
-            mapping_path = os.path.join(path, "memory_mapping.json")
-            if not os.path.exists(faiss_path) or not os.path.exists(mapping_path): return
-            self.memory_index = faiss.read_index(faiss_path)
-            with open(mapping_path, "r", encoding="utf-8") as f:
-                self.memory_mapping = list(json.load(f).values())
-            print(f"            - ✅ สมองส่วนความทรงจำ {len(self.memory_mapping)} ตื่น!!")
-        except Exception as e:
-            print(f"            - ❌ Critical error loading memory index: {e}")
-
     def _load_graph_index(self, path: str):
         print("        - [V32] Loading Knowledge Graph Vector Base (FAISS on CPU)...")
         if not os.path.exists(path):
@@ -118,6 +146,108 @@ class RAGEngine:
         except Exception as e:
             print(f"            - ❌ Critical error loading news index: {e}")
 
+    async def _warm(self, key: tuple, factory: Callable[[], Awaitable[Any]], prefetch: bool = False) -> Any:
+        """
+        [V34] คืนผลจาก cache ถ้ามี (รวมถึงงานที่กำลังทำอยู่) ไม่เช่นนั้นเริ่มงานใหม่และเก็บไว้ให้คนถัดไป
+        [V34.4] ทุกคน (รวม prefetch) await แบบ shield: การยกเลิกของผู้รอคนหนึ่งแค่ถอนตัว ไม่ยกเลิกงานที่คนอื่นรอร่วมอยู่
+        prefetch = เรียกจาก start_prefetch (นับแยกว่าผลที่อุ่นไว้ถูกใช้จริงหรือไม่)
+        """
+        now = time.monotonic()
+        stats = self._warm_stats[key[0]]
+        entry = self._warm_cache.get(key)
+        if entry:
+            expires_at, future, origin = entry
+            if expires_at > now and not future.cancelled() and not (future.done() and future.exception()):
+                self._warm_cache.move_to_end(key)
+                if not prefetch:
+                    stats["hits"] += 1
+                    if origin == "prefetch":
+                        # นับครั้งแรกที่ agent ใช้ผลของ prefetch
+                        stats["prefetch_consumed"] += 1
+                        self._warm_cache[key] = (expires_at, future, "consumed")
+                return await asyncio.shield(future)
+            self._warm_cache.pop(key, None)
+
+        if prefetch:
+            stats["prefetched"] += 1
+        else:
+            stats["misses"] += 1
+        future = asyncio.ensure_future(factory())
+        self._warm_cache[key] = (now + WARM_CACHE_TTL_SECONDS, future, "prefetch" if prefetch else "search")
+        while len(self._warm_cache) > WARM_CACHE_SIZE:
+            self._warm_cache.popitem(last=False)
+        return await asyncio.shield(future)
+
+    async def _encode_query(self, query: str, prefetch: bool = False):
+        query = _normalize_query(query)
+        return await self._warm(
+            ("embedding", query),
+            lambda: asyncio.to_thread(self.embedder.encode, [query], convert_to_numpy=True),
+            prefetch=prefetch
+        )
+
+    async def encode_query(self, query: str):
+        """[V34] embedding ของคำถาม ใช้ warm cache ร่วมกับ prefetch (เช่น IntentClassifier ระหว่าง triage)"""
+        return await self._encode_query(query)
+
+    async def _book_candidates(self, query: str, category: str, top_k_retrieval: int) -> List[Dict]:
+        query = _normalize_query(query)
+
+        async def _search():
+            query_vector = await self._encode_query(query)
+            data = self.book_indexes[category]
+            _, indices = await asyncio.to_thread(data["index"].search, query_vector, top_k_retrieval)
+            return [dict(item, category=category) for i in indices[0] if (item := data["mapping"].get(str(i)))]
+
+        return await self._warm(("book", query, category, top_k_retrieval), _search)
+
+    async def _graph_candidates(self, query: str, top_k: int, prefetch: bool = False) -> List[Dict]:
+        query = _normalize_query(query)
+
+        async def _search():
+            query_vector = await self._encode_query(query, prefetch=prefetch)
+            distances, indices = await asyncio.to_thread(self.graph_index.search, query_vector, top_k)
+            results, found_ids = [], set()
+            for dist, i in zip(distances[0], indices[0]):
+                if item := self.graph_mapping.get(str(i)):
+                    item_copy = item.copy()
+                    item_id = item_copy.get('id')
+                    if item_id not in found_ids:
+                        item_copy['score'] = float(dist)
+                        results.append(item_copy)
+                        found_ids.add(item_id)
+            return results
+
+        return await self._warm(("graph", query, top_k), _search, prefetch=prefetch)
+
+    def start_prefetch(self, query: str) -> Optional[asyncio.Task]:
+        """
+        [V34] เริ่มค้นหาล่วงหน้าสำหรับคำถามดิบ (embedding + กราฟ)
+        ระหว่างที่ FengAgent กำลังวิเคราะห์เจตนา agent ที่ถูกเลือกจะได้ผลที่อุ่นไว้แล้ว
+        คืน Task ที่ Dispatcher ยกเลิกได้ถ้าเจตนาไม่ต้องใช้การค้นหา
+        [V34.4] ไม่ prefetch หนังสือแล้ว: ผู้ค้นหนังสือคนเดียวคือ Planner ซึ่งค้นด้วย sub_queries จาก LLM (ไม่เคยตรง key)
+        [V34.5] ถ้า FengAgent แก้คำถาม Dispatcher เรียกซ้ำด้วย corrected_query (agent ค้นด้วยคำถามที่แก้แล้วเสมอ)
+        """
+        if self.embedder is None or not query:
+            return None
+
+        @traced("rag.prefetch")
+        async def _prefetch():
+            started = time.perf_counter()
+            try:
+                jobs = [self._encode_query(query, prefetch=True)]
+                if self.graph_index and self.graph_mapping:
+                    jobs.append(self._graph_candidates(query, PREFETCH_GRAPH_TOP_K, prefetch=True))
+                await asyncio.gather(*jobs)
+                print(f"🔥 RAG Prefetch: Warmed {len(jobs)} retrievals in {time.perf_counter() - started:.2f}s.")
+            except asyncio.CancelledError:
+                print("🧊 RAG Prefetch: Abandoned (intent does not need retrieval).")
+                raise
+            except Exception as e:
+                print(f"⚠️ RAG Prefetch: Failed ({e}). Agents will search normally.")
+
+        return asyncio.create_task(_prefetch())
+
     async def get_all_book_titles(self) -> list:
         
         def _blocking_get_titles():
@@ -131,6 +261,7 @@ class RAGEngine:
         titles = await asyncio.to_thread(_blocking_get_titles)
         return titles
 
+    @traced("rag.search_books")
     async def search_books(self, query: str, top_k_retrieval: int = 5, top_k_rerank: int = 5,
                            return_raw_chunks: bool = False, 
                            target_categories: Optional[List[str]] = None) -> Dict[str, Any]:
@@ -139,30 +270,26 @@ class RAGEngine:
         if not search_scope: search_scope = self.book_indexes
         
         try:
-            query_vector = await asyncio.to_thread(
-                self.embedder.encode, [query], convert_to_numpy=True
-            )
-
-            def _blocking_faiss_search():
-                candidates = []
-                for category, data in search_scope.items():
-                    distances, indices = data["index"].search(query_vector, top_k_retrieval)
-                    for i in indices[0]:
-                        if item := data["mapping"].get(str(i)):
-                            item['category'] = category 
-                            candidates.append(item)
-                return candidates
-
-            all_candidates = await asyncio.to_thread(_blocking_faiss_search)
+            # [V34] candidate ต่อหมวดผ่าน warm cache (อาจถูก prefetch ไว้แล้วระหว่างวิเคราะห์เจตนา)
+            candidate_lists = await asyncio.gather(*[
+                self._book_candidates(query, category, top_k_retrieval) for category in search_scope
+            ])
+            all_candidates = [item for candidates in candidate_lists for item in candidates]
             
             if not all_candidates: return {"context": "", "sources": [], "raw_chunks": []}
             
             unique_candidates = list({item['embedding_text']: item for item in all_candidates}.values())
+
+            # [V34.3] เวลา/โหลดตึงตัว: ข้าม cross-encoder ใช้ลำดับจาก vector search (สลับหมวดทีละอันดับ) แทน
+            if should_degrade(SKIP_RERANK):
+                return self._unranked_result(candidate_lists, top_k_rerank, return_raw_chunks)
+
             sentence_pairs = [[query, item.get('embedding_text', '')] for item in unique_candidates]
             
-            scores = await asyncio.to_thread(
-                self.reranker.predict, sentence_pairs
-            )
+            with span("rag.rerank", pairs=len(sentence_pairs)):
+                scores = await asyncio.to_thread(
+                    self.reranker.predict, sentence_pairs
+                )
             
             reranked_results = sorted(zip(scores, unique_candidates), key=lambda x: x[0], reverse=True)
             top_results = reranked_results[:top_k_rerank]
@@ -183,51 +310,43 @@ class RAGEngine:
             print(f"❌ Error during async search_books: {e}")
             return {"context": "", "sources": [], "raw_chunks": []}
 
-    async def search_memory(self, query: str, top_k: int = 5) -> List[Dict]:
-        if not self.memory_index or not self.memory_mapping: return []
-        
-        query_vector = await asyncio.to_thread(
-            self.embedder.encode, [query], convert_to_numpy=True
-        )
-        distances, indices = await asyncio.to_thread(
-            self.memory_index.search, query_vector, top_k
-        )
-        
-        results = []
-        for dist, i in zip(distances[0], indices[0]):
-            if i < len(self.memory_mapping):
-                item = self.memory_mapping[i].copy()
-                item['score'] = float(dist)
-                results.append(item)
-        return results
+    def _unranked_result(self, candidate_lists: List[List[Dict]], top_k: int, return_raw_chunks: bool) -> Dict[str, Any]:
+        selected, seen = [], set()
+        for rank in range(max((len(c) for c in candidate_lists), default=0)):
+            for candidates in candidate_lists:
+                if rank < len(candidates) and candidates[rank]['embedding_text'] not in seen:
+                    seen.add(candidates[rank]['embedding_text'])
+                    selected.append(candidates[rank])
+        selected = selected[:top_k]
+        result = {
+            "context": "\n\n---\n\n".join(item.get("embedding_text", "") for item in selected),
+            "sources": sorted(set(item.get("book_title") for item in selected if item.get("book_title"))),
+        }
+        if return_raw_chunks:
+            result["raw_chunks"] = [dict(item) for item in selected]
+        return result
+
+    async def search_memory(self, query: str, session_id: str, top_k: int = 5) -> List[Dict]:
+        """[V33] ส่งต่อไปยัง MemoryRetriever กลาง ค้นหาเฉพาะความทรงจำของ session_id"""
+        if not self.memory_retriever: return []
+        return await self.memory_retriever.search(query, session_id=session_id, k=top_k)
 
+    @traced("rag.search_graph")
     async def search_graph(self, query: str, top_k: int = 3) -> List[Dict]:
         if not self.graph_index or not self.graph_mapping: return []
         
-        query_vector = await asyncio.to_thread(
-            self.embedder.encode, [query], convert_to_numpy=True
-        )
-        distances, indices = await asyncio.to_thread(
-            self.graph_index.search, query_vector, top_k
-        )
-        
-        results, found_ids = [], set()
-        for dist, i in zip(distances[0], indices[0]):
-            if item := self.graph_mapping.get(str(i)):
-                item_copy = item.copy()
-                item_id = item_copy.get('id')
-                if item_id not in found_ids:
-                    item_copy['score'] = float(dist)
-                    results.append(item_copy)
-                    found_ids.add(item_id)
-        return results
+        # [V34] ใช้ผลที่ prefetch ไว้ (top_k สูงสุด) แล้วตัดให้พอดี ถ้าขอมากกว่านั้นค่อยค้นใหม่
+        if top_k <= PREFETCH_GRAPH_TOP_K:
+            results = await self._graph_candidates(query, PREFETCH_GRAPH_TOP_K)
+        else:
+            results = await self._graph_candidates(query, top_k)
+        return [item.copy() for item in results[:top_k]]
 
+    @traced("rag.search_news")
     async def search_news(self, query: str, top_k: int = 7) -> str:
         if not self.news_index or not self.news_mapping: return "ไม่พบข้อมูลข่าวสารที่เกี่ยวข้อง"
         
-        query_vector = await asyncio.to_thread(
-            self.embedder.encode, [query], convert_to_numpy=True
-        )
+        query_vector = await self._encode_query(query)
         distances, indices = await asyncio.to_thread(
             self.news_index.search, query_vector, top_k
         )
@@ -237,4 +356,16 @@ class RAGEngine:
             if item := self.news_mapping.get(str(i)):
                 context = f"จากแหล่งข่าว '{item.get('source_name')}':\nหัวข้อ: {item.get('title')}\nสรุป: {item.get('description')}\n---\n"
                 results.append(context)
-        return "\n".join(results) if results else "ไม่พบข้อมูลข่าวสารที่เกี่ยวข้อง"
\ No newline at end of file
+        return "\n".join(results) if results else "ไม่พบข้อมูลข่าวสารที่เกี่ยวข้อง"
+
+    def warm_cache_metrics(self) -> Dict[str, Any]:
+        """[V34.4] hit rate ของ warm cache ต่อชนิด และสัดส่วนผล prefetch ที่ agent ได้ใช้จริง"""
+        return {
+            "entries": len(self._warm_cache),
+            "per_kind": {
+                kind: dict(counts,
+                           hit_rate=round(counts["hits"] / max(1, counts["hits"] + counts["misses"]), 4),
+                           prefetch_use_rate=round(counts["prefetch_consumed"] / max(1, counts["prefetched"]), 4))
+                for kind, counts in self._warm_stats.items()
+            },
+        }
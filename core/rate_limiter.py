@@ -0,0 +1,356 @@
+# core/rate_limiter.py
+# (V1.4 - Thread-Safe)
+# key manager เคยรู้ขีดจำกัดหลังเจอ 429 เท่านั้น (cooldown ตายตัว) ตอนนี้แต่ละ (คีย์, โมเดล) มี bucket สองใบ:
+# คำขอต่อนาที (RPM) และ token ต่อนาที (TPM) ตาม GROQ_RATE_LIMITS / GOOGLE_RATE_LIMITS
+# ก่อนส่งคำขอจองโควตาด้วยจำนวน token ที่ประมาณไว้ แล้วแก้เป็นค่าจริงจาก usage และ header x-ratelimit-* ที่ provider ส่งกลับ
+# get_key() จึงเลือกคีย์ที่เหลือโควตามากที่สุด หรือรอจนโควตาคืนแทนการยิงคำขอที่รู้อยู่แล้วว่าจะได้ 429
+# [V1.1] ถ้ามี KeyStateStore ยอดที่ process อื่นใช้คีย์เดียวกันใน 1 นาทีล่าสุดถูกหักออกจากโควตาด้วย
+# [V1.2] ช่องทาง (lane): INTERACTIVE = คำขอของผู้ใช้ผ่าน Dispatcher, BATCH = งานเบื้องหลัง
+# BATCH มองไม่เห็นโควตาส่วนที่กันไว้ให้ INTERACTIVE (LLM_INTERACTIVE_RESERVE_SHARE ของแต่ละ bucket)
+# และหลีกทาง (backoff) ตราบใดที่มีคำขอ INTERACTIVE รอโควตาอยู่ ทั้งใน process นี้และ process อื่น (ผ่าน store)
+# [V1.3] KeyLease: คีย์ที่ถูกยืมไปหนึ่งคำขอ (key_manager.lease()) นับคำขอที่ยังค้างอยู่ต่อคีย์ ใช้เลือกคีย์ที่ว่างที่สุด
+# และส่ง usage/header ของคำขอให้ bucket ตอนคืนคีย์
+# [V1.4] สคริปต์ extractor เรียก get_key จากหลาย worker thread (asyncio.run ต่อ thread) บน limiter ตัวเดียวกัน
+# state ที่แก้ได้ทั้งหมดจึงอยู่ใต้ threading.RLock (ถือเฉพาะช่วงที่ไม่มี await ไม่เคยถือข้าม asyncio.sleep)
+
+import asyncio
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple
+
+from core.config import settings
+from core.key_state_store import KeyStateStore, fingerprint
+
+# อัตราส่วนโดยประมาณของข้อความไทย/อังกฤษปนกัน ใช้จองโควตาก่อนรู้ usage จริง
+CHARS_PER_TOKEN = 3
+
+UsageCallback = Callable[[Optional[Mapping[str, str]], Optional[int]], None]
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+BATCH_YIELD_MAX_DELAY_SECONDS = 8.0
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def estimate_tokens(text: str, output_reserve: int = settings.RATE_LIMIT_OUTPUT_TOKEN_RESERVE) -> int:
+    return len(text) // CHARS_PER_TOKEN + output_reserve
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """แปลงเวลาแบบ Groq (เช่น "2m59.56s", "7.66s", "120ms") เป็นวินาที"""
+    if not value:
+        return None
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, period_seconds: float = 60.0):
+        self.capacity = float(capacity)
+        self.period_seconds = period_seconds
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period_seconds
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def time_until(self, amount: float) -> float:
+        """เวลาที่ต้องรอจนมี amount (คำขอที่ใหญ่กว่าความจุรอแค่ให้เต็ม ไม่เช่นนั้นจะรอตลอดไป)"""
+        missing = min(amount, self.capacity) - self.available()
+        return max(0.0, missing / self.refill_rate)
+
+    def consume(self, amount: float):
+        # ติดลบได้: usage จริงที่มากกว่าที่จองไว้เป็นหนี้ที่ต้องรอคืนก่อนคำขอถัดไป
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync(self, remaining: float, reset_seconds: Optional[float] = None, limit: Optional[float] = None):
+        """ใช้ตัวเลขจาก provider (แม่นกว่าการนับเอง เพราะรวมคำขอจาก process อื่นที่ใช้คีย์เดียวกัน)"""
+        self._refill()
+        if limit:
+            self.capacity = float(limit)
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset_seconds:
+            # bucket ว่างจนถึงเวลา reset ที่ provider บอก
+            self.tokens = -reset_seconds * self.refill_rate
+
+
+class KeyLease:
+    """คีย์ที่ถูกยืมไปหนึ่งคำขอ ส่ง on_usage ให้ client แทน usage_observer (ค่าถูกส่งให้ rate limiter ตอนคืนคีย์)"""
+
+    def __init__(self, api_key: str, model: Optional[str], estimated_tokens: int):
+        self.api_key = api_key
+        self.model = model
+        self.estimated_tokens = estimated_tokens
+        self.headers: Optional[Mapping[str, str]] = None
+        self.total_tokens: Optional[int] = None
+
+    def on_usage(self, headers: Optional[Mapping[str, str]] = None, total_tokens: Optional[int] = None):
+        if headers is not None:
+            self.headers = headers
+        if total_tokens is not None:
+            self.total_tokens = total_tokens
+
+
+class KeyRateLimiter:
+    def __init__(self, provider: str, limits: Dict[str, Tuple[int, int]],
+                 max_wait: float = settings.RATE_LIMIT_MAX_WAIT_SECONDS,
+                 state_store: Optional[KeyStateStore] = None):
+        self.provider = provider
+        self.limits = limits
+        self.max_wait = max_wait
+        self.state_store = state_store
+        self._buckets: Dict[Tuple[str, str], Tuple[TokenBucket, TokenBucket]] = {}
+        # [V1.1] ยอดของ process นี้ที่ยังไม่ได้เขียนลง store และยอดของ process อื่นที่อ่านมาล่าสุด
+        self._pending_usage: Dict[Tuple[str, str], List[float]] = {}
+        self._external_usage: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        self._synced_at = 0.0
+        self.interactive_reserve = settings.LLM_INTERACTIVE_RESERVE_SHARE
+        self._interactive_waiting = 0
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._stats = {"acquired": 0, "waits": 0, "wait_seconds": 0.0, "header_syncs": 0,
+                       "batch_acquired": 0, "batch_yields": 0, "batch_yield_seconds": 0.0,
+                       "leases": 0, "failed_leases": 0}
+
+    def limits_for(self, model: Optional[str]) -> Optional[Tuple[int, int]]:
+        return self.limits.get(model) if model else None
+
+    def _buckets_for(self, api_key: str, model: str) -> Optional[Tuple[TokenBucket, TokenBucket]]:
+        limits = self.limits_for(model)
+        if not limits:
+            return None
+        with self._lock:
+            buckets = self._buckets.get((api_key, model))
+            if buckets is None:
+                rpm, tpm = limits
+                buckets = self._buckets[(api_key, model)] = (TokenBucket(rpm), TokenBucket(tpm))
+            return buckets
+
+    def _record_usage(self, api_key: str, model: str, requests: float, tokens: float):
+        if self.state_store:
+            with self._lock:
+                pending = self._pending_usage.setdefault((api_key, model), [0.0, 0.0])
+                pending[0] += requests
+                pending[1] += tokens
+
+    def sync_shared(self, force: bool = False):
+        """[V1.1] เขียนยอดของ process นี้ลง store และอ่านยอดของ process อื่น (ไม่บ่อยกว่า KEY_STATE_REFRESH_SECONDS)"""
+        if not self.state_store:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._synced_at < settings.KEY_STATE_REFRESH_SECONDS:
+                return
+            self._synced_at = now
+            if self._pending_usage:
+                pending, self._pending_usage = self._pending_usage, {}
+                self.state_store.record_usage(self.provider, pending)
+            self._external_usage = self.state_store.external_usage(self.provider)
+
+    def _held_back(self, api_key: str, model: str, lane: str) -> Tuple[float, float]:
+        """(คำขอ, token) ที่ lane นี้ใช้ไม่ได้: ยอดของ process อื่น + ส่วนที่กันไว้ให้ INTERACTIVE (เฉพาะ BATCH)"""
+        requests, token_bucket = self._buckets_for(api_key, model)
+        held_requests, held_tokens = self._external_usage.get(model, {}).get(fingerprint(api_key), (0.0, 0.0))
+        if lane == BATCH:
+            held_requests += requests.capacity * self.interactive_reserve
+            held_tokens += token_bucket.capacity * self.interactive_reserve
+        return held_requests, held_tokens
+
+    def wait_time(self, api_key: str, model: str, tokens: int, lane: str = INTERACTIVE) -> float:
+        requests, token_bucket = self._buckets_for(api_key, model)
+        held_requests, held_tokens = self._held_back(api_key, model, lane)
+        with self._lock:
+            return max(requests.time_until(1 + held_requests), token_bucket.time_until(tokens + held_tokens))
+
+    def headroom(self, api_key: str, model: str, lane: str = INTERACTIVE) -> float:
+        """สัดส่วนโควตาที่เหลือ (0..1) ของ bucket ที่ตึงกว่า หลังหักส่วนที่ lane นี้ใช้ไม่ได้"""
+        requests, token_bucket = self._buckets_for(api_key, model)
+        held_requests, held_tokens = self._held_back(api_key, model, lane)
+        with self._lock:
+            return min((requests.available() - held_requests) / requests.capacity,
+                       (token_bucket.available() - held_tokens) / token_bucket.capacity)
+
+    def in_flight(self, api_key: str) -> int:
+        return self._in_flight.get(api_key, 0)
+
+    @asynccontextmanager
+    async def lease(self, api_key: str, model: Optional[str] = None, estimated_tokens: int = 0) -> AsyncIterator[KeyLease]:
+        """
+        [V1.3] นับคำขอค้างของคีย์ตลอดช่วง async with และส่ง usage ให้ bucket ตอนคืน
+        คำขอที่ล้มเหลวก่อนได้ response (ไม่มี header/usage เลย) provider ไม่ได้นับ token จึงคืน token ที่จองไว้
+        """
+        key_lease = KeyLease(api_key, model, estimated_tokens)
+        with self._lock:
+            self._in_flight[api_key] = self._in_flight.get(api_key, 0) + 1
+            self._stats["leases"] += 1
+        failed = False
+        try:
+            yield key_lease
+        except BaseException:
+            failed = True
+            with self._lock:
+                self._stats["failed_leases"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight[api_key] -= 1
+            if model:
+                total_tokens = key_lease.total_tokens
+                if failed and total_tokens is None and key_lease.headers is None:
+                    total_tokens = 0
+                self.observe(api_key, model, key_lease.headers, total_tokens, estimated_tokens)
+
+    def _set_interactive_waiting(self, delta: int):
+        with self._lock:
+            self._interactive_waiting += delta
+            if self.state_store:
+                self.state_store.publish_interactive_waiting(self.provider, self._interactive_waiting)
+
+    def interactive_pending(self) -> bool:
+        if self._interactive_waiting > 0:
+            return True
+        return bool(self.state_store and self.state_store.interactive_waiting(self.provider) > 0)
+
+    async def yield_to_interactive(self):
+        """
+        [V1.2] เรียกก่อนจ่ายคีย์ให้งาน BATCH: รอ (exponential backoff + jitter) ตราบใดที่มีคำขอ INTERACTIVE รอโควตาอยู่
+        รอรวมไม่เกิน LLM_BATCH_MAX_YIELD_SECONDS แล้วไปต่อ
+        """
+        delay = settings.LLM_BATCH_YIELD_BASE_SECONDS
+        yielded = 0.0
+        while yielded < settings.LLM_BATCH_MAX_YIELD_SECONDS and self.interactive_pending():
+            pause = random.uniform(delay / 2, delay)
+            with self._lock:
+                self._stats["batch_yields"] += 1
+                self._stats["batch_yield_seconds"] += pause
+            yielded += pause
+            await asyncio.sleep(pause)
+            delay = min(delay * 2, BATCH_YIELD_MAX_DELAY_SECONDS)
+
+    async def acquire(self, candidates: Callable[[], List[str]], model: str, tokens: int,
+                      lane: str = INTERACTIVE) -> Optional[str]:
+        """
+        [V1] จองโควตา 1 คำขอ + tokens บนคีย์ที่เหลือโควตามากที่สุดในตอนนี้
+        ถ้าทุกคีย์เต็ม รอจนคีย์แรกคืนโควตา (candidates ถูกเรียกใหม่ทุกรอบ เพราะ cooldown อาจเปลี่ยนระหว่างรอ)
+        คืน None เมื่อไม่มีคีย์ให้เลือก หรือต้องรอนานกว่า max_wait (BATCH รอได้นานกว่า: LLM_BATCH_MAX_WAIT_SECONDS)
+        [V1.2] คำขอ INTERACTIVE ที่ต้องรอถูกนับเป็นคิวที่ทำให้งาน BATCH หลีกทาง
+        [V1.3] คีย์ที่มีคำขอค้างน้อยที่สุดมาก่อน แล้วจึงดูโควตาที่เหลือ
+        """
+        max_wait = self.max_wait if lane == INTERACTIVE else settings.LLM_BATCH_MAX_WAIT_SECONDS
+        waited = 0.0
+        queued = False
+        try:
+            while True:
+                self.sync_shared()
+                keys = candidates()
+                if not keys:
+                    return None
+                # [V1.4] เลือกคีย์และจองโควตาเป็นขั้นเดียว: thread อื่นจองคีย์เดียวกันแทรกระหว่างนั้นไม่ได้
+                with self._lock:
+                    waits = {key: self.wait_time(key, model, tokens, lane) for key in keys}
+                    ready = [key for key, wait in waits.items() if wait <= 0]
+                    if ready:
+                        best = min(ready, key=lambda key: (self.in_flight(key), -self.headroom(key, model, lane)))
+                        requests, token_bucket = self._buckets_for(best, model)
+                        requests.consume(1)
+                        token_bucket.consume(tokens)
+                        self._record_usage(best, model, 1, tokens)
+                        self._stats["acquired" if lane == INTERACTIVE else "batch_acquired"] += 1
+                        return best
+                wait = min(waits.values())
+                if waited + wait > max_wait:
+                    return None
+                if lane == INTERACTIVE and not queued:
+                    queued = True
+                    self._set_interactive_waiting(1)
+                with self._lock:
+                    self._stats["waits"] += 1
+                    self._stats["wait_seconds"] += wait
+                waited += wait
+                print(f"⏳ [{self.provider} Rate Limiter] All keys at quota for '{model}' ({lane}). Waiting {wait:.2f}s for refill...")
+                await asyncio.sleep(wait)
+        finally:
+            if queued:
+                self._set_interactive_waiting(-1)
+
+    def observe(self, api_key: str, model: str, headers: Optional[Mapping[str, str]] = None,
+                total_tokens: Optional[int] = None, estimated_tokens: int = 0):
+        """[V1] แก้ยอดที่จองไว้ด้วย usage จริง และ sync กับ header x-ratelimit-* (Groq) ถ้ามี"""
+        buckets = self._buckets_for(api_key, model)
+        if not buckets:
+            return
+        with self._lock:
+            self._observe(buckets, api_key, model, headers, total_tokens, estimated_tokens)
+
+    def _observe(self, buckets: Tuple[TokenBucket, TokenBucket], api_key: str, model: str,
+                 headers: Optional[Mapping[str, str]], total_tokens: Optional[int], estimated_tokens: int):
+        requests, token_bucket = buckets
+        if total_tokens is not None:
+            difference = total_tokens - estimated_tokens
+            if difference > 0:
+                token_bucket.consume(difference)
+            else:
+                token_bucket.refund(-difference)
+            self._record_usage(api_key, model, 0, difference)
+        if not headers:
+            return
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self._stats["header_syncs"] += 1
+            token_bucket.sync(float(remaining_tokens), parse_duration(headers.get("x-ratelimit-reset-tokens")),
+                              float(headers.get("x-ratelimit-limit-tokens") or 0) or None)
+        # header นับรวมทุก process ที่ใช้คีย์นี้อยู่แล้ว
+        # Groq: x-ratelimit-*-requests เป็นโควตารายวัน ใช้เฉพาะตอนหมดเพื่อหยุดคีย์นี้จนถึงเวลา reset
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None and float(remaining_requests) <= 0:
+            requests.sync(0, parse_duration(headers.get("x-ratelimit-reset-requests")))
+
+    def usage_observer(self, api_key: str, model: str, estimated_tokens: int) -> UsageCallback:
+        def on_usage(headers: Optional[Mapping[str, str]] = None, total_tokens: Optional[int] = None):
+            self.observe(api_key, model, headers, total_tokens, estimated_tokens)
+        return on_usage
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict:
+        return {
+            **self._stats,
+            "wait_seconds": round(self._stats["wait_seconds"], 2),
+            "batch_yield_seconds": round(self._stats["batch_yield_seconds"], 2),
+            "interactive_waiting": self._interactive_waiting,
+            "in_flight": {f"...{api_key[-4:]}": count for api_key, count in self._in_flight.items()},
+            "buckets": {
+                f"...{api_key[-4:]}/{model}": {
+                    "requests_available": round(requests.available(), 1),
+                    "tokens_available": int(token_bucket.available()),
+                }
+                for (api_key, model), (requests, token_bucket) in self._buckets.items()
+            },
+        }
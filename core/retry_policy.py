@@ -0,0 +1,170 @@
+# core/retry_policy.py
+# (V1.3 - Bounded Exponential Backoff with Jitter)
+# นโยบาย retry เดียวของทุกคำขอ LLM (Groq ผ่าน LLM Gateway และ Gemini ใน agent) แทนการเรียกตัวเองซ้ำหลัง sleep(1) ตายตัว
+# ซึ่งไม่มีเพดานจำนวนครั้ง และทำให้คำขอที่ล้มเหลวพร้อมกันยิงซ้ำพร้อมกันอีก
+# - จำนวนครั้งสูงสุด (LLM_RETRY_MAX_ATTEMPTS)
+# - backoff แบบ exponential + full jitter: สุ่ม 0..min(max_delay, base * 2^(n-1))
+# - เคารพ Retry-After ของ provider: คีย์ที่ถูกสั่งให้รอถูกพักตามนั้น และรอบถัดไปรออย่างน้อยเท่านั้น (ไม่เกิน max_delay)
+# - [V1.3] พักคีย์เฉพาะเมื่อถูกจำกัดอัตรา (429) ข้อผิดพลาด 5xx/timeout/connection แค่ backoff แล้วลองใหม่ (คีย์ไม่ได้ผิด)
+# - งบเวลารวมของทุกรอบ (LLM_RETRY_BUDGET_SECONDS) และไม่รอเกินเวลาที่เหลือของเทิร์น (core/deadline.py)
+# จำนวน retry ต่อ label ดูได้ที่ /api/metrics
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from core.config import settings
+from core.deadline import current_deadline
+from core.llm_stream import StreamInterruptedError
+from core.rate_limiter import INTERACTIVE, KeyLease, parse_duration
+from core.tracing import current_span
+
+T = TypeVar("T")
+
+# status ที่ลองใหม่แล้วมีโอกาสสำเร็จ (รวม 408/5xx ของ provider)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_MESSAGES = ("429", "resource_exhausted", "unavailable")
+RATE_LIMIT_MESSAGES = ("429", "resource_exhausted", "rate limit", "rate_limit")
+
+
+def is_transient_error(error: Exception) -> bool:
+    """ข้อผิดพลาดชั่วคราว: status ที่ลองใหม่ได้, connection/timeout หรือข้อความแบบ 429 ของ SDK"""
+    if isinstance(error, StreamInterruptedError):
+        # ส่ง delta ให้ผู้ใช้ไปแล้ว ลองใหม่ = ข้อความซ้ำ
+        return False
+    status_code = getattr(error, "status_code", None)
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True
+    # [V1.3] httpx.TransportError = connection/timeout ของ GeminiClient (REST)
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_MESSAGES)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """[V1.3] provider จำกัดอัตราของคีย์นี้ (429 / RESOURCE_EXHAUSTED / สั่งให้รอ) ควรพักคีย์ ไม่ใช่แค่ลองใหม่"""
+    if getattr(error, "status_code", None) == 429 or getattr(error, "retry_after", None) is not None:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RATE_LIMIT_MESSAGES)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """เวลาที่ provider สั่งให้รอ จาก error.retry_after (Gemini) หรือ header retry-after(-ms) ของ response (Groq)"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+class RetryPolicy:
+    def __init__(self,
+                 max_attempts: int = settings.LLM_RETRY_MAX_ATTEMPTS,
+                 base_delay: float = settings.LLM_RETRY_BASE_DELAY_SECONDS,
+                 max_delay: float = settings.LLM_RETRY_MAX_DELAY_SECONDS,
+                 budget_seconds: float = settings.LLM_RETRY_BUDGET_SECONDS):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_seconds = budget_seconds
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def backoff(self, retry_number: int, retry_after: Optional[float] = None) -> float:
+        """เวลารอก่อน retry ครั้งที่ retry_number (เริ่มที่ 1)"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry_number - 1)))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _stats_for(self, label: str) -> Dict[str, float]:
+        stats = self._stats.get(label)
+        if stats is None:
+            stats = self._stats[label] = {"calls": 0, "retries": 0, "exhausted": 0, "out_of_time": 0,
+                                          "retry_after_honored": 0, "backoff_seconds": 0.0}
+        return stats
+
+    async def run(self, label: str, attempt: Callable[[], Awaitable[T]],
+                  is_retryable: Callable[[Exception], bool] = is_transient_error) -> T:
+        """
+        [V1] เรียก attempt() จนสำเร็จ หรือจนหมดจำนวนครั้ง/งบเวลา แล้วโยนข้อผิดพลาดล่าสุดให้ผู้เรียกใช้คำตอบสำรองของตัวเอง
+        ข้อผิดพลาดที่ไม่ชั่วคราว (เช่น 400, StreamInterruptedError) โยนต่อทันทีโดยไม่ลองใหม่
+        """
+        stats = self._stats_for(label)
+        stats["calls"] += 1
+        started_at = time.monotonic()
+        for attempt_number in range(1, self.max_attempts + 1):
+            try:
+                result = await attempt()
+                if attempt_number > 1:
+                    active = current_span()
+                    if active:
+                        active.set_attribute("retries", attempt_number - 1)
+                return result
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt_number == self.max_attempts:
+                    stats["exhausted"] += 1
+                    print(f"❌ Retry Policy: {label} failed after {attempt_number} attempts. Error: {e}")
+                    raise
+
+                retry_after = retry_after_seconds(e)
+                delay = self.backoff(attempt_number, retry_after)
+                time_left = self.budget_seconds - (time.monotonic() - started_at)
+                deadline = current_deadline()
+                if deadline:
+                    time_left = min(time_left, deadline.remaining())
+                if delay >= time_left:
+                    stats["out_of_time"] += 1
+                    print(f"❌ Retry Policy: {label} gave up after {attempt_number} attempts "
+                          f"(next retry in {delay:.2f}s, {max(time_left, 0):.2f}s left). Error: {e}")
+                    raise
+
+                stats["retries"] += 1
+                stats["backoff_seconds"] += delay
+                if retry_after:
+                    stats["retry_after_honored"] += 1
+                print(f" 	 -> Retry Policy: {label} attempt {attempt_number} failed ({type(e).__name__}). "
+                      f"Retrying in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+
+    async def call_with_key(self, key_manager, label: str, attempt: Callable[[KeyLease], Awaitable[T]],
+                            model: Optional[str] = None, estimated_tokens: int = 0,
+                            is_retryable: Callable[[Exception], bool] = is_transient_error,
+                            lane: str = INTERACTIVE) -> T:
+        """
+        [V1] รูปแบบที่ agent ใช้: ขอคีย์ใหม่ทุกรอบ และคีย์ที่ล้มเหลวแบบชั่วคราวถูกพัก (ตาม Retry-After ถ้ามี)
+        [V1.1] lane ส่งต่อให้ key manager (core/rate_limiter.py)
+        [V1.2] attempt(lease) ทำคำขอเดียวด้วย lease.api_key และส่ง lease.on_usage ให้ client
+        คีย์ถูกยืมผ่าน key_manager.lease() จึงถูกนับเป็นงานค้างระหว่างคำขอ
+        [V1.3] พักคีย์เฉพาะข้อผิดพลาดแบบ rate limit (5xx/timeout ลองใหม่ด้วยคีย์ถัดไปโดยไม่พักคีย์เดิม)
+        """
+        async def keyed_attempt() -> T:
+            async with key_manager.lease(model, estimated_tokens, lane) as lease:
+                try:
+                    return await attempt(lease)
+                except Exception as e:
+                    if is_retryable(e) and is_rate_limit_error(e):
+                        key_manager.report_failure(lease.api_key, retry_after=retry_after_seconds(e))
+                    raise
+        return await self.run(label, keyed_attempt, is_retryable)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        return {label: {**stats, "backoff_seconds": round(stats["backoff_seconds"], 2)}
+                for label, stats in self._stats.items()}
+
+
+llm_retry_policy = RetryPolicy()
@@ -0,0 +1,62 @@
+# core/single_flight.py
+# (V1.0 - Single-Flight Request Coalescing)
+# คำขอที่เหมือนกันและมาพร้อมกัน (ผู้ใช้กดส่งซ้ำ / WebSocket reconnect / คำถามยอดนิยมจากหลายคน) ใช้การคำนวณร่วมกันครั้งเดียว
+# คนแรก (leader) เริ่มงานเป็น Task ผู้มาทีหลัง (follower) ที่ key ตรงกันรอผลของ Task เดียวกัน
+# งานถูกยกเลิกก็ต่อเมื่อทุกคนที่รออยู่ยกเลิกแล้ว การยกเลิกของคนใดคนหนึ่งไม่ทำให้คนอื่นเสียผล
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str = "SingleFlight"):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._stats = {"leaders": 0, "followers": 0}
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        flight = self._flights.get(key)
+        if flight and flight.task is task:
+            del self._flights[key]
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]],
+                 on_join: Optional[Callable[[], Awaitable[None]]] = None) -> Tuple[Any, bool]:
+        """
+        [V1] คืน (ผลลัพธ์, shared) โดย shared=True เมื่อเข้าร่วมงานที่มีคนเริ่มไว้แล้ว
+        exception ของงานถูกส่งถึงทุกคนที่รออยู่
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            self._stats["followers"] += 1
+            if on_join:
+                await on_join()
+            flight = self._flights.get(key) or flight  # งานอาจจบไประหว่าง on_join ผลยังอ่านจาก Task ได้
+        else:
+            self._stats["leaders"] += 1
+            task = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+            flight = _Flight(task)
+            self._flights[key] = flight
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                print(f"🛑 {self.name}: Last requester left. Cancelling shared computation.")
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self._stats, "in_flight": len(self._flights)}
@@ -0,0 +1,212 @@
+# core/tracing.py
+# (V1.0 - Request-Scoped Tracing)
+# span/trace แบบเบาที่ส่งต่อผ่าน contextvars (asyncio task ลูกที่สร้างจาก gather/create_task ได้ parent ที่ถูกต้องอัตโนมัติ)
+# span ที่จบแล้วถูกส่งเข้า queue และ thread เบื้องหลังเขียนลงไฟล์ JSON lines ในรูปแบบ OTLP/JSON
+# (หนึ่งบรรทัด = หนึ่ง ExportTraceServiceRequest แบบเดียวกับ file exporter ของ OpenTelemetry Collector)
+# สรุปผลเป็น latency ต่อ agent ได้ด้วย manage_traces.py
+
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from core.config import settings
+
+SERVICE_NAME = "project-nexus"
+SCOPE_NAME = "nexus.tracing"
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("nexus_current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent", "name", "attributes", "start_ns", "end_ns", "status", "message")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.name = name
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = "STATUS_CODE_UNSET"
+        self.message = ""
+
+    @property
+    def root(self) -> "Span":
+        span = self
+        while span.parent:
+            span = span.parent
+        return span
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def to_otlp(self) -> Dict[str, Any]:
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status, "message": self.message} if self.message else {"code": self.status},
+        }
+        if self.parent:
+            data["parentSpanId"] = self.parent.span_id
+        return data
+
+
+class TraceWriter:
+    """เขียน span ลงไฟล์จาก thread เบื้องหลัง ไม่ให้ disk I/O บล็อก event loop"""
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, span: Span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="nexus-trace-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+        self._queue.put_nowait(span)
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        closing = False
+        while not closing:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is None:
+                        closing = True
+                        break
+                    batch.append(item)
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [span.to_otlp() for span in batch]}],
+        }]}
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Tracing: Could not write {len(batch)} spans to {self.path}. Error: {e}")
+
+    def close(self):
+        if self._thread and self._thread.is_alive():
+            self._queue.put_nowait(None)
+            self._thread.join(timeout=5)
+
+
+_writer = TraceWriter(settings.TRACE_FILE)
+
+
+class span:
+    """
+    [V1] เปิด span ลูกของ span ปัจจุบัน (หรือ trace ใหม่ถ้ายังไม่มี) ใช้ได้ทั้งในโค้ด sync และภายใน coroutine:
+        with span("rag.search_books", category=cat) as s:
+            ...
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._span: Optional[Span] = None
+        self._token = None
+
+    def __enter__(self) -> Optional[Span]:
+        if not settings.TRACING_ENABLED:
+            return None
+        self._span = Span(self.name, _current_span.get(), self.attributes)
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._span:
+            return False
+        current = self._span
+        current.end_ns = time.time_ns()
+        if exc_type is not None:
+            current.status = "STATUS_CODE_ERROR"
+            current.message = f"{exc_type.__name__}: {exc}"[:300]
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # ออกจาก span คนละ context กับที่เข้า (เช่น async generator ที่ถูกปิดจาก task อื่น)
+            _current_span.set(current.parent)
+        _writer.submit(current)
+        return False
+
+
+def traced(name: str):
+    """
+    decorator สำหรับฟังก์ชัน sync และ async: ครอบการเรียกด้วย span ชื่อ name
+    ถ้าเป็นเมธอด จะเติม code.namespace (ชื่อคลาส) และ model (self.model_name ถ้ามี) ให้อัตโนมัติ
+    """
+    def decorator(func):
+        owner = func.__qualname__.split(".")[0] if "." in func.__qualname__ else None
+
+        def _attributes(args) -> Dict[str, Any]:
+            attributes = {"code.function": func.__qualname__}
+            if owner and args:
+                attributes["code.namespace"] = owner
+                attributes["model"] = getattr(args[0], "model_name", None)
+            return attributes
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **_attributes(args)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            with span(name, **_attributes(args)):
+                return func(*args, **kwargs)
+        return sync_wrapper
+    return decorator
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def annotate_trace(**attributes):
+    """ติด attribute ให้ root span ของ trace ปัจจุบัน (เช่น agent ที่ตอบจริงหลังการ routing)"""
+    active = _current_span.get()
+    if active:
+        for key, value in attributes.items():
+            active.root.set_attribute(key, value)
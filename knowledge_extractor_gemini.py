@@ -1,7 +1,8 @@
 # knowledge_extractor_gemini.py
-# (V13 - Safe & Production-Ready)
+# (V13.2 - Cached Extractions)
 # อัปเกรดสู่มาตรฐานความปลอดภัยและการจัดการไฟล์สูงสุด
 
+import asyncio
 import json
 import os
 import time
@@ -17,6 +18,8 @@ from tqdm import tqdm
 
 from core.config import settings
 from core.api_key_manager import ApiKeyManager, AllKeysOnCooldownError
+from core.llm_cache import llm_cache
+from core.rate_limiter import BATCH, estimate_tokens
 
 class KnowledgeGraphExtractorGemini:
     """
@@ -107,6 +110,14 @@ json
                         except json.JSONDecodeError: return None
         return None
 
+    @staticmethod
+    def _attach_raw_content(graph_data: Dict, item: Dict) -> Dict:
+        for node in graph_data.get("nodes", []):
+            if node.get("label") in ["Concept", "Strategy"]:
+                if "properties" not in node: node["properties"] = {}
+                node["properties"]["raw_content"] = item.get("content", "")
+        return graph_data
+
     def _process_single_chunk(self, line: str, max_retries: int) -> Optional[Dict]:
         if not line.strip(): return None
         try:
@@ -116,28 +127,32 @@ json
         except json.JSONDecodeError:
             print(f"Skipping malformed JSON line: {line[:100]}...")
             return None
+        safety_settings = [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+        ]
+        # [V13.2] บรรทัดที่เคยสกัดสำเร็จแล้ว (prompt เดิม) ใช้ผลจากแคชบนดิสก์ การรันซ้ำจึงไม่กินโควตาของคีย์
+        cached_response = llm_cache.get("KG_EXTRACTION", self.model_name, prompt, safety_settings=safety_settings)
+        graph_data = self._extract_json(cached_response) if cached_response else None
+        if graph_data and isinstance(graph_data, dict) and "nodes" in graph_data:
+            return self._attach_raw_content(graph_data, item)
         last_exception = None
+        estimated = estimate_tokens(prompt)
         for attempt in range(max_retries):
             try:
-                api_key = self.key_manager.get_key()
+                # [V13.1] ขอคีย์ในช่องทาง BATCH (async get_key รันใน event loop ของ worker thread นี้)
+                api_key = asyncio.run(self.key_manager.get_key(self.model_name, estimated, lane=BATCH))
                 genai.configure(api_key=api_key)
                 model = genai.GenerativeModel(self.model_name)
-                safety_settings = [
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-                ]
                 response = model.generate_content(prompt, safety_settings=safety_settings)
                 if response.prompt_feedback and response.prompt_feedback.block_reason:
                     raise ValueError(f"Gemini API blocked the prompt. Reason: {response.prompt_feedback.block_reason}")
                 graph_data = self._extract_json(response.text)
                 if graph_data and isinstance(graph_data, dict) and "nodes" in graph_data:
-                    for node in graph_data.get("nodes", []):
-                        if node.get("label") in ["Concept", "Strategy"]:
-                            if "properties" not in node: node["properties"] = {}
-                            node["properties"]["raw_content"] = item.get("content", "")
-                    return graph_data
+                    llm_cache.put("KG_EXTRACTION", self.model_name, prompt, response.text, safety_settings=safety_settings)
+                    return self._attach_raw_content(graph_data, item)
                 else:
                     raise ValueError(f"Failed to extract valid JSON. Raw response: {response.text[:200]}...")
             except (ResourceExhausted, TooManyRequests) as e:
@@ -1,7 +1,8 @@
 # knowledge_extractor_llama.py
-# (V2.2 - Final & Fully Standardized)
+# (V2.4 - Cached Extractions)
 # เวอร์ชันสุดท้ายที่ได้มาตรฐานเดียวกับ Gemini ทุกประการ
 
+import asyncio
 import json
 import os
 import time
@@ -17,6 +18,8 @@ from tqdm import tqdm
 
 from core.config import settings
 from core.groq_key_manager import GroqApiKeyManager, AllGroqKeysOnCooldownError
+from core.llm_cache import llm_cache
+from core.rate_limiter import BATCH, estimate_tokens
 
 class KnowledgeGraphExtractorLlama:
     """
@@ -114,6 +117,14 @@ json
                         except json.JSONDecodeError: return None
         return None
 
+    @staticmethod
+    def _attach_raw_content(graph_data: Dict, item: Dict) -> Dict:
+        for node in graph_data.get("nodes", []):
+            if node.get("label") in ["Concept", "Strategy"]:
+                if "properties" not in node: node["properties"] = {}
+                node["properties"]["raw_content"] = item.get("content", "")
+        return graph_data
+
     # --- ฟังก์ชันที่แก้ไขใหม่ (มี try-except-retry ที่ถูกต้อง) ---
     def _process_single_chunk(self, line: str, max_retries: int) -> Optional[Dict]:
         if not line.strip(): return None
@@ -124,23 +135,30 @@ json
         except json.JSONDecodeError:
             print(f"Skipping malformed JSON line: {line[:100]}...")
             return None
+        # [V2.4] แคชบนดิสก์ใช้ร่วมกับ extractor ของ Gemini (key แยกตามโมเดล) รันซ้ำแล้วไม่ต้องเรียก Groq ใหม่
+        cached_response = llm_cache.get("KG_EXTRACTION", self.model_name, prompt)
+        graph_data = self._extract_json(cached_response) if cached_response else None
+        if graph_data and isinstance(graph_data, dict) and "nodes" in graph_data:
+            return self._attach_raw_content(graph_data, item)
         last_exception = None
+        estimated = estimate_tokens(prompt)
         for attempt in range(max_retries):
             try:
-                api_key = self.key_manager.get_key()
+                # [V2.3] get_key เป็น async: worker thread รันใน event loop ของตัวเอง
+                # ช่องทาง BATCH = หลีกทางให้เซิร์ฟเวอร์เมื่อผู้ใช้รอโควตา และไม่แตะโควตาส่วนที่กันไว้ให้ผู้ใช้
+                api_key = asyncio.run(self.key_manager.get_key(self.model_name, estimated, lane=BATCH))
                 client = Groq(api_key=api_key)
                 chat_completion = client.chat.completions.create(
                     messages=[{"role": "user", "content": prompt}],
                     model=self.model_name
                 )
+                if chat_completion.usage:
+                    self.key_manager.usage_observer(api_key, self.model_name, estimated)(None, chat_completion.usage.total_tokens)
                 raw_response_text = chat_completion.choices[0].message.content
                 graph_data = self._extract_json(raw_response_text)
                 if graph_data and isinstance(graph_data, dict) and "nodes" in graph_data:
-                    for node in graph_data.get("nodes", []):
-                        if node.get("label") in ["Concept", "Strategy"]:
-                            if "properties" not in node: node["properties"] = {}
-                            node["properties"]["raw_content"] = item.get("content", "")
-                    return graph_data
+                    llm_cache.put("KG_EXTRACTION", self.model_name, prompt, raw_response_text)
+                    return self._attach_raw_content(graph_data, item)
                 else:
                     raise ValueError(f"Failed to extract valid JSON. Raw response: {raw_response_text[:200]}...")
             except AllGroqKeysOnCooldownError as e:
@@ -1,5 +1,5 @@
 # main.py
-# (V47.0 - Fully Asynchronous & CORRECTED Non-Blocking Startup)
+# (V50.16 - Memory Paths from Settings)
 # --- Project Nexus AI Assistant Server ---
 
 import uvicorn
@@ -20,11 +20,22 @@ from core.config import settings
 from core.dispatcher import Dispatcher, FinalResponse
 from core.rag_engine import RAGEngine 
 from core.memory_manager import MemoryManager 
-from core.long_term_memory_manager import LongTermMemoryManager 
+from core.memory_retriever import MemoryRetriever 
+from core.intent_classifier import IntentClassifier
 from core.api_key_manager import ApiKeyManager 
 from core.graph_manager import GraphManager
 from core.groq_key_manager import GroqApiKeyManager 
 from core.tts_engine import TextToSpeechEngine 
+from core.tracing import span
+from core.admission import AdmissionController, AdmissionRejected
+from core.gemini_client import gemini_clients
+from core.llm_gateway import llm_gateway
+from core.retry_policy import llm_retry_policy
+from core.key_state_store import default_key_state_store
+from core.llm_cache import llm_cache
+from core.prompt_budget import prompt_budgeter
+from core.llm_hedging import llm_hedger
+from core.deadline import Deadline
 
 from agents.planning_mode.planner_agent import PlannerAgent 
 from agents.formatter_agent import FormatterAgent 
@@ -50,6 +61,8 @@ web_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web")
 AGENTS = {}
 GRAPH_MANAGER: GraphManager = None
 DISPATCHER: Dispatcher = None
+# [V50.2] เพดานจำนวนเทิร์นที่ทำงานพร้อมกัน (ทั้งระบบ/ต่อผู้ใช้) พร้อมคิวรอที่มีขนาดจำกัด
+ADMISSION = AdmissionController()
 audio_tasks = {}
 
 async def create_audio_file_background(text: str, output_path: str, task_id: str):
@@ -57,7 +70,9 @@ async def create_audio_file_background(text: str, output_path: str, task_id: str
         print(f"🎙️  Starting background audio synthesis for task: {task_id}")
         tts_agent = AGENTS.get("TTS")
         if tts_agent:
-            voice_file_path = await tts_agent.synthesize(text, output_path)
+            # TTS ทำงานหลังส่งคำตอบแล้ว จึงเป็น trace แยกของตัวเอง (ไม่นับรวมใน latency ของเทิร์น)
+            with span("tts.synthesize", chars=len(text)):
+                voice_file_path = await tts_agent.synthesize(text, output_path)
             if voice_file_path:
                 audio_tasks[task_id] = {"status": "done", "url": f"/static/audio/{os.path.basename(output_path)}"}
                 print(f" 	- ✅ Audio task {task_id} completed.")
@@ -93,15 +108,55 @@ async def cleanup_old_audio_files():
         except Exception as e:
             print(f" 	- Error during audio cleanup: {e}")
 
+async def watch_memory_index_updates(memory_retriever: MemoryRetriever):
+    """[V48] เฝ้าดูไฟล์สัญญาณจาก manage_memory.py --daemon แล้วโหลด Memory index ใหม่"""
+    version_path = os.path.join(settings.MEMORY_INDEX_DIR, settings.MEMORY_INDEX_VERSION_FILE)
+    last_mtime = os.path.getmtime(version_path) if os.path.exists(version_path) else None
+
+    while True:
+        await asyncio.sleep(settings.MEMORY_INDEX_WATCH_INTERVAL_SECONDS)
+        try:
+            if not os.path.exists(version_path):
+                continue
+            mtime = os.path.getmtime(version_path)
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            print("🔔 Memory daemon published new memories. Reloading memory indexes...")
+            await memory_retriever.refresh()
+        except Exception as e:
+            print(f" 	- Error while reloading memory index: {e}")
+
+async def watch_knowledge_index_updates(rag_engine: RAGEngine):
+    """[V50.3] เฝ้าดูไฟล์ index หนังสือ/กราฟ/ข่าว เมื่อ manage_*.py สร้างใหม่ จะโหลดใหม่ (และล้างแคชคำตอบผ่าน reload listener)"""
+    last_signature = await asyncio.to_thread(rag_engine.index_signature)
+
+    while True:
+        await asyncio.sleep(settings.KNOWLEDGE_INDEX_WATCH_INTERVAL_SECONDS)
+        try:
+            signature = await asyncio.to_thread(rag_engine.index_signature)
+            if signature == last_signature:
+                continue
+            last_signature = signature
+            print("🔔 Knowledge indexes changed on disk. Reloading RAG indexes...")
+            await rag_engine.load_models_and_index()
+        except Exception as e:
+            print(f" 	- Error while reloading knowledge indexes: {e}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     
     global DISPATCHER, GRAPH_MANAGER, AGENTS
     print("--- 🚀 Initializing Project Nexus Server (V47 - Async & Corrected) ---") 
+    if settings.LLM_PROVIDER == "fake":
+        # [V50.14] load test: ทุกคำขอ LLM ไปที่ core/fake_llm.py (ต้องรัน python -m core.fake_llm แยกไว้)
+        print(f"🧪 LLM_PROVIDER=fake: Groq/Gemini requests go to {settings.FAKE_LLM_BASE_URL} (no real quota used).")
     try:
         google_key_manager = ApiKeyManager(all_google_keys=settings.GOOGLE_API_KEYS, silent=True)
         groq_key_manager = GroqApiKeyManager(all_groq_keys=settings.GROQ_API_KEYS, silent=True)
+        # [V50.4] คำขอสำรอง (hedged) ของ agent หนึ่งต้องใช้คีย์ของอีก provider
+        llm_hedger.configure(google_key_manager, groq_key_manager)
         
         device = "cuda" if torch.cuda.is_available() else "cpu"
         print(f"--- 🧠 Initializing Central Armory on {device.upper()} (Optimized FP16 Mode) ---")
@@ -118,16 +173,21 @@ async def lifespan(app: FastAPI):
         
         hf_models_task = asyncio.create_task(asyncio.to_thread(_blocking_load_hf_models))
 
+        # [V49] ความทรงจำระยะยาวมีตัวค้นหาเดียว ใช้ร่วมกันทั้ง RAGEngine และ GeneralConversationAgent
+        memory_retriever_instance = MemoryRetriever(
+            embedder=None,
+            index_dir=settings.MEMORY_INDEX_DIR,
+            db_path=settings.MEMORY_DB_PATH
+        ) # (V1)
         rag_engine_instance = RAGEngine(
             embedder=None, 
             reranker=None, 
-        ) # (V32)
-        memory_manager_instance = MemoryManager() # (V17)
+            memory_retriever=memory_retriever_instance
+        ) # (V33)
+        # [V50] คัดแยกเจตนาบนเครื่องก่อนถาม LLM (ใช้ embedding จาก warm cache ของ RAGEngine)
+        intent_classifier_instance = IntentClassifier(embedder=None) if settings.INTENT_CLASSIFIER_ENABLED else None
+        memory_manager_instance = MemoryManager(db_path=settings.MEMORY_DB_PATH) # (V17)
         tts_engine_instance = TextToSpeechEngine() # (V33)
-        ltm_manager_instance = LongTermMemoryManager( # (V34)
-            embedding_model="intfloat/multilingual-e5-large",
-            index_dir="data/memory_index"
-        )
         
         AGENTS = {
             "MEMORY": memory_manager_instance,
@@ -148,18 +208,20 @@ async def lifespan(app: FastAPI):
                 key_manager=groq_key_manager, 
                 model_name=settings.MEMORY_AGENT_MODEL, 
                 memory_manager=memory_manager_instance, 
-                persona_prompt=FENG_PERSONA_PROMPT 	
+                persona_prompt=FENG_PERSONA_PROMPT,
+                intent_classifier=intent_classifier_instance
             ),
             "FENG": FengAgent( # (V37)
                 key_manager=google_key_manager,
                 model_name=settings.PRIMARY_GEMINI_MODEL,
-                persona_prompt=FENG_PERSONA_PROMPT
+                persona_prompt=FENG_PERSONA_PROMPT,
+                intent_classifier=intent_classifier_instance
             ),
             "GENERAL_HANDLER": GeneralConversationAgent( # (V42)
                 key_manager=groq_key_manager,
                 model_name=settings.FENG_PRIMARY_MODEL,
                 rag_engine=rag_engine_instance,
-                ltm_manager=ltm_manager_instance,
+                memory_retriever=memory_retriever_instance,
                 persona_prompt=FENG_PERSONA_PROMPT
             ),
             "PROACTIVE_OFFER_HANDLER": ProactiveOfferAgent( # (V41)
@@ -219,6 +281,10 @@ async def lifespan(app: FastAPI):
         
         rag_engine_instance.embedder = embedder_instance
         rag_engine_instance.reranker = reranker_instance
+        memory_retriever_instance.embedder = embedder_instance
+        if intent_classifier_instance:
+            intent_classifier_instance.embedder = embedder_instance
+            intent_classifier_instance.query_encoder = rag_engine_instance.encode_query
         
         global GRAPH_MANAGER
         GRAPH_MANAGER = GraphManager() 
@@ -235,11 +301,14 @@ async def lifespan(app: FastAPI):
         
         await asyncio.gather(
             rag_engine_instance.load_models_and_index(),    
-            ltm_manager_instance.load_models_and_index(),  
+            memory_retriever_instance.load(),  
+            intent_classifier_instance.load() if intent_classifier_instance else asyncio.sleep(0),
             asyncio.to_thread(_blocking_verify_neo4j)       
         )
         
         asyncio.create_task(cleanup_old_audio_files())
+        asyncio.create_task(watch_memory_index_updates(memory_retriever_instance))
+        asyncio.create_task(watch_knowledge_index_updates(rag_engine_instance))
         DISPATCHER = Dispatcher(agents=AGENTS, key_manager=google_key_manager)
         
         print("✅ All systems operational. Hybrid AI team is ready.")
@@ -251,6 +320,8 @@ async def lifespan(app: FastAPI):
     yield
     
     print("--- 🌙 Server shutting down ---")
+    await llm_gateway.aclose()
+    await gemini_clients.aclose()
     if GRAPH_MANAGER:
         GRAPH_MANAGER.close()
 
@@ -285,12 +356,22 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                 await send_update({"type": "error", "payload": {"detail": "Server is initializing."}})
                 continue
             
+            async def report_queue_position(position: int):
+                await send_update({"type": "progress", "payload": {
+                    "status": "QUEUED", "position": position,
+                    "detail": f"ระบบกำลังทำงานเต็มกำลัง คุณอยู่คิวที่ {position}"
+                }})
+
             try:
-                await send_update({"type": "progress", "payload": {"status": "RECEIVED", "detail": "ได้รับคำสั่งแล้ว กำลังประมวลผล..."}})
-                
-                response_model = await DISPATCHER.handle_query(query, user_id, update_callback=send_update)
+                async with ADMISSION.admit(user_id, on_queued=report_queue_position):
+                    await send_update({"type": "progress", "payload": {"status": "RECEIVED", "detail": "ได้รับคำสั่งแล้ว กำลังประมวลผล..."}})
+                    
+                    # [V50.5] งบเวลาของเทิร์นเริ่มนับเมื่อได้เข้าทำงาน และลดคุณภาพตามโหลด ณ ตอนนั้น
+                    response_model = await DISPATCHER.handle_query(query, user_id, update_callback=send_update,
+                                                                   deadline=Deadline(load=ADMISSION.load()))
                 
-                if response_model.answer and not response_model.error:
+                # [V50.14] LLM_PROVIDER=fake ไม่สร้างเสียง (gTTS เรียกเครือข่ายจริง และ load test ไม่ได้ใช้ไฟล์เสียง)
+                if response_model.answer and not response_model.error and settings.LLM_PROVIDER != "fake":
                     timestamp = int(time.time())
                     filename = f"response_{user_id}_{timestamp}.mp3"
                     task_id = filename
@@ -308,6 +389,11 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                 final_data = response_model.dict()
                 await send_update({"type": "final_response", "payload": final_data})
 
+            except AdmissionRejected as e:
+                await send_update({"type": "error", "payload": {
+                    "code": 503, "retry_after": e.retry_after,
+                    "detail": f"ระบบมีผู้ใช้งานมากเกินไป กรุณาลองใหม่ในอีก {e.retry_after} วินาที"
+                }})
             except Exception as e:
                 print(f"❌ Error during WebSocket processing for user {user_id}: {e}")
                 traceback.print_exc()
@@ -324,9 +410,11 @@ async def ask_assistant(request: QueryRequest, background_tasks: BackgroundTasks
     if not DISPATCHER:
         raise HTTPException(status_code=503, detail="Server is still initializing or has failed.")
     try:
-        response = await DISPATCHER.handle_query(request.query, request.user_id)
+        async with ADMISSION.admit(request.user_id):
+            response = await DISPATCHER.handle_query(request.query, request.user_id,
+                                                     deadline=Deadline(load=ADMISSION.load()))
 
-        if response.answer and not response.error:
+        if response.answer and not response.error and settings.LLM_PROVIDER != "fake":
             timestamp = int(time.time())
             filename = f"response_{request.user_id}_{timestamp}.mp3"
             task_id = filename
@@ -343,11 +431,35 @@ async def ask_assistant(request: QueryRequest, background_tasks: BackgroundTasks
 
         return response
         
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail="Server is overloaded. Please retry later.",
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         print(f"❌ Unhandled error in /ask endpoint: {e}")
         traceback.print_exc()
         return FinalResponse(agent_used="FATAL_ERROR", answer="ขออภัยครับ เกิดข้อผิดพลาดร้ายแรง", error=True)
 
+@app.get("/api/metrics", tags=["Monitoring"])
+async def get_metrics():
+    """[V50.3] สถิติ admission control และ hit rate ของแคชคำตอบ [V50.7] + การใช้ connection ซ้ำของ Groq/Gemini client [V50.9] + โควตาคงเหลือต่อคีย์ [V50.10] + จำนวน retry ต่อ agent [V50.11] + สถานะคีย์ที่ใช้ร่วมกับ process อื่น [V50.12] + แคชคำตอบ LLM บนดิสก์ [V50.13] + token ที่ตัดออกจาก prompt ต่อ agent [V50.15] + hit rate ของ warm cache / prefetch ของ RAG"""
+    return {
+        "admission": ADMISSION.snapshot(),
+        "answer_cache": DISPATCHER.answer_cache.metrics() if DISPATCHER and DISPATCHER.answer_cache else None,
+        "llm_hedging": llm_hedger.metrics(),
+        "llm_gateway": llm_gateway.metrics(),
+        "gemini_clients": gemini_clients.metrics(),
+        "single_flight": DISPATCHER.single_flight.metrics() if DISPATCHER else None,
+        "llm_retries": llm_retry_policy.metrics(),
+        "key_state": default_key_state_store().snapshot() if default_key_state_store() else None,
+        "llm_cache": llm_cache.metrics(),
+        "prompt_budget": prompt_budgeter.metrics(),
+        "rag_warm_cache": DISPATCHER.rag_engine.warm_cache_metrics() if DISPATCHER and DISPATCHER.rag_engine else None,
+        "rate_limits": {
+            "google": llm_hedger.google_key_manager.rate_limiter.snapshot() if llm_hedger.google_key_manager else None,
+            "groq": llm_hedger.groq_key_manager.rate_limiter.snapshot() if llm_hedger.groq_key_manager else None,
+        },
+    }
+
 @app.get("/audio_status/{task_id}")
 async def get_audio_status(task_id: str):
     task = audio_tasks.get(task_id)
@@ -1,22 +1,28 @@
-# (V12.2 - BGE-M3 Optimized & FP16 VRAM)
+# (V15.1 - Memory Paths from Settings)
 
+import argparse
 import sqlite3
 import faiss
 import json
 import os
 import torch
 import time
+from concurrent.futures import ThreadPoolExecutor
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import re
+from collections import defaultdict
 import numpy as np 
 
+from core.config import settings
+from core.memory_index import MemoryIndexShards, MemoryVectorIndex, ensure_vector_log_schema, log_upserts, log_deletes, memory_embedding_text
+
 class MemoryBuilder:
     def __init__(self, model_name="BAAI/bge-m3"):
-        self.DB_PATH = "data/memory.db"
-        self.MEMORY_INDEX_DIR = "data/memory_index"
-        self.MEMORY_FAISS_PATH = os.path.join(self.MEMORY_INDEX_DIR, "memory_faiss.index")
-        self.MEMORY_MAPPING_PATH = os.path.join(self.MEMORY_INDEX_DIR, "memory_mapping.jsonl")
+        self.DB_PATH = settings.MEMORY_DB_PATH
+        self.MEMORY_INDEX_DIR = settings.MEMORY_INDEX_DIR
+        self.MEMORY_INDEX_VERSION_PATH = os.path.join(self.MEMORY_INDEX_DIR, settings.MEMORY_INDEX_VERSION_FILE)
+        
         
         device = "cuda" if torch.cuda.is_available() else "cpu"
         print(f"⚙️  Memory Builder is initializing on device: {device.upper()}")
@@ -30,6 +36,10 @@ class MemoryBuilder:
         print(f"✅ Embedding model '{model_name}' loaded successfully (FP16: {device=='cuda'}).")
 
         self._ensure_db_schema()
+        # [V15] index ที่อ้างอิงด้วย long_term_memories.id แยก shard ละหนึ่ง session
+        self.shards = MemoryIndexShards(
+            db_path=self.DB_PATH, root_dir=self.MEMORY_INDEX_DIR, max_loaded=settings.MEMORY_SHARD_CACHE_SIZE
+        )
 
     def _ensure_db_schema(self):
         """[UPGRADE] เพิ่มคอลัมน์สำหรับเก็บ 'ช่วงเวลา' ของบทสนทนา"""
@@ -66,239 +76,341 @@ class MemoryBuilder:
             conn.commit()
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_ltm_session_id ON long_term_memories(session_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_ch_session_id ON conversation_history(session_id)")
+            ensure_vector_log_schema(cursor)
             conn.commit()
             print("🗄️  LTM DB Schema (V12.2) is ready.")
 
-    def get_unprocessed_conversation_chunks(self, num_sessions: int = 5, chunk_size: int = 20) -> List[Dict[str, Any]]:
-        chunks_to_process = []
+    def _connect(self) -> sqlite3.Connection:
+        # [V13] รอ lock นานขึ้น เพราะเซิร์ฟเวอร์อาจกำลังเขียน conversation_history พร้อมกัน
+        return sqlite3.connect(self.DB_PATH, timeout=30)
+
+    def get_pending_sessions(self, num_sessions: int = 5) -> List[Tuple[str, int]]:
+        """[V13] คืน (session_id, last_processed_id) ของ session ที่มีคำตอบใหม่จากโมเดลแล้ว"""
         try:
-            with sqlite3.connect(self.DB_PATH) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._connect() as conn:
                 cursor = conn.cursor()
-                
                 cursor.execute("""
                     WITH SessionMaxID AS (
-                        SELECT session_id, MAX(id) as max_id
+                        SELECT session_id, MAX(CASE WHEN role = 'model' THEN id END) as max_model_id
                         FROM conversation_history
                         GROUP BY session_id
                     )
                     SELECT T1.session_id, COALESCE(T2.last_processed_id, 0) as last_processed_id
                     FROM SessionMaxID T1
                     LEFT JOIN memory_processing_state T2 ON T1.session_id = T2.session_id
-                    WHERE T1.max_id > COALESCE(T2.last_processed_id, 0)
+                    WHERE T1.max_model_id > COALESCE(T2.last_processed_id, 0)
                     ORDER BY T1.session_id
                     LIMIT ?
                 """, (num_sessions,))
-                
-                sessions = cursor.fetchall()
-
-                if not sessions: return []
-                print(f"🔍 Found {len(sessions)} active sessions with new messages.")
-                for session in sessions:
-                    session_id, last_id = session['session_id'], session['last_processed_id']
-                    cursor.execute(
-                        "SELECT id, role, content, timestamp FROM conversation_history WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
-                        (session_id, last_id, chunk_size)
-                    )
-                    messages = [dict(row) for row in cursor.fetchall()]
-                    if messages:
-                        chunks_to_process.append({
-                            "session_id": session_id, "messages": messages,
-                            "start_message_id": messages[0]['id'], "end_message_id": messages[-1]['id'],
-                            "conversation_start_time": messages[0]['timestamp'],
-                            "conversation_end_time": messages[-1]['timestamp']
-                        })
-                return chunks_to_process
+                return [(row[0], row[1]) for row in cursor.fetchall()]
         except Exception as e:
-            print(f"❌ Could not retrieve conversation chunks: {e}")
+            print(f"❌ Could not retrieve pending sessions: {e}")
             return []
 
-    def extract_memories_from_chunks(self, conversation_chunks: List[Dict[str, Any]]) -> List[Dict]:
-        if not conversation_chunks: return []
-        
-        print(f"\n--- ✍️  Extracting memories from {len(conversation_chunks)} chunks (Rule-based)... ---")
-        successful_memories = []
-        
-        for chunk in conversation_chunks:
-            try:
-                user_messages = [msg['content'] for msg in chunk['messages'] if msg['role'] == 'user']
-                model_messages = [msg['content'] for msg in chunk['messages'] if msg['role'] == 'model']
-
-                if not user_messages or not model_messages: continue
-
-                title = user_messages[0][:100]
-                summary = model_messages[-1]
-                keywords = list(set(re.findall(r'\b\w{4,}\b', title.lower())))[:5]
-
-                memory_data = {
-                    "title": title, "summary": summary, "keywords": keywords
-                }
-                memory_data.update(chunk)
-                successful_memories.append(memory_data)
-            except Exception as e:
-                print(f"  - ⚠️ Error processing chunk for session {chunk['session_id']} with rules: {e}")
-        
-        print(f"  - ✅ Extracted {len(successful_memories)} memories successfully.")
-        return successful_memories
+    def get_session_chunk(self, session_id: str, last_id: int, chunk_size: int = 20) -> Optional[Dict[str, Any]]:
+        """[V13] ดึงข้อความชุดถัดไปของ session เดียว (เรียกจาก worker thread ได้)"""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, role, content, timestamp FROM conversation_history WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (session_id, last_id, chunk_size)
+            )
+            messages = [dict(row) for row in cursor.fetchall()]
+        # [V13] ถ้าถึงท้ายประวัติแล้ว ข้อความท้ายที่เป็นของผู้ใช้อาจยังรอคำตอบอยู่ เก็บไว้ประมวลผลรอบถัดไป
+        if len(messages) < chunk_size:
+            while messages and messages[-1]['role'] == 'user':
+                messages.pop()
+        if not messages:
+            return None
+        return {
+            "session_id": session_id, "messages": messages,
+            "start_message_id": messages[0]['id'], "end_message_id": messages[-1]['id'],
+            "conversation_start_time": messages[0]['timestamp'],
+            "conversation_end_time": messages[-1]['timestamp']
+        }
+
+    def extract_memory_from_chunk(self, chunk: Dict[str, Any]) -> Optional[Dict]:
+        """[V13] สกัดความทรงจำจาก chunk เดียว (Rule-based) คืน None ถ้าไม่มีคู่ถาม-ตอบ"""
+        user_messages = [msg['content'] for msg in chunk['messages'] if msg['role'] == 'user']
+        model_messages = [msg['content'] for msg in chunk['messages'] if msg['role'] == 'model']
 
-    def save_memories_to_db(self, memories: List[Dict]):
-        if not memories: return
+        if not user_messages or not model_messages: return None
+
+        title = user_messages[0][:100]
+        summary = model_messages[-1]
+        keywords = list(set(re.findall(r'\b\w{4,}\b', title.lower())))[:5]
+
+        memory_data = {
+            "title": title, "summary": summary, "keywords": keywords
+        }
+        memory_data.update(chunk)
+        return memory_data
+
+    # ------------------------------------------------------------------
+    # [V13] Continuous mode: ทำงานเป็นชุด แต่ละชุด commit แบบ atomic
+    # ------------------------------------------------------------------
+
+    def _prepare_session(self, session_id: str, last_id: int, chunk_size: int) -> Optional[Tuple[Dict, Optional[Dict]]]:
+        """[V13] งานของ worker หนึ่งตัว: ดึง chunk ของ session แล้วสกัดความทรงจำ"""
         try:
-            with sqlite3.connect(self.DB_PATH) as conn:
-                cursor = conn.cursor()
-                for mem in memories:
-                    cursor.execute(
-                        """INSERT INTO long_term_memories (session_id, title, summary, keywords, start_message_id, end_message_id, conversation_start_time, conversation_end_time) 
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                        (mem['session_id'], mem['title'], mem['summary'], ", ".join(mem.get('keywords', [])), 
-                         mem['start_message_id'], mem['end_message_id'], 
-                         mem['conversation_start_time'], mem['conversation_end_time'])
-                    )
-                conn.commit()
-                print(f"  - 💾 Saved {len(memories)} new memories to database.")
+            chunk = self.get_session_chunk(session_id, last_id, chunk_size)
+            if not chunk:
+                return None
+            return chunk, self.extract_memory_from_chunk(chunk)
         except Exception as e:
-            print(f"  - ❌ Could not save memories to DB: {e}")
+            print(f"  - ⚠️ Worker failed on session {session_id}: {e}")
+            return None
 
-    def update_processing_state(self, chunks: List[Dict]):
-        if not chunks: return
+    def _embed_memories(self, memories: List[Dict]) -> np.ndarray:
+        texts_to_embed = [memory_embedding_text(mem) for mem in memories]
+        embeddings = self.model.encode(texts_to_embed, show_progress_bar=False, convert_to_numpy=True).astype("float32")
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+    def _commit_batch_to_db(self, chunks: List[Dict], memories: List[Dict], embeddings: Optional[np.ndarray]):
+        """
+        [V14] บันทึกความทรงจำ + เวกเตอร์ (memory_vector_log) + processing state + การย้ายไป archive
+        ใน transaction เดียว ถ้าล้มกลางทาง จะไม่มีอะไรถูกบันทึกเลย และชุดนี้จะถูกประมวลผลใหม่ในรอบถัดไป
+        """
+        conn = self._connect()
         try:
-            with sqlite3.connect(self.DB_PATH) as conn:
-                cursor = conn.cursor()
-                for chunk in chunks:
-                    cursor.execute(
-                        "INSERT INTO memory_processing_state (session_id, last_processed_id) VALUES (?, ?) ON CONFLICT(session_id) DO UPDATE SET last_processed_id = excluded.last_processed_id",
-                        (chunk['session_id'], chunk['end_message_id'])
-                    )
-                conn.commit()
-                print(f"  - 🔄 Updated processing state for {len(chunks)} chunks.")
-        except Exception as e:
-            print(f"  - ❌ Could not update processing state: {e}")
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for mem in memories:
+                cursor.execute(
+                    """INSERT INTO long_term_memories (session_id, title, summary, keywords, start_message_id, end_message_id, conversation_start_time, conversation_end_time) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (mem['session_id'], mem['title'], mem['summary'], ", ".join(mem.get('keywords', [])), 
+                     mem['start_message_id'], mem['end_message_id'], 
+                     mem['conversation_start_time'], mem['conversation_end_time'])
+                )
+                mem['id'] = cursor.lastrowid
+            for session_id, positions in self._group_by_session(memories).items():
+                log_upserts(cursor, session_id, [memories[i]['id'] for i in positions], embeddings[positions])
+            for chunk in chunks:
+                session_id, start_id, end_id = chunk['session_id'], chunk['start_message_id'], chunk['end_message_id']
+                cursor.execute(
+                    "INSERT INTO memory_processing_state (session_id, last_processed_id) VALUES (?, ?) ON CONFLICT(session_id) DO UPDATE SET last_processed_id = excluded.last_processed_id",
+                    (session_id, end_id)
+                )
+                cursor.execute(
+                    """
+                    INSERT OR IGNORE INTO archived_conversations (id, timestamp, session_id, role, content, agent_used)
+                    SELECT id, timestamp, session_id, role, content, agent_used
+                    FROM conversation_history
+                    WHERE session_id = ? AND id BETWEEN ? AND ?
+                    """,
+                    (session_id, start_id, end_id)
+                )
+                cursor.execute(
+                    "DELETE FROM conversation_history WHERE session_id = ? AND id BETWEEN ? AND ?",
+                    (session_id, start_id, end_id)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _group_by_session(memories: List[Dict]) -> Dict[str, List[int]]:
+        """[V15] จัดกลุ่มตำแหน่งของความทรงจำตาม session (index แยก shard ละ session)"""
+        groups: Dict[str, List[int]] = defaultdict(list)
+        for position, mem in enumerate(memories):
+            groups[mem['session_id']].append(position)
+        return groups
+
+    def _signal_index_updated(self):
+        """[V13] บอกเซิร์ฟเวอร์ที่กำลังรันอยู่ว่ามีเวกเตอร์ใหม่ (main.py เฝ้าดูไฟล์นี้)"""
+        os.makedirs(self.MEMORY_INDEX_DIR, exist_ok=True)
+        version_info = {"version": time.time_ns()}
+        tmp_path = self.MEMORY_INDEX_VERSION_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(version_info, f)
+        os.replace(tmp_path, self.MEMORY_INDEX_VERSION_PATH)
 
-    def build_and_save_index(self, memories: List[Dict]):
+    def _fetch_memories(self, session_id: Optional[str] = None, memory_ids: Optional[List[int]] = None) -> List[Dict]:
+        query, params = "SELECT id, session_id, title, summary FROM long_term_memories WHERE 1=1", []
+        if session_id is not None:
+            query += " AND session_id = ?"
+            params.append(session_id)
+        if memory_ids is not None:
+            query += f" AND id IN ({','.join('?' * len(memory_ids))})"
+            params.extend(memory_ids)
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(query + " ORDER BY id", params)]
+
+    def _sessions_with_memories(self) -> List[str]:
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM long_term_memories")]
+
+    def rebuild_session_index(self, session_id: str):
+        """[V15] สร้าง shard ของ session ใหม่ทั้งหมดจากตาราง long_term_memories"""
+        shard = self.shards.get(session_id)
+        snapshot_seq = shard.current_log_seq()
+        memories = self._fetch_memories(session_id=session_id)
         if not memories:
-            print("  - 🟡 No new memories to index.")
             return
+        embeddings = self._embed_memories(memories)
+        shard.rebuild([mem['id'] for mem in memories], embeddings, snapshot_seq)
 
-        print(f"\n--- 🏭 Building/Updating Memory RAG Index ---")
-        os.makedirs(self.MEMORY_INDEX_DIR, exist_ok=True)
-        
-        texts_to_embed = []
-        mapping_data = []
-        for mem in memories:
-            embedding_text = f"หัวข้อ: {mem.get('title', '')}\nสรุป: {mem.get('summary', '')}"
-            texts_to_embed.append(embedding_text)
-            
-            mem_copy = mem.copy()
-            mem_copy['embedding_text'] = embedding_text
-            mapping_data.append(mem_copy)
-
-        print(f"  - 🧠 Generating {len(texts_to_embed)} new embeddings (using {str(self.model.device).upper()})...")
-        new_embeddings = self.model.encode(
-            texts_to_embed, 
-            show_progress_bar=True, 
-            convert_to_numpy=True
-        ).astype("float32")
-        
-        faiss.normalize_L2(new_embeddings)
-        
-        if os.path.exists(self.MEMORY_FAISS_PATH):
-            print("  -  appending to existing index...")
-            index = faiss.read_index(self.MEMORY_FAISS_PATH)
-            index.add(new_embeddings)
-            with open(self.MEMORY_MAPPING_PATH, "a", encoding="utf-8") as f:
-                for item in mapping_data:
-                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
-        else:
-            print("  - creating new index (using IndexFlatIP for BGE-M3)...")
-            # [V12.2] Use Inner Product (IP) index for new indexes
-            index = faiss.IndexFlatIP(new_embeddings.shape[1])
-            index.add(new_embeddings)
-            with open(self.MEMORY_MAPPING_PATH, "w", encoding="utf-8") as f:
-                for item in mapping_data:
-                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
-            
-        faiss.write_index(index, self.MEMORY_FAISS_PATH)
-        print(f"  - ✅ Memory RAG Index updated successfully! Total memories in index: {index.ntotal}")
-    def archive_processed_conversations(self, chunks: List[Dict]):
+    def rebuild_index(self):
+        """[V15] สร้าง index ใหม่ทุก shard (ใช้ครั้งแรก หรือเมื่อเปลี่ยนโมเดล)"""
+        sessions = self._sessions_with_memories()
+        print(f"\n--- 🏭 Rebuilding Memory Index for {len(sessions)} sessions ---")
+        for session_id in sessions:
+            self.rebuild_session_index(session_id)
+        self._signal_index_updated()
+
+    def load_index_state(self):
+        """[V15] ตรวจว่าทุก session ที่มีความทรงจำมี shard แล้ว ถ้ายังไม่มี (เช่น ข้อมูลก่อน V15) ให้สร้างจาก DB"""
+        missing = [
+            sid for sid in self._sessions_with_memories()
+            if not MemoryVectorIndex(sid, db_path=self.DB_PATH, root_dir=self.MEMORY_INDEX_DIR).exists()
+        ]
+        if missing:
+            print(f"  - 🩹 Building memory index shards for {len(missing)} sessions from the database...")
+            for session_id in missing:
+                self.rebuild_session_index(session_id)
+            self._signal_index_updated()
+        print("  - ✅ Memory index shards are ready.")
+
+    def delete_memories(self, memory_ids: List[int]):
+        """[V14] ลบความทรงจำออกจาก DB และ index ใน transaction เดียว"""
+        memories = self._fetch_memories(memory_ids=memory_ids)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for session_id, positions in self._group_by_session(memories).items():
+                ids = [memories[i]['id'] for i in positions]
+                cursor.execute(f"DELETE FROM long_term_memories WHERE id IN ({','.join('?' * len(ids))})", ids)
+                log_deletes(cursor, session_id, ids)
+            conn.commit()
+        self._refresh_sessions({mem['session_id'] for mem in memories})
+        print(f"  - 🗑️  Deleted {len(memories)} memories.")
+
+    def reembed_memories(self, memory_ids: List[int]):
+        """[V14] ฝังเวกเตอร์ใหม่ให้ความทรงจำที่ถูกแก้ไขใน DB (เช่น แก้ title/summary)"""
+        memories = self._fetch_memories(memory_ids=memory_ids)
+        if not memories:
+            print("  - 🟡 No matching memories to re-embed.")
+            return
+        embeddings = self._embed_memories(memories)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for session_id, positions in self._group_by_session(memories).items():
+                log_upserts(cursor, session_id, [memories[i]['id'] for i in positions], embeddings[positions])
+            conn.commit()
+        self._refresh_sessions({mem['session_id'] for mem in memories})
+        print(f"  - ♻️  Re-embedded {len(memories)} memories.")
+
+    def _refresh_sessions(self, session_ids):
+        """[V15] replay log ให้ shard ที่เปลี่ยน, compact ถ้า log ยาวเกินเกณฑ์ แล้วแจ้งเซิร์ฟเวอร์"""
+        for session_id in session_ids:
+            shard = self.shards.get(session_id)
+            shard.refresh()
+            if shard.pending_log_size() >= settings.MEMORY_INDEX_COMPACT_THRESHOLD:
+                shard.compact()
+        self._signal_index_updated()
+
+    def compact_all(self):
+        """[V15] รวม log ที่ค้างอยู่ของทุก session เข้าไฟล์ฐานทันที"""
+        with self._connect() as conn:
+            sessions = [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM memory_vector_log")]
+        for session_id in sessions:
+            self.shards.get(session_id).compact()
+        self._signal_index_updated()
+
+    def run_batch(self, executor: ThreadPoolExecutor, num_sessions: int, chunk_size: int) -> int:
         """
-        ย้ายข้อความดิบใน conversation_history ที่ถูกประมวลผลแล้ว
-        ไปเก็บไว้ในตาราง archived_conversations
+        [V13] ประมวลผลหนึ่งชุด: worker ดึง+สกัดแบบขนานต่อ session,
+        ฝังเวกเตอร์ แล้ว commit ทุกอย่างแบบ atomic ก่อนส่งสัญญาณให้เซิร์ฟเวอร์ คืนจำนวน chunk ที่ทำไป
         """
-        if not chunks: return
-        
-        print(f"\n--- 🗄️  Archiving {len(chunks)} processed conversation chunks... ---")
-        try:
-            with sqlite3.connect(self.DB_PATH) as conn:
-                cursor = conn.cursor()
-                total_moved = 0
-                for chunk in chunks:
-                    session_id = chunk['session_id']
-                    start_id = chunk['start_message_id']
-                    end_id = chunk['end_message_id']
-                    
-                    cursor.execute(
-                        """
-                        INSERT OR IGNORE INTO archived_conversations (id, timestamp, session_id, role, content, agent_used)
-                        SELECT id, timestamp, session_id, role, content, agent_used
-                        FROM conversation_history
-                        WHERE session_id = ? AND id BETWEEN ? AND ?
-                        """,
-                        (session_id, start_id, end_id)
-                    )
-                    
-                    cursor.execute(
-                        "DELETE FROM conversation_history WHERE session_id = ? AND id BETWEEN ? AND ?",
-                        (session_id, start_id, end_id)
-                    )
-                    
-                    total_moved += cursor.rowcount
-                
-                conn.commit()
-                print(f"  - ✅ Archived and cleaned up {total_moved} old messages.")
-        except Exception as e:
-            print(f"  - ❌ Could not archive processed conversations: {e}")
+        sessions = self.get_pending_sessions(num_sessions)
+        if not sessions:
+            return 0
+        print(f"🔍 Found {len(sessions)} active sessions with new messages.")
+
+        results = [r for r in executor.map(lambda s: self._prepare_session(s[0], s[1], chunk_size), sessions) if r]
+        chunks = [chunk for chunk, _ in results]
+        memories = [memory for _, memory in results if memory]
+        if not chunks:
+            return 0
+
+        embeddings = self._embed_memories(memories) if memories else None
+        self._commit_batch_to_db(chunks, memories, embeddings)
+        print(f"  - 💾 Committed batch: {len(memories)} memories from {len(chunks)} chunks (vectors + state + archive included).")
+
+        if memories:
+            touched_sessions = {mem['session_id'] for mem in memories}
+            self._refresh_sessions(touched_sessions)
+            print(f"  - 🏭 Updated memory index shards of {len(touched_sessions)} sessions. Server notified.")
+        return len(chunks)
+
+    def run_continuous(self, workers: int, num_sessions: int, chunk_size: int, interval: float, daemon: bool):
+        """[V13] วนทำงานทีละชุด ถ้าเป็น daemon จะรอ interval แล้วตรวจสอบใหม่แทนการจบโปรแกรม"""
+        self.load_index_state()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="memory-worker") as executor:
+            while True:
+                try:
+                    processed = self.run_batch(executor, num_sessions, chunk_size)
+                except Exception as e:
+                    print(f"❌ Batch failed, will retry: {e}")
+                    processed = 0
+                    if not daemon:
+                        raise
+                if processed:
+                    continue
+                if not daemon:
+                    print("\n🎉 All sessions are fully processed and up-to-date!")
+                    return
+                time.sleep(interval)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory consolidation & indexing for Project Nexus")
+    parser.add_argument("--daemon", action="store_true", help="ทำงานต่อเนื่อง คอยประมวลผลบทสนทนาใหม่ตลอดเวลา")
+    parser.add_argument("--workers", type=int, default=settings.MEMORY_DAEMON_WORKERS, help="จำนวน worker ที่ประมวลผล session แบบขนาน")
+    parser.add_argument("--batch-sessions", type=int, default=settings.MEMORY_DAEMON_BATCH_SESSIONS, help="จำนวน session สูงสุดต่อชุด")
+    parser.add_argument("--chunk-size", type=int, default=20, help="จำนวนข้อความต่อ chunk")
+    parser.add_argument("--interval", type=float, default=settings.MEMORY_DAEMON_INTERVAL_SECONDS, help="(daemon) วินาทีที่รอเมื่อไม่มีงาน")
+    parser.add_argument("--rebuild-index", action="store_true", help="สร้าง Memory index ใหม่ทั้งหมดจากฐานข้อมูล")
+    parser.add_argument("--compact", action="store_true", help="รวม vector log เข้าไฟล์ index หลักทันที")
+    parser.add_argument("--delete-memory", type=int, nargs="+", metavar="ID", help="ลบความทรงจำตาม id")
+    parser.add_argument("--reembed-memory", type=int, nargs="+", metavar="ID", help="ฝังเวกเตอร์ใหม่ให้ความทรงจำที่ถูกแก้ไข")
+    args = parser.parse_args()
+
     print("\n" + "="*60)
-    print("--- 🏛️  Starting Memory Consolidation & Indexing Process (BGE-M3 / FP16) 🏛️ ---")
+    mode = "Daemon" if args.daemon else "One-shot"
+    print(f"--- 🏛️  Starting Memory Consolidation & Indexing Process ({mode}, {args.workers} workers) 🏛️ ---")
     print("="*60)
 
     builder = MemoryBuilder()
-    
-    all_new_memories = []
-    all_processed_chunks_for_archiving = []
-    
-    while True:
-        print("\n" + "-"*20 + " Searching for new conversation chunks " + "-"*20)
-        
-        unprocessed_chunks = builder.get_unprocessed_conversation_chunks(num_sessions=10, chunk_size=20)
-        if not unprocessed_chunks:
-            print("\n✅ No more unprocessed chunks found.")
-            break
-        
-        new_memories = builder.extract_memories_from_chunks(unprocessed_chunks)
-        builder.update_processing_state(unprocessed_chunks)
 
-        if new_memories:
-            all_new_memories.extend(new_memories)
-            all_processed_chunks_for_archiving.extend(unprocessed_chunks)
-            print(f"  - Staged {len(new_memories)} new memories for batch processing.")
-
-        print("...Searching for more messages...")
-        time.sleep(1)
+    maintenance_requested = args.rebuild_index or args.compact or args.delete_memory or args.reembed_memory
+    if maintenance_requested:
+        if args.rebuild_index:
+            builder.rebuild_index()
+        else:
+            builder.load_index_state()
+        if args.delete_memory:
+            builder.delete_memories(args.delete_memory)
+        if args.reembed_memory:
+            builder.reembed_memories(args.reembed_memory)
+        if args.compact:
+            builder.compact_all()
+        raise SystemExit(0)
 
-    if all_new_memories:
-        print("\n" + "="*60)
-        print(f"--- 🏛️  Committing {len(all_new_memories)} new memories to storage (Batch Operation)  🏛️ ---")
-        print("="*60)
-        
-        builder.save_memories_to_db(all_new_memories)
-        builder.build_and_save_index(all_new_memories)
-        builder.archive_processed_conversations(all_processed_chunks_for_archiving)
-    else:
-        print("\n🎉 All sessions are fully processed and up-to-date!")
+    try:
+        builder.run_continuous(
+            workers=args.workers, num_sessions=args.batch_sessions,
+            chunk_size=args.chunk_size, interval=args.interval, daemon=args.daemon
+        )
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped by user. Every committed batch is already saved.")
 
     print("\n" + "="*60)
     print("--- 🏛️  Memory Consolidation Process Finished  🏛️ ---")
-    print("="*60)
\ No newline at end of file
+    print("="*60)
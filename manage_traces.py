@@ -0,0 +1,148 @@
+# manage_traces.py
+# (V1.0 - Trace Summarizer)
+# อ่านไฟล์ trace (OTLP/JSON lines จาก core/tracing.py) แล้วสรุป latency ต่อ agent ที่ตอบจริง (agent_used)
+# - ต่อเทิร์น: จำนวน, p50, p95 ของ span ราก dispatcher.handle_query
+# - แยกตามขั้นตอน: เวลาเฉลี่ยต่อเทิร์นของแต่ละชื่อ span และสัดส่วนเทียบกับเวลาทั้งเทิร์น
+#   (span ซ้อนกันหรือทำงานพร้อมกันได้ เช่น rag.rerank อยู่ใน rag.search_books ผลรวมสัดส่วนจึงเกิน 100% ได้)
+# - trace ที่ไม่ใช่เทิร์น (เช่น tts.synthesize ที่ทำงานเบื้องหลัง) สรุปแยกท้ายรายงาน
+#
+# วิธีใช้: python manage_traces.py
+#          python manage_traces.py --file data/traces.jsonl --last 500 --agent PLANNER
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List
+
+from core.config import settings
+
+TURN_ROOT_SPAN = "dispatcher.handle_query"
+
+
+def _attribute_value(value: Dict):
+    for key in ("stringValue", "boolValue", "doubleValue"):
+        if key in value:
+            return value[key]
+    if "intValue" in value:
+        return int(value["intValue"])
+    return None
+
+
+def load_spans(path: str) -> List[Dict]:
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            for resource in request.get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    for raw in scope.get("spans", []):
+                        spans.append({
+                            "trace_id": raw["traceId"],
+                            "parent_id": raw.get("parentSpanId"),
+                            "name": raw["name"],
+                            "start_ns": int(raw["startTimeUnixNano"]),
+                            "duration_ms": (int(raw["endTimeUnixNano"]) - int(raw["startTimeUnixNano"])) / 1e6,
+                            "attributes": {a["key"]: _attribute_value(a["value"]) for a in raw.get("attributes", [])},
+                            "error": raw.get("status", {}).get("code") == "STATUS_CODE_ERROR",
+                        })
+    return spans
+
+
+def group_traces(spans: List[Dict]) -> List[Dict]:
+    """คืน [{"root": span ราก, "children": [span อื่นใน trace เดียวกัน]}] เรียงตามเวลาเริ่ม"""
+    by_trace: Dict[str, List[Dict]] = defaultdict(list)
+    for span in spans:
+        by_trace[span["trace_id"]].append(span)
+    traces = []
+    for members in by_trace.values():
+        roots = [s for s in members if not s["parent_id"]]
+        if not roots:
+            continue  # ราก (ที่จบทีหลังสุด) ยังไม่ถูกเขียน เช่น server ถูกปิดกลางเทิร์น
+        root = roots[0]
+        traces.append({"root": root, "children": [s for s in members if s is not root]})
+    return sorted(traces, key=lambda t: t["root"]["start_ns"])
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def span_label(span: Dict) -> str:
+    if span["name"] == "llm.call":
+        owner = span["attributes"].get("agent") or span["attributes"].get("code.namespace")
+        purpose = span["attributes"].get("purpose")
+        return f"llm.call[{owner}{'/' + purpose if purpose else ''}]" if owner else "llm.call"
+    return span["name"]
+
+
+def summarize_turns(turns: List[Dict]):
+    by_agent: Dict[str, List[Dict]] = defaultdict(list)
+    for trace in turns:
+        by_agent[trace["root"]["attributes"].get("agent_used", "UNKNOWN")].append(trace)
+
+    print(f"\n{'agent_used':<22} | {'turns':>5} | {'p50 ms':>9} | {'p95 ms':>9} | {'errors':>6}")
+    print("-" * 64)
+    for agent, traces in sorted(by_agent.items(), key=lambda item: -len(item[1])):
+        durations = [t["root"]["duration_ms"] for t in traces]
+        errors = sum(1 for t in traces if t["root"]["attributes"].get("error") or t["root"]["error"])
+        print(f"{agent:<22} | {len(traces):>5} | {percentile(durations, 50):>9.0f} | {percentile(durations, 95):>9.0f} | {errors:>6}")
+
+    for agent, traces in sorted(by_agent.items(), key=lambda item: -len(item[1])):
+        turn_mean = sum(t["root"]["duration_ms"] for t in traces) / len(traces)
+        per_label: Dict[str, float] = defaultdict(float)
+        calls: Dict[str, int] = defaultdict(int)
+        for trace in traces:
+            for span in trace["children"]:
+                per_label[span_label(span)] += span["duration_ms"]
+                calls[span_label(span)] += 1
+        print(f"\n⏱️  {agent} (mean turn {turn_mean:.0f} ms)")
+        print(f"   {'span':<44} | {'calls/turn':>10} | {'ms/turn':>9} | {'share':>6}")
+        for label, total_ms in sorted(per_label.items(), key=lambda item: -item[1]):
+            mean_ms = total_ms / len(traces)
+            share = mean_ms / turn_mean if turn_mean else 0.0
+            print(f"   {label:<44} | {calls[label] / len(traces):>10.1f} | {mean_ms:>9.1f} | {share:>6.1%}")
+
+
+def summarize_background(others: List[Dict]):
+    by_name: Dict[str, List[float]] = defaultdict(list)
+    for trace in others:
+        by_name[trace["root"]["name"]].append(trace["root"]["duration_ms"])
+    print("\n🔊 Background traces (not part of turn latency)")
+    for name, durations in sorted(by_name.items()):
+        print(f"   {name:<44} | n={len(durations):<5} | p50 {percentile(durations, 50):.0f} ms | p95 {percentile(durations, 95):.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize Project Nexus request traces into per-agent latency breakdowns")
+    parser.add_argument("--file", default=settings.TRACE_FILE, help="ไฟล์ trace (OTLP/JSON lines)")
+    parser.add_argument("--last", type=int, default=0, help="สรุปเฉพาะ N เทิร์นล่าสุด (0 = ทั้งหมด)")
+    parser.add_argument("--agent", default=None, help="สรุปเฉพาะ agent_used นี้")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"❌ Trace file not found: {args.file} (ตั้ง TRACING_ENABLED=true แล้วใช้งาน server ก่อน)")
+        raise SystemExit(1)
+
+    traces = group_traces(load_spans(args.file))
+    turns = [t for t in traces if t["root"]["name"] == TURN_ROOT_SPAN]
+    others = [t for t in traces if t["root"]["name"] != TURN_ROOT_SPAN]
+    if args.agent:
+        turns = [t for t in turns if t["root"]["attributes"].get("agent_used") == args.agent]
+    if args.last:
+        turns = turns[-args.last:]
+
+    print("=" * 64)
+    print(f"--- 🔭 Trace Summary: {len(turns)} turns from {args.file} ---")
+    print("=" * 64)
+    if turns:
+        summarize_turns(turns)
+    else:
+        print("ℹ️  No completed turns found.")
+    if others and not args.agent:
+        summarize_background(others)
@@ -1,5 +1,5 @@
 // web/static/script.js
-// (V7.5 - Final Audited & Corrected Version)
+// (V7.6 - Streaming Deltas)
 
 import { createAudioManager } from './audioManager.js';
 import { createThoughtProcessManager } from './thoughtProcessManager.js';
@@ -46,6 +46,10 @@ document.addEventListener('DOMContentLoaded', () => {
         thinkingIndicator: null,
         thinkingTimer: null,
         thinkingStartTime: null,
+        streamBuffer: '',
+        streamElement: null,
+        streamRenderPending: false,
+        firstDeltaTime: null,
 
         addMessage(messageData, sender) {
             const messageContainer = document.createElement('div');
@@ -90,11 +94,43 @@ document.addEventListener('DOMContentLoaded', () => {
             }, 100);
         },
 
+        // [V7.6] แสดงคำตอบที่กำลังสตรีมภายใน thinking indicator จนกว่า final_response (ฉบับจัดรูปแบบ) จะมาแทนที่
+        appendDelta(text) {
+            if (!this.thinkingIndicator) return;
+            if (!this.streamElement) {
+                this.firstDeltaTime = Date.now();
+                this.thinkingIndicator.querySelector('.dot-flashing')?.remove();
+                this.streamElement = document.createElement('div');
+                this.streamElement.className = 'streaming-text';
+                this.thinkingIndicator.prepend(this.streamElement);
+            }
+            this.streamBuffer += text;
+            if (this.streamRenderPending) return;
+            this.streamRenderPending = true;
+            requestAnimationFrame(() => {
+                this.streamRenderPending = false;
+                if (!this.streamElement) return;
+                this.streamElement.innerHTML = window.marked
+                    ? window.marked.parse(this.streamBuffer)
+                    : this.streamBuffer.replace(/</g, "&lt;").replace(/>/g, "&gt;");
+                this.scrollToBottom();
+            });
+        },
+
+        resetStream() {
+            this.streamBuffer = '';
+            this.streamElement = null;
+            this.streamRenderPending = false;
+            this.firstDeltaTime = null;
+        },
+
         replaceThinkingIndicator(messageData) {
             clearInterval(this.thinkingTimer);
             this.thinkingTimer = null;
             if (!this.thinkingIndicator) { this.addMessage(messageData, 'feng'); return; }
             const finalTime = ((Date.now() - this.thinkingStartTime) / 1000).toFixed(2);
+            const firstTokenTime = this.firstDeltaTime ? ((this.firstDeltaTime - this.thinkingStartTime) / 1000).toFixed(2) : null;
+            this.resetStream();
             const messageContainer = document.createElement('div');
             messageContainer.className = 'message feng-message';
 
@@ -117,7 +153,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
             const timeElement = document.createElement('div');
             timeElement.className = 'message-time';
-            timeElement.textContent = `(ประมวลผลใน ${finalTime} วินาที)`;
+            timeElement.textContent = firstTokenTime
+                ? `(เริ่มตอบใน ${firstTokenTime} วินาที, เสร็จใน ${finalTime} วินาที)`
+                : `(ประมวลผลใน ${finalTime} วินาที)`;
             messageContainer.appendChild(timeElement);
 
             this.thinkingIndicator.replaceWith(messageContainer);
@@ -148,6 +186,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 const response = JSON.parse(event.data);
                 if (response.type === 'progress') {
                     thoughtProcessManager.addStep(response.payload);
+                } else if (response.type === 'delta') {
+                    ChatLog.appendDelta(response.payload.text || '');
                 } else if (response.type === 'final_response') {
                     const data = response.payload;
                     const messageData = { text: data.answer || 'ขออภัยค่ะ มีการตอบกลับที่ผิดพลาด', image: data.image || null };
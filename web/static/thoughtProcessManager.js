@@ -1,4 +1,4 @@
-// (V2.2 - Polished with Animations & Agent-Specific Colors)
+// (V2.5 - Polished with Animations, Agent-Specific Colors, Queue, Cache & Coalesced Status)
 
 export function createThoughtProcessManager() {
     const elements = {
@@ -12,11 +12,14 @@ export function createThoughtProcessManager() {
     };
 
     const statusMap = new Map([
+        ['QUEUED', { icon: '⏳', text: 'รอคิว' }],
         ['RECEIVED', { icon: '📥', text: 'ได้รับคำสั่ง' }],
         ['ROUTING', { icon: '🚦', text: 'วิเคราะห์เจตนา' }],
         ['PROCESSING', { icon: '⚙️', text: 'ประมวลผล' }],
         ['DEEP_ANALYSIS', { icon: '🧠', text: 'วิเคราะห์เชิงลึก' }],
         ['FORMATTING', { icon: '✍️', text: 'เรียบเรียงคำตอบ' }],
+        ['CACHE_HIT', { icon: '🗃️', text: 'ใช้คำตอบจากแคช' }],
+        ['COALESCED', { icon: '🔗', text: 'รอคำตอบร่วมกับคำขอเดียวกัน' }],
     ]);
 
     const agentMap = new Map([